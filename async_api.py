@@ -0,0 +1,127 @@
+from typing import List, Optional, Tuple, Type
+from result import Result
+
+from base_api import BaseAPI, PollInfo, PollMessage, UserRegistrationStatus
+from database import Polls, PollVoters, UsernameWhitelist
+from database.database import UserID
+from helpers.db_executor import DBExecutor
+from helpers.message_buillder import MessageBuilder
+
+"""
+awaitable versions of BaseAPI's database methods for async handlers
+each call runs on the DBExecutor using the connection checked out for
+the calling telegram update, so the event loop never waits on MySQL
+"""
+
+
+class AsyncAPI(object):
+    def __init__(
+        self, api: Type[BaseAPI] | BaseAPI = BaseAPI,
+        db_executor: Optional[DBExecutor] = None
+    ):
+        self.api = api
+        self.db_executor = db_executor or DBExecutor()
+
+    async def verify_voter(
+        self, poll_id: int, user_id: UserID, username: Optional[str] = None,
+        chat_id: Optional[int] = None
+    ) -> Result[tuple[PollVoters, bool], UserRegistrationStatus]:
+        return await self.db_executor.run(
+            self.api.verify_voter, poll_id, user_id,
+            username=username, chat_id=chat_id
+        )
+
+    async def register_from_username_whitelist(
+        self, poll_id: int, user_id: UserID, ignore_voter_limit: bool,
+        username: str
+    ) -> Result[PollVoters, UserRegistrationStatus]:
+        return await self.db_executor.run(
+            self.api.register_from_username_whitelist, poll_id=poll_id,
+            user_id=user_id, ignore_voter_limit=ignore_voter_limit,
+            username=username
+        )
+
+    async def register_user_id(
+        self, poll_id: int, user_id: UserID, ignore_voter_limit: bool,
+        from_whitelist: bool = False
+    ) -> Result[Tuple[PollVoters, bool], UserRegistrationStatus]:
+        return await self.db_executor.run(
+            self.api.register_user_id, poll_id=poll_id, user_id=user_id,
+            ignore_voter_limit=ignore_voter_limit,
+            from_whitelist=from_whitelist
+        )
+
+    async def check_has_voted(self, poll_id: int, user_id: UserID) -> bool:
+        return await self.db_executor.run(
+            self.api.check_has_voted, poll_id, user_id
+        )
+
+    async def get_poll_message(
+        self, poll_id: int, user_id: UserID, bot_username: str,
+        username: Optional[str], add_webapp_link: bool = False,
+        add_instructions: bool = False
+    ) -> Result[PollMessage, MessageBuilder]:
+        return await self.db_executor.run(
+            self.api.get_poll_message, poll_id=poll_id, user_id=user_id,
+            bot_username=bot_username, username=username,
+            add_webapp_link=add_webapp_link,
+            add_instructions=add_instructions
+        )
+
+    async def read_poll_info(
+        self, poll_id: int, user_id: UserID, username: Optional[str],
+        chat_id: Optional[int]
+    ) -> Result[PollInfo, MessageBuilder]:
+        return await self.db_executor.run(
+            self.api.read_poll_info, poll_id=poll_id, user_id=user_id,
+            username=username, chat_id=chat_id
+        )
+
+    async def unverified_read_poll_info(self, poll_id: int) -> PollInfo:
+        return await self.db_executor.run(
+            self.api.unverified_read_poll_info, poll_id=poll_id
+        )
+
+    async def get_poll_closed(
+        self, poll_id: int
+    ) -> Result[int, MessageBuilder]:
+        return await self.db_executor.run(self.api.get_poll_closed, poll_id)
+
+    async def get_poll_as_owner(
+        self, poll_id: int, user_id: UserID
+    ) -> Result[Polls, None]:
+        return await self.db_executor.run(
+            self.api.get_poll_as_owner, poll_id, user_id
+        )
+
+    async def has_access_to_poll_id(
+        self, poll_id: int, user_id: UserID, username: Optional[str]
+    ) -> bool:
+        return await self.db_executor.run(
+            self.api.has_access_to_poll_id, poll_id, user_id,
+            username=username
+        )
+
+    async def resolve_username_to_user_tele_ids(
+        self, username: str
+    ) -> List[int]:
+        return await self.db_executor.run(
+            self.api.resolve_username_to_user_tele_ids, username
+        )
+
+    async def get_whitelist_entry(
+        self, poll_id: int, user_id: UserID, username: str
+    ) -> Result[UsernameWhitelist, UserRegistrationStatus]:
+        return await self.db_executor.run(
+            self.api.get_whitelist_entry, poll_id=poll_id,
+            user_id=user_id, username=username
+        )
+
+    async def register_vote(
+        self, poll_id: int, rankings: List[int], user_tele_id: int,
+        username: Optional[str], chat_id: Optional[int]
+    ) -> Result[tuple[bool, bool], MessageBuilder]:
+        return await self.db_executor.run(
+            self.api.register_vote, poll_id=poll_id, rankings=rankings,
+            user_tele_id=user_tele_id, username=username, chat_id=chat_id
+        )
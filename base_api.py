@@ -11,17 +11,18 @@ import hashlib
 import textwrap
 import dataclasses
 
-from py_rcv import PyEliminationStrategies
+from helpers.tally_engine import PyEliminationStrategies
 
 import database
 
 from enum import IntEnum
-from typing_extensions import Any
 from strenum import StrEnum
 from requests import PreparedRequest
 
 from helpers.constants import BLANK_ID
 from helpers.rcv_tally import RCVTally
+from helpers.live_tally import LiveTallyManager
+from helpers.tally_executor import TallyExecutor
 from helpers.redis_cache_manager import RedisCacheManager
 from helpers.start_get_params import StartGetParams
 from helpers import constants, strings
@@ -37,7 +38,7 @@ from load_config import WEBHOOK_URL
 
 from database import (
     Polls, PollVoters, UsernameWhitelist, PollOptions, VoteRankings,
-    db, Users
+    VoteBallots, PollPairwiseCounts, db, Users
 )
 from telegram import (
     InlineKeyboardButton, InlineKeyboardMarkup, User as TeleUser,
@@ -46,6 +47,7 @@ from telegram import (
 from database.database import (
     UserID, PollMetadata, ChatWhitelist
 )
+from database.setup import on_commit
 
 logger = logging.getLogger(__name__)
 
@@ -115,7 +117,8 @@ class BaseAPI(object):
 
     def __init__(self):
         self.cache = RedisCacheManager()
-        self.rcv_tally = RCVTally()
+        self.tally_executor = TallyExecutor()
+        self.rcv_tally = RCVTally(tally_executor=self.tally_executor)
         database.initialize_db()
 
     @staticmethod
@@ -365,7 +368,7 @@ class BaseAPI(object):
         """
         with db.atomic():
             try:
-                poll = Polls.get(id=poll_id)
+                poll = Polls.fetch(poll_id)
             except Polls.DoesNotExist:
                 return Err(UserRegistrationStatus.POLL_NOT_FOUND)
 
@@ -631,7 +634,7 @@ class BaseAPI(object):
         error_message = MessageBuilder()
 
         try:
-            poll = Polls.select().where(Polls.id == poll_id).get()
+            poll = Polls.fetch(poll_id)
         except Polls.DoesNotExist:
             error_message.add(f'poll {poll_id} does not exist')
             return Err(error_message)
@@ -647,11 +650,11 @@ class BaseAPI(object):
         cls, poll_id: int, user_id: UserID
     ) -> Result[Polls, None]:
         try:
-            poll = Polls.select().where(Polls.id == poll_id).get()
+            poll = Polls.fetch(poll_id)
         except Polls.DoesNotExist:
             return Err(None)
 
-        creator_id = poll.creator.id
+        creator_id = poll.creator_id
         if creator_id == user_id:
             return Ok(poll)
         else:
@@ -665,7 +668,7 @@ class BaseAPI(object):
         returns whether the user is a member or creator of the poll
         """
         try:
-            poll = Polls.select().where(Polls.id == poll_id).get()
+            poll = Polls.fetch(poll_id)
         except Polls.DoesNotExist:
             return False
 
@@ -678,7 +681,7 @@ class BaseAPI(object):
         cls, poll: Polls, user_id: UserID, username: Optional[str]
     ) -> bool:
         poll_id = poll.id
-        creator_id = poll.creator.id
+        creator_id = poll.creator_id
         assert isinstance(creator_id, int)
 
         if creator_id == user_id:
@@ -1039,7 +1042,7 @@ class BaseAPI(object):
             return validate_result
 
         try:
-            poll = Polls.select().where(Polls.id == poll_id).get()
+            poll = Polls.fetch(poll_id)
         except Polls.DoesNotExist:
             error_message.add(f'Poll {poll_id} does not exist')
             return Err(error_message)
@@ -1049,7 +1052,7 @@ class BaseAPI(object):
             return Err(error_message)
 
         try:
-            user = Users.build_from_fields(tele_id=user_tele_id).get()
+            user = Users.fetch_by(Users.tele_id, user_tele_id)
         except Users.DoesNotExist:
             error_message.add(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return Err(error_message)
@@ -1108,9 +1111,10 @@ class BaseAPI(object):
             option_no = poll_option_row.option_number
             option_rank_to_ids[option_no] = poll_option_row.id
 
-        vote_rankings: List[Dict[str, Any]] = []
+        # option ids / special vote values of the ballot, in ranked order
+        ballot: List[int] = []
 
-        for ranking, option_no in enumerate(rankings):
+        for option_no in rankings:
             assert isinstance(option_no, int)
             poll_option_id: Optional[int] = None
             special_vote_val: Optional[int] = None
@@ -1138,25 +1142,33 @@ class BaseAPI(object):
                 isinstance(poll_option_id, int) or
                 isinstance(special_vote_val, int)
             )
-            vote_ranking_row = cls.kwargify(
-                poll_voter_id=poll_voter_id,
-                option_id=poll_option_id, special_value=special_vote_val,
-                ranking=ranking
+            ballot.append(
+                poll_option_id if special_vote_val is None
+                else special_vote_val
             )
 
-            vote_rankings.append(vote_ranking_row)
-
-        assert len(vote_rankings) > 0
-        # clear previous vote by the same user on the same poll
-        delete_vote_query = VoteRankings.delete().where(
-            VoteRankings.poll_voter == poll_voter_id
-        )
-
+        assert len(ballot) > 0
         with db.atomic():
-            num_rows_deleted = delete_vote_query.execute()
+            # the previous ballot is only read once the voter's row is
+            # locked, otherwise concurrent re-votes would both subtract
+            # the same previous ballot from the pairwise counts
+            PollVoters.lock_for_update(poll_voter_id)
+            prev_ballot = VoteBallots.read_ballot(poll_voter_id)
             # whether the user cast a vote for this poll for the first time
-            is_first_vote = num_rows_deleted == 0
-            VoteRankings.insert_many(vote_rankings).execute()
+            is_first_vote = len(prev_ballot) == 0
+            # overwrites the previous vote by the same user in place
+            VoteBallots.save_ballot(poll_id, poll_voter_id, ballot)
+            if constants.READ_LEGACY_VOTE_RANKINGS:
+                # drop the legacy copy of the previous vote (if any)
+                VoteRankings.delete().where(
+                    VoteRankings.poll_voter == poll_voter_id
+                ).execute()
+            # swap the previous ballot's head-to-head preferences
+            # for the new ballot's in the poll's pairwise counts
+            PollPairwiseCounts.replace_ballot(
+                poll_id, option_rank_to_ids.values(),
+                old_ballot=prev_ballot, new_ballot=ballot
+            )
 
             if is_first_vote:
                 # declare that the voter has cast a vote
@@ -1168,6 +1180,11 @@ class BaseAPI(object):
                     Polls.id == poll_id
                 ).execute()
 
+        # keep the poll's in-memory tally (if any) in sync, once the
+        # vote is committed (callers may wrap this in a transaction)
+        on_commit(lambda: LiveTallyManager().register_ballot(
+            poll_id=poll_id, voter_id=poll_voter_id, ballot=ballot
+        ))
         return Ok(is_first_vote)
 
     @classmethod
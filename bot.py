@@ -24,12 +24,18 @@ from datetime import datetime
 
 from helpers import strings
 from helpers.rcv_tally import RCVTally
-from py_rcv import PyEliminationStrategies
+from helpers.live_tally import LiveTallyManager
+from helpers.ballot_loader import BallotLoader
+from helpers.ballot_compaction import BallotCompactor
+from helpers.tally_engine import PyEliminationStrategies
+from helpers.tally_executor import TallyExecutor
 from tele_helpers import ModifiedTeleUpdate
 from helpers.special_votes import SpecialVotes
 from bot_middleware import track_errors, admin_only
 from database.database import UserID, CallbackContextState
 from database.db_helpers import EmptyField, Empty
+from database.setup import get_connection_pool
+from database.users_cache import UsersCache
 from handlers.chat_context_handlers import context_handlers, ClosePollContextHandler
 from helpers import constants
 
@@ -41,7 +47,7 @@ from telegram.ext import (
     ContextTypes, filters, CallbackContext, Application
 )
 from typing import (
-    List, Dict, Optional, Sequence, Iterable
+    List, Dict, Optional, Sequence, Iterable, Tuple
 )
 
 from helpers.strings import (
@@ -55,10 +61,11 @@ from helpers.chat_contexts import (
 )
 from database import (
     Users, Polls, PollVoters, UsernameWhitelist,
-    PollOptions, VoteRankings, db, ChatWhitelist, PollWinners,
+    PollOptions, db, ChatWhitelist, PollWinners,
     MessageContextState, Payments
 )
 from base_api import BaseAPI, UserRegistrationStatus, CallbackCommands
+from async_api import AsyncAPI
 from tele_helpers import TelegramHelpers
 
 # https://stackoverflow.com/questions/15892946/
@@ -79,6 +86,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 logger.warning("<<< INITIALIZING >>>")
+async_api = AsyncAPI()
 
 
 class RankedChoiceBot(BaseAPI):
@@ -106,10 +114,31 @@ class RankedChoiceBot(BaseAPI):
     @classmethod
     async def _call_polling_tasks_once(cls):
         print(f'CALLING_CLEANUP @ {datetime.now()}')
-        Users.prune_deleted_users(logger)
-        CallbackContextState.prune_expired_contexts()
-        MessageContextState.prune_expired_contexts()
-        Payments.prune_expired()
+        # like the handlers, the cleanup queries run on the DB executor
+        # rather than blocking the event loop
+        db_executor = async_api.db_executor
+        await db_executor.run(Users.prune_deleted_users, logger)
+        # drop ballots of deleted voters from in-memory poll tallies
+        await db_executor.run(LiveTallyManager().verify_all)
+        # collapse closed polls' ballots and purge expired raw ballots
+        await db_executor.run(BallotCompactor().run_once)
+        await db_executor.run(CallbackContextState.prune_expired_contexts)
+        await db_executor.run(MessageContextState.prune_expired_contexts)
+        await db_executor.run(Payments.prune_expired)
+
+        connection_pool = get_connection_pool()
+        if connection_pool is not None:
+            # recycle stale idle connections and top the pool back up,
+            # on a plain thread as it doesn't need a pooled connection
+            await asyncio.to_thread(connection_pool.maintain)
+            logger.info(f'DB pool metrics: {connection_pool.get_metrics()}')
+
+        users_cache = UsersCache.get_active()
+        if users_cache is not None:
+            logger.info(f'Users cache metrics: {users_cache.get_metrics()}')
+
+        # queue wait / compute time and rejected or timed out tallies
+        logger.info(f'Tally metrics: {TallyExecutor().get_metrics()}')
 
     def start_bot(self):
         assert self.bot is None
@@ -121,6 +150,12 @@ class RankedChoiceBot(BaseAPI):
         # them in the background
         loop.run_until_complete(self._call_polling_tasks_once())
         loop.create_task(self._call_polling_tasks_routine())
+        # cache users_middleware's user lookups, and drop
+        # users that other bot processes have written to
+        loop.create_task(UsersCache().listen())
+        # drop warm poll tallies that other processes (e.g. the
+        # webapp) have registered votes for
+        loop.create_task(LiveTallyManager().listen())
 
         builder = self.create_application_builder()
         builder.concurrent_updates(constants.MAX_CONCURRENT_UPDATES)
@@ -209,6 +244,7 @@ class RankedChoiceBot(BaseAPI):
         # self.app.add_error_handler(self.error_handler)
         self.app.run_polling(allowed_updates=BaseTeleUpdate.ALL_TYPES)
         print('<<< BOT POLLING LOOP ENDED >>>')
+        self.tally_executor.shutdown()
 
     async def post_init(self, _: Application):
         # print('SET COMMANDS')
@@ -307,7 +343,7 @@ class RankedChoiceBot(BaseAPI):
             {poll_id}: {formatted_rankings}
         """))
 
-        vote_result = self.register_vote(
+        vote_result = await async_api.register_vote(
             poll_id=poll_id, rankings=ranked_option_numbers,
             user_tele_id=user_tele_id, username=username,
             chat_id=message.chat_id
@@ -339,7 +375,7 @@ class RankedChoiceBot(BaseAPI):
         if (ref_msg_id == BLANK_ID) or (ref_chat_id == BLANK_ID):
             return None
 
-        poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+        poll_info = await async_api.unverified_read_poll_info(poll_id)
         return await TelegramHelpers.update_poll_message(
             poll_info=poll_info, chat_id=ref_chat_id,
             message_id=ref_msg_id, context=context,
@@ -402,8 +438,8 @@ class RankedChoiceBot(BaseAPI):
 
         user_id = user.get_user_id()
         poll_id = extract_poll_id_result.unwrap()
-        is_voter = PollVoters.is_poll_voter(
-            poll_id=poll_id, user_id=user_id
+        is_voter = await async_api.db_executor.run(
+            PollVoters.is_poll_voter, poll_id=poll_id, user_id=user_id
         )
 
         if not is_voter:
@@ -412,7 +448,7 @@ class RankedChoiceBot(BaseAPI):
             )
             return False
 
-        voted = self.check_has_voted(poll_id=poll_id, user_id=user_id)
+        voted = await async_api.check_has_voted(poll_id, user_id)
 
         if voted:
             return await message.reply_text("you've voted already")
@@ -474,8 +510,12 @@ class RankedChoiceBot(BaseAPI):
 
         # initiate poll creation context here
         if raw_poll_creation_args == '':
-            num_user_created_polls = Polls.count_polls_created(user_id)
-            subscription_tier_res = user_entry.get_subscription_tier()
+            num_user_created_polls = await async_api.db_executor.run(
+                Polls.count_polls_created, user_id
+            )
+            subscription_tier_res = await async_api.db_executor.run(
+                user_entry.get_subscription_tier
+            )
             if subscription_tier_res.is_err():
                 return await message.reply_text(READ_SUBSCRIPTION_TIER_FAILED)
 
@@ -486,11 +526,11 @@ class RankedChoiceBot(BaseAPI):
                 await message.reply_text(POLL_OPTIONS_LIMIT_REACHED_TEXT)
                 return False
 
-            PollCreationChatContext(
+            await async_api.db_executor.run(PollCreationChatContext(
                 user_id=user_entry.get_user_id(), chat_id=message.chat.id,
                 max_options=POLL_MAX_OPTIONS, poll_options=[],
                 open_registration=open_registration
-            ).save_state()
+            ).save_state)
 
             await message.reply_text(
                 "Enter the title / question for your new poll:"
@@ -498,7 +538,9 @@ class RankedChoiceBot(BaseAPI):
             return True
 
         assert raw_poll_creation_args != ''
-        subscription_tier_res = user_entry.get_subscription_tier()
+        subscription_tier_res = await async_api.db_executor.run(
+            user_entry.get_subscription_tier
+        )
         if subscription_tier_res.is_err():
             err_msg = "Unexpected error reading subscription tier"
             await message.reply_text(err_msg)
@@ -570,7 +612,9 @@ class RankedChoiceBot(BaseAPI):
             whitelisted_usernames.append(whitelisted_username)
 
         try:
-            db_user = Users.build_from_fields(tele_id=creator_tele_id).get()
+            db_user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=creator_tele_id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
@@ -593,7 +637,9 @@ class RankedChoiceBot(BaseAPI):
             whitelisted_chat_ids=whitelisted_chat_ids
         )
 
-        create_poll_res = poll_creator.save_poll_to_db()
+        create_poll_res = await async_api.db_executor.run(
+            poll_creator.save_poll_to_db
+        )
         if create_poll_res.is_err():
             error_message = create_poll_res.err()
             await error_message.call(message.reply_text)
@@ -702,22 +748,22 @@ class RankedChoiceBot(BaseAPI):
         target_user_tele_id = int(capture_groups[1])
 
         try:
-            target_user = Users.build_from_fields(
-                tele_id=target_user_tele_id
-            ).get()
+            target_user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=target_user_tele_id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
 
         try:
-            poll = Polls.select().where(Polls.id == poll_id).get()
+            poll = await async_api.db_executor.run(Polls.fetch, poll_id)
         except Polls.DoesNotExist:
             await message.reply_text(f'poll {poll_id} does not exist')
             return False
 
         target_user_id = target_user.get_user_id()
         current_user_id = update.user.get_user_id()
-        creator_id: UserID = poll.get_creator().get_user_id()
+        creator_id: UserID = poll.creator_id
         if creator_id != current_user_id:
             await message.reply_text(
                 'only poll creator is allowed to whitelist chats '
@@ -725,14 +771,14 @@ class RankedChoiceBot(BaseAPI):
             )
             return False
 
-        try:
-            PollVoters.get(poll_id=poll_id, user_id=target_user_id)
+        is_registered = await async_api.db_executor.run(
+            PollVoters.is_poll_voter, poll_id=poll_id, user_id=target_user_id
+        )
+        if is_registered:
             await message.reply_text(f'User #{target_user_id} already registered')
             return False
-        except PollVoters.DoesNotExist:
-            pass
 
-        register_result = self.register_user_id(
+        register_result = await async_api.register_user_id(
             poll_id=poll_id, user_id=target_user_id,
             ignore_voter_limit=False, from_whitelist=False
         )
@@ -761,101 +807,47 @@ class RankedChoiceBot(BaseAPI):
         user_tele_id = tele_user.id
 
         try:
-            user = Users.build_from_fields(tele_id=user_tele_id).get()
+            user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=user_tele_id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
 
         user_id = user.get_user_id()
         # check if voter is part of the poll
-        get_poll_closed_result = self.get_poll_closed(poll_id)
+        get_poll_closed_result = await async_api.get_poll_closed(poll_id)
         if get_poll_closed_result.is_err():
             error_message = get_poll_closed_result.err()
             await error_message.call(message.reply_text)
             return False
 
-        has_poll_access = self.has_access_to_poll_id(
+        has_poll_access = await async_api.has_access_to_poll_id(
             poll_id, user_id, username=tele_user.username
         )
         if not has_poll_access:
             await message.reply_text(f'You have no access to poll {poll_id}')
             return False
 
-        # get poll options in ascending order
-        poll_option_rows = PollOptions.select().where(
-            PollOptions.poll == poll_id
-        ).order_by(PollOptions.option_number)
-
         # map poll option ids to their option ranking numbers
         # (option number is the position of the option in the poll)
-        option_index_map = {}
-        for poll_option_row in poll_option_rows:
-            option_index_map[poll_option_row.id] = (
-                poll_option_row.option_number
-            )
-
-        relevant_voters = PollVoters.select(PollVoters.id).where(
-            PollVoters.poll == poll_id
+        option_index_map = await async_api.db_executor.run(
+            self.read_option_numbers, poll_id
         )
-        # TODO: is this or the join query faster?
-        vote_rows = VoteRankings.select().where(
-            VoteRankings.poll_voter.in_(relevant_voters)
-        ).order_by(
-            VoteRankings.option, VoteRankings.ranking
+        # each ballot is a sequence of vote values, where each
+        # vote_value is either a poll option_id (which is always a
+        # positive number), or either of the <abstain> or <withhold>
+        # special votes (which are represented as negative numbers)
+        ballots = await async_api.db_executor.run(
+            BallotLoader.load_poll_ballots, poll_id
         )
-        """
-        vote_rows = VoteRankings.select().join(
-            PollVoters, on=(PollVoters.id == VoteRankings.poll_voter_id)
-        ).where(
-            PollVoters.poll_id == poll_id
-        ).order_by(
-            VoteRankings.option_id, VoteRankings.ranking
-        )
-        """
-
-        vote_sequence_map: Dict[int, Dict[int, int]] = {}
-        for vote_row in vote_rows:
-            """
-            Maps voters to their ranked vote
-            Each ranked vote is stored as a dictionary
-            mapping their vote ranking to a vote_value
-            Each vote_value is either a poll option_id 
-            (which is always a positive number), 
-            or either of the <abstain> or <withhold> special votes
-            (which are represented as negative numbers -1 and -2)
-            """
-            voter_id: int = vote_row.poll_voter.id
-            assert isinstance(voter_id, int)
-
-            if voter_id not in vote_sequence_map:
-                vote_sequence_map[voter_id] = {}
-
-            option_id_row = vote_row.option
-
-            if option_id_row is None:
-                vote_value = vote_row.special_value
-                assert vote_value < 0
-            else:
-                vote_value = option_id_row.id
-                assert vote_value > 0
-
-            ranking = int(vote_row.ranking)
-            ranking_map = vote_sequence_map[voter_id]
-            ranking_map[ranking] = vote_value
 
         ranking_message = ''
-        for voter_id in vote_sequence_map:
-            # format vote sequence map into string rankings
-            ranking_map = vote_sequence_map[voter_id]
-            ranking_nos = sorted(ranking_map.keys())
-            sorted_option_nos = [
-                ranking_map[ranking] for ranking in ranking_nos
-            ]
-
-            # print('SORT-NOS', sorted_option_nos)
+        for _, ballot in ballots.iter_ballots():
+            # format ballot into string rankings
             str_rankings = []
 
-            for vote_value in sorted_option_nos:
+            for vote_value in ballot:
                 if vote_value > 0:
                     option_id = vote_value
                     option_rank_no = option_index_map[option_id]
@@ -871,12 +863,46 @@ class RankedChoiceBot(BaseAPI):
         ranking_message = ranking_message.strip()
         return await message.reply_text(f'votes recorded:\n{ranking_message}')
 
+    @staticmethod
+    def read_option_numbers(poll_id: int) -> Dict[int, int]:
+        # get poll options in ascending order
+        poll_option_rows = PollOptions.select().where(
+            PollOptions.poll == poll_id
+        ).order_by(PollOptions.option_number)
+
+        return {
+            poll_option_row.id: poll_option_row.option_number
+            for poll_option_row in poll_option_rows
+        }
+
     async def unclose_poll_admin(self, update, *_, **__):
         await self._set_poll_status(update, False)
 
     async def close_poll_admin(self, update, *_, **__):
         await self._set_poll_status(update, True)
 
+    @staticmethod
+    def set_poll_status(poll_id: int, closed: bool) -> bool:
+        """
+        :return: whether the poll's closed status could be set
+        """
+        with db.atomic():
+            # compacted ballots are dropped when reopening the poll, which
+            # isn't possible anymore once its raw ballots have been purged
+            can_set_status = (
+                closed or BallotCompactor.uncompact_poll(poll_id)
+            )
+            if can_set_status:
+                PollWinners.delete().where(
+                    PollWinners.poll == poll_id
+                ).execute()
+                # remove the cached result for the poll winner
+                Polls.update({Polls.closed: closed}).where(
+                    Polls.id == poll_id
+                ).execute()
+
+        return can_set_status
+
     @admin_only
     async def _set_poll_status(self, update: ModifiedTeleUpdate, closed=True):
         assert isinstance(update, ModifiedTeleUpdate)
@@ -889,15 +915,21 @@ class RankedChoiceBot(BaseAPI):
             return False
 
         poll_id = extract_result.unwrap()
+        can_set_status = await async_api.db_executor.run(
+            self.set_poll_status, poll_id, closed
+        )
+        if not can_set_status:
+            return await message.reply_text(
+                f'poll {poll_id} can no longer be unclosed '
+                f'as its individual votes have been purged'
+            )
 
-        with db.atomic():
-            PollWinners.delete().where(
-                PollWinners.poll == poll_id
-            ).execute()
-            # remove the cached result for the poll winner
-            Polls.update({Polls.closed: closed}).where(
-                Polls.id == poll_id
-            ).execute()
+        if closed:
+            # fill in PollWinners before anyone asks for the results
+            self.rcv_tally.schedule_poll_winner(poll_id)
+            return await message.reply_text(
+                f'poll {poll_id} has been closed'
+            )
 
         return await message.reply_text(
             f'poll {poll_id} has been unclosed'
@@ -921,7 +953,9 @@ class RankedChoiceBot(BaseAPI):
             await message.reply_text("username not found")
             return False
 
-        user_tele_ids = self.resolve_username_to_user_tele_ids(username)
+        user_tele_ids = await async_api.resolve_username_to_user_tele_ids(
+            username
+        )
         id_strings = ' '.join([f'#{tele_id}' for tele_id in user_tele_ids])
         return await message.reply_text(textwrap.dedent(f"""
             matching user_ids for username [{username}]:
@@ -961,9 +995,11 @@ class RankedChoiceBot(BaseAPI):
         assert len(username) >= 1
 
         if not force:
-            user, created = Users.build_from_fields(
-                tele_id=tele_id, username=username
-            ).get_or_create()
+            user, created = await async_api.db_executor.run(
+                Users.build_from_fields(
+                    tele_id=tele_id, username=username
+                ).get_or_create
+            )
 
             if created:
                 return await message.reply_text(
@@ -976,12 +1012,12 @@ class RankedChoiceBot(BaseAPI):
                     'override existing entry'
                 )
         else:
-            Users.build_from_fields(
+            await async_api.db_executor.run(Users.build_from_fields(
                 tele_id=tele_id, username=username
             ).insert().on_conflict(
                 preserve=[Users.tele_id],
                 update={Users.username: username}
-            ).execute()
+            ).execute)
 
             return await message.reply_text(
                 f'User with tele_id {tele_id} and username '
@@ -1005,8 +1041,9 @@ class RankedChoiceBot(BaseAPI):
             await message.reply_text("username not found")
             return False
 
-        matching_users = Users.select().where(Users.username == username)
-        user_tele_ids = [user.tele_id for user in matching_users]
+        user_tele_ids = await async_api.resolve_username_to_user_tele_ids(
+            username
+        )
         return await message.reply_text(textwrap.dedent(f"""
             matching user_tele_ids for username [{username}]:
             {' '.join([f'#{tele_id}' for tele_id in user_tele_ids])}
@@ -1045,9 +1082,11 @@ class RankedChoiceBot(BaseAPI):
         assert len(username) >= 1
 
         if not force:
-            user, created = Users.build_from_fields(
-                tele_id=tele_id, username=username
-            ).get_or_create()
+            user, created = await async_api.db_executor.run(
+                Users.build_from_fields(
+                    tele_id=tele_id, username=username
+                ).get_or_create
+            )
 
             if created:
                 return await message.reply_text(
@@ -1061,12 +1100,12 @@ class RankedChoiceBot(BaseAPI):
                 )
         else:
             # TODO: check if update on insert conflict works with MySQL
-            Users.build_from_fields(
+            await async_api.db_executor.run(Users.build_from_fields(
                 tele_id=tele_id, username=username
             ).insert().on_conflict(
                 preserve=[Users.id],
                 update={Users.username: username}
-            ).execute()
+            ).execute)
 
             return await message.reply_text(
                 f'User with user_id {tele_id} and username '
@@ -1109,12 +1148,14 @@ class RankedChoiceBot(BaseAPI):
         assert isinstance(user_tele_id, int)
 
         try:
-            user = Users.build_from_fields(tele_id=user_tele_id).get()
+            user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=user_tele_id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
 
-        polls = user.get_owned_polls()
+        polls = await async_api.db_executor.run(user.get_owned_polls)
         poll_descriptions = []
 
         if len(polls) == 0:
@@ -1148,9 +1189,9 @@ class RankedChoiceBot(BaseAPI):
         user = update.user
 
         if message_text == '':
-            ClosePollChatContext(
+            await async_api.db_executor.run(ClosePollChatContext(
                 user_id=user.get_user_id(), chat_id=message.chat.id
-            ).save_state()
+            ).save_state)
             return await message.reply_text(
                 'Enter the poll ID for the poll you want to close'
             )
@@ -1195,10 +1236,10 @@ class RankedChoiceBot(BaseAPI):
 
         if message_text == '':
             # no poll_id or new title specified
-            EditPollTitleChatContext(
+            await async_api.db_executor.run(EditPollTitleChatContext(
                 user_id=user_id, chat_id=message.chat.id,
                 poll_id=BLANK_ID
-            ).save_state()
+            ).save_state)
 
             return await message.reply_text(textwrap.dedent(f"""
                 Enter the poll ID for the poll you want to edit:
@@ -1215,7 +1256,9 @@ class RankedChoiceBot(BaseAPI):
             # only poll_id is specified, poll_id is invalid
             return await message.reply_text(invalid_format_text)
 
-        poll_res = Polls.get_as_creator(poll_id, user_id)
+        poll_res = await async_api.db_executor.run(
+            Polls.get_as_creator, poll_id, user_id
+        )
         if poll_res.is_err():
             return await message.reply_text(
                 "You're not the creator of this poll"
@@ -1229,10 +1272,10 @@ class RankedChoiceBot(BaseAPI):
 
         if new_title == '':
             # TODO: implement poll title update in chat context
-            EditPollTitleChatContext(
+            await async_api.db_executor.run(EditPollTitleChatContext(
                 user_id=user_id, chat_id=message.chat.id,
                 poll_id=poll_id
-            ).save_state()
+            ).save_state)
 
             return await message.reply_text(
                 strings.build_poll_title_edit_prompt(poll.desc)
@@ -1240,7 +1283,7 @@ class RankedChoiceBot(BaseAPI):
         else:
             prev_title = poll.desc
             poll.desc = new_title
-            poll.save()
+            await async_api.db_executor.run(poll.save)
 
             return await message.reply_text(
                 strings.build_poll_title_edit_message(prev_title, new_title)
@@ -1307,7 +1350,9 @@ class RankedChoiceBot(BaseAPI):
         )
 
         user_id = update.user.get_user_id()
-        poll_res = BaseAPI.get_poll_as_owner(poll_id=poll_id, user_id=user_id)
+        poll_res = await async_api.get_poll_as_owner(
+            poll_id=poll_id, user_id=user_id
+        )
 
         if poll_res.is_err():
             err_message = "You're not the creator of this poll"
@@ -1322,7 +1367,7 @@ class RankedChoiceBot(BaseAPI):
             )
 
         poll.vote_algorithm = strategy.to_int()
-        poll.save()
+        await async_api.db_executor.run(poll.save)
 
         return await message.reply_text(
             f"Poll #{poll_id} voting algorithm updated from "
@@ -1352,14 +1397,17 @@ class RankedChoiceBot(BaseAPI):
 
         poll_id = int(raw_poll_id)
         user_id = update.user.get_user_id()
-        poll_res = Polls.get_as_creator(poll_id, user_id)
+        poll_res = await async_api.db_executor.run(
+            Polls.get_as_creator, poll_id, user_id
+        )
         if poll_res.is_err():
             return await message.reply_text(
                 "You're not the creator of this poll"
             )
 
         poll = poll_res.unwrap()
-        whitelist_res = BaseAPI._whitelist_username_for_poll(
+        whitelist_res = await async_api.db_executor.run(
+            BaseAPI._whitelist_username_for_poll,
             poll=poll, target_username=target_username
         )
         if whitelist_res.is_err():
@@ -1429,7 +1477,9 @@ class RankedChoiceBot(BaseAPI):
             user_query = Users.build_from_fields(
                 tele_id=tele_id, username=username
             )
-            matching_users = user_query.select()
+            matching_users = await async_api.db_executor.run(
+                list, user_query.select()
+            )
 
             if len(matching_users) > 1:
                 user_tele_ids = [
@@ -1448,7 +1498,9 @@ class RankedChoiceBot(BaseAPI):
                     return False
                 else:
                     # create user entry if username and tele_id are specified
-                    user_db_entry, _ = user_query.get_or_create()
+                    user_db_entry, _ = await async_api.db_executor.run(
+                        user_query.get_or_create
+                    )
             else:
                 assert len(matching_users) == 1
                 user_db_entry = matching_users[0]
@@ -1465,7 +1517,9 @@ class RankedChoiceBot(BaseAPI):
             user_tele_id = int(raw_tele_id)
 
             try:
-                user = Users.build_from_fields(tele_id=user_tele_id).get()
+                user = await async_api.db_executor.run(
+                    Users.build_from_fields(tele_id=user_tele_id).get
+                )
             except Users.DoesNotExist:
                 await message.reply_text(f'invalid user id: {user_tele_id}')
                 return False
@@ -1508,16 +1562,16 @@ class RankedChoiceBot(BaseAPI):
         assert tele_user is not None
 
         if raw_command_args == '':
-            VoteChatContext(
+            await async_api.db_executor.run(VoteChatContext(
                 user_id=user_entry.get_user_id(), chat_id=message.chat.id,
                 max_options=POLL_MAX_OPTIONS
-            ).save_state()
+            ).save_state)
             return await message.reply_text(
                 "Enter the poll ID of the poll you want to vote for:"
             )
         elif constants.ID_PATTERN.match(raw_command_args) is not None:
             poll_id = int(raw_command_args)
-            view_poll_result = self.get_poll_message(
+            view_poll_result = await async_api.get_poll_message(
                 poll_id=poll_id, user_id=user_entry.get_user_id(),
                 bot_username=context.bot.username,
                 username=tele_user.username
@@ -1533,7 +1587,7 @@ class RankedChoiceBot(BaseAPI):
                 max_options=max_options, poll_id=poll_id
             )
 
-            vote_context.save_state()
+            await async_api.db_executor.run(vote_context.save_state)
             return await message.reply_text(
                 vote_context.generate_vote_option_prompt()
             )
@@ -1590,7 +1644,7 @@ class RankedChoiceBot(BaseAPI):
             return False
 
         poll_query = (Polls.id == poll_id) & (Polls.creator == user_id)
-        poll = Polls.get_or_none(poll_query)
+        poll = await async_api.db_executor.run(Polls.get_or_none, poll_query)
         delete_comment = f"Poll #{poll_id} user#{user_id} tele#{user_tele_id}"
 
         if poll is None:
@@ -1598,7 +1652,9 @@ class RankedChoiceBot(BaseAPI):
             return False
         elif force_delete:
             logger.warning(f"Deleting {delete_comment}")
-            Polls.delete().where(poll_query).execute()
+            await async_api.db_executor.run(
+                Polls.delete().where(poll_query).execute
+            )
             logger.warning(f"Deleted {delete_comment}")
             await message.reply_text(f'Poll #{poll_id} ({poll.desc}) deleted')
             return True
@@ -1654,10 +1710,13 @@ class RankedChoiceBot(BaseAPI):
         logger.warning(
             f"Scheduling deleting user#{user_id} tele#{tele_user_id}"
         )
-        try:
+        def mark_deleted():
             with db.atomic():
                 user.deleted_at = datetime.now()  # mark as deleted
                 user.save()
+
+        try:
+            await async_api.db_executor.run(mark_deleted)
         except Exception as e:
             await update.message.reply_text(
                 'Unexpected error occurred during account deletion'
@@ -1701,34 +1760,31 @@ class RankedChoiceBot(BaseAPI):
         user_tele_id = tele_user.id
 
         try:
-            user = Users.build_from_fields(tele_id=user_tele_id).get()
+            user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=user_tele_id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
 
         user_id = user.get_user_id()
         # check if voter is part of the poll
-        has_poll_access = self.has_access_to_poll_id(
+        has_poll_access = await async_api.has_access_to_poll_id(
             poll_id, user_id, username=tele_user.username
         )
         if not has_poll_access:
             await message.reply_text(f'You have no access to poll {poll_id}')
             return False
 
-        read_vote_count_result = self.read_vote_count(poll_id)
+        read_vote_count_result = await async_api.db_executor.run(
+            self.read_vote_count, poll_id
+        )
         if read_vote_count_result.is_err():
             error_message = read_vote_count_result.err()
             await error_message.call(message.reply_text)
             return False
 
         vote_count = read_vote_count_result.unwrap()
-        poll_voters: Iterable[PollVoters] = PollVoters.select().join(
-            Users, on=(PollVoters.user == Users.id),
-            join_type=JOIN.LEFT_OUTER
-        ).where(
-            PollVoters.poll == poll_id
-        )
-
         if vote_count >= constants.MAX_DISPLAY_VOTE_COUNT:
             await message.reply_text(
                 f'Can only display voters when vote count is '
@@ -1736,6 +1792,30 @@ class RankedChoiceBot(BaseAPI):
             )
             return False
 
+        voted_usernames, not_voted_usernames = (
+            await async_api.db_executor.run(self.read_voter_names, poll_id)
+        )
+        return await message.reply_text(textwrap.dedent(f"""
+            voted:
+            {' '.join(voted_usernames)}
+            not voted:
+            {' '.join(not_voted_usernames)}
+        """))
+
+    @staticmethod
+    def read_voter_names(poll_id: int) -> Tuple[List[str], List[str]]:
+        """
+        :return: display names of voters who have and haven't voted
+        """
+        poll_voters: Iterable[PollVoters] = PollVoters.select(
+            PollVoters, Users
+        ).join(
+            Users, on=(PollVoters.user == Users.id),
+            join_type=JOIN.LEFT_OUTER
+        ).where(
+            PollVoters.poll == poll_id
+        )
+
         voted_usernames, not_voted_usernames = [], []
         recorded_user_ids: set[int] = set()
 
@@ -1771,12 +1851,7 @@ class RankedChoiceBot(BaseAPI):
             else:
                 not_voted_usernames.append(username)
 
-        return await message.reply_text(textwrap.dedent(f"""
-            voted:
-            {' '.join(voted_usernames)}
-            not voted:
-            {' '.join(not_voted_usernames)}
-        """))
+        return voted_usernames, not_voted_usernames
 
     @staticmethod
     async def show_about(update: ModifiedTeleUpdate, *_, **__):
@@ -1810,28 +1885,39 @@ class RankedChoiceBot(BaseAPI):
         user_tele_id = tele_user.id
 
         try:
-            user = Users.build_from_fields(tele_id=user_tele_id).get()
+            user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=user_tele_id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
 
         user_id = user.get_user_id()
         # check if voter is part of the poll
-        has_poll_access = self.has_access_to_poll_id(
+        has_poll_access = await async_api.has_access_to_poll_id(
             poll_id, user_id, username=tele_user.username
         )
         if not has_poll_access:
             await message.reply_text(f'You have no access to poll {poll_id}')
             return False
 
-        get_poll_closed_result = self.get_poll_closed(poll_id)
+        get_poll_closed_result = await async_api.get_poll_closed(poll_id)
+        provisional = False
         if get_poll_closed_result.is_err():
-            error_message = get_poll_closed_result.err()
-            await error_message.call(message.reply_text)
+            # poll creators can view provisional results of open polls
+            if (await async_api.get_poll_as_owner(
+                poll_id, user_id
+            )).is_err():
+                error_message = get_poll_closed_result.err()
+                await error_message.call(message.reply_text)
+                return False
+
+            provisional = True
 
         await TelegramHelpers.handle_poll_winner_request(
             rcv_tally=self.rcv_tally,
-            update=update, poll_id=poll_id
+            update=update, poll_id=poll_id,
+            provisional=provisional
         )
         return None
 
@@ -1841,9 +1927,9 @@ class RankedChoiceBot(BaseAPI):
     ):
         user = update.user
         message = update.message
-        PaySupportChatContext(
+        await async_api.db_executor.run(PaySupportChatContext(
             user_id=user.get_user_id(), chat_id=message.chat.id
-        ).save_state()
+        ).save_state)
 
         return await message.reply_text(textwrap.dedent("""
             Please enter the following details:
@@ -1881,9 +1967,11 @@ class RankedChoiceBot(BaseAPI):
         target_tele_user_id = int(capture_groups[0])
         payment_ref_id = capture_groups[1]
         bot = self.get_bot()
-        payment_res = Payments.build_from_fields(
-            telegram_payment_charge_id=payment_ref_id
-        ).safe_get()
+        payment_res = await async_api.db_executor.run(
+            Payments.build_from_fields(
+                telegram_payment_charge_id=payment_ref_id
+            ).safe_get
+        )
 
         if payment_res.is_err():
             await message.reply_text(f'Payment db entry not found')
@@ -1901,7 +1989,7 @@ class RankedChoiceBot(BaseAPI):
         if payment_res.is_ok():
             payment = payment_res.unwrap()
             payment.refunded_at = datetime.now()
-            payment.save()
+            await async_api.db_executor.run(payment.save)
 
         return None
 
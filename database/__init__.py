@@ -2,8 +2,9 @@ from .database import database_proxy as db, initialize_db
 
 from .database import (
     Users, Polls, ChatWhitelist, PollVoters, UsernameWhitelist,
-    PollOptions, VoteRankings, PollWinners, CallbackContextState,
-    MessageContextState, Payments, SupportTickets
+    PollOptions, VoteRankings, VoteBallots, CompactedBallots, PollWinners,
+    PollPairwiseCounts, CallbackContextState, MessageContextState, Payments,
+    SupportTickets
 )
 
 from .callback_context_state import SerializableChatContext, ChatContextStateTypes
@@ -36,13 +36,18 @@ class CallbackContextState(BaseModel):
     chat_id = BigIntegerField(null=False)  # telegram chat ID
     context_type = CharField(max_length=255, null=False)
     state = TextField(null=False)
-    last_updated_at = DateTimeField(default=datetime.datetime.now, null=False)
-
-    indexes = (
-        # Unique multi-column index for user-chat_id pairs
-        (('user', 'chat_id'), True),
+    # indexed for prune_expired_contexts
+    last_updated_at = DateTimeField(
+        default=datetime.datetime.now, null=False, index=True
     )
 
+    class Meta:
+        database = database_proxy
+        indexes = (
+            # Unique multi-column index for user-chat_id pairs
+            (('user', 'chat_id'), True),
+        )
+
     def update_state(self, new_state: SerializableChatContext):
         self.state = new_state.dump_to_json_str()
         self.last_updated_at = datetime.datetime.now()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+
+from typing import Callable, List
+
+"""
+callbacks that run once the current transaction has committed, for
+in-memory state (caches, warm tallies) that mirrors database rows and
+mustn't see writes that an outer transaction may still roll back
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class CommitHooksMixin(object):
+    """
+    mixin for peewee databases, hooks registered with on_commit while
+    a transaction is open run after the outermost transaction commits
+    and are dropped if it rolls back. Hooks registered inside a nested
+    atomic block that rolls back to its savepoint still run if the
+    outer transaction commits
+    """
+    def _get_commit_hooks(self) -> List[Callable[[], None]]:
+        # stored with the connection state, so every thread / pooled
+        # connection scope tracks the hooks of its own transaction
+        try:
+            return self._state.commit_hooks
+        except AttributeError:
+            self._state.commit_hooks = []
+            return self._state.commit_hooks
+
+    def on_commit(self, callback: Callable[[], None]):
+        if not self.in_transaction():
+            callback()
+            return
+
+        self._get_commit_hooks().append(callback)
+
+    def commit(self):
+        result = super().commit()
+        commit_hooks = self._get_commit_hooks()
+        while len(commit_hooks) > 0:
+            callback = commit_hooks.pop(0)
+            try:
+                callback()
+            except Exception as e:
+                # the transaction has committed regardless
+                logger.error(f'commit hook {callback} failed: {e}')
+
+        return result
+
+    def rollback(self):
+        self._get_commit_hooks().clear()
+        return super().rollback()
@@ -5,43 +5,52 @@ import datetime
 import os
 import sys
 
+from array import array
 # noinspection PyUnresolvedReferences
 from playhouse.shortcuts import ReconnectMixin
 from result import Result, Ok, Err
 
-from database.setup import DB, BaseModel, database_proxy
+from database.setup import PooledDB, BaseModel, database_proxy
+from database.pool import PoolConfig
 from database.users import Users
 from database.payments import Payments
 from database.callback_context_state import CallbackContextState
 from database.message_context_state import MessageContextState
 
 from load_config import YAML_CONFIG
-from typing import Self, Optional, Type, List
+from typing import Self, Optional, Type, List, Iterable, Sequence
+from helpers import constants
+from helpers.pairwise_matrix import ballot_pair_deltas
 from database.db_helpers import (
     BoundRowFields, Empty, EmptyField, UserID
 )
 from peewee import (
     BigIntegerField, CharField, SmallIntegerField,
     IntegerField, AutoField, TextField, DateTimeField,
-    BooleanField, ForeignKeyField, SQL, Database, BigAutoField,
+    BooleanField, ForeignKeyField, SQL, Database, BigAutoField, Case,
+    BlobField
 )
 
-initialised_db: DB | None = None
+initialised_db: Database | None = None
 # TODO: refactor each individual table into its own file
 
 
 def get_tables() -> list[Type[BaseModel]]:
     return [
         Users, Polls, ChatWhitelist, PollVoters, UsernameWhitelist,
-        PollOptions, VoteRankings, PollWinners, CallbackContextState,
+        PollOptions, VoteRankings, VoteBallots, CompactedBallots,
+        PollWinners, PollPairwiseCounts, CallbackContextState,
         MessageContextState, Payments, SupportTickets
     ]
 
 
 def initialize_db(db: Database | None = None):
     if db is None:
-        db = DB(
-            database='ranked_choice_voting',
+        pool_config = PoolConfig.from_config(
+            YAML_CONFIG['database'].get('pool')
+        )
+        db = PooledDB.from_pool_config(
+            'ranked_choice_voting', pool_config,
             user=YAML_CONFIG['database']['user'],
             password=YAML_CONFIG['database']['password'],
             charset='utf8mb4'
@@ -54,6 +63,8 @@ def initialize_db(db: Database | None = None):
     # Create tables (if they don't exist)
     database_proxy.connect()
     database_proxy.create_tables(get_tables(), safe=True)
+    if isinstance(db, PooledDB):
+        db.maintain()
 
 
 @dataclasses.dataclass
@@ -97,6 +108,10 @@ class Polls(BaseModel):
     num_votes = IntegerField(default=0)
     # TODO: rename to num_deleted_voters
     deleted_voters = IntegerField(default=0)
+    # when the poll's ballots were collapsed into CompactedBallots
+    ballots_compacted_at = DateTimeField(null=True)
+    # when the poll's raw VoteBallots / VoteRankings rows were purged
+    ballots_purged_at = DateTimeField(null=True)
 
     @property
     def num_active_voters(self) -> int:
@@ -123,7 +138,7 @@ class Polls(BaseModel):
 
     @classmethod
     def read_poll_metadata(cls, poll_id: int) -> PollMetadata:
-        poll = cls.select().where(cls.id == poll_id).get()
+        poll = cls.fetch(poll_id)
         return PollMetadata(
             id=poll.id, question=poll.desc,
             _num_voters=poll.num_voters, num_votes=poll.num_votes,
@@ -248,6 +263,24 @@ class PollVoters(BaseModel):
     def is_poll_voter(cls, poll_id: int, user_id: UserID) -> bool:
         return cls.get_poll_voter(poll_id=poll_id, user_id=user_id).is_ok()
 
+    @classmethod
+    def lock_for_update(cls, poll_voter_id: int):
+        """
+        locks the voter's row until the current transaction ends, so
+        that concurrent votes by the same voter are applied one after
+        the other instead of both replacing the same previous ballot
+        """
+        if cls._meta.database.for_update:
+            cls.select(cls.id).where(
+                cls.id == poll_voter_id
+            ).for_update().execute()
+        else:
+            # sqlite has no row locks, a (no-op) write takes
+            # the database's write lock for the transaction instead
+            cls.update(voted=cls.voted).where(
+                cls.id == poll_voter_id
+            ).execute()
+
 
 # whitelists voters for a poll by their username
 # assigns their user_id to the corresponding username
@@ -287,6 +320,13 @@ class PollOptions(BaseModel):
     option_name = CharField(max_length=255)
     option_number = IntegerField()
 
+    class Meta:
+        database = database_proxy
+        indexes = (
+            # a poll's options are read in option number order
+            (('poll', 'option_number'), False),
+        )
+
     @classmethod
     def build_from_fields(
         cls, poll_id: int | EmptyField = Empty,
@@ -298,8 +338,20 @@ class PollOptions(BaseModel):
             cls.option_number: option_number
         })
 
+    @classmethod
+    def read_option_names(cls, poll_id: int) -> dict[int, str]:
+        """
+        :return: option id -> option name of the poll's options
+        """
+        query = cls.select(cls.id, cls.option_name).where(
+            cls.poll == poll_id
+        ).tuples()
+        return {option_id: option_name for option_id, option_name in query}
+
 
 class VoteRankings(BaseModel):
+    # legacy ballot storage, superseded by VoteBallots
+    # (only read while READ_LEGACY_VOTE_RANKINGS is set)
     id = AutoField(primary_key=True)
     poll_voter = ForeignKeyField(
         PollVoters, to_field='id', on_delete='CASCADE'
@@ -315,6 +367,113 @@ class VoteRankings(BaseModel):
     )
     ranking = IntegerField()
 
+    class Meta:
+        database = database_proxy
+        indexes = (
+            # lets read_ballot read a ballot in ranking order
+            (('poll_voter', 'ranking'), False),
+        )
+
+    @classmethod
+    def read_ballot(cls, poll_voter_id: int) -> list[int]:
+        """
+        :return: option ids / special vote values of the voter's
+        ballot in ranked order, empty if the voter hasn't voted
+        """
+        query = cls.select(cls.option, cls.special_value).where(
+            cls.poll_voter == poll_voter_id
+        ).order_by(cls.ranking.asc()).tuples()
+        return [
+            option_id if option_id is not None else special_value
+            for option_id, special_value in query
+        ]
+
+
+class VoteBallots(BaseModel):
+    """
+    a voter's whole ranked ballot in a single row, packed as
+    little-endian int32 option ids / special vote values
+    ordered from most favoured to least favoured
+    replaces the one-row-per-ranking VoteRankings table
+    """
+    id = AutoField(primary_key=True)
+    # denormalized so that a poll's ballots can be read without a join
+    poll = ForeignKeyField(Polls, to_field='id', on_delete='CASCADE')
+    poll_voter = ForeignKeyField(
+        PollVoters, to_field='id', on_delete='CASCADE', unique=True
+    )
+    rankings = BlobField()
+
+    @staticmethod
+    def pack_ballot(ballot: Sequence[int]) -> bytes:
+        packed_ballot = array('i', ballot)
+        if sys.byteorder == 'big':
+            packed_ballot.byteswap()
+
+        return packed_ballot.tobytes()
+
+    @staticmethod
+    def unpack_ballot(
+        raw_ballot: bytes, into: Optional[array] = None
+    ) -> array:
+        """
+        decodes a packed ballot, appending it to into if given
+        """
+        packed_ballot = array('i')
+        packed_ballot.frombytes(raw_ballot)
+        if sys.byteorder == 'big':
+            packed_ballot.byteswap()
+        if into is None:
+            return packed_ballot
+
+        into.extend(packed_ballot)
+        return into
+
+    @classmethod
+    def save_ballot(
+        cls, poll_id: int, poll_voter_id: int, ballot: Sequence[int]
+    ):
+        """
+        inserts the voter's ballot, or overwrites it in place if
+        the voter has voted before
+        """
+        assert len(ballot) > 0
+        raw_ballot = cls.pack_ballot(ballot)
+        num_updated = cls.update(rankings=raw_ballot).where(
+            cls.poll_voter == poll_voter_id
+        ).execute()
+        if num_updated == 0:
+            cls.insert(
+                poll=poll_id, poll_voter=poll_voter_id, rankings=raw_ballot
+            ).execute()
+
+    @classmethod
+    def read_ballot(cls, poll_voter_id: int) -> list[int]:
+        """
+        :return: option ids / special vote values of the voter's
+        ballot in ranked order, empty if the voter hasn't voted
+        """
+        raw_ballot = cls.select(cls.rankings).where(
+            cls.poll_voter == poll_voter_id
+        ).scalar()
+        if raw_ballot is not None:
+            return cls.unpack_ballot(bytes(raw_ballot)).tolist()
+        elif constants.READ_LEGACY_VOTE_RANKINGS:
+            return VoteRankings.read_ballot(poll_voter_id)
+        else:
+            return []
+
+
+class CompactedBallots(BaseModel):
+    """
+    distinct ballots of a closed poll along with the number of voters
+    that cast each of them, packed in the same format as VoteBallots
+    """
+    id = AutoField(primary_key=True)
+    poll = ForeignKeyField(Polls, to_field='id', on_delete='CASCADE')
+    rankings = BlobField()
+    count = IntegerField()
+
 
 class PollWinners(BaseModel):
     id = AutoField(primary_key=True)
@@ -323,29 +482,188 @@ class PollWinners(BaseModel):
         PollOptions, to_field='id', on_delete='CASCADE',
         null=True
     )
+    # elimination strategy (Polls.vote_algorithm) the winner is for
+    vote_algorithm = SmallIntegerField(default=0)
+    # compact JSON round-by-round breakdown of the tally
+    round_report = TextField(null=True)
+
+    class Meta:
+        database = database_proxy
+        indexes = (
+            # Unique multi-column index for poll_id-vote_algorithm pairs
+            # (which also serves lookups by poll alone)
+            (('poll', 'vote_algorithm'), True),
+        )
 
     @classmethod
     def build_from_fields(
         cls, poll_id: int | EmptyField = Empty,
-        option_id: int | EmptyField = Empty
+        option_id: int | EmptyField = Empty,
+        vote_algorithm: int | EmptyField = Empty
     ) -> BoundRowFields[Self]:
         return BoundRowFields(cls, {
-            cls.poll: poll_id, cls.option: option_id
+            cls.poll: poll_id, cls.option: option_id,
+            cls.vote_algorithm: vote_algorithm
         })
 
     @classmethod
-    def read_poll_winner_id(cls, poll_id: int) -> Result[Optional[int]]:
-        get_result = cls.build_from_fields(poll_id=poll_id).safe_get()
+    def read_poll_winner(
+        cls, poll_id: int, vote_algorithm: int
+    ) -> Result[Self]:
+        return cls.build_from_fields(
+            poll_id=poll_id, vote_algorithm=vote_algorithm
+        ).safe_get()
+
+    @classmethod
+    def read_poll_winner_id(
+        cls, poll_id: int, vote_algorithm: int
+    ) -> Result[Optional[int]]:
+        get_result = cls.read_poll_winner(poll_id, vote_algorithm)
         if get_result.is_err():
             return get_result
 
         poll_winner = get_result.unwrap()
-        winning_option = poll_winner.option
-        if winning_option is None:
+        # read the raw foreign key to avoid fetching the option row
+        winning_option_id = poll_winner.option_id
+        if winning_option_id is None:
             return Ok(None)
 
-        winning_option_id = int(winning_option.id)
-        return Ok(winning_option_id)
+        return Ok(int(winning_option_id))
+
+    @classmethod
+    def read_strategy_winner_ids(
+        cls, poll_id: int
+    ) -> dict[int, Optional[int]]:
+        """
+        :return: mapping of vote_algorithm to winning option id
+        for every elimination strategy computed for the poll
+        """
+        query = cls.select(cls.vote_algorithm, cls.option).where(
+            cls.poll == poll_id
+        ).tuples()
+        return {
+            vote_algorithm: option_id
+            for vote_algorithm, option_id in query
+        }
+
+    @classmethod
+    def read_round_reports(cls, poll_id: int) -> dict[int, Optional[str]]:
+        """
+        :return: mapping of vote_algorithm to serialized round report
+        """
+        query = cls.select(cls.vote_algorithm, cls.round_report).where(
+            cls.poll == poll_id
+        ).tuples()
+        return {
+            vote_algorithm: round_report
+            for vote_algorithm, round_report in query
+        }
+
+    @classmethod
+    def save_strategy_winner_ids(
+        cls, poll_id: int, strategy_winner_ids: dict[int, Optional[int]],
+        round_reports: Optional[dict[int, str]] = None
+    ):
+        round_reports = round_reports or {}
+        rows = [{
+            'poll': poll_id, 'option': option_id,
+            'vote_algorithm': vote_algorithm,
+            'round_report': round_reports.get(vote_algorithm)
+        } for vote_algorithm, option_id in strategy_winner_ids.items()]
+
+        # winners that were already stored by an earlier tally are kept
+        cls.insert_many(rows).on_conflict_ignore().execute()
+
+
+class PollPairwiseCounts(BaseModel):
+    """
+    number of ballots that prefer the winner option over the
+    loser option, for every ordered pair of options in a poll
+    rows are created along with the poll's options, and are then
+    incremented / decremented in place as votes are cast
+    """
+    id = AutoField(primary_key=True)
+    poll = ForeignKeyField(Polls, to_field='id', on_delete='CASCADE')
+    winner = ForeignKeyField(
+        PollOptions, to_field='id', on_delete='CASCADE'
+    )
+    loser = ForeignKeyField(
+        PollOptions, to_field='id', on_delete='CASCADE'
+    )
+    count = IntegerField(default=0)
+
+    class Meta:
+        database = database_proxy
+        indexes = (
+            (('poll', 'winner', 'loser'), True),
+        )
+
+    @classmethod
+    def create_poll_rows(cls, poll_id: int) -> int:
+        """
+        creates zeroed rows for every ordered pair of the poll's options
+        :return: number of rows inserted
+        """
+        winner_option = PollOptions.alias()
+        loser_option = PollOptions.alias()
+        pairs_query = winner_option.select(
+            winner_option.poll, winner_option.id, loser_option.id, 0
+        ).join(loser_option, on=(
+            (loser_option.poll == winner_option.poll) &
+            (loser_option.id != winner_option.id)
+        )).where(winner_option.poll == poll_id)
+
+        return cls.insert_from(
+            pairs_query, [cls.poll, cls.winner, cls.loser, cls.count]
+        ).on_conflict_ignore().execute()
+
+    @classmethod
+    def apply_deltas(
+        cls, poll_id: int, deltas: dict[tuple[int, int], int]
+    ) -> int:
+        """
+        adds deltas ((winner option id, loser option id) -> change)
+        to the poll's pairwise counts in a single statement
+        :return: number of rows updated
+        """
+        if len(deltas) == 0:
+            return 0
+
+        count_delta = Case(None, [(
+            (cls.winner == winner_id) & (cls.loser == loser_id), delta
+        ) for (winner_id, loser_id), delta in deltas.items()], 0)
+
+        return cls.update(count=cls.count + count_delta).where(
+            (cls.poll == poll_id) &
+            cls.winner.in_({winner_id for winner_id, _ in deltas})
+        ).execute()
+
+    @classmethod
+    def replace_ballot(
+        cls, poll_id: int, option_ids: Iterable[int],
+        old_ballot: Optional[Sequence[int]],
+        new_ballot: Optional[Sequence[int]]
+    ) -> int:
+        """
+        moves the poll's pairwise counts from old_ballot to new_ballot
+        (either may be None for a new or removed vote)
+        """
+        return cls.apply_deltas(poll_id, ballot_pair_deltas(
+            option_ids, old_ballot or None, new_ballot or None
+        ))
+
+    @classmethod
+    def read_counts(cls, poll_id: int) -> dict[tuple[int, int], int]:
+        """
+        :return: (winner option id, loser option id) -> number of ballots
+        """
+        query = cls.select(cls.winner, cls.loser, cls.count).where(
+            cls.poll == poll_id
+        ).tuples()
+        return {
+            (winner_id, loser_id): count
+            for winner_id, loser_id, count in query
+        }
 
 
 class SupportTickets(BaseModel):
@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import peewee
 
-from peewee import Model
+from peewee import Model, MySQLDatabase
+from pymysql.cursors import SSCursor
 from typing import (
-    Dict, Any, Tuple, Type, TypeVar, Generic, Iterable, TypeAlias
+    Dict, Any, Tuple, Type, TypeVar, Generic, Iterable, TypeAlias,
+    Iterator, Optional
 )
 
 from result import Result, Ok, Err
+from database.identity_map import IdentityMap, get_identity_map
 
 
 class Empty(object):
@@ -70,6 +73,91 @@ class TypedModel(Model, Generic[M]):
         rows = [row_entry.to_dict() for row_entry in row_entries]
         return cls.insert_many(rows)
 
+    @classmethod
+    def fetch(cls: Type[M], pk: Any) -> M:
+        """
+        get by primary key, reusing the row if it was already
+        fetched in the current identity scope (see identity_map.py)
+        """
+        identity_map = cls._get_read_identity_map()
+        if identity_map is None:
+            return cls.get_by_id(pk)
+
+        row = identity_map.get(cls, pk)
+        if row is None:
+            row = cls.get_by_id(pk)
+            identity_map.add(row)
+
+        return row
+
+    @classmethod
+    def fetch_by(cls: Type[M], field: peewee.Field, value: Any) -> M:
+        # same as fetch, but by a unique field
+        identity_map = cls._get_read_identity_map()
+        if identity_map is None:
+            return cls.get(field == value)
+
+        row = identity_map.find(cls, field, value)
+        if row is None:
+            row = cls.get(field == value)
+            identity_map.add(row)
+
+        return row
+
+    @classmethod
+    def _get_read_identity_map(cls) -> Optional[IdentityMap]:
+        # reads in a transaction bypass the map, as rows cached before
+        # it began can be stale, and rows read in it may be rolled back
+        if cls._meta.database.in_transaction():
+            return None
+
+        return get_identity_map()
+
+    @classmethod
+    def _evict_cached_rows(cls):
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.evict_model(cls)
+
+    # writes can touch any row of the model, so they evict all of
+    # the model's rows from the identity scope. save, create and
+    # delete_instance all go through update / insert / delete
+    @classmethod
+    def update(cls, *args, **kwargs):
+        cls._evict_cached_rows()
+        return super().update(*args, **kwargs)
+
+    @classmethod
+    def delete(cls):
+        cls._evict_cached_rows()
+        return super().delete()
+
+    @classmethod
+    def insert(cls, *args, **kwargs):
+        # inserts can update existing rows via on_conflict
+        cls._evict_cached_rows()
+        return super().insert(*args, **kwargs)
+
+    @classmethod
+    def insert_many(cls, *args, **kwargs):
+        cls._evict_cached_rows()
+        return super().insert_many(*args, **kwargs)
+
+    @classmethod
+    def replace(cls, *args, **kwargs):
+        cls._evict_cached_rows()
+        return super().replace(*args, **kwargs)
+
+    @classmethod
+    def replace_many(cls, *args, **kwargs):
+        cls._evict_cached_rows()
+        return super().replace_many(*args, **kwargs)
+
+    @classmethod
+    def bulk_update(cls, *args, **kwargs):
+        cls._evict_cached_rows()
+        return super().bulk_update(*args, **kwargs)
+
 
 T = TypeVar('T', bound=TypedModel)
 
@@ -126,3 +214,35 @@ class BoundRowFields(ModelRowFields, Generic[T]):
 
 class UserID(int):
     pass
+
+
+def stream_query_rows(
+    query: peewee.Query, database: peewee.Database,
+    batch_size: int = 1000
+) -> Iterator[tuple]:
+    """
+    Yields the rows of a query as plain tuples without building
+    model instances or buffering the whole result set client-side.
+    MySQL connections use an unbuffered server-side cursor, so the
+    generator has to be fully consumed (or closed) before another
+    query is issued on the same connection.
+    """
+    if isinstance(database, peewee.Proxy):
+        database = database.obj
+
+    if isinstance(database, MySQLDatabase):
+        sql, params = query.sql()
+        cursor = database.connection().cursor(SSCursor)
+        cursor.execute(sql, params)
+    else:
+        cursor = database.execute(query)
+
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if len(rows) == 0:
+                break
+
+            yield from rows
+    finally:
+        cursor.close()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import threading
+
+from peewee import Field, Model
+from typing import Any, Dict, Iterator, Optional, Tuple, Type
+
+"""
+unit of work cache for a single telegram update / webapp request
+rows fetched through TypedModel.fetch / fetch_by are remembered by
+(model, primary key), so helpers that each look up the same poll or
+user end up sharing one read. Writes made through the model evict
+the affected rows, so later reads in the scope see fresh data
+a scope's map is only used by the thread that opened it (and by
+DBExecutor threads it is lent to), and only until the scope ends,
+even though tasks and threads spawned in the scope copy its context
+"""
+
+RowKey = Tuple[Type[Model], Any]
+
+
+class IdentityMap(object):
+    def __init__(self):
+        self._rows: Dict[RowKey, Model] = {}
+        # DBExecutor threads work on the same map as the update
+        self._lock = threading.Lock()
+        self.owner_thread = threading.get_ident()
+        # set once the scope ends, copies of its context that
+        # outlive it (e.g. background tasks) stop using the map
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, model: Type[Model], pk: Any) -> Optional[Model]:
+        with self._lock:
+            return self._rows.get((model, pk))
+
+    def find(
+        self, model: Type[Model], field: Field, value: Any
+    ) -> Optional[Model]:
+        # lookup by a unique column, rows are few enough to scan
+        with self._lock:
+            for (row_model, _), row in self._rows.items():
+                if (row_model is model) and (
+                    getattr(row, field.name) == value
+                ):
+                    return row
+
+        return None
+
+    def add(self, row: Model):
+        pk = row.get_id()
+        if pk is None:
+            return
+
+        with self._lock:
+            self._rows[(type(row), pk)] = row
+
+    def evict(self, row: Model):
+        with self._lock:
+            self._rows.pop((type(row), row.get_id()), None)
+
+    def evict_model(self, model: Type[Model]):
+        with self._lock:
+            for row_key in list(self._rows):
+                if issubclass(row_key[0], model):
+                    del self._rows[row_key]
+
+
+_identity_map: contextvars.ContextVar[Optional[IdentityMap]] = (
+    contextvars.ContextVar('identity_map', default=None)
+)
+# map lent to the current (DBExecutor) thread, see borrow_identity_map
+_borrowed = threading.local()
+
+
+def get_identity_map() -> Optional[IdentityMap]:
+    """
+    None if the current context isn't in an identity scope, or if
+    the scope has ended or was opened on another thread
+    """
+    identity_map = getattr(_borrowed, 'identity_map', None)
+    if identity_map is None:
+        identity_map = _identity_map.get()
+        if (identity_map is None) or (
+            identity_map.owner_thread != threading.get_ident()
+        ):
+            return None
+
+    return None if identity_map.closed else identity_map
+
+
+def remember(row: Model) -> Model:
+    # adds a row that was read without fetch to the current scope
+    # (rows read in a transaction may yet be rolled back)
+    identity_map = get_identity_map()
+    if (identity_map is not None) and not (
+        row._meta.database.in_transaction()
+    ):
+        identity_map.add(row)
+
+    return row
+
+
+@contextlib.contextmanager
+def borrow_identity_map(
+    identity_map: Optional[IdentityMap]
+) -> Iterator[None]:
+    # lends the caller's map to this thread for the duration of a call
+    prev_identity_map = getattr(_borrowed, 'identity_map', None)
+    _borrowed.identity_map = identity_map
+    try:
+        yield
+    finally:
+        _borrowed.identity_map = prev_identity_map
+
+
+@contextlib.contextmanager
+def identity_scope() -> Iterator[IdentityMap]:
+    identity_map = IdentityMap()
+    token = _identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        identity_map.closed = True
+        _identity_map.reset(token)
@@ -32,13 +32,18 @@ class MessageContextState(BaseModel):
     message_id = BigIntegerField(null=False)
     context_type = CharField(max_length=255, null=False)
     state = TextField(null=False)
-    last_updated_at = DateTimeField(default=datetime.datetime.now, null=False)
-
-    indexes = (
-        # Unique multi-column index for user-message_id pairs
-        (('user', 'message_id'), True),
+    # indexed for prune_expired_contexts
+    last_updated_at = DateTimeField(
+        default=datetime.datetime.now, null=False, index=True
     )
 
+    class Meta:
+        database = database_proxy
+        indexes = (
+            # Unique multi-column index for user-message_id pairs
+            (('user', 'message_id'), True),
+        )
+
     def update_state(self, new_state: SerializableMessageContext):
         self.state = new_state.dump_to_json_str()
         self.last_updated_at = datetime.datetime.now()
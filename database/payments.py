@@ -1,7 +1,7 @@
 import datetime
 
 from database.db_helpers import EmptyField, Empty, UserID, BoundRowFields
-from database.setup import BaseModel
+from database.setup import BaseModel, database_proxy
 from peewee import (
     AutoField, BooleanField, TextField, IntegerField,
     BigIntegerField, DateTimeField, CharField
@@ -26,6 +26,13 @@ class Payments(BaseModel):
     refunded_at = DateTimeField(default=None, null=True)
     refund_amount = IntegerField(default=0, null=False)
 
+    class Meta:
+        database = database_proxy
+        indexes = (
+            # unpaid payments past a cutoff are pruned by prune_expired
+            (('paid', 'created_at'), False),
+        )
+
     @classmethod
     def build_from_fields(
         cls, payment_id: int | EmptyField = Empty,
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import dataclasses
+import heapq
+import logging
+import threading
+import time
+
+from typing import Optional
+from peewee import _ConnectionState
+from playhouse.pool import PooledDatabase, MaxConnectionsExceeded
+
+"""
+connection pooling for the bot / webapp database
+peewee tracks the open connection per thread, but telegram updates
+and webapp requests are asyncio tasks that share one thread, so the
+pool tracks connections per context instead: every update / request
+runs inside a connection scope that checks out its own connection
+and returns it to the pool once the update / request is done
+"""
+
+logger = logging.getLogger(__name__)
+# seconds between attempts to check out a connection from a full pool
+CHECKOUT_POLL_INTERVAL = 0.05
+
+
+@dataclasses.dataclass
+class PoolConfig(object):
+    # connections opened up front and kept idle in the pool
+    min_connections: int = 4
+    max_connections: int = 32
+    # seconds before idle connections are closed and replaced
+    stale_timeout: int = 300
+    # seconds to wait for a free connection before giving up
+    checkout_timeout: int = 10
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> PoolConfig:
+        config = config or {}
+        defaults = cls()
+        return cls(
+            min_connections=int(config.get(
+                'min_connections', defaults.min_connections
+            )),
+            max_connections=int(config.get(
+                'max_connections', defaults.max_connections
+            )),
+            stale_timeout=int(config.get(
+                'stale_timeout', defaults.stale_timeout
+            )),
+            checkout_timeout=int(config.get(
+                'checkout_timeout', defaults.checkout_timeout
+            ))
+        )
+
+
+@dataclasses.dataclass
+class PoolMetrics(object):
+    num_checkouts: int = 0
+    num_timeouts: int = 0
+    # seconds spent waiting for a free connection
+    total_wait: float = 0
+    max_wait: float = 0
+    # connections checked out / sitting idle in the pool
+    in_use: int = 0
+    idle: int = 0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / max(self.num_checkouts, 1)
+
+    def record(self, wait: float):
+        self.num_checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class ContextConnectionState(_ConnectionState):
+    """
+    drop-in replacement for peewee's thread local connection state
+    that lets an asyncio task hold a connection of its own for the
+    duration of a scope (see new_scope). The scope's state is kept in
+    a contextvar, so tasks spawned inside the scope share it while it
+    lasts. Once the scope ends, and on threads other than the one that
+    opened the scope (asyncio.to_thread copies the context too), the
+    state falls back on per-thread state like peewee's thread locals,
+    so the scope's connection is never reopened after it was returned
+    or used by two threads at once. Other threads can use a scope's
+    connection through borrow_scope
+    """
+    def __init__(self):
+        object.__setattr__(self, '_scope_var', contextvars.ContextVar(
+            f'db_connection_scope_{id(self)}', default=None
+        ))
+        object.__setattr__(self, '_local', threading.local())
+        super().__init__()
+
+    @staticmethod
+    def _build_state(scoped: bool = False) -> dict:
+        state = dict(closed=True, conn=None, ctx=[], transactions=[])
+        if scoped:
+            state.update(
+                owner_thread=threading.get_ident(), ended=False,
+                # serializes threads that borrow the scope's connection
+                scope_lock=threading.RLock()
+            )
+
+        return state
+
+    def get_owned_scope(self) -> Optional[dict]:
+        # the current scope, if it was opened on this thread
+        # and hasn't ended yet
+        scope = self._scope_var.get()
+        if (scope is None) or scope['ended']:
+            return None
+        if scope['owner_thread'] != threading.get_ident():
+            return None
+
+        return scope
+
+    def _get_state(self) -> dict:
+        scope = self.get_owned_scope()
+        if scope is not None:
+            return scope
+
+        local = self._local
+        borrowed_scope = getattr(local, 'borrowed_scope', None)
+        if borrowed_scope is not None:
+            return borrowed_scope
+
+        if not hasattr(local, 'state'):
+            local.state = self._build_state()
+        return local.state
+
+    def __getattr__(self, name: str):
+        try:
+            return self._get_state()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name: str, value):
+        self._get_state()[name] = value
+
+    def new_scope(self) -> contextvars.Token:
+        return self._scope_var.set(self._build_state(scoped=True))
+
+    def end_scope(self, token: contextvars.Token):
+        # copies of the context made inside the scope still hold
+        # the scope, mark it so that they stop borrowing it
+        scope = self._scope_var.get()
+        if scope is not None:
+            scope['ended'] = True
+        self._scope_var.reset(token)
+
+    @contextlib.contextmanager
+    def borrow_scope(self, scope: dict):
+        """
+        lets the current thread run queries on the connection of a
+        scope opened by another thread, one borrower at a time
+        """
+        with scope['scope_lock']:
+            if scope['ended']:
+                raise RuntimeError('Connection scope has already ended')
+
+            prev_scope = getattr(self._local, 'borrowed_scope', None)
+            self._local.borrowed_scope = scope
+            try:
+                yield
+            finally:
+                self._local.borrowed_scope = prev_scope
+
+
+class ConnectionPoolMixin(object):
+    """
+    mixin for playhouse pooled databases that adds per-context
+    connection scopes, non-blocking checkouts from async code,
+    a minimum pool size and pool metrics
+    """
+    def __init__(
+        self, *args, min_connections: int = 0, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        assert isinstance(self, PooledDatabase)
+        self._state = ContextConnectionState()
+        self.min_connections = min_connections
+        self.metrics = PoolMetrics()
+        self._metrics_lock = threading.Lock()
+
+    @classmethod
+    def from_pool_config(cls, database: str, config: PoolConfig, **kwargs):
+        return cls(
+            database, min_connections=config.min_connections,
+            max_connections=config.max_connections,
+            stale_timeout=config.stale_timeout,
+            timeout=config.checkout_timeout, **kwargs
+        )
+
+    def _record_checkout(self, wait: Optional[float]):
+        with self._metrics_lock:
+            if wait is None:
+                self.metrics.num_timeouts += 1
+            else:
+                self.metrics.record(wait)
+
+    def connect(self, reuse_if_open=False):
+        start_stamp = time.perf_counter()
+        try:
+            result = super().connect(reuse_if_open)
+        except MaxConnectionsExceeded:
+            self._record_checkout(None)
+            raise
+
+        self._record_checkout(time.perf_counter() - start_stamp)
+        return result
+
+    async def connect_async(self) -> bool:
+        """
+        same as connect, but waits for a free connection without
+        blocking the event loop (PooledDatabase.connect sleeps)
+        """
+        assert isinstance(self, PooledDatabase)
+        start_stamp = time.perf_counter()
+        wait_timeout = self._wait_timeout or 0
+
+        while True:
+            try:
+                # skip PooledDatabase.connect's blocking retry loop
+                result = super(PooledDatabase, self).connect()
+            except MaxConnectionsExceeded:
+                wait = time.perf_counter() - start_stamp
+                if wait + CHECKOUT_POLL_INTERVAL > wait_timeout:
+                    self._record_checkout(None)
+                    raise MaxConnectionsExceeded(
+                        'Max connections exceeded, timed out '
+                        'attempting to connect.'
+                    )
+                await asyncio.sleep(CHECKOUT_POLL_INTERVAL)
+            else:
+                self._record_checkout(time.perf_counter() - start_stamp)
+                return result
+
+    @contextlib.contextmanager
+    def connection_scope(self):
+        """
+        checks out a connection that is used by everything run in
+        the current context until the scope exits
+        """
+        assert isinstance(self, PooledDatabase)
+        token = self._state.new_scope()
+        scope_lock = self._state.scope_lock
+        try:
+            self.connect()
+            try:
+                yield
+            finally:
+                # wait for threads still borrowing the connection
+                with scope_lock:
+                    self.close()
+        finally:
+            self._state.end_scope(token)
+
+    @contextlib.asynccontextmanager
+    async def async_connection_scope(self):
+        assert isinstance(self, PooledDatabase)
+        token = self._state.new_scope()
+        scope_lock = self._state.scope_lock
+        try:
+            await self.connect_async()
+            try:
+                yield
+            finally:
+                # a cancelled update can leave a DBExecutor thread
+                # using its connection, wait for the thread to finish
+                while not scope_lock.acquire(blocking=False):
+                    await asyncio.sleep(CHECKOUT_POLL_INTERVAL)
+                try:
+                    self.close()
+                finally:
+                    scope_lock.release()
+        finally:
+            self._state.end_scope(token)
+
+    def get_owned_scope(self) -> Optional[dict]:
+        return self._state.get_owned_scope()
+
+    @contextlib.contextmanager
+    def borrow_scope(self, scope: Optional[dict]):
+        """
+        runs queries on the connection of scope (from get_owned_scope
+        on the thread that opened it), or on a connection checked out
+        for just this block if there is no scope to borrow
+        """
+        if (scope is None) or scope['ended']:
+            with self.connection_scope():
+                yield
+            return
+
+        with self._state.borrow_scope(scope):
+            yield
+
+    def maintain(self):
+        """
+        closes idle connections that have gone stale, then opens
+        new connections until the pool holds min_connections
+        (playhouse pools have no minimum size of their own)
+        """
+        assert isinstance(self, PooledDatabase)
+        with self._lock:
+            fresh_connections = []
+            for timestamp, conn in self._connections:
+                if self._stale_timeout and self._is_stale(timestamp):
+                    self._close(conn, close_conn=True)
+                else:
+                    fresh_connections.append((timestamp, conn))
+
+            # playhouse pools keep idle connections in a heap
+            heapq.heapify(fresh_connections)
+            self._connections = fresh_connections
+            num_missing = self.min_connections - (
+                len(self._connections) + len(self._in_use)
+            )
+            if num_missing <= 0:
+                return
+
+            # checking out (and then releasing) the idle connections
+            # along with the missing ones makes the pool open new ones
+            conns = []
+            try:
+                for _ in range(len(self._connections) + num_missing):
+                    conns.append(self._connect())
+            except MaxConnectionsExceeded:
+                pass
+            except Exception as e:
+                logger.error(f'Failed to fill connection pool: {e}')
+            finally:
+                for conn in conns:
+                    self._close(conn)
+
+    def get_metrics(self) -> PoolMetrics:
+        assert isinstance(self, PooledDatabase)
+        with self._lock, self._metrics_lock:
+            return dataclasses.replace(
+                self.metrics, in_use=len(self._in_use),
+                idle=len(self._connections)
+            )
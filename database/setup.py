@@ -1,11 +1,25 @@
+import contextlib
+
+from typing import Callable, Optional
 from peewee import MySQLDatabase, Proxy
 # noinspection PyUnresolvedReferences
 from playhouse.shortcuts import ReconnectMixin
+from playhouse.pool import PooledMySQLDatabase
 
 from database.db_helpers import TypedModel
+from database.commit_hooks import CommitHooksMixin
+from database.pool import ConnectionPoolMixin
+from database.identity_map import identity_scope
+
+
+class DB(CommitHooksMixin, ReconnectMixin, MySQLDatabase):
+    pass
 
 
-class DB(ReconnectMixin, MySQLDatabase):
+class PooledDB(
+    CommitHooksMixin, ConnectionPoolMixin, ReconnectMixin,
+    PooledMySQLDatabase
+):
     pass
 
 
@@ -16,3 +30,52 @@ class BaseModel(TypedModel):
     class Meta:
         database = database_proxy
         table_settings = ['DEFAULT CHARSET=utf8mb4']
+
+
+def get_connection_pool() -> Optional[ConnectionPoolMixin]:
+    # None if the initialized database isn't pooled (e.g. in tests)
+    db = database_proxy.obj
+    return db if isinstance(db, ConnectionPoolMixin) else None
+
+
+def on_commit(callback: Callable[[], None]):
+    """
+    runs callback once the current transaction (if any) commits
+    databases without commit hooks run it right away
+    """
+    db = database_proxy.obj
+    if isinstance(db, CommitHooksMixin):
+        db.on_commit(callback)
+    else:
+        callback()
+
+
+@contextlib.asynccontextmanager
+async def checkout_connection():
+    """
+    checks out a pooled connection and opens an identity map
+    for the rest of the current telegram update / webapp request
+    """
+    connection_pool = get_connection_pool()
+    with identity_scope():
+        if connection_pool is None:
+            yield
+            return
+
+        async with connection_pool.async_connection_scope():
+            yield
+
+
+@contextlib.contextmanager
+def connection_scope():
+    """
+    checks out a pooled connection for the rest of the block, for
+    threads (e.g. tally workers) that query outside DBExecutor
+    """
+    connection_pool = get_connection_pool()
+    if connection_pool is None:
+        yield
+        return
+
+    with connection_pool.connection_scope():
+        yield
@@ -2,14 +2,24 @@ import pytest
 
 from peewee import SqliteDatabase
 from database import database
+from database.commit_hooks import CommitHooksMixin
+
+
+class SqliteTestDB(CommitHooksMixin, SqliteDatabase):
+    pass
 
 
 @pytest.fixture(scope='function')
-def test_database():
-    test_db = SqliteDatabase(':memory:')
+def test_database(monkeypatch):
+    test_db = SqliteTestDB(':memory:')
+    db_tables = database.get_tables()
+    for db_table in db_tables:
+        # MySQL table options (e.g. DEFAULT CHARSET) aren't valid in
+        # sqlite, they're restored once the test is done
+        monkeypatch.setattr(db_table._meta, 'table_settings', [])
+
     # Bind model classes to test database
     database.initialize_db(test_db)
-    db_tables = database.get_tables()
     test_db.create_tables(db_tables)
 
     yield test_db
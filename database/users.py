@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import datetime
+import functools
 import logging
 
 # noinspection PyUnresolvedReferences
@@ -8,7 +9,8 @@ from playhouse.shortcuts import ReconnectMixin
 from result import Result, Ok, Err
 
 from database import database
-from database.setup import database_proxy
+from database.setup import database_proxy, on_commit
+from database.users_cache import UsersCache
 from helpers import constants
 from .subscription_tiers import SubscriptionTiers
 from typing import Self, List, Iterable
@@ -46,6 +48,38 @@ class Users(BaseModel):
     def is_deleted(self) -> bool:
         return self.deleted_at is not None
 
+    # keep the users cache in sync with row writes, bulk Users
+    # queries bypass these and have to invalidate the cache themselves
+    # the cache (and other processes) only see writes once they commit,
+    # until then the row is just dropped from this process' cache
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        users_cache = UsersCache.get_active()
+        if users_cache is not None:
+            if database_proxy.in_transaction():
+                users_cache.invalidate(self.get_tele_id(), broadcast=False)
+
+            # copied, as the row may change again before the commit
+            saved_user = type(self)(**self.__data__)
+            on_commit(functools.partial(
+                users_cache.write_through, saved_user
+            ))
+
+        return result
+
+    def delete_instance(self, *args, **kwargs):
+        result = super().delete_instance(*args, **kwargs)
+        users_cache = UsersCache.get_active()
+        if users_cache is not None:
+            if database_proxy.in_transaction():
+                users_cache.invalidate(self.get_tele_id(), broadcast=False)
+
+            on_commit(functools.partial(
+                users_cache.invalidate, self.get_tele_id()
+            ))
+
+        return result
+
     def get_subscription_tier(self) -> Result[SubscriptionTiers, ValueError]:
         try:
             return Ok(SubscriptionTiers(self.subscription_tier))
@@ -88,11 +122,22 @@ class Users(BaseModel):
         tele_user_id = self.get_tele_id()
         logger.warning(f"Deleting user #{user_id} with tele_id #{tele_user_id}")
 
+        from helpers.live_tally import LiveTallyManager
+
         with database_proxy.atomic():
             # delete all polls created by the user
+            owned_poll_ids = [
+                poll.id for poll in database.Polls.select(
+                    database.Polls.id
+                ).where(database.Polls.creator == user_id)
+            ]
             database.Polls.delete().where(
                 database.Polls.creator == user_id
             ).execute()
+            for poll_id in owned_poll_ids:
+                on_commit(functools.partial(
+                    LiveTallyManager().discard, poll_id, broadcast=True
+                ))
 
             poll_registrations: Iterable[database.PollVoters] = (
                 database.PollVoters.select().where(
@@ -109,8 +154,25 @@ class Users(BaseModel):
                 else:
                     # delete poll voter and increment deleted voters count
                     poll.deleted_voters += 1
+                    # withdraw the voter's ballot from the pairwise counts
+                    option_ids = [
+                        option.id for option in
+                        database.PollOptions.select(
+                            database.PollOptions.id
+                        ).where(database.PollOptions.poll == poll.id)
+                    ]
+                    database.PollPairwiseCounts.replace_ballot(
+                        poll.id, option_ids, new_ballot=None,
+                        old_ballot=database.VoteBallots.read_ballot(
+                            poll_registration.id
+                        )
+                    )
                     poll_registration.delete_instance()
                     poll.save()
+                    on_commit(functools.partial(
+                        LiveTallyManager().remove_ballot,
+                        poll.id, poll_registration.id
+                    ))
 
             # actually remove self from database
             self.delete_instance()
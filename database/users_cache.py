@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+import threading
+import time
+import uuid
+
+import redis
+import redis.asyncio as async_redis
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Type, TYPE_CHECKING
+from redis.exceptions import RedisError
+
+if TYPE_CHECKING:
+    from database.users import Users
+
+"""
+in-process LRU + TTL cache of Users rows by telegram id, so that
+users_middleware doesn't need a database round trip for every update
+rows are written through on save and dropped on delete, and every
+write is broadcast over redis so that other bot processes drop their
+(now stale) copy of the row
+"""
+
+logger = logging.getLogger(__name__)
+# seconds to wait before resubscribing after losing the redis connection
+RESUBSCRIBE_INTERVAL = 5
+
+
+@dataclasses.dataclass
+class UsersCacheConfig(object):
+    max_size: int = 10000
+    # seconds before a cached row is read from the database again
+    ttl: float = 60
+    # leave empty to skip cross-process invalidation
+    redis_url: str = 'redis://localhost:6379'
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> UsersCacheConfig:
+        config = config or {}
+        defaults = cls()
+        return cls(
+            max_size=int(config.get('max_size', defaults.max_size)),
+            ttl=float(config.get('ttl', defaults.ttl)),
+            redis_url=str(config.get('redis_url', defaults.redis_url))
+        )
+
+
+@dataclasses.dataclass
+class UsersCacheMetrics(object):
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    # invalidations received from other processes
+    remote_invalidations: int = 0
+
+
+class UsersCache(object):
+    _instance = None
+    """
+    process-wide users cache, the cache is only active in processes
+    that create it (the bot and the webapp), so that Users writes made
+    by either are broadcast to the other. Writes from processes that
+    don't create it (e.g. scripts) are only picked up after the ttl
+    """
+    INVALIDATE_CHANNEL = 'USERS_CACHE_INVALIDATE'
+    FLUSH_ALL = 'ALL'
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(UsersCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, config: Optional[UsersCacheConfig] = None):
+        if hasattr(self, 'config'):
+            return
+
+        if config is None:
+            from load_config import USERS_CACHE_CONFIG
+            config = UsersCacheConfig.from_config(USERS_CACHE_CONFIG)
+
+        self.config = config
+        self.metrics = UsersCacheMetrics()
+        # tells this process' own broadcasts apart from other processes'
+        self.instance_id = uuid.uuid4().hex
+        # tele_id -> (expiry timestamp, row class, row data)
+        self._rows: OrderedDict[
+            int, Tuple[float, Type[Users], Dict[str, Any]]
+        ] = OrderedDict()
+        # rows are read from both the event loop and DBExecutor threads
+        self.lock = threading.Lock()
+        self._redis_client: Optional[redis.Redis] = None
+
+    @classmethod
+    def get_active(cls) -> Optional[UsersCache]:
+        return cls._instance
+
+    def get(self, tele_id: int) -> Optional[Users]:
+        """
+        returns a copy of the cached row, so that concurrent
+        updates for the same user don't share one instance
+        """
+        with self.lock:
+            entry = self._rows.get(tele_id)
+            if entry is None:
+                self.metrics.misses += 1
+                return None
+
+            expiry, row_cls, row_data = entry
+            if time.monotonic() > expiry:
+                del self._rows[tele_id]
+                self.metrics.misses += 1
+                return None
+
+            self._rows.move_to_end(tele_id)
+            self.metrics.hits += 1
+
+        user = row_cls(**row_data)
+        user._dirty.clear()
+        return user
+
+    def put(self, user: Users):
+        expiry = time.monotonic() + self.config.ttl
+        with self.lock:
+            self._rows[user.get_tele_id()] = (
+                expiry, type(user), dict(user.__data__)
+            )
+            self._rows.move_to_end(user.get_tele_id())
+            while len(self._rows) > self.config.max_size:
+                self._rows.popitem(last=False)
+
+    def write_through(self, user: Users):
+        # called once the row's save has committed
+        self.put(user)
+        self.publish(str(user.get_tele_id()))
+
+    def invalidate(self, tele_id: int, broadcast: bool = True):
+        with self.lock:
+            self._rows.pop(tele_id, None)
+            self.metrics.invalidations += 1
+
+        if broadcast:
+            self.publish(str(tele_id))
+
+    def clear(self, broadcast: bool = True):
+        with self.lock:
+            self._rows.clear()
+            self.metrics.invalidations += 1
+
+        if broadcast:
+            self.publish(self.FLUSH_ALL)
+
+    def get_metrics(self) -> UsersCacheMetrics:
+        with self.lock:
+            return dataclasses.replace(self.metrics)
+
+    def get_redis_client(self) -> redis.Redis:
+        # synchronous client, as writes happen on DBExecutor threads
+        if self._redis_client is None:
+            self._redis_client = redis.Redis.from_url(
+                self.config.redis_url, socket_connect_timeout=1,
+                socket_timeout=1
+            )
+
+        return self._redis_client
+
+    def publish(self, payload: str):
+        if not self.config.redis_url:
+            return
+
+        try:
+            self.get_redis_client().publish(
+                self.INVALIDATE_CHANNEL, f'{self.instance_id}:{payload}'
+            )
+        except RedisError as e:
+            # other processes fall back on the ttl
+            logger.warning(f'Failed to broadcast users cache write: {e}')
+
+    def handle_message(self, message: bytes | str):
+        if isinstance(message, bytes):
+            message = message.decode()
+
+        instance_id, _, payload = message.partition(':')
+        if instance_id == self.instance_id:
+            return
+
+        with self.lock:
+            self.metrics.remote_invalidations += 1
+
+        if payload == self.FLUSH_ALL:
+            self.clear(broadcast=False)
+        elif payload.isdigit():
+            self.invalidate(int(payload), broadcast=False)
+        else:
+            logger.error(f'Invalid users cache message: {message}')
+
+    async def listen(self):
+        """
+        drops rows that other processes have written, runs until
+        cancelled and resubscribes whenever the connection is lost
+        """
+        if not self.config.redis_url:
+            return
+
+        while True:
+            client = async_redis.Redis.from_url(self.config.redis_url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.subscribe(self.INVALIDATE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.handle_message(message['data'])
+            except (RedisError, OSError) as e:
+                logger.warning(f'Users cache subscription lost: {e}')
+            finally:
+                await client.aclose()
+
+            # writes made while unsubscribed were missed
+            self.clear(broadcast=False)
+            await asyncio.sleep(RESUBSCRIBE_INTERVAL)
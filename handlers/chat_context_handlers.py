@@ -6,6 +6,7 @@ from abc import ABCMeta, abstractmethod
 from telegram import Message, User as TeleUser
 from telegram.ext import ContextTypes
 from base_api import BaseAPI
+from async_api import AsyncAPI
 from bot_middleware import track_errors
 from database.db_helpers import UserID
 from handlers.payment_handlers import IncMaxVotersChatContext, PaymentHandlers
@@ -32,6 +33,8 @@ from database import (
     SupportTickets, PollOptions
 )
 
+async_api = AsyncAPI()
+
 
 class BaseContextHandler(object, metaclass=ABCMeta):
     @abstractmethod
@@ -103,7 +106,7 @@ class PollCreationContextHandler(BaseContextHandler):
                     f"or use /done if you're done:"
                 )
 
-        poll_creation_context.save_state()
+        await async_api.db_executor.run(poll_creation_context.save_state)
         return await message.reply_text(reply_message)
 
     async def complete_chat_context(
@@ -125,7 +128,9 @@ class PollCreationContextHandler(BaseContextHandler):
             )
 
         poll_creation_context = poll_creation_context_res.unwrap()
-        subscription_tier_res = user_entry.get_subscription_tier()
+        subscription_tier_res = await async_api.db_executor.run(
+            user_entry.get_subscription_tier
+        )
         if subscription_tier_res.is_err():
             return await reply_text(READ_SUBSCRIPTION_TIER_FAILED)
 
@@ -134,7 +139,9 @@ class PollCreationContextHandler(BaseContextHandler):
             creator_id=user_id, subscription_tier=subscription_tier
         )
 
-        create_poll_res = poll_creator.save_poll_to_db()
+        create_poll_res = await async_api.db_executor.run(
+            poll_creator.save_poll_to_db
+        )
         if create_poll_res.is_err():
             error_message = create_poll_res.err()
             return await error_message.call(reply_text)
@@ -142,9 +149,9 @@ class PollCreationContextHandler(BaseContextHandler):
         new_poll: Polls = create_poll_res.unwrap()
         poll_id = int(new_poll.id)
         # self-destruct context once processed
-        chat_context.delete_instance()
+        await async_api.db_executor.run(chat_context.delete_instance)
 
-        view_poll_result = BaseAPI.get_poll_message(
+        view_poll_result = await async_api.get_poll_message(
             poll_id=poll_id, user_id=user_id,
             bot_username=context.bot.username,
             username=user_entry.username,
@@ -227,7 +234,7 @@ class VoteContextHandler(BaseContextHandler):
                 return await message.reply_text("Invalid poll ID")
 
             poll_id = vote_context.poll_id
-            poll_info_res = BaseAPI.read_poll_info(
+            poll_info_res = await async_api.read_poll_info(
                 poll_id=poll_id, user_id=user.get_user_id(),
                 username=tele_user.username, chat_id=message.chat_id
             )
@@ -258,7 +265,7 @@ class VoteContextHandler(BaseContextHandler):
             except ValueError:
                 return await message.reply_text("Invalid poll ID")
 
-            poll_info_res = BaseAPI.read_poll_info(
+            poll_info_res = await async_api.read_poll_info(
                 poll_id=poll_id, user_id=user.get_user_id(),
                 username=tele_user.username, chat_id=message.chat_id
             )
@@ -275,7 +282,7 @@ class VoteContextHandler(BaseContextHandler):
                     set_poll_id_res.unwrap_err()
                 ))
 
-            vote_context.save_state()
+            await async_api.db_executor.run(vote_context.save_state)
             return await message.reply_text(
                 vote_context.generate_vote_option_prompt()
             )
@@ -292,7 +299,7 @@ class VoteContextHandler(BaseContextHandler):
                 error = add_ranked_option_res.unwrap_err()
                 return await message.reply_text(str(error))
 
-            vote_context.save_state()
+            await async_api.db_executor.run(vote_context.save_state)
             # print('CURRENT_RANKINGS', vote_context.rankings)
             return await message.reply_text(
                 vote_context.generate_vote_option_prompt()
@@ -314,7 +321,7 @@ class VoteContextHandler(BaseContextHandler):
         tele_user: TeleUser = message.from_user
         vote_creation_context = vote_creation_context_res.unwrap()
         poll_id = vote_creation_context.poll_id
-        register_vote_result = BaseAPI.register_vote(
+        register_vote_result = await async_api.register_vote(
             chat_id=message.chat_id, rankings=vote_creation_context.rankings,
             poll_id=vote_creation_context.poll_id,
             username=tele_user.username, user_tele_id=tele_user.id
@@ -324,7 +331,7 @@ class VoteContextHandler(BaseContextHandler):
             error_message = register_vote_result.unwrap_err()
             return await error_message.call(message.reply_text)
 
-        chat_context.delete_instance()
+        await async_api.db_executor.run(chat_context.delete_instance)
         is_first_vote, newly_registered = register_vote_result.unwrap()
         send_reply_coroutine = TelegramHelpers.send_post_vote_reply(
             message=message, poll_id=poll_id
@@ -333,7 +340,7 @@ class VoteContextHandler(BaseContextHandler):
         coroutines: list[Coroutine] = [send_reply_coroutine]
         ref_message_id = vote_creation_context.ref_message_id
         ref_chat_id = vote_creation_context.ref_chat_id
-        poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+        poll_info = await async_api.unverified_read_poll_info(poll_id)
         update_ref_message = (
             (is_first_vote or newly_registered) and
             (ref_message_id != BLANK_ID)
@@ -357,7 +364,9 @@ class IncreaseMaxVotersContextHandler(BaseContextHandler):
         update: ModifiedTeleUpdate, context: ContextTypes.DEFAULT_TYPE
     ):
         msg: Message = update.message
-        extract_context_res = extract_chat_context(update)
+        extract_context_res = await async_api.db_executor.run(
+            extract_chat_context, update
+        )
 
         if extract_context_res.is_err():
             error = extract_context_res.unwrap_err()
@@ -379,7 +388,9 @@ class IncreaseMaxVotersContextHandler(BaseContextHandler):
             return await msg.reply_text(strings.ENTER_POLL_ID_PROMPT)
         else:
             user_id = update.user.get_user_id()
-            poll_res = Polls.get_as_creator(poll_id, user_id)
+            poll_res = await async_api.db_executor.run(
+                Polls.get_as_creator, poll_id, user_id
+            )
             if poll_res.is_err():
                 return await msg.reply_text(
                     strings.MAX_VOTERS_NOT_EDITABLE
@@ -414,7 +425,9 @@ class IncreaseMaxVotersContextHandler(BaseContextHandler):
             except ValueError:
                 return await msg.reply_text("Invalid poll ID")
 
-            poll_res = Polls.get_as_creator(poll_id, user.get_user_id())
+            poll_res = await async_api.db_executor.run(
+                Polls.get_as_creator, poll_id, user.get_user_id()
+            )
             if poll_res.is_err():
                 return await msg.reply_text(
                     strings.MAX_VOTERS_NOT_EDITABLE
@@ -422,7 +435,7 @@ class IncreaseMaxVotersContextHandler(BaseContextHandler):
 
             poll = poll_res.unwrap()
             inc_voters_context.poll_id = poll_id
-            inc_voters_context.save_state()
+            await async_api.db_executor.run(inc_voters_context.save_state)
             return await msg.reply_text(strings.generate_max_voters_prompt(
                 poll_id, current_max=poll.max_voters
             ))
@@ -440,7 +453,7 @@ class IncreaseMaxVotersContextHandler(BaseContextHandler):
                 new_max_voters=new_max_voters
             )
             if invoice_sent:
-                chat_context.delete_instance()
+                await async_api.db_executor.run(chat_context.delete_instance)
 
             return None
 
@@ -472,9 +485,11 @@ class PaySupportContextHandler(BaseContextHandler):
         user_id = user.get_user_id()
         tele_id = message.from_user.id
         username = message.from_user.username
-        support_ticket = SupportTickets.build_from_fields(
-            info=message.text, is_payment_support=True
-        ).create()
+        support_ticket = await async_api.db_executor.run(
+            SupportTickets.build_from_fields(
+                info=message.text, is_payment_support=True
+            ).create
+        )
 
         support_ticket_id = support_ticket.id
         support_message = textwrap.dedent(f"""
@@ -490,7 +505,7 @@ class PaySupportContextHandler(BaseContextHandler):
                 f"Support ticket #{support_ticket_id} has been created"
             )
         finally:
-            chat_context.delete_instance()
+            await async_api.db_executor.run(chat_context.delete_instance)
 
 
 class ClosePollContextHandler(BaseContextHandler):
@@ -512,7 +527,7 @@ class ClosePollContextHandler(BaseContextHandler):
 
         # TODO: implement poll closing here
         chat_context = extracted_context.chat_context
-        chat_context.delete_instance()
+        await async_api.db_executor.run(chat_context.delete_instance)
         await self.close_poll(
             poll_id=poll_id, user_id=user_id,
             update=update
@@ -524,7 +539,9 @@ class ClosePollContextHandler(BaseContextHandler):
         poll_id: int, user_id: UserID, update: ModifiedTeleUpdate
     ):
         message = update.message
-        poll_res = Polls.get_as_creator(poll_id, user_id)
+        poll_res = await async_api.db_executor.run(
+            Polls.get_as_creator, poll_id, user_id
+        )
         if poll_res.is_err():
             return await message.reply_text(
                 "You're not the creator of this poll"
@@ -532,12 +549,15 @@ class ClosePollContextHandler(BaseContextHandler):
 
         poll = poll_res.unwrap()
         poll.closed = True
-        poll.save()
+        await async_api.db_executor.run(poll.save)
 
+        rcv_tally = RCVTally()
+        # start the tally right away, the winner request below
+        # (and any others that come in meanwhile) join the same job
+        rcv_tally.schedule_poll_winner(poll_id)
         await message.reply_text(f'poll {poll_id} closed')
         await TelegramHelpers.handle_poll_winner_request(
-            rcv_tally=RCVTally(),
-            update=update, poll_id=poll_id
+            rcv_tally=rcv_tally, update=update, poll_id=poll_id
         )
         return None
 
@@ -574,7 +594,9 @@ class ContextHandlers(object):
         is_from_start: bool = False
     ):
         message: Message = update.message
-        chat_context_res = extract_chat_context(update)
+        chat_context_res = await async_api.db_executor.run(
+            extract_chat_context, update
+        )
         if chat_context_res.is_err():
             error = chat_context_res.unwrap_err()
             return await message.reply_text(error.to_message())
@@ -598,7 +620,9 @@ class ContextHandlers(object):
         self, update: ModifiedTeleUpdate, context: ContextTypes.DEFAULT_TYPE
     ):
         message: Message = update.message
-        extract_context_res = extract_chat_context(update)
+        extract_context_res = await async_api.db_executor.run(
+            extract_chat_context, update
+        )
 
         if extract_context_res.is_err():
             error = extract_context_res.unwrap_err()
@@ -658,7 +682,9 @@ class EditPollTitleContextHandler(BaseContextHandler):
             except ValueError:
                 return await message.reply_text("Invalid poll ID")
 
-            poll_res = Polls.get_as_creator(poll_id, update.user.get_user_id())
+            poll_res = await async_api.db_executor.run(
+                Polls.get_as_creator, poll_id, update.user.get_user_id()
+            )
             if poll_res.is_err():
                 return await message.reply_text(
                     "You're not the creator of this poll"
@@ -666,14 +692,16 @@ class EditPollTitleContextHandler(BaseContextHandler):
 
             current_poll = poll_res.unwrap()
             edit_poll_context.set_poll_id(poll_id)
-            edit_poll_context.save_state()
+            await async_api.db_executor.run(edit_poll_context.save_state)
             coroutines.append(message.reply_text(
                 strings.build_poll_title_edit_prompt(current_poll.desc)
             ))
         else:
             # update the poll title with message text
             poll_id = edit_poll_context.poll_id
-            poll_res = Polls.get_as_creator(poll_id, update.user.get_user_id())
+            poll_res = await async_api.db_executor.run(
+                Polls.get_as_creator, poll_id, update.user.get_user_id()
+            )
             if poll_res.is_err():
                 return await message.reply_text(
                     "You're not the creator of this poll"
@@ -682,9 +710,9 @@ class EditPollTitleContextHandler(BaseContextHandler):
             poll = poll_res.unwrap()
             prev_title = poll.desc
             poll.desc = message_text
-            poll.save()
+            await async_api.db_executor.run(poll.save)
 
-            chat_context.delete_instance()
+            await async_api.db_executor.run(chat_context.delete_instance)
             coroutines.append(message.reply_text(
                 strings.build_poll_title_edit_message(prev_title, poll.desc)
             ))
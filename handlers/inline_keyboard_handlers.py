@@ -8,6 +8,7 @@ import base_api
 
 from abc import ABCMeta, abstractmethod
 from base_api import BaseAPI, UserRegistrationStatus, CallbackCommands
+from async_api import AsyncAPI
 from telegram._utils.types import ReplyMarkup
 from typing import Optional, Type
 from telegram.ext import CallbackContext
@@ -29,6 +30,8 @@ from helpers.message_contexts import (
     VoteMessageContext, extract_message_context, ExtractMessageContextErrors
 )
 
+async_api = AsyncAPI()
+
 
 async def register_for_poll(
     update: ModifiedTeleUpdate, context: CallbackContext,
@@ -41,12 +44,14 @@ async def register_for_poll(
     tele_user = query.from_user
     user = update.user
 
-    if not ChatWhitelist.is_whitelisted(poll_id, chat_id):
+    if not await async_api.db_executor.run(
+        ChatWhitelist.is_whitelisted, poll_id, chat_id
+    ):
         await query.answer("Not allowed to register from this chat")
         return False
 
-    registration_status = _register_voter(
-        poll_id=poll_id, user_id=user.get_user_id(),
+    registration_status = await async_api.db_executor.run(
+        _register_voter, poll_id=poll_id, user_id=user.get_user_id(),
         username=tele_user.username
     )
     reply_text = BaseAPI.reg_status_to_msg(registration_status, poll_id)
@@ -55,7 +60,7 @@ async def register_for_poll(
         return False
 
     assert registration_status == UserRegistrationStatus.REGISTERED
-    poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+    poll_info = await async_api.unverified_read_poll_info(poll_id)
     notification = query.answer(reply_text)
     poll_message_update = TelegramHelpers.update_poll_message(
         poll_info=poll_info, chat_id=chat_id,
@@ -205,12 +210,14 @@ class RegisterPollMessageHandler(BaseMessageHandler):
         tele_user = query.from_user
         user = update.user
 
-        if not ChatWhitelist.is_whitelisted(poll_id, chat_id):
+        if not await async_api.db_executor.run(
+            ChatWhitelist.is_whitelisted, poll_id, chat_id
+        ):
             await query.answer("Not allowed to register from this chat")
             return False
 
-        registration_status = _register_voter(
-            poll_id=poll_id, user_id=user.get_user_id(),
+        registration_status = await async_api.db_executor.run(
+            _register_voter, poll_id=poll_id, user_id=user.get_user_id(),
             username=tele_user.username
         )
 
@@ -220,7 +227,7 @@ class RegisterPollMessageHandler(BaseMessageHandler):
             return False
 
         assert registration_status == UserRegistrationStatus.REGISTERED
-        poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+        poll_info = await async_api.unverified_read_poll_info(poll_id)
         notification = query.answer(reply_text)
         poll_message_update = TelegramHelpers.update_poll_message(
             poll_info=poll_info, chat_id=chat_id,
@@ -250,14 +257,14 @@ class DeletePollMessageHandler(BaseMessageHandler):
 
         poll_query = (Polls.id == poll_id) & (Polls.creator == user_id)
         # TODO: write test to check that only poll creator can delete poll
-        poll = Polls.get_or_none(poll_query)
+        poll = await async_api.db_executor.run(Polls.get_or_none, poll_query)
 
         if poll is None:
             return await query.answer(f"Poll #{poll_id} does not exist")
 
         assert isinstance(poll, Polls)
-        poll_creator = poll.get_creator()
-        is_poll_creator = user_id == poll_creator.get_user_id()
+        # compared by id, so that the creator row isn't loaded
+        is_poll_creator = user_id == poll.creator_id
 
         if not is_poll_creator:
             return await query.answer(f"Not creator of poll #{poll_id}")
@@ -266,7 +273,9 @@ class DeletePollMessageHandler(BaseMessageHandler):
 
         delete_comment = f"Poll #{poll_id} user#{user_id} tele#{user_tele_id}"
         self.logger.warning(f"Deleting {delete_comment}")
-        Polls.delete().where(poll_query).execute()
+        await async_api.db_executor.run(
+            Polls.delete().where(poll_query).execute
+        )
         self.logger.warning(f"Deleted {delete_comment}")
         await query.answer(f"Poll #{poll_id} deleted")
         # remove delete button after deletion is complete
@@ -286,10 +295,14 @@ class AddVoteMessageHandler(BaseMessageHandler):
         message_id = query.message.message_id
         user = update.user
 
-        extracted_message_context_res = extract_message_context(update)
+        extracted_message_context_res = await async_api.db_executor.run(
+            extract_message_context, update
+        )
         poll_id = int(callback_data['poll_id'])
         ranked_option = int(callback_data['option'])
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
 
         if poll_closed_res.is_err():
             return await query.answer(generate_poll_deleted_message(poll_id))
@@ -301,7 +314,7 @@ class AddVoteMessageHandler(BaseMessageHandler):
             if error == ExtractMessageContextErrors.LOAD_FAILED:
                 return await query.answer("Failed to load context")
 
-            poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+            poll_info = await async_api.unverified_read_poll_info(poll_id)
             vote_context = VoteMessageContext(
                 message_id=message_id, poll_id=poll_id,
                 max_options=poll_info.max_options,
@@ -323,7 +336,7 @@ class AddVoteMessageHandler(BaseMessageHandler):
             error = add_ranked_option_res.unwrap_err()
             return await query.answer(str(error))
 
-        vote_context.save_state()
+        await async_api.db_executor.run(vote_context.save_state)
         # print('CURRENT_RANKINGS', vote_context.rankings)
         return await query.answer(
             f'Current vote: {vote_context.rankings_to_str()}'
@@ -336,7 +349,9 @@ class UndoVoteRankingMessageHandler(BaseMessageHandler):
         callback_data: dict[str, any]
     ):
         query = update.callback_query
-        extracted_message_context_res = extract_message_context(update)
+        extracted_message_context_res = await async_api.db_executor.run(
+            extract_message_context, update
+        )
         if extracted_message_context_res.is_err():
             return await query.answer("Vote is empty")
 
@@ -352,7 +367,9 @@ class UndoVoteRankingMessageHandler(BaseMessageHandler):
         assert num_vote_rankings >= 0
 
         poll_id = vote_context.poll_id
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
 
         if poll_closed_res.is_err():
             return await query.answer(generate_poll_deleted_message(poll_id))
@@ -360,10 +377,12 @@ class UndoVoteRankingMessageHandler(BaseMessageHandler):
             return await query.answer(generate_poll_closed_message(poll_id))
 
         if num_vote_rankings == 0:
-            extracted_message_context.message_context.delete_instance()
+            await async_api.db_executor.run(
+                extracted_message_context.message_context.delete_instance
+            )
             return await query.answer("Vote is now empty")
         else:
-            vote_context.save_state()
+            await async_api.db_executor.run(vote_context.save_state)
             return await query.answer(
                 f'Current vote: {vote_context.rankings_to_str()}'
             )
@@ -375,7 +394,9 @@ class ResetVoteMessageHandler(BaseMessageHandler):
         callback_data: dict[str, any]
     ):
         query = update.callback_query
-        extracted_message_context_res = extract_message_context(update)
+        extracted_message_context_res = await async_api.db_executor.run(
+            extract_message_context, update
+        )
         if extracted_message_context_res.is_err():
             return await query.answer("Vote was empty")
 
@@ -385,14 +406,18 @@ class ResetVoteMessageHandler(BaseMessageHandler):
         )
         vote_context = vote_context_res.unwrap()
         poll_id = vote_context.poll_id
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
 
         if poll_closed_res.is_err():
             return await query.answer(generate_poll_deleted_message(poll_id))
         elif poll_closed_res.unwrap():
             return await query.answer(generate_poll_closed_message(poll_id))
         else:
-            extracted_message_context.message_context.delete_instance()
+            await async_api.db_executor.run(
+                extracted_message_context.message_context.delete_instance
+            )
             return await query.answer("Vote is now empty")
 
 
@@ -402,11 +427,13 @@ class ViewVoteMessageHandler(BaseMessageHandler):
         callback_data: dict[str, any]
     ):
         query = update.callback_query
-        extracted_message_context_res = extract_message_context(update)
+        extracted_message_context_res = await async_api.db_executor.run(
+            extract_message_context, update
+        )
         poll_id = int(callback_data['poll_id'])
 
         if extracted_message_context_res.is_err():
-            has_voted = BaseAPI.check_has_voted(
+            has_voted = await async_api.check_has_voted(
                 poll_id=poll_id, user_id=update.user.id
             )
             if has_voted:
@@ -420,7 +447,9 @@ class ViewVoteMessageHandler(BaseMessageHandler):
         )
         vote_context = vote_context_res.unwrap()
         poll_id = vote_context.poll_id
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
 
         if poll_closed_res.is_err():
             return await query.answer(generate_poll_deleted_message(poll_id))
@@ -448,18 +477,22 @@ class SubmitVoteMessageHandler(BaseMessageHandler):
         message_id = query.message.message_id
 
         poll_id = int(callback_data['poll_id'])
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
 
         if poll_closed_res.is_err():
             return await query.answer(generate_poll_deleted_message(poll_id))
         elif poll_closed_res.unwrap():
             return await query.answer(generate_poll_closed_message(poll_id))
 
-        extracted_message_context_res = extract_message_context(update)
+        extracted_message_context_res = await async_api.db_executor.run(
+            extract_message_context, update
+        )
         if extracted_message_context_res.is_err():
             # message chat context is empty
             # (i.e. number buttons weren't pressed)
-            has_voted = BaseAPI.check_has_voted(
+            has_voted = await async_api.check_has_voted(
                 poll_id=poll_id, user_id=update.user.id
             )
             if has_voted:
@@ -476,7 +509,7 @@ class SubmitVoteMessageHandler(BaseMessageHandler):
 
         vote_context = vote_context_res.unwrap()
         # print('TELE_USER_ID:', tele_user.id)
-        register_vote_result = BaseAPI.register_vote(
+        register_vote_result = await async_api.register_vote(
             chat_id=chat_id, rankings=vote_context.rankings,
             poll_id=vote_context.poll_id,
             username=tele_user.username, user_tele_id=tele_user.id
@@ -488,11 +521,13 @@ class SubmitVoteMessageHandler(BaseMessageHandler):
 
         # whether the voter was registered for the poll during the vote itself
         is_first_vote, newly_registered = register_vote_result.unwrap()
-        extracted_message_context.message_context.delete_instance()
+        await async_api.db_executor.run(
+            extracted_message_context.message_context.delete_instance
+        )
         await query.answer("Vote Submitted")
 
         if is_first_vote or newly_registered:
-            poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+            poll_info = await async_api.unverified_read_poll_info(poll_id)
             await TelegramHelpers.update_poll_message(
                 poll_info=poll_info, chat_id=chat_id,
                 message_id=message_id, context=context,
@@ -514,7 +549,9 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
         tele_user: TeleUser = query.from_user
         message_id = query.message.message_id
         poll_id = int(callback_data['poll_id'])
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
         chat_id = message.chat_id
         coroutines = []
 
@@ -523,9 +560,11 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
         elif poll_closed_res.unwrap():
             return await query.answer(generate_poll_closed_message(poll_id))
 
-        extracted_message_context_res = extract_message_context(update)
-        poll_voter_res = PollVoters.get_poll_voter(
-            poll_id=poll_id, user_id=user_id
+        extracted_message_context_res = await async_api.db_executor.run(
+            extract_message_context, update
+        )
+        poll_voter_res = await async_api.db_executor.run(
+            PollVoters.get_poll_voter, poll_id=poll_id, user_id=user_id
         )
         registered = poll_voter_res.is_ok()
         has_message_context = extracted_message_context_res.is_ok()
@@ -542,7 +581,7 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
 
             vote_context = vote_context_res.unwrap()
             # print('TELE_USER_ID:', tele_user.id)
-            register_vote_result = BaseAPI.register_vote(
+            register_vote_result = await async_api.register_vote(
                 chat_id=chat_id, rankings=vote_context.rankings,
                 poll_id=vote_context.poll_id,
                 username=tele_user.username, user_tele_id=tele_user.id
@@ -554,10 +593,12 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
 
             # whether the voter was registered for the poll during the vote itself
             _, newly_registered = register_vote_result.unwrap()
-            extracted_message_context.message_context.delete_instance()
+            await async_api.db_executor.run(
+                extracted_message_context.message_context.delete_instance
+            )
 
             if newly_registered:
-                poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+                poll_info = await async_api.unverified_read_poll_info(poll_id)
                 await TelegramHelpers.update_poll_message(
                     poll_info=poll_info, chat_id=chat_id,
                     message_id=message_id, context=context,
@@ -571,18 +612,20 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
 
         if not registered:
             # not registered, no message context vote found
-            if not ChatWhitelist.is_whitelisted(poll_id, chat_id):
+            if not await async_api.db_executor.run(
+                ChatWhitelist.is_whitelisted, poll_id, chat_id
+            ):
                 return await query.answer(
                     "Not allowed to register from this chat"
                 )
 
-            register_status = _register_voter(
-                poll_id=poll_id, user_id=user_id,
+            register_status = await async_api.db_executor.run(
+                _register_voter, poll_id=poll_id, user_id=user_id,
                 username=tele_user.username
             )
             if register_status == UserRegistrationStatus.REGISTERED:
                 newly_registered = True
-                poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+                poll_info = await async_api.unverified_read_poll_info(poll_id)
                 coroutines.append(TelegramHelpers.update_poll_message(
                     poll_info=poll_info, chat_id=chat_id,
                     message_id=message_id, context=context,
@@ -594,7 +637,7 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
                 ))
 
         # create vote chat DM context and try to send a message to the user
-        poll_info_res = BaseAPI.read_poll_info(
+        poll_info_res = await async_api.read_poll_info(
             poll_id=poll_id, user_id=user_id,
             username=tele_user.username, chat_id=message.chat_id
         )
@@ -607,7 +650,7 @@ class RegisterSubmitMessageHandler(BaseMessageHandler):
             user_id=user_id, chat_id=tele_user.id,
             max_options=poll_info.max_options, poll_id=poll_id
         )
-        vote_context.save_state()
+        await async_api.db_executor.run(vote_context.save_state)
         bot_username = context.bot.username
 
         async def send_dm(text, markup: Optional[ReplyMarkup] = None):
@@ -666,7 +709,9 @@ class VoteDirectChatMessageHandler(BaseMessageHandler):
         tele_user: TeleUser = query.from_user
         message_id = query.message.message_id
         poll_id = int(callback_data['poll_id'])
-        poll_closed_res = Polls.get_is_closed(poll_id)
+        poll_closed_res = await async_api.db_executor.run(
+            Polls.get_is_closed, poll_id
+        )
         chat_id = message.chat_id
         coroutines = []
 
@@ -675,24 +720,28 @@ class VoteDirectChatMessageHandler(BaseMessageHandler):
         elif _poll_closed := poll_closed_res.unwrap():
             return await query.answer(generate_poll_closed_message(poll_id))
 
-        poll_voter_res = PollVoters.get_poll_voter(poll_id, user_id=user_id)
+        poll_voter_res = await async_api.db_executor.run(
+            PollVoters.get_poll_voter, poll_id, user_id=user_id
+        )
         registered = poll_voter_res.is_ok()
         newly_registered = False
 
         if not registered:
             # not registered, no message context vote found
-            if not ChatWhitelist.is_whitelisted(poll_id, chat_id):
+            if not await async_api.db_executor.run(
+                ChatWhitelist.is_whitelisted, poll_id, chat_id
+            ):
                 return await query.answer(
                     "Not allowed to register from this chat"
                 )
 
-            register_status = _register_voter(
-                poll_id=poll_id, user_id=user_id,
+            register_status = await async_api.db_executor.run(
+                _register_voter, poll_id=poll_id, user_id=user_id,
                 username=tele_user.username
             )
             if register_status == UserRegistrationStatus.REGISTERED:
                 newly_registered = True
-                poll_info = BaseAPI.unverified_read_poll_info(poll_id=poll_id)
+                poll_info = await async_api.unverified_read_poll_info(poll_id)
                 coroutines.append(TelegramHelpers.update_poll_message(
                     poll_info=poll_info, chat_id=chat_id,
                     message_id=message_id, context=context,
@@ -705,7 +754,7 @@ class VoteDirectChatMessageHandler(BaseMessageHandler):
                 ))
 
         # create vote chat DM context and try to send a message to the user
-        poll_info_res = BaseAPI.read_poll_info(
+        poll_info_res = await async_api.read_poll_info(
             poll_id=poll_id, user_id=user_id,
             username=tele_user.username, chat_id=message.chat_id
         )
@@ -720,7 +769,7 @@ class VoteDirectChatMessageHandler(BaseMessageHandler):
             max_options=poll_info.max_options, poll_id=poll_id,
             ref_message_id=message_id, ref_chat_id=current_chat_id
         )
-        vote_context.save_state()
+        await async_api.db_executor.run(vote_context.save_state)
         bot_username = context.bot.username
 
         async def send_dm(text, markup: Optional[ReplyMarkup] = None):
@@ -19,12 +19,15 @@ from helpers.start_get_params import StartGetParams
 from helpers import constants, strings
 from helpers.commands import Command
 from helpers.constants import BLANK_ID
+from async_api import AsyncAPI
 from tele_helpers import ModifiedTeleUpdate, TelegramHelpers
 from telegram.ext import ContextTypes
 from database import (
     Polls, Payments, db, SerializableChatContext, ChatContextStateTypes
 )
 
+async_api = AsyncAPI()
+
 
 class InvoiceTypes(StrEnum):
     INCREASE_VOTER_LIMIT = "INCREASE_VOTER_LIMIT"
@@ -150,7 +153,9 @@ class IncreaseVoteLimitHandler(BasePaymentHandler):
 
         invoice = invoice_res.unwrap()
         poll_id = invoice.poll_id
-        poll_res = Polls.build_from_fields(poll_id=poll_id).safe_get()
+        poll_res = await async_api.db_executor.run(
+            Polls.build_from_fields(poll_id=poll_id).safe_get
+        )
         if poll_res.is_err():
             return await fail(f"Failed to get poll #{poll_id}")
 
@@ -181,9 +186,9 @@ class IncreaseVoteLimitHandler(BasePaymentHandler):
 
         invoice = load_invoice_result.unwrap()
         voters_increase = invoice.voters_increase
-        receipt_res = Payments.build_from_fields(
-            payment_id=invoice.payment_id
-        ).safe_get()
+        receipt_res = await async_api.db_executor.run(
+            Payments.build_from_fields(payment_id=invoice.payment_id).safe_get
+        )
 
         if receipt_res.is_err():
             self.logger.error(f"RECEIPT GET ERR: CHR#{payment_charge_id}")
@@ -193,10 +198,10 @@ class IncreaseVoteLimitHandler(BasePaymentHandler):
         receipt: Payments = receipt_res.unwrap()
         receipt.telegram_payment_charge_id = payment_charge_id
         receipt.paid = True
-        receipt.save()
+        await async_api.db_executor.run(receipt.save)
 
-        process_res = self._process_payment(
-            invoice=invoice, receipt=receipt,
+        process_res = await async_api.db_executor.run(
+            self._process_payment, invoice=invoice, receipt=receipt,
             voters_increase=voters_increase
         )
         if process_res.is_err():
@@ -331,9 +336,9 @@ class PaymentHandlers(object):
             return await fail(error_message)
 
         payment_id = base_invoice_params.payment_id
-        receipt_res = Payments.build_from_fields(
-            payment_id=payment_id
-        ).safe_get()
+        receipt_res = await async_api.db_executor.run(
+            Payments.build_from_fields(payment_id=payment_id).safe_get
+        )
 
         if receipt_res.is_err():
             # checks if payment has corresponding receipt
@@ -360,24 +365,26 @@ class PaymentHandlers(object):
         user = update.user
 
         if raw_args == '':
-            IncMaxVotersChatContext(
+            await async_api.db_executor.run(IncMaxVotersChatContext(
                 user_id=user.get_user_id(), chat_id=msg.chat_id
-            ).save_state()
+            ).save_state)
             return await msg.reply_text(
                 strings.ENTER_POLL_ID_PROMPT
             )
         elif constants.ID_PATTERN.match(raw_args) is not None:
             poll_id = int(raw_args)
-            poll_res = Polls.get_as_creator(poll_id, user.get_user_id())
+            poll_res = await async_api.db_executor.run(
+                Polls.get_as_creator, poll_id, user.get_user_id()
+            )
             if poll_res.is_err():
                 return await msg.reply_text(
                     strings.MAX_VOTERS_NOT_EDITABLE
                 )
 
-            IncMaxVotersChatContext(
+            await async_api.db_executor.run(IncMaxVotersChatContext(
                 user_id=user.get_user_id(), chat_id=msg.chat_id,
                 poll_id=poll_id
-            ).save_state()
+            ).save_state)
 
             poll = poll_res.unwrap()
             return await msg.reply_text(strings.generate_max_voters_prompt(
@@ -413,9 +420,9 @@ class PaymentHandlers(object):
         user = update.user
 
         # print(f'{poll_id=}, {new_max_voters=}')
-        poll_res = Polls.build_from_fields(
+        poll_res = await async_api.db_executor.run(Polls.build_from_fields(
             poll_id=poll_id, creator_id=user.get_user_id()
-        ).safe_get()
+        ).safe_get)
 
         if poll_res.is_err():
             await message.reply_text(strings.MAX_VOTERS_NOT_EDITABLE)
@@ -433,17 +440,12 @@ class PaymentHandlers(object):
         invoice = IncreaseVoterLimitParams(
             poll_id=poll_id, voters_increase=voters_increase
         )
-
-        with db.atomic():
-            receipt: Payments = Payments.build_from_fields(
-                user_id=user.get_user_id(), amount=payment_amount
-            ).create()
-
-            receipt_id = receipt.id
-            invoice.payment_id = receipt_id
-            invoice_payload = invoice.dump_to_json_str()
-            receipt.invoice_payload = invoice_payload
-            receipt.save()
+        receipt = await async_api.db_executor.run(
+            cls._create_receipt, user_id=user.get_user_id(),
+            payment_amount=payment_amount, invoice=invoice
+        )
+        receipt_id = receipt.id
+        invoice_payload = receipt.invoice_payload
 
         # INC_MAX_VOTERS_INVOICE = str(StartGetParams.INC_MAX_VOTERS_INVOICE)
         await context.bot.send_invoice(
@@ -462,3 +464,20 @@ class PaymentHandlers(object):
             )],
         )
         return True
+
+    @staticmethod
+    def _create_receipt(
+        user_id: UserID, payment_amount: int,
+        invoice: IncreaseVoterLimitParams
+    ) -> Payments:
+        # the invoice payload refers to the receipt's own id
+        with db.atomic():
+            receipt: Payments = Payments.build_from_fields(
+                user_id=user_id, amount=payment_amount
+            ).create()
+
+            invoice.payment_id = receipt.id
+            receipt.invoice_payload = invoice.dump_to_json_str()
+            receipt.save()
+
+        return receipt
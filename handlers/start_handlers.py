@@ -2,6 +2,7 @@ from abc import ABCMeta, abstractmethod
 from typing import Type
 
 from base_api import BaseAPI
+from async_api import AsyncAPI
 from database import Users, Payments, Polls
 from helpers import strings
 from helpers.chat_contexts import extract_chat_context
@@ -15,6 +16,8 @@ from handlers.payment_handlers import (
     PaymentHandlers
 )
 
+async_api = AsyncAPI()
+
 
 class BaseMessageHandler(object, metaclass=ABCMeta):
     @abstractmethod
@@ -49,7 +52,7 @@ class StartVoteHandler(BaseMessageHandler):
         user: Users = update.user
 
         user_id = user.get_user_id()
-        view_poll_result = BaseAPI.get_poll_message(
+        view_poll_result = await async_api.get_poll_message(
             poll_id=poll_id, user_id=user_id,
             bot_username=context.bot.username,
             username=tele_user.username,
@@ -104,9 +107,9 @@ class StartPaymentsHandler(BaseMessageHandler):
                 f"Invalid payment id: {raw_payload}"
             )
 
-        ref_payment_res = Payments.build_from_fields(
-            payment_id=payment_id
-        ).safe_get()
+        ref_payment_res = await async_api.db_executor.run(
+            Payments.build_from_fields(payment_id=payment_id).safe_get
+        )
 
         if ref_payment_res.is_err():
             return await message.reply_text("Payment form has expired (3)")
@@ -127,9 +130,11 @@ class StartPaymentsHandler(BaseMessageHandler):
 
             invoice: IncreaseVoterLimitParams = load_invoice_res.unwrap()
             poll_id = invoice.poll_id
-            poll_res = Polls.build_from_fields(
-                poll_id=poll_id, creator_id=user.get_user_id()
-            ).safe_get()
+            poll_res = await async_api.db_executor.run(
+                Polls.build_from_fields(
+                    poll_id=poll_id, creator_id=user.get_user_id()
+                ).safe_get
+            )
 
             if poll_res.is_err():
                 await message.reply_text(strings.MAX_VOTERS_NOT_EDITABLE)
@@ -170,7 +175,9 @@ class StartHandlers(object):
         if len(args) == 0:
             await update.message.reply_text(strings.BOT_STARTED)
             # check for existing chat context and process it if it exists
-            chat_context_res = extract_chat_context(update)
+            chat_context_res = await async_api.db_executor.run(
+                extract_chat_context, update
+            )
             if chat_context_res.is_err():
                 return None
 
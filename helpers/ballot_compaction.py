@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import logging
+
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from helpers.ballot_loader import BallotLoader
+from database import (
+    db, Polls, PollVoters, PollWinners, VoteBallots, VoteRankings,
+    CompactedBallots
+)
+
+"""
+collapses the ballots of closed polls (whose winners have already
+been stored) into distinct ballots with counts, and purges the raw
+per-voter ballot rows once they have been kept for long enough
+"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class BallotCompactionConfig(object):
+    # how long raw ballots are kept after a poll is compacted
+    retention: datetime.timedelta = datetime.timedelta(days=30)
+    # raw ballot rows deleted per statement (and per transaction),
+    # kept small so that replicas don't fall behind
+    purge_chunk_size: int = 500
+    # maximum number of polls compacted / purged per run
+    max_polls_per_run: int = 100
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> BallotCompactionConfig:
+        config = config or {}
+        defaults = cls()
+        return cls(
+            retention=datetime.timedelta(days=float(config.get(
+                'ballot_retention_days', defaults.retention.days
+            ))),
+            purge_chunk_size=int(config.get(
+                'purge_chunk_size', defaults.purge_chunk_size
+            )),
+            max_polls_per_run=int(config.get(
+                'compaction_max_polls_per_run', defaults.max_polls_per_run
+            ))
+        )
+
+
+class BallotCompactor(object):
+    def __init__(self, config: Optional[BallotCompactionConfig] = None):
+        if config is None:
+            from load_config import TALLY_CONFIG
+            config = BallotCompactionConfig.from_config(TALLY_CONFIG)
+
+        self.config = config
+
+    def find_compactable_polls(self) -> List[int]:
+        """
+        closed polls that have their winners stored, but whose
+        ballots haven't been compacted yet
+        """
+        polls_with_winners = PollWinners.select(PollWinners.poll)
+        query = Polls.select(Polls.id).where(
+            Polls.closed &
+            Polls.ballots_compacted_at.is_null() &
+            Polls.id.in_(polls_with_winners)
+        ).limit(self.config.max_polls_per_run).tuples()
+        return [poll_id for poll_id, in query]
+
+    def find_purgeable_polls(
+        self, now: Optional[datetime.datetime] = None
+    ) -> List[int]:
+        if now is None:
+            now = datetime.datetime.now()
+
+        query = Polls.select(Polls.id).where(
+            Polls.closed &
+            Polls.ballots_purged_at.is_null() &
+            (Polls.ballots_compacted_at <= now - self.config.retention)
+        ).limit(self.config.max_polls_per_run).tuples()
+        return [poll_id for poll_id, in query]
+
+    @staticmethod
+    def compact_poll(poll_id: int) -> int:
+        """
+        :return: number of distinct ballots written,
+        or 0 if the poll was no longer eligible for compaction
+        """
+        with db.atomic():
+            poll = Polls.get_or_none(Polls.id == poll_id)
+            if (
+                (poll is None) or not poll.closed or
+                (poll.ballots_compacted_at is not None)
+            ):
+                return 0
+
+            ballots = BallotLoader.load_poll_ballots(poll_id)
+            ballot_counts: Counter[Tuple[int, ...]] = Counter()
+            for ballot, count in ballots.iter_ballot_counts():
+                ballot_counts[tuple(ballot)] += count
+
+            CompactedBallots.insert_many([{
+                'poll': poll_id, 'count': count,
+                'rankings': VoteBallots.pack_ballot(ballot)
+            } for ballot, count in ballot_counts.items()]).execute()
+            # polls without any ballots are still marked as compacted
+            # so that they aren't picked up again on the next run
+            Polls.update(
+                ballots_compacted_at=datetime.datetime.now()
+            ).where(Polls.id == poll_id).execute()
+
+        return len(ballot_counts)
+
+    @staticmethod
+    def uncompact_poll(poll_id: int) -> bool:
+        """
+        drops the compacted ballots of a poll that is being reopened
+        :return: False if the poll's raw ballots have been purged,
+        in which case it can't be reopened
+        """
+        with db.atomic():
+            poll = Polls.get_or_none(Polls.id == poll_id)
+            if poll is None:
+                return True
+            elif poll.ballots_purged_at is not None:
+                return False
+
+            CompactedBallots.delete().where(
+                CompactedBallots.poll == poll_id
+            ).execute()
+            Polls.update(ballots_compacted_at=None).where(
+                Polls.id == poll_id
+            ).execute()
+
+        return True
+
+    def purge_poll(self, poll_id: int) -> int:
+        """
+        deletes the raw ballots of a compacted poll in small chunks,
+        each in its own transaction
+        :return: number of rows deleted
+        """
+        # the poll is marked as purged first so that it can't be
+        # reopened once some of its raw ballots are gone
+        num_marked = Polls.update(
+            ballots_purged_at=datetime.datetime.now()
+        ).where(
+            (Polls.id == poll_id) & Polls.closed &
+            Polls.ballots_compacted_at.is_null(False) &
+            Polls.ballots_purged_at.is_null()
+        ).execute()
+        if num_marked == 0:
+            return 0
+
+        legacy_rankings = VoteRankings.select(VoteRankings.id).join(
+            PollVoters, on=(PollVoters.id == VoteRankings.poll_voter)
+        ).where(PollVoters.poll == poll_id)
+        vote_ballots = VoteBallots.select(VoteBallots.id).where(
+            VoteBallots.poll == poll_id
+        )
+        num_deleted = self._delete_in_chunks(VoteBallots, vote_ballots)
+        num_deleted += self._delete_in_chunks(VoteRankings, legacy_rankings)
+        logger.info(f'purged {num_deleted} raw ballot rows of poll {poll_id}')
+        return num_deleted
+
+    def _delete_in_chunks(self, model, id_query) -> int:
+        num_deleted = 0
+        while True:
+            with db.atomic():
+                row_ids = [
+                    row_id for row_id, in
+                    id_query.limit(self.config.purge_chunk_size).tuples()
+                ]
+                if len(row_ids) == 0:
+                    return num_deleted
+
+                num_deleted += model.delete().where(
+                    model.id.in_(row_ids)
+                ).execute()
+
+    def run_once(self) -> Tuple[int, int]:
+        """
+        :return: number of polls compacted, number of polls purged
+        """
+        compacted_poll_ids = [
+            poll_id for poll_id in self.find_compactable_polls()
+            if self.compact_poll(poll_id) > 0
+        ]
+        purgeable_poll_ids = self.find_purgeable_polls()
+        for poll_id in purgeable_poll_ids:
+            self.purge_poll(poll_id)
+
+        return len(compacted_poll_ids), len(purgeable_poll_ids)
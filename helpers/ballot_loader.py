@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import dataclasses
+
+from array import array
+from typing import Iterator, Optional, Protocol, Sequence
+
+from helpers import constants
+from database import (
+    db, VoteBallots, VoteRankings, PollVoters, CompactedBallots
+)
+from database.db_helpers import stream_query_rows
+
+"""
+loads the ranked ballots cast for a poll as flat integer arrays
+so that the tally never has to instantiate a model per vote ranking
+"""
+
+
+class BallotsConsumer(Protocol):
+    def insert_ballot(self, ranking: Sequence[int], count: int) -> None: ...
+    def insert_ballots(self, values: array, offsets: array) -> int: ...
+
+
+@dataclasses.dataclass
+class PackedBallots(object):
+    """
+    Ranked ballots of a poll in compressed sparse row (CSR) form.
+    The rankings of ballot k are values[offsets[k]:offsets[k+1]],
+    ordered from the most favoured to the least favoured choice.
+    Each value is either a poll option id (positive), or a
+    special vote value (negative)
+    Ballots of compacted polls are weighted: each entry stands for
+    counts[k] identical ballots, and voter_ids holds the ids of the
+    CompactedBallots rows instead
+    """
+    voter_ids: array = dataclasses.field(
+        default_factory=lambda: array('q')
+    )
+    values: array = dataclasses.field(
+        default_factory=lambda: array('i')
+    )
+    offsets: array = dataclasses.field(
+        default_factory=lambda: array('q', [0])
+    )
+    # left empty unless the ballots are weighted
+    counts: array = dataclasses.field(
+        default_factory=lambda: array('q')
+    )
+
+    @property
+    def is_weighted(self) -> bool:
+        return len(self.counts) > 0
+
+    @property
+    def num_ballots(self) -> int:
+        if self.is_weighted:
+            return sum(self.counts)
+
+        return len(self.voter_ids)
+
+    def add_ranking(self, voter_id: int, vote_value: int):
+        assert not self.is_weighted
+        if (len(self.voter_ids) == 0) or (self.voter_ids[-1] != voter_id):
+            # start a new ballot for the next voter
+            self.voter_ids.append(voter_id)
+            self.offsets.append(self.offsets[-1])
+
+        self.values.append(vote_value)
+        self.offsets[-1] += 1
+
+    def add_packed_ballot(self, voter_id: int, raw_ballot: bytes):
+        # raw_ballot is a VoteBallots.rankings blob
+        assert not self.is_weighted
+        self.voter_ids.append(voter_id)
+        VoteBallots.unpack_ballot(raw_ballot, into=self.values)
+        self.offsets.append(len(self.values))
+
+    def get_ballot(self, index: int) -> array:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.values[start:end]
+
+    def add_weighted_ballot(
+        self, ballot_id: int, raw_ballot: bytes, count: int
+    ):
+        # raw_ballot is a CompactedBallots.rankings blob
+        assert self.is_weighted or (len(self.voter_ids) == 0)
+        self.voter_ids.append(ballot_id)
+        VoteBallots.unpack_ballot(raw_ballot, into=self.values)
+        self.offsets.append(len(self.values))
+        self.counts.append(count)
+
+    def iter_ballots(self) -> Iterator[tuple[int, array]]:
+        """
+        yields every ballot cast, repeating weighted ballots
+        as many times as they were cast
+        """
+        for index, voter_id in enumerate(self.voter_ids):
+            ballot = self.get_ballot(index)
+            for _ in range(self.get_count(index)):
+                yield voter_id, ballot
+
+    def get_count(self, index: int) -> int:
+        return self.counts[index] if self.is_weighted else 1
+
+    def iter_ballot_counts(self) -> Iterator[tuple[array, int]]:
+        for index in range(len(self.voter_ids)):
+            yield self.get_ballot(index), self.get_count(index)
+
+    def insert_into(self, votes_counter: BallotsConsumer) -> int:
+        if self.is_weighted:
+            # one call per distinct ballot, which is few of them
+            for ballot, count in self.iter_ballot_counts():
+                votes_counter.insert_ballot(ballot, count)
+
+            return self.num_ballots
+
+        # hands both buffers over in a single call, so that no
+        # python int is created per vote ranking during ingestion
+        return votes_counter.insert_ballots(self.values, self.offsets)
+
+
+class BallotLoader(object):
+    @staticmethod
+    def build_ballots_query(poll_id: int):
+        # reads the poll's packed ballots without joining PollVoters
+        return VoteBallots.select(
+            VoteBallots.poll_voter, VoteBallots.rankings
+        ).where(
+            VoteBallots.poll == poll_id
+        ).order_by(VoteBallots.poll_voter)
+
+    @staticmethod
+    def build_legacy_rankings_query(poll_id: int):
+        # selects only the raw foreign key columns so that no
+        # PollVoters / PollOptions rows are fetched per vote ranking
+        return VoteRankings.select(
+            VoteRankings.poll_voter, VoteRankings.option,
+            VoteRankings.special_value, VoteRankings.ranking
+        ).join(
+            PollVoters, on=(PollVoters.id == VoteRankings.poll_voter)
+        ).where(
+            PollVoters.poll == poll_id
+        ).order_by(
+            VoteRankings.poll_voter, VoteRankings.ranking.asc()
+        )
+
+    @classmethod
+    def load_poll_ballots(cls, poll_id: int) -> PackedBallots:
+        """
+        Reads every ballot cast for the poll in a single streamed
+        query of (poll_voter_id, packed rankings) rows, and
+        concatenates them into flat arrays
+        Compacted polls are read from their weighted distinct ballots
+        """
+        compacted_ballots = cls.load_compacted_ballots(poll_id)
+        if compacted_ballots.num_ballots > 0:
+            return compacted_ballots
+
+        ballots = PackedBallots()
+        query = cls.build_ballots_query(poll_id)
+        for poll_voter_id, raw_ballot in stream_query_rows(query, db):
+            ballots.add_packed_ballot(poll_voter_id, bytes(raw_ballot))
+
+        if constants.READ_LEGACY_VOTE_RANKINGS:
+            cls._load_legacy_ballots(poll_id, ballots)
+
+        return ballots
+
+    @staticmethod
+    def load_compacted_ballots(poll_id: int) -> PackedBallots:
+        ballots = PackedBallots()
+        query = CompactedBallots.select(
+            CompactedBallots.id, CompactedBallots.rankings,
+            CompactedBallots.count
+        ).where(
+            CompactedBallots.poll == poll_id
+        ).order_by(CompactedBallots.id).tuples()
+
+        for ballot_id, raw_ballot, count in query:
+            ballots.add_weighted_ballot(ballot_id, bytes(raw_ballot), count)
+
+        return ballots
+
+    @classmethod
+    def _load_legacy_ballots(cls, poll_id: int, ballots: PackedBallots):
+        """
+        adds ballots that are only stored as VoteRankings rows, in a
+        single streamed query of (poll_voter_id, option_id,
+        special_value, ranking) tuples
+        """
+        loaded_voter_ids = set(ballots.voter_ids)
+        query = cls.build_legacy_rankings_query(poll_id)
+
+        for row in stream_query_rows(query, db):
+            poll_voter_id, option_id, special_value, _ = row
+            if poll_voter_id in loaded_voter_ids:
+                continue
+
+            vote_value: Optional[int] = option_id
+            if vote_value is None:
+                vote_value = special_value
+
+            assert isinstance(vote_value, int)
+            ballots.add_ranking(poll_voter_id, vote_value)
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+import dataclasses
+
+from array import array
+from typing import Any, BinaryIO, Dict, List, Optional, TYPE_CHECKING
+
+from helpers.ballot_loader import PackedBallots
+
+if TYPE_CHECKING:
+    from helpers.round_report import RoundReport
+
+"""
+versioned binary snapshots of a poll's ballots, so that old or large
+polls can be recounted offline without touching the production database
+
+file layout (all integers little-endian):
+    magic           8 bytes, SNAPSHOT_MAGIC
+    version         uint16
+    header length   uint32
+    header          UTF-8 JSON SnapshotHeader
+    padding         zero bytes up to the next multiple of 8
+    voter_ids       int64[num_entries]
+    offsets         int64[num_entries + 1]
+    counts          int64[num_entries] (only if the ballots are weighted)
+    values          int32[offsets[-1]]
+
+the arrays are the CSR buffers of PackedBallots, so loading a snapshot
+memory-maps the file and hands out views over it instead of copies
+
+recounts serialize the snapshot's VotesCounter once (in memory), and
+load a fresh counter from it for every vote algorithm
+"""
+
+logger = logging.getLogger(__name__)
+SNAPSHOT_MAGIC = b'RCVSNAP\0'
+SNAPSHOT_VERSION = 1
+_PREFIX_FORMAT = '<8sHI'
+_ALIGNMENT = 8
+
+
+class SnapshotFormatError(ValueError):
+    pass
+
+
+@dataclasses.dataclass
+class SnapshotOption(object):
+    option_id: int
+    option_number: int
+    option_name: str
+
+
+@dataclasses.dataclass
+class SnapshotHeader(object):
+    poll_id: int
+    # Polls.vote_algorithm at the time of export
+    vote_algorithm: int
+    # registered voters, including those that haven't voted
+    num_poll_voters: int
+    options: List[SnapshotOption]
+    num_entries: int
+    num_values: int
+    weighted: bool = False
+    exported_at: float = dataclasses.field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(dataclasses.asdict(self), separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, raw_header: str | bytes) -> SnapshotHeader:
+        data = json.loads(raw_header)
+        data['options'] = [
+            SnapshotOption(**option) for option in data['options']
+        ]
+        return cls(**data)
+
+    @property
+    def option_names(self) -> Dict[int, str]:
+        return {
+            option.option_id: option.option_name for option in self.options
+        }
+
+
+def _padding(position: int) -> int:
+    return -position % _ALIGNMENT
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
+def write_snapshot(
+    file: BinaryIO, header: SnapshotHeader, ballots: PackedBallots
+):
+    assert header.num_entries == len(ballots.voter_ids)
+    assert header.num_values == len(ballots.values)
+    assert header.weighted == ballots.is_weighted
+
+    raw_header = header.to_json().encode('utf-8')
+    prefix = struct.pack(
+        _PREFIX_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(raw_header)
+    )
+    file.write(prefix)
+    file.write(raw_header)
+    file.write(b'\0' * _padding(len(prefix) + len(raw_header)))
+
+    arrays = [ballots.voter_ids, ballots.offsets]
+    if ballots.is_weighted:
+        arrays.append(ballots.counts)
+    # values go last as they are the only 4 byte aligned array
+    arrays.append(ballots.values)
+
+    for values in arrays:
+        file.write(_to_little_endian(array(values.typecode, values)))
+
+
+def save_snapshot(path: str, header: SnapshotHeader, ballots: PackedBallots):
+    # written to a temporary file first, so that readers
+    # never map a partially written snapshot
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as file:
+        write_snapshot(file, header, ballots)
+
+    os.replace(temp_path, path)
+
+
+def export_poll_snapshot(poll_id: int, path: str) -> SnapshotHeader:
+    """
+    writes the poll's ballots (read from the database) to path
+    """
+    from database import Polls, PollOptions
+    from helpers.ballot_loader import BallotLoader
+
+    poll = Polls.get_by_id(poll_id)
+    options = [
+        SnapshotOption(
+            option_id=option.id, option_number=option.option_number,
+            option_name=option.option_name
+        ) for option in PollOptions.select().where(
+            PollOptions.poll == poll_id
+        ).order_by(PollOptions.option_number)
+    ]
+    ballots = BallotLoader.load_poll_ballots(poll_id)
+    header = SnapshotHeader(
+        poll_id=poll_id, vote_algorithm=poll.vote_algorithm,
+        num_poll_voters=poll.num_active_voters, options=options,
+        num_entries=len(ballots.voter_ids), num_values=len(ballots.values),
+        weighted=ballots.is_weighted
+    )
+    save_snapshot(path, header, ballots)
+    return header
+
+
+class BallotSnapshot(object):
+    """
+    read-only memory-mapped snapshot file. ballots are views over the
+    mapped file (on little-endian hosts), and are only valid until
+    the snapshot is closed. Ballots returned by ballots.get_ballot
+    are views as well, and have to be released (or dropped) before
+    the snapshot is closed
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # VotesCounter.to_bytes of the snapshot's ballots
+        self._raw_votes_counter: Optional[bytes] = None
+        # views over the map, released when the snapshot is closed
+        self._views: List[memoryview] = []
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.header, self.ballots = self._parse()
+        except Exception:
+            self._release_views()
+            self._mmap.close()
+            raise
+
+    def _parse(self) -> tuple[SnapshotHeader, PackedBallots]:
+        # the file's layout is validated before any view over the map
+        # is created, as the map can't be closed while views are alive
+        # (views created before the offsets are checked are released
+        # by __init__)
+        raw = self._mmap
+        prefix_size = struct.calcsize(_PREFIX_FORMAT)
+        if len(raw) < prefix_size:
+            raise SnapshotFormatError(f'{self.path} is truncated')
+
+        magic, version, header_size = struct.unpack_from(_PREFIX_FORMAT, raw)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotFormatError(f'{self.path} is not a snapshot')
+        elif version != SNAPSHOT_VERSION:
+            raise SnapshotFormatError(
+                f'unsupported snapshot version {version}'
+            )
+
+        position = prefix_size + header_size
+        header = SnapshotHeader.from_json(raw[prefix_size:position])
+        position += _padding(position)
+
+        num_entries = header.num_entries
+        layout = [
+            ('q', num_entries), ('q', num_entries + 1),
+            ('q', num_entries if header.weighted else 0),
+            ('i', header.num_values)
+        ]
+        end = position + sum(
+            length * array(typecode).itemsize for typecode, length in layout
+        )
+        if end != len(raw):
+            raise SnapshotFormatError(f'{self.path} has the wrong size')
+
+        buffer = memoryview(raw)
+        self._views.append(buffer)
+        arrays = []
+        for typecode, length in layout:
+            end = position + length * array(typecode).itemsize
+            view = buffer[position:end].cast(typecode)
+            position = end
+            if sys.byteorder == 'big':
+                # views can't be byteswapped in place, fall back to a copy
+                values = array(typecode, view)
+                values.byteswap()
+                view.release()
+                view = values
+            else:
+                self._views.append(view)
+
+            arrays.append(view)
+
+        voter_ids, offsets, counts, values = arrays
+        # ballots are sliced out of values by consecutive offsets
+        if (offsets[0] != 0) or (offsets[-1] != header.num_values) or any(
+            offsets[k] > offsets[k + 1] for k in range(num_entries)
+        ):
+            raise SnapshotFormatError(f'{self.path} has invalid offsets')
+
+        return header, PackedBallots(
+            voter_ids=voter_ids, values=values, offsets=offsets,
+            counts=counts
+        )
+
+    def get_raw_votes_counter(self) -> bytes:
+        """
+        serialized VotesCounter of the snapshot's ballots, built on
+        the first recount. It only holds the distinct ballots, so
+        later recounts don't decode every voter's ballot again
+        """
+        if self._raw_votes_counter is None:
+            from helpers.rcv_tally import RCVTally
+            self._raw_votes_counter = RCVTally.build_votes_counter(
+                self.header.vote_algorithm, self.header.num_poll_voters,
+                self.ballots, record_ballots=True
+            ).to_bytes()
+
+        return self._raw_votes_counter
+
+    def count_votes(self, vote_algorithm: Optional[int] = None) -> Optional[int]:
+        """
+        recounts the snapshot's ballots under vote_algorithm
+        (the poll's own strategy by default). Counting consumes the
+        counter's trie, so every recount loads a fresh counter
+        :return: ID of the winning option, or None if there's no winner
+        """
+        from helpers.tally_engine import get_tally_engine
+        if vote_algorithm is None:
+            vote_algorithm = self.header.vote_algorithm
+
+        tally_engine = get_tally_engine()
+        votes_counter = tally_engine.VotesCounter.from_bytes(
+            self.get_raw_votes_counter()
+        )
+        votes_counter.set_elimination_strategy(
+            tally_engine.PyEliminationStrategies.from_int(vote_algorithm)
+        )
+        return votes_counter.determine_winner()
+
+    def tally_strategies(self) -> Dict[int, RoundReport]:
+        from helpers.rcv_tally import RCVTally
+        return RCVTally.tally_strategies(
+            self.header.num_poll_voters, self.ballots
+        )
+
+    def _release_views(self):
+        while self._views:
+            self._views.pop().release()
+
+    def close(self):
+        # views have to be released before the map can be closed
+        self.ballots = None
+        self._raw_votes_counter = None
+        self._release_views()
+        try:
+            self._mmap.close()
+        except BufferError as e:
+            raise BufferError(
+                f'{self.path} is still in use, release ballots read '
+                f'from the snapshot before closing it'
+            ) from e
+
+    def __enter__(self) -> BallotSnapshot:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
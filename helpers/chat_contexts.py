@@ -20,7 +20,8 @@ from database.db_helpers import BoundRowFields, UserID
 from database import db, CallbackContextState
 from database import (
     ChatContextStateTypes, SerializableChatContext, Users, Polls,
-    ChatWhitelist, UsernameWhitelist, PollOptions, PollVoters
+    ChatWhitelist, UsernameWhitelist, PollOptions, PollVoters,
+    PollPairwiseCounts
 )
 from tele_helpers import ModifiedTeleUpdate
 
@@ -211,6 +212,7 @@ class PollCreatorTemplate(object):
             UsernameWhitelist.batch_insert(whitelist_user_rows).execute()
             PollOptions.batch_insert(poll_option_rows).execute()
             ChatWhitelist.batch_insert(chat_whitelist_rows).execute()
+            PollPairwiseCounts.create_poll_rows(new_poll_id)
 
         return Ok(new_poll)
 
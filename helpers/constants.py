@@ -12,6 +12,24 @@ DELETE_USERS_BACKLOG = datetime.timedelta(days=28)
 DELETE_CONTEXTS_BACKLOG = datetime.timedelta(hours=2)
 RECEIPT_VALIDITY_BACKLOG = datetime.timedelta(hours=24)
 POLLING_TASKS_INTERVAL = 600
+# open poll results are recounted at most once every N seconds,
+# unless at least K new votes have been cast since the last count
+PROVISIONAL_RESULTS_MIN_INTERVAL = 60
+PROVISIONAL_RESULTS_VOTE_INTERVAL = 25
+# replaced ballots don't change the vote count, so results are also
+# recounted once they are older than N seconds
+PROVISIONAL_RESULTS_MAX_AGE = 300
+# provisional results are kept in memory for at most N open polls,
+# and dropped K seconds after they were counted
+PROVISIONAL_RESULTS_MAX_POLLS = 1024
+PROVISIONAL_RESULTS_TTL = 3600
+# fall back to the legacy one-row-per-ranking VoteRankings table for
+# ballots that haven't been written to VoteBallots yet. Turn off once
+# every instance writes VoteBallots and migration 006 has been applied
+READ_LEGACY_VOTE_RANKINGS = True
+# polls with at least this many (distinct) ballots have their round
+# reports counted across shards of ballots on the rust thread pool
+SHARDED_ROUND_COUNT_MIN_BALLOTS = 50_000
 
 ID_PATTERN = re.compile(r"^[1-9]\d*$")
 MAX_DISPLAY_VOTE_COUNT = 30
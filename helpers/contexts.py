@@ -8,7 +8,7 @@ from helpers import strings
 from helpers.commands import Command
 from helpers.constants import POLL_MAX_OPTIONS
 from helpers.special_votes import SpecialVotes
-from py_rcv import VotesCounter as PyVotesCounter
+from helpers.tally_engine import VotesCounter as PyVotesCounter
 
 
 class BaseVoteContext(pydantic.BaseModel, metaclass=ABCMeta):
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+
+from typing import Any, Callable, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+
+from database.setup import get_connection_pool
+from database.identity_map import (
+    IdentityMap, borrow_identity_map, get_identity_map
+)
+
+"""
+bounded thread pool that blocking peewee queries made by async
+handlers are run on, so that a slow query holds up only the update
+that made it rather than every update on the event loop
+"""
+
+T = TypeVar('T')
+
+
+class DBExecutor(object):
+    _instance = None
+    """
+    process-wide database worker pool, sized to the connection pool
+    the pool is created lazily on first use and lives until shutdown
+    """
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(DBExecutor, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if hasattr(self, 'max_workers'):
+            return
+
+        if max_workers is None:
+            from load_config import YAML_CONFIG
+            from database.pool import PoolConfig
+            max_workers = PoolConfig.from_config(
+                YAML_CONFIG['database'].get('pool')
+            ).max_connections
+
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='db_worker'
+                )
+
+            return self._executor
+
+    @staticmethod
+    def _call(
+        func: Callable[..., T], scope: Optional[dict],
+        identity_map: Optional[IdentityMap], args, kwargs
+    ) -> T:
+        connection_pool = get_connection_pool()
+        assert connection_pool is not None
+        # calls made concurrently by the same update share its
+        # connection, so they take turns using it. Calls made outside
+        # an update / request (or from tasks spawned by one) borrow a
+        # connection from the pool for just this call instead
+        # the update's identity map is lent along with its connection
+        with connection_pool.borrow_scope(scope), borrow_identity_map(
+            identity_map
+        ):
+            return func(*args, **kwargs)
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        runs func(*args, **kwargs) on a database worker thread
+        the caller's contextvars are copied over, and func uses the
+        connection checked out for the caller's update / request
+        """
+        connection_pool = get_connection_pool()
+        if connection_pool is None:
+            # unpooled databases (e.g. sqlite in tests) keep their
+            # connections in thread locals, so stay on this thread
+            return func(*args, **kwargs)
+
+        # only the task that opened the scope can lend its connection
+        scope = connection_pool.get_owned_scope()
+        identity_map = get_identity_map()
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.get_executor(), functools.partial(
+                context.run, self._call, func, scope, identity_map,
+                args, kwargs
+            )
+        )
+
+    def shutdown(self, wait: bool = True):
+        with self.lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import uuid
+import redis
+import asyncio
+import logging
+import threading
+import redis.asyncio as async_redis
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from redis.exceptions import RedisError
+
+from helpers.ballot_loader import BallotLoader, PackedBallots
+
+"""
+keeps the ballots of recently tallied open polls in memory and
+updates them as votes are cast, so that winners can be computed
+without reloading every vote ranking from the database
+ballot changes are broadcast over redis from a background thread,
+so that other processes (e.g. the webapp, or other bot processes)
+drop their now stale copy without votes waiting on redis
+"""
+
+Ballot = Tuple[int, ...]
+logger = logging.getLogger(__name__)
+# seconds to wait before resubscribing after losing the redis connection
+RESUBSCRIBE_INTERVAL = 5
+
+
+class LivePollTally(object):
+    """
+    in-memory ballots of a single poll, keyed by poll voter id
+    ballots are stored as tuples of option ids (or special vote values)
+    ordered from most favoured to least favoured
+    """
+    def __init__(self, poll_id: int):
+        self.poll_id = poll_id
+        self.voter_ballots: Dict[int, Ballot] = {}
+
+    @classmethod
+    def from_packed_ballots(
+        cls, poll_id: int, ballots: PackedBallots
+    ) -> LivePollTally:
+        live_tally = cls(poll_id)
+        for voter_id, ballot in ballots.iter_ballots():
+            live_tally.set_ballot(voter_id, ballot)
+
+        return live_tally
+
+    @property
+    def num_ballots(self) -> int:
+        return len(self.voter_ballots)
+
+    def set_ballot(
+        self, voter_id: int, ballot: Iterable[int]
+    ) -> Optional[Ballot]:
+        """
+        inserts the voter's ballot, or replaces it if the voter
+        has voted before. Returns the replaced ballot if any
+        """
+        ballot = tuple(ballot)
+        assert len(ballot) > 0
+        prev_ballot = self.voter_ballots.get(voter_id)
+        self.voter_ballots[voter_id] = ballot
+        return prev_ballot
+
+    def remove_ballot(self, voter_id: int) -> Optional[Ballot]:
+        return self.voter_ballots.pop(voter_id, None)
+
+    def count_ballots(self) -> Counter[Ballot]:
+        return Counter(self.voter_ballots.values())
+
+    def to_packed_ballots(self) -> PackedBallots:
+        ballots = PackedBallots()
+        for voter_id in sorted(self.voter_ballots):
+            for vote_value in self.voter_ballots[voter_id]:
+                ballots.add_ranking(voter_id, vote_value)
+
+        return ballots
+
+
+class LiveTallyManager(object):
+    _instance = None
+    # maximum number of polls whose ballots are kept in memory
+    MAX_WARM_POLLS = 256
+    INVALIDATE_CHANNEL = 'LIVE_TALLY_INVALIDATE'
+    FLUSH_ALL = 'ALL'
+    """
+    process-wide registry of warm poll tallies. Polls are warmed from
+    the database the first time their ballots are requested, and are
+    then kept in sync by register_ballot / remove_ballot calls, which
+    callers make once the vote's transaction has committed
+    """
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(LiveTallyManager, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, redis_url: Optional[str] = None):
+        if hasattr(self, 'live_tallies'):
+            return
+
+        if redis_url is None:
+            from load_config import TALLY_CONFIG
+            redis_url = TALLY_CONFIG.get('redis_url') or ''
+
+        self.live_tallies: OrderedDict[int, LivePollTally] = OrderedDict()
+        # ballot changes made while a poll's ballots are being loaded,
+        # one voter_id -> ballot (None if removed) map per load
+        self._pending_changes: Dict[
+            int, List[Dict[int, Optional[Ballot]]]
+        ] = {}
+        # vote registrations run in worker threads as well,
+        # so an async lock isn't sufficient here
+        self.lock = threading.RLock()
+        # leave empty to skip cross-process invalidation
+        self.redis_url = redis_url
+        # tells this process' own broadcasts apart from other processes'
+        self.instance_id = uuid.uuid4().hex
+        self._redis_client: Optional[redis.Redis] = None
+        # payloads waiting to be broadcast (as an ordered set), a
+        # burst of votes for a poll is sent as a single message
+        self._pending_payloads: Dict[str, None] = {}
+        self._publish_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='live-tally-publish'
+        )
+
+    def is_warm(self, poll_id: int) -> bool:
+        with self.lock:
+            return poll_id in self.live_tallies
+
+    def __set_live_tally(self, live_tally: LivePollTally):
+        self.live_tallies[live_tally.poll_id] = live_tally
+        self.live_tallies.move_to_end(live_tally.poll_id)
+
+        while len(self.live_tallies) > self.MAX_WARM_POLLS:
+            # evict the least recently used poll tally
+            self.live_tallies.popitem(last=False)
+
+    def __record_change(
+        self, poll_id: int, voter_id: int, ballot: Optional[Ballot]
+    ):
+        for pending_changes in self._pending_changes.get(poll_id, ()):
+            pending_changes[voter_id] = ballot
+
+    def __load_tally(
+        self, poll_id: int
+    ) -> Tuple[LivePollTally, Dict[int, Optional[Ballot]]]:
+        """
+        loads the poll's ballots from the database without holding
+        the lock, so that votes for other polls aren't held up
+        :return:
+        loaded tally, and the ballot changes registered during the
+        load that still have to be applied on top of it
+        """
+        pending_changes: Dict[int, Optional[Ballot]] = {}
+        with self.lock:
+            self._pending_changes.setdefault(poll_id, []).append(
+                pending_changes
+            )
+
+        try:
+            ballots = BallotLoader.load_poll_ballots(poll_id)
+        finally:
+            with self.lock:
+                poll_changes = self._pending_changes[poll_id]
+                poll_changes.remove(pending_changes)
+                if len(poll_changes) == 0:
+                    del self._pending_changes[poll_id]
+
+        live_tally = LivePollTally.from_packed_ballots(poll_id, ballots)
+        return live_tally, pending_changes
+
+    @staticmethod
+    def __apply_changes(
+        live_tally: LivePollTally, changes: Dict[int, Optional[Ballot]]
+    ):
+        # re-applying changes the load already saw is harmless,
+        # as ballots are keyed by voter
+        for voter_id, ballot in changes.items():
+            if ballot is None:
+                live_tally.remove_ballot(voter_id)
+            else:
+                live_tally.set_ballot(voter_id, ballot)
+
+    def rebuild(self, poll_id: int) -> LivePollTally:
+        """
+        reloads the poll's ballots from the database
+        votes registered while the ballots are loading are recorded
+        and re-applied to the loaded ballots before they are used
+        """
+        live_tally, pending_changes = self.__load_tally(poll_id)
+        with self.lock:
+            # the lock was released while loading, so the changes
+            # recorded up to now are the complete set
+            self.__apply_changes(live_tally, pending_changes)
+            self.__set_live_tally(live_tally)
+            return live_tally
+
+    def get_ballots(
+        self, poll_id: int, keep_warm: bool = True
+    ) -> PackedBallots:
+        """
+        returns the ballots of the poll from memory if the poll is warm,
+        otherwise loads them from the database (and keeps them in memory
+        for subsequent requests if keep_warm is set)
+        """
+        with self.lock:
+            if poll_id in self.live_tallies:
+                self.live_tallies.move_to_end(poll_id)
+                return self.live_tallies[poll_id].to_packed_ballots()
+
+        if keep_warm:
+            live_tally = self.rebuild(poll_id)
+            with self.lock:
+                return live_tally.to_packed_ballots()
+
+        return BallotLoader.load_poll_ballots(poll_id)
+
+    def register_ballot(
+        self, poll_id: int, voter_id: int, ballot: Iterable[int]
+    ) -> bool:
+        """
+        applies a newly cast (or replaced) ballot to the poll's
+        in-memory tally, and tells other processes to drop theirs
+        Polls that aren't warm are left untouched
+        :return: whether the poll was warm
+        """
+        ballot = tuple(ballot)
+        with self.lock:
+            self.__record_change(poll_id, voter_id, ballot)
+            live_tally = self.live_tallies.get(poll_id)
+            if live_tally is not None:
+                live_tally.set_ballot(voter_id, ballot)
+
+        self.publish(str(poll_id))
+        return live_tally is not None
+
+    def remove_ballot(self, poll_id: int, voter_id: int) -> bool:
+        with self.lock:
+            self.__record_change(poll_id, voter_id, None)
+            live_tally = self.live_tallies.get(poll_id)
+            if live_tally is not None:
+                live_tally.remove_ballot(voter_id)
+
+        self.publish(str(poll_id))
+        return live_tally is not None
+
+    def discard(self, poll_id: int, broadcast: bool = False):
+        with self.lock:
+            self.live_tallies.pop(poll_id, None)
+
+        if broadcast:
+            self.publish(str(poll_id))
+
+    def clear(self, broadcast: bool = False):
+        with self.lock:
+            self.live_tallies.clear()
+
+        if broadcast:
+            self.publish(self.FLUSH_ALL)
+
+    def verify_poll(self, poll_id: int) -> bool:
+        """
+        compares the poll's in-memory ballots against a cold recount
+        from the database, and rebuilds the poll's tally on mismatch
+        :return: whether the in-memory ballots were consistent
+        """
+        if not self.is_warm(poll_id):
+            return True
+
+        cold_tally, pending_changes = self.__load_tally(poll_id)
+        with self.lock:
+            live_tally = self.live_tallies.get(poll_id)
+            if live_tally is None:
+                # evicted while loading
+                return True
+
+            # the warm tally has already applied these changes
+            self.__apply_changes(cold_tally, pending_changes)
+            if cold_tally.voter_ballots == live_tally.voter_ballots:
+                return True
+
+            self.__set_live_tally(cold_tally)
+            return False
+
+    def verify_all(self) -> List[int]:
+        """
+        runs the consistency check on every warm poll
+        :return: ids of polls whose in-memory ballots were rebuilt
+        """
+        with self.lock:
+            poll_ids = list(self.live_tallies.keys())
+
+        return [
+            poll_id for poll_id in poll_ids
+            if not self.verify_poll(poll_id)
+        ]
+
+    def get_redis_client(self) -> redis.Redis:
+        # synchronous client, as ballots are registered on DB threads
+        if self._redis_client is None:
+            self._redis_client = redis.Redis.from_url(
+                self.redis_url, socket_connect_timeout=1, socket_timeout=1
+            )
+
+        return self._redis_client
+
+    def publish(self, payload: str):
+        """
+        queues the payload to be broadcast in the background,
+        payloads already waiting to be sent aren't queued again
+        """
+        if not self.redis_url:
+            return
+
+        with self.lock:
+            is_scheduled = len(self._pending_payloads) > 0
+            self._pending_payloads[payload] = None
+
+        if not is_scheduled:
+            self._publish_executor.submit(self.__send_pending_payloads)
+
+    def __send_pending_payloads(self):
+        with self.lock:
+            payloads = list(self._pending_payloads)
+            self._pending_payloads.clear()
+
+        try:
+            pipeline = self.get_redis_client().pipeline(transaction=False)
+            for payload in payloads:
+                pipeline.publish(
+                    self.INVALIDATE_CHANNEL, f'{self.instance_id}:{payload}'
+                )
+            pipeline.execute()
+        except RedisError as e:
+            # other processes' verify_all catches the change eventually
+            logger.warning(f'Failed to broadcast ballot changes: {e}')
+
+    def handle_message(self, message: bytes | str):
+        if isinstance(message, bytes):
+            message = message.decode()
+
+        instance_id, _, payload = message.partition(':')
+        if instance_id == self.instance_id:
+            return
+
+        if payload == self.FLUSH_ALL:
+            self.clear()
+        elif payload.isdigit():
+            # the next request reloads the poll's ballots
+            self.discard(int(payload))
+        else:
+            logger.error(f'Invalid live tally message: {message}')
+
+    async def listen(self):
+        """
+        drops warm polls whose ballots other processes have changed,
+        runs until cancelled and resubscribes whenever the connection
+        is lost
+        """
+        if not self.redis_url:
+            return
+
+        while True:
+            client = async_redis.Redis.from_url(self.redis_url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.subscribe(self.INVALIDATE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.handle_message(message['data'])
+            except (RedisError, OSError) as e:
+                logger.warning(f'Live tally subscription lost: {e}')
+            finally:
+                await client.aclose()
+
+            # changes made while unsubscribed were missed
+            self.clear()
+            await asyncio.sleep(RESUBSCRIBE_INTERVAL)
@@ -0,0 +1,673 @@
+from __future__ import annotations
+
+import math
+import struct
+import dataclasses
+import numpy as np
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from helpers.pairwise_matrix import PairwiseMatrix
+from helpers.special_votes import SpecialVotes
+
+"""
+pure python implementation of py_rcv's vote counting interface
+(VotesCounter, TallyTask, determine_winners), used when the py_rcv
+wheel isn't available and as an independent implementation that
+py_rcv's winners can be checked against.
+Ballots are packed into a voters x ranks int16 matrix of dense
+candidates, and each instant runoff round is counted with whole-matrix
+operations (a masked argmax for every ballot's next choice, then a
+weighted bincount) instead of walking the ballots one by one
+"""
+
+# next choice of a ballot that has run out of rankings, which is
+# also the padding after the last ranking of each matrix row
+EXHAUSTED = 0
+# dense candidates have to fit in the int16 ballot matrix
+MAX_CANDIDATES = np.iinfo(np.int16).max
+# ballots per chunk when building pairwise counts, which
+# needs ballots x candidates x candidates booleans per chunk
+PAIRWISE_CHUNK_SIZE = 4096
+
+# error messages match py_rcv's ValidateVoteResult
+INVALID_CANDIDATE_ERROR = 'Invalid candidate'
+INVALID_SPECIAL_VOTE_ERROR = 'Invalid cast to special vote'
+NON_FINAL_SPECIAL_VOTE_ERROR = (
+    'Special vote value can only be ranked once as the last choice'
+)
+DUPLICATE_VOTES_ERROR = 'Duplicate vote rankings'
+EMPTY_VOTE_ERROR = 'Vote is empty'
+
+# serialized VotesCounter layout (all integers little-endian):
+#   magic           4 bytes, SERIALIZED_MAGIC
+#   format version  u16, SERIALIZED_FORMAT_VERSION
+#   strategy        u8, PyEliminationStrategies value
+#   candidates      u8 flag, then (if set) u32 length + i32 option ids
+#   num ballots     u64 number of distinct ballots
+#   ballots         per ballot: u64 count, u32 length, i32 rankings
+SERIALIZED_MAGIC = b'RCVN'
+SERIALIZED_FORMAT_VERSION = 1
+
+
+class PyEliminationStrategies(IntEnum):
+    """
+    same values and methods as py_rcv.PyEliminationStrategies
+    """
+    DowdallScoring = 0
+    EliminateAll = 1
+    RankedPairs = 2
+    CondorcetRankedPairs = 3
+
+    @classmethod
+    def spawn_default(cls) -> PyEliminationStrategies:
+        return cls.DowdallScoring
+
+    @classmethod
+    def from_int(cls, value: int) -> PyEliminationStrategies:
+        try:
+            return cls(value)
+        except ValueError:
+            raise ValueError(f'Invalid elimination strategy value: {value}')
+
+    def to_int(self) -> int:
+        return int(self)
+
+    @classmethod
+    def get_all_strategies(cls) -> List[PyEliminationStrategies]:
+        return list(cls)
+
+    def to_one_liner(self) -> str:
+        return {
+            PyEliminationStrategies.DowdallScoring: 'IRV with Dowdall Scoring',
+            PyEliminationStrategies.EliminateAll:
+                'IRV with multi-candidate elimination',
+            PyEliminationStrategies.RankedPairs: 'Ranked Pairs',
+            PyEliminationStrategies.CondorcetRankedPairs:
+                'Condorcet Ranked Pairs'
+        }[self]
+
+    def to_stub_string(self) -> str:
+        return self.name
+
+    @classmethod
+    def convert_from_stub_string(
+        cls, strategy_str: str
+    ) -> PyEliminationStrategies:
+        for strategy in cls:
+            if strategy.to_stub_string() == strategy_str:
+                return strategy
+
+        raise ValueError(
+            f'Invalid elimination strategy string: {strategy_str}'
+        )
+
+
+def to_strategy(elimination_strategy: Any) -> PyEliminationStrategies:
+    # also accepts py_rcv's PyEliminationStrategies and plain ints
+    if isinstance(elimination_strategy, int):
+        return PyEliminationStrategies.from_int(elimination_strategy)
+
+    return PyEliminationStrategies.from_int(elimination_strategy.to_int())
+
+
+@dataclasses.dataclass(frozen=True)
+class ValidateVoteResult(object):
+    valid: bool
+    error_message: str
+
+    def to_tuple(self) -> tuple:
+        return self.valid, self.error_message
+
+
+def validate_offsets(offsets: np.ndarray, num_values: int):
+    if (len(offsets) == 0) or (offsets[0] != 0):
+        raise ValueError('offsets must start at 0')
+    if (np.diff(offsets) < 0).any():
+        raise ValueError('offsets must be non-decreasing')
+    if offsets[-1] != num_values:
+        raise ValueError('last offset must equal the number of values')
+
+
+def find_ballot_error(
+    values: np.ndarray, offsets: np.ndarray,
+    candidates: Optional[np.ndarray] = None
+) -> Optional[str]:
+    """
+    error message of the first kind of invalid ballot found among
+    the CSR ballots (ballot k is values[offsets[k]:offsets[k+1]]),
+    or None if every ballot is valid. If candidates is set then
+    rankings of any other (non-special) value are invalid too
+    """
+    lengths = np.diff(offsets)
+    if (lengths == 0).any():
+        return EMPTY_VOTE_ERROR
+    if (values < SpecialVotes.ABSTAIN_VOTE).any():
+        return INVALID_SPECIAL_VOTE_ERROR
+
+    is_final = np.zeros(len(values), dtype=bool)
+    is_final[offsets[1:] - 1] = True
+    if ((values < 0) & ~is_final).any():
+        return NON_FINAL_SPECIAL_VOTE_ERROR
+
+    # duplicates are adjacent once rankings are sorted within ballots
+    ballot_indexes = np.repeat(np.arange(len(lengths)), lengths)
+    order = np.lexsort((values, ballot_indexes))
+    sorted_values = values[order]
+    sorted_indexes = ballot_indexes[order]
+    if (
+        (sorted_values[1:] == sorted_values[:-1]) &
+        (sorted_indexes[1:] == sorted_indexes[:-1])
+    ).any():
+        return DUPLICATE_VOTES_ERROR
+
+    if candidates is not None:
+        ranked = values[values >= 0]
+        if not np.isin(ranked, candidates).all():
+            return INVALID_CANDIDATE_ERROR
+
+    return None
+
+
+def pack_ballots(ballots: Sequence[Sequence[int]]) -> Tuple[
+    np.ndarray, np.ndarray
+]:
+    # CSR values and offsets of a list of ballots
+    lengths = np.fromiter(
+        (len(ballot) for ballot in ballots), dtype=np.int64,
+        count=len(ballots)
+    )
+    offsets = np.zeros(len(ballots) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    values = np.fromiter(
+        (value for ballot in ballots for value in ballot),
+        dtype=np.int64, count=int(offsets[-1])
+    )
+    return values, offsets
+
+
+@dataclasses.dataclass
+class BallotBlock(object):
+    # ballot k is values[offsets[k]:offsets[k+1]], cast counts[k] times
+    values: np.ndarray
+    offsets: np.ndarray
+    counts: np.ndarray
+
+    def iter_ballot_counts(self):
+        for index, count in enumerate(self.counts):
+            ballot = self.values[self.offsets[index]:self.offsets[index + 1]]
+            yield tuple(ballot.tolist()), int(count)
+
+
+@dataclasses.dataclass
+class RoundCounts(object):
+    # indexed by dense candidate, index EXHAUSTED is unused
+    first_preferences: np.ndarray
+    withheld: int
+    abstained: int
+    exhausted: int
+
+
+class BallotMatrix(object):
+    def __init__(
+        self, matrix: np.ndarray, weights: np.ndarray,
+        candidates: np.ndarray
+    ):
+        # matrix[k] is the k-th distinct ballot, with candidates mapped
+        # to dense candidates 1..M, special votes kept as is and every
+        # rank after the last ranking padded with EXHAUSTED
+        self.matrix = matrix
+        # number of times each distinct ballot was cast
+        self.weights = weights
+        # candidates[k - 1] is the option id of dense candidate k,
+        # dense candidates are assigned in ascending option id order
+        # so ties broken by candidate order are broken the same way
+        self.candidates = candidates
+        self._dowdall_scores: Optional[np.ndarray] = None
+        self._pairwise_matrix: Optional[PairwiseMatrix] = None
+
+    @property
+    def num_candidates(self) -> int:
+        return len(self.candidates)
+
+    @classmethod
+    def from_blocks(cls, blocks: Sequence[BallotBlock]) -> BallotMatrix:
+        values_list, offsets_list, counts_list = [], [], []
+        base = 0
+        for block in blocks:
+            values_list.append(block.values)
+            offsets_list.append(block.offsets[:-1] + base)
+            counts_list.append(block.counts)
+            base += len(block.values)
+
+        values = np.concatenate(values_list or [np.zeros(0, np.int64)])
+        offsets = np.append(
+            np.concatenate(offsets_list or [np.zeros(0, np.int64)]), base
+        ).astype(np.int64)
+        counts = np.concatenate(counts_list or [np.zeros(0, np.int64)])
+
+        candidates = np.unique(values[values >= 0])
+        if len(candidates) > MAX_CANDIDATES:
+            raise ValueError(
+                f'too many candidates: {len(candidates)} > {MAX_CANDIDATES}'
+            )
+
+        lengths = np.diff(offsets)
+        num_ranks = int(lengths.max()) if len(lengths) > 0 else 0
+        dense_values = np.where(
+            values >= 0, np.searchsorted(candidates, values) + 1, values
+        )
+        ballot_indexes = np.repeat(np.arange(len(lengths)), lengths)
+        ranks = np.arange(len(values)) - np.repeat(offsets[:-1], lengths)
+        matrix = np.full(
+            (len(lengths), num_ranks), EXHAUSTED, dtype=np.int16
+        )
+        matrix[ballot_indexes, ranks] = dense_values
+
+        # identical ballots are counted once with their combined weight
+        has_votes = counts > 0
+        matrix, inverse = np.unique(
+            matrix[has_votes], axis=0, return_inverse=True
+        )
+        weights = np.zeros(len(matrix), dtype=np.int64)
+        np.add.at(weights, inverse.reshape(-1), counts[has_votes])
+        return cls(matrix, weights, candidates)
+
+    def count_round(self, remaining: np.ndarray) -> RoundCounts:
+        """
+        next choices of every ballot given the remaining candidates
+        (a mask over dense candidates), where a ballot's next choice is
+        its first ranking that is a special vote or a remaining candidate
+        """
+        matrix = self.matrix
+        num_candidates = self.num_candidates
+        if matrix.shape[1] == 0:
+            choices = np.full(len(matrix), EXHAUSTED, dtype=np.int16)
+        else:
+            # padding is EXHAUSTED, which is never a remaining candidate
+            choosable = (matrix < 0) | remaining[np.maximum(matrix, 0)]
+            choices = matrix[
+                np.arange(len(matrix)), choosable.argmax(axis=1)
+            ]
+            choices = np.where(choosable.any(axis=1), choices, EXHAUSTED)
+
+        # special votes are shifted up to non-negative bins
+        shift = -int(SpecialVotes.ABSTAIN_VOTE)
+        tallies = np.bincount(
+            choices.astype(np.int64) + shift, weights=self.weights,
+            minlength=num_candidates + shift + 1
+        )
+        tallies = np.rint(tallies).astype(np.int64)
+        first_preferences = tallies[shift:]
+        return RoundCounts(
+            first_preferences=first_preferences,
+            withheld=int(tallies[SpecialVotes.WITHHOLD_VOTE + shift]),
+            abstained=int(tallies[SpecialVotes.ABSTAIN_VOTE + shift]),
+            exhausted=int(first_preferences[EXHAUSTED])
+        )
+
+    @property
+    def dowdall_scores(self) -> np.ndarray:
+        """
+        sum of count / (rank + 1) over every ranking of each candidate,
+        scaled up by lcm(1, ..., num_ranks) so that scores are exact
+        integers (and tied scores compare equal)
+        """
+        if self._dowdall_scores is None:
+            num_ranks = self.matrix.shape[1]
+            scale = math.lcm(*range(1, num_ranks + 1))
+            rank_weights = scale // np.arange(1, num_ranks + 1)
+            ranking_weights = self.weights[:, None] * rank_weights[None, :]
+            is_candidate = self.matrix > 0
+
+            scores = np.zeros(self.num_candidates + 1, dtype=np.int64)
+            np.add.at(
+                scores, self.matrix[is_candidate],
+                ranking_weights[is_candidate]
+            )
+            self._dowdall_scores = scores
+
+        return self._dowdall_scores
+
+    @property
+    def pairwise_matrix(self) -> PairwiseMatrix:
+        """
+        pairwise preference counts between dense candidates, with
+        ranked candidates preferred over every unranked candidate
+        (see pairwise_matrix.iter_ballot_pairs)
+        """
+        if self._pairwise_matrix is not None:
+            return self._pairwise_matrix
+
+        num_ballots, num_ranks = self.matrix.shape
+        num_candidates = self.num_candidates
+        # rank of each candidate on each ballot, with unranked
+        # candidates ranked after every ranked candidate
+        candidate_ranks = np.full(
+            (num_ballots, num_candidates + 1), num_ranks, dtype=np.int16
+        )
+        ballot_indexes, ranks = np.nonzero(self.matrix > 0)
+        candidate_ranks[
+            ballot_indexes, self.matrix[ballot_indexes, ranks]
+        ] = ranks
+
+        counts = np.zeros(
+            (num_candidates + 1, num_candidates + 1), dtype=np.int64
+        )
+        for start in range(0, num_ballots, PAIRWISE_CHUNK_SIZE):
+            chunk = candidate_ranks[start:start + PAIRWISE_CHUNK_SIZE]
+            prefers = chunk[:, :, None] < chunk[:, None, :]
+            counts += np.einsum(
+                'k,kab->ab',
+                self.weights[start:start + PAIRWISE_CHUNK_SIZE],
+                prefers.astype(np.int64)
+            )
+
+        preferred, less_preferred = np.nonzero(counts)
+        self._pairwise_matrix = PairwiseMatrix(
+            range(1, num_candidates + 1), {
+                (int(winner), int(loser)): int(counts[winner, loser])
+                for winner, loser in zip(preferred, less_preferred)
+            }
+        )
+        return self._pairwise_matrix
+
+    def pick_eliminated(
+        self, first_preferences: np.ndarray, remaining: np.ndarray,
+        elimination_strategy: PyEliminationStrategies
+    ) -> np.ndarray:
+        """
+        mask of the remaining candidates eliminated this round:
+        the ones with the fewest first preferences, with ties
+        broken according to the elimination strategy
+        """
+        lowest_votes = np.ma.masked_array(
+            first_preferences, mask=~remaining
+        ).min()
+        eliminated = remaining & (first_preferences == lowest_votes)
+        if (
+            (np.count_nonzero(eliminated) == 1) or
+            (elimination_strategy == PyEliminationStrategies.EliminateAll)
+        ):
+            return eliminated
+
+        if elimination_strategy == PyEliminationStrategies.DowdallScoring:
+            scores = self.dowdall_scores
+            return eliminated & (scores == scores[eliminated].min())
+
+        # eliminate the weakest of the tied candidates in the ranked
+        # pairs order, which for the Condorcet variant also accounts
+        # for head-to-heads with every other remaining candidate
+        ranked_candidates = (
+            remaining if elimination_strategy ==
+            PyEliminationStrategies.CondorcetRankedPairs else eliminated
+        )
+        order = self.pairwise_matrix.ranked_pairs_order(
+            np.flatnonzero(ranked_candidates).tolist()
+        )
+        weakest = [
+            candidate for candidate in order if eliminated[candidate]
+        ][-1]
+        eliminated = np.zeros_like(remaining)
+        eliminated[weakest] = True
+        return eliminated
+
+    def determine_winner(
+        self, elimination_strategy: PyEliminationStrategies
+    ) -> Optional[int]:
+        """
+        eliminates the weakest candidate(s) round by round until one
+        has a majority of the ballots that weren't abstained, which
+        (as in py_rcv) includes withheld and exhausted ballots
+        :return: option id of the winner, or None if there isn't one
+        """
+        remaining = np.ones(self.num_candidates + 1, dtype=bool)
+        remaining[EXHAUSTED] = False
+        num_ballots = int(self.weights.sum())
+
+        while remaining.any():
+            round_counts = self.count_round(remaining)
+            first_preferences = round_counts.first_preferences
+            top_candidate = int(np.ma.masked_array(
+                first_preferences, mask=~remaining
+            ).argmax())
+            num_counted = num_ballots - round_counts.abstained
+            if 2 * first_preferences[top_candidate] > num_counted:
+                return int(self.candidates[top_candidate - 1])
+
+            remaining &= ~self.pick_eliminated(
+                first_preferences, remaining, elimination_strategy
+            )
+
+        return None
+
+
+class VotesCounter(object):
+    def __init__(
+        self, elimination_strategy: Any = (
+            PyEliminationStrategies.DowdallScoring
+        ), candidates: Optional[Sequence[int]] = None,
+        record_ballots: bool = False
+    ):
+        # if candidates (the poll's option ids) are given,
+        # ballots that rank any other option are rejected
+        # to_bytes requires record_ballots, as with py_rcv
+        # (ballots are kept in blocks here either way)
+        self.elimination_strategy = to_strategy(elimination_strategy)
+        self.record_ballots = record_ballots
+        self.candidates: Optional[np.ndarray] = None
+        if candidates is not None:
+            if any(candidate <= 0 for candidate in candidates):
+                raise ValueError(INVALID_CANDIDATE_ERROR)
+            self.candidates = np.unique(np.array(candidates, dtype=np.int64))
+
+        self._raw_votes_cache: Dict[int, List[int]] = {}
+        self._blocks: List[BallotBlock] = []
+        self._num_votes = 0
+
+    def set_elimination_strategy(self, elimination_strategy: Any):
+        self.elimination_strategy = to_strategy(elimination_strategy)
+
+    def _insert_block(
+        self, values: np.ndarray, offsets: np.ndarray, counts: np.ndarray
+    ):
+        error_message = find_ballot_error(values, offsets, self.candidates)
+        if error_message is not None:
+            raise ValueError(error_message)
+
+        self._blocks.append(BallotBlock(values, offsets, counts))
+        self._num_votes += int(counts.sum())
+
+    def flush_votes(self) -> bool:
+        if len(self._raw_votes_cache) == 0:
+            return False
+
+        values, offsets = pack_ballots(list(self._raw_votes_cache.values()))
+        self._insert_block(
+            values, offsets, np.ones(len(offsets) - 1, dtype=np.int64)
+        )
+        self._raw_votes_cache.clear()
+        return True
+
+    def get_num_votes(self) -> int:
+        # total number of votes cast
+        return self._num_votes + len(self._raw_votes_cache)
+
+    @staticmethod
+    def validate_raw_vote(rankings: Sequence[int]) -> ValidateVoteResult:
+        values, offsets = pack_ballots([rankings])
+        error_message = find_ballot_error(values, offsets)
+        return ValidateVoteResult(
+            valid=error_message is None, error_message=error_message or ''
+        )
+
+    def insert_vote_ranking(self, vote_id: int, vote_ranking: int):
+        self._raw_votes_cache.setdefault(vote_id, []).append(vote_ranking)
+
+    def insert_ballot(self, ranking: Sequence[int], count: int):
+        # insert count copies of a ballot in a single call
+        if count < 0:
+            raise ValueError('count must be non-negative')
+
+        values, offsets = pack_ballots([ranking])
+        self._insert_block(values, offsets, np.array([count], np.int64))
+
+    def insert_ballots(self, values: Any, offsets: Any) -> int:
+        # insert every ballot from CSR-style buffers, where ballot k
+        # is values[offsets[k]:offsets[k+1]]
+        values = np.array(values, dtype=np.int64)
+        offsets = np.array(offsets, dtype=np.int64)
+        validate_offsets(offsets, len(values))
+        num_ballots = len(offsets) - 1
+        self._insert_block(
+            values, offsets, np.ones(num_ballots, dtype=np.int64)
+        )
+        return num_ballots
+
+    def insert_empty_votes(self, num_votes: int) -> bool:
+        # insert withhold votes to represent registered voters
+        # who did not vote in the poll
+        self.insert_ballot([SpecialVotes.WITHHOLD_VOTE], num_votes)
+        return True
+
+    def determine_winner(self) -> Optional[int]:
+        self.flush_votes()
+        ballot_matrix = BallotMatrix.from_blocks(self._blocks)
+        return ballot_matrix.determine_winner(self.elimination_strategy)
+
+    def to_bytes(self) -> bytes:
+        # serializes the counter's strategy and every ballot
+        # inserted so far (pending raw votes are flushed first)
+        if not self.record_ballots:
+            raise ValueError(
+                'VotesCounter was created without record_ballots'
+            )
+
+        self.flush_votes()
+        ballot_counts: Counter[Tuple[int, ...]] = Counter()
+        for block in self._blocks:
+            for ballot, count in block.iter_ballot_counts():
+                if count > 0:
+                    ballot_counts[ballot] += count
+
+        chunks = [struct.pack(
+            '<4sHB', SERIALIZED_MAGIC, SERIALIZED_FORMAT_VERSION,
+            self.elimination_strategy.to_int()
+        )]
+        if self.candidates is None:
+            chunks.append(struct.pack('<B', 0))
+        else:
+            candidates = self.candidates.tolist()
+            chunks.append(struct.pack(
+                f'<BI{len(candidates)}i', 1, len(candidates), *candidates
+            ))
+
+        # sorted so that equal counters serialize to equal bytes
+        chunks.append(struct.pack('<Q', len(ballot_counts)))
+        for ballot, count in sorted(ballot_counts.items()):
+            chunks.append(struct.pack(
+                f'<QI{len(ballot)}i', count, len(ballot), *ballot
+            ))
+
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, raw_counter: bytes) -> VotesCounter:
+        # rebuilds a counter from the output of to_bytes
+        position = 0
+
+        def read(fmt: str) -> tuple:
+            nonlocal position
+            size = struct.calcsize(fmt)
+            if position + size > len(raw_counter):
+                raise ValueError('serialized VotesCounter is truncated')
+
+            values = struct.unpack_from(fmt, raw_counter, position)
+            position += size
+            return values
+
+        magic, format_version, strategy = read('<4sHB')
+        if magic != SERIALIZED_MAGIC:
+            raise ValueError('not a serialized VotesCounter')
+        if format_version != SERIALIZED_FORMAT_VERSION:
+            raise ValueError(
+                f'unsupported VotesCounter format version {format_version}'
+            )
+
+        candidates = None
+        (has_candidates,) = read('<B')
+        if has_candidates:
+            (num_candidates,) = read('<I')
+            candidates = read(f'<{num_candidates}i')
+
+        votes_counter = cls(
+            strategy, candidates=candidates, record_ballots=True
+        )
+        (num_ballots,) = read('<Q')
+        for _ in range(num_ballots):
+            count, length = read('<QI')
+            votes_counter.insert_ballot(read(f'<{length}i'), count)
+
+        if position != len(raw_counter):
+            raise ValueError('serialized VotesCounter has trailing bytes')
+
+        return votes_counter
+
+    def __reduce__(self) -> Tuple[Any, Tuple[bytes]]:
+        # pickles as VotesCounter.from_bytes(counter.to_bytes())
+        return VotesCounter.from_bytes, (self.to_bytes(),)
+
+
+class TallyTask(object):
+    def __init__(
+        self, values: Any, offsets: Any, num_empty_votes: int,
+        elimination_strategy: Any, counts: Optional[Any] = None
+    ):
+        # buffers are copied so that later changes to them
+        # don't affect the task
+        self.values = np.array(values, dtype=np.int64)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        validate_offsets(self.offsets, len(self.values))
+
+        num_ballots = len(self.offsets) - 1
+        if counts is None:
+            self.counts = np.ones(num_ballots, dtype=np.int64)
+        else:
+            self.counts = np.array(counts, dtype=np.int64)
+            if len(self.counts) != num_ballots:
+                raise ValueError('counts must have one entry per ballot')
+            if (self.counts < 0).any():
+                raise ValueError('counts must be non-negative')
+
+        self.num_empty_votes = num_empty_votes
+        self.elimination_strategy = to_strategy(elimination_strategy)
+
+    def tally(self) -> TallyResult:
+        votes_counter = VotesCounter(self.elimination_strategy)
+        try:
+            votes_counter._insert_block(self.values, self.offsets, self.counts)
+            votes_counter.insert_empty_votes(self.num_empty_votes)
+            winner = votes_counter.determine_winner()
+        except ValueError as error:
+            return TallyResult(winner=None, valid=False, error_message=str(error))
+
+        return TallyResult(winner=winner, valid=True, error_message='')
+
+
+@dataclasses.dataclass(frozen=True)
+class TallyResult(object):
+    winner: Optional[int]
+    valid: bool
+    error_message: str
+
+
+def determine_winners(
+    tasks: Sequence[TallyTask], num_threads: Optional[int] = None
+) -> List[TallyResult]:
+    # tallies every task on a thread pool (numpy releases the GIL
+    # in most of the counting), and returns the results in order
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        return list(executor.map(TallyTask.tally, tasks))
@@ -0,0 +1,168 @@
+"""
+candidate-by-candidate pairwise preference counts of a poll, which is
+all that Condorcet methods (such as ranked pairs) need to rank the
+candidates. The matrix has at most POLL_MAX_OPTIONS ** 2 entries no
+matter how many ballots have been cast
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Pair = Tuple[int, int]
+# vote_algorithm values of the ranked pairs PyEliminationStrategies
+RANKED_PAIRS = 2
+CONDORCET_RANKED_PAIRS = 3
+
+
+def iter_ballot_pairs(
+    ballot: Sequence[int], candidates: Iterable[int]
+) -> Iterator[Pair]:
+    """
+    yields every (preferred, less preferred) candidate pair expressed
+    by the ballot. Ranked candidates are preferred over every candidate
+    ranked after them, and over every candidate left unranked.
+    Rankings stop at the first special vote (negative value)
+    """
+    ranked: List[int] = []
+    for value in ballot:
+        if value < 0:
+            break
+        ranked.append(value)
+
+    unranked = [
+        candidate for candidate in candidates if candidate not in ranked
+    ]
+    for index, preferred in enumerate(ranked):
+        for less_preferred in ranked[index + 1:]:
+            yield preferred, less_preferred
+        for less_preferred in unranked:
+            yield preferred, less_preferred
+
+
+def ballot_pair_deltas(
+    candidates: Iterable[int], old_ballot: Optional[Sequence[int]],
+    new_ballot: Optional[Sequence[int]]
+) -> Dict[Pair, int]:
+    """
+    change in pairwise counts from replacing old_ballot with new_ballot
+    (either of which may be None), with unchanged pairs left out
+    """
+    candidates = list(candidates)
+    deltas: Counter[Pair] = Counter()
+    if old_ballot is not None:
+        deltas.subtract(iter_ballot_pairs(old_ballot, candidates))
+    if new_ballot is not None:
+        deltas.update(iter_ballot_pairs(new_ballot, candidates))
+
+    return {pair: delta for pair, delta in deltas.items() if delta != 0}
+
+
+class PairwiseMatrix(object):
+    def __init__(
+        self, candidates: Iterable[int],
+        counts: Optional[Dict[Pair, int]] = None
+    ):
+        self.candidates = sorted(set(candidates))
+        # (preferred, less preferred) -> number of ballots
+        self.counts: Dict[Pair, int] = dict(counts or {})
+
+    @classmethod
+    def from_ballots(
+        cls, ballot_counts: Counter[Tuple[int, ...]],
+        candidates: Iterable[int]
+    ) -> PairwiseMatrix:
+        matrix = cls(candidates)
+        for ballot, count in ballot_counts.items():
+            matrix.add_ballot(ballot, count)
+
+        return matrix
+
+    def add_ballot(self, ballot: Sequence[int], weight: int = 1):
+        # a negative weight removes the ballot
+        for pair in iter_ballot_pairs(ballot, self.candidates):
+            self.counts[pair] = self.counts.get(pair, 0) + weight
+
+    def get(self, preferred: int, less_preferred: int) -> int:
+        return self.counts.get((preferred, less_preferred), 0)
+
+    def margin(self, candidate: int, opponent: int) -> int:
+        return self.get(candidate, opponent) - self.get(opponent, candidate)
+
+    def condorcet_winner(
+        self, candidates: Optional[Iterable[int]] = None
+    ) -> Optional[int]:
+        """
+        candidate that beats every other candidate head-to-head, if any
+        """
+        candidates = (
+            self.candidates if candidates is None else sorted(candidates)
+        )
+        for candidate in candidates:
+            if all(
+                self.margin(candidate, opponent) > 0
+                for opponent in candidates if opponent != candidate
+            ):
+                return candidate
+
+        return None
+
+    def ranked_pairs_order(
+        self, candidates: Optional[Iterable[int]] = None
+    ) -> List[int]:
+        """
+        ranks candidates from strongest to weakest using ranked pairs:
+        head-to-head wins are locked in from the largest margin down,
+        skipping any that would create a cycle with those already locked
+        ties are broken by candidate id to keep the order deterministic
+        """
+        candidates = (
+            self.candidates if candidates is None else sorted(candidates)
+        )
+        majorities = [
+            (winner, loser) for winner in candidates for loser in candidates
+            if self.margin(winner, loser) > 0
+        ]
+        majorities.sort(key=lambda pair: (
+            -self.get(*pair), self.get(pair[1], pair[0]), pair
+        ))
+
+        locked: Dict[int, set[int]] = defaultdict(set)
+        for winner, loser in majorities:
+            if not self.__reaches(locked, loser, winner):
+                locked[winner].add(loser)
+
+        # repeatedly take the candidate that no remaining candidate
+        # has been locked in to beat
+        order: List[int] = []
+        remaining = list(candidates)
+        while len(remaining) > 0:
+            for candidate in remaining:
+                if not any(
+                    candidate in locked[other]
+                    for other in remaining if other != candidate
+                ):
+                    break
+
+            order.append(candidate)
+            remaining.remove(candidate)
+
+        return order
+
+    @staticmethod
+    def __reaches(
+        locked: Dict[int, set[int]], start: int, target: int
+    ) -> bool:
+        stack, seen = [start], {start}
+        while len(stack) > 0:
+            node = stack.pop()
+            if node == target:
+                return True
+
+            for next_node in locked[node]:
+                if next_node not in seen:
+                    seen.add(next_node)
+                    stack.append(next_node)
+
+        return False
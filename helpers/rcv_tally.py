@@ -1,37 +1,174 @@
+import time
 import asyncio
+import logging
 import dataclasses
 
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import (
+    Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+)
 from aioredlock import LockError
 from result import Result, Err, Ok
 
-from database import PollWinners, Polls, VoteRankings, PollVoters
+from database import PollWinners, Polls
+from database.setup import checkout_connection, connection_scope
+from helpers.db_executor import DBExecutor
+from helpers.ballot_loader import PackedBallots
+from helpers.live_tally import LiveTallyManager
+from helpers.round_report import RoundReport, RoundReportBuilder
+from helpers.tally_executor import TallyExecutor, TallyJobStatus
+from helpers.tally_queue import TallyQueue, TallyJobState, get_tally_queue
 from helpers.message_buillder import MessageBuilder
+from helpers.constants import (
+    PROVISIONAL_RESULTS_MIN_INTERVAL, PROVISIONAL_RESULTS_VOTE_INTERVAL,
+    PROVISIONAL_RESULTS_MAX_AGE, PROVISIONAL_RESULTS_MAX_POLLS,
+    PROVISIONAL_RESULTS_TTL
+)
 from helpers.redis_cache_manager import RedisCacheManager, GetPollWinnerStatus
-from py_rcv import VotesCounter as PyVotesCounter, PyEliminationStrategies
+from helpers.tally_engine import PyEliminationStrategies, get_tally_engine
 
 """
 helpers to actually calculate / retrieve the winner of a 
 ranked choice poll
 """
 
+logger = logging.getLogger(__name__)
+
 
 @dataclasses.dataclass
 class GetPollWinnerInfo(object):
     poll: Polls
     poll_winner_id: int
     status: GetPollWinnerStatus
+    round_report: Optional[RoundReport] = None
+    # whether the poll is still open and the winner may yet change
+    provisional: bool = False
 
 
 @dataclasses.dataclass
 class DeterminePollWinnerInfo(object):
     winning_option_id: int
     poll: Polls
+    # tally breakdown (and winner) for every elimination strategy
+    round_reports: Dict[int, RoundReport]
+
+    @property
+    def strategy_winner_ids(self) -> Dict[int, Optional[int]]:
+        return {
+            vote_algorithm: round_report.winner_id
+            for vote_algorithm, round_report in self.round_reports.items()
+        }
+
+    def get_round_report(self, vote_algorithm: int) -> Optional[RoundReport]:
+        """
+        :return:
+        round report of the strategy, or None if its rounds contradict
+        the winner, so that no breakdown is shown or stored for it
+        """
+        round_report = self.round_reports[vote_algorithm]
+        return round_report if round_report.matches_winner() else None
+
+
+@dataclasses.dataclass
+class ProvisionalResult(object):
+    poll_winner_id: Optional[int]
+    round_report: Optional[RoundReport]
+    # value of Polls.num_votes when the ballots were counted
+    num_votes: int
+    computed_at: float
+
+    def to_winner_info(
+        self, poll: Polls, status: GetPollWinnerStatus
+    ) -> GetPollWinnerInfo:
+        return GetPollWinnerInfo(
+            poll=poll, poll_winner_id=self.poll_winner_id,
+            status=status, round_report=self.round_report,
+            provisional=True
+        )
+
+
+class ProvisionalResultsCache(object):
+    """
+    latest provisional result of each open poll, bounded to the
+    max_size most recently read polls. Results are dropped ttl
+    seconds after they were stored, however often they are read
+    """
+    def __init__(
+        self, max_size: int = PROVISIONAL_RESULTS_MAX_POLLS,
+        ttl: float = PROVISIONAL_RESULTS_TTL
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        # poll_id -> (expiry timestamp, provisional result)
+        self._results: OrderedDict[
+            int, Tuple[float, ProvisionalResult]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, poll_id: int) -> Optional[ProvisionalResult]:
+        entry = self._results.get(poll_id)
+        if entry is None:
+            return None
+
+        expiry, provisional_result = entry
+        if time.monotonic() > expiry:
+            del self._results[poll_id]
+            return None
+
+        # reads only refresh the LRU position, not the expiry
+        self._results.move_to_end(poll_id)
+        return provisional_result
+
+    def put(self, poll_id: int, provisional_result: ProvisionalResult):
+        expiry = time.monotonic() + self.ttl
+        self._results[poll_id] = (expiry, provisional_result)
+        self._results.move_to_end(poll_id)
+        while len(self._results) > self.max_size:
+            # evict the least recently read poll's result
+            self._results.popitem(last=False)
+
+    def pop(self, poll_id: int) -> Optional[ProvisionalResult]:
+        entry = self._results.pop(poll_id, None)
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        self._results.clear()
 
 
 class RCVTally(object):
-    def __init__(self):
+    # in-flight winner computations of this process, shared across
+    # RCVTally instances so that every requester joins the same one
+    _pending_winners: Dict[
+        int, asyncio.Task[Result[GetPollWinnerInfo, GetPollWinnerStatus]]
+    ] = {}
+    _pending_provisional_winners: Dict[
+        int, asyncio.Task[Result[GetPollWinnerInfo, GetPollWinnerStatus]]
+    ] = {}
+    # latest provisional result of each open poll
+    _provisional_results = ProvisionalResultsCache()
+    # strong references to background winner computations, as the
+    # event loop only keeps weak references to running tasks
+    _background_tasks: Set[asyncio.Task] = set()
+
+    def __init__(
+        self, tally_executor: Optional[TallyExecutor] = None,
+        tally_queue: Optional[TallyQueue] = None,
+        db_executor: Optional[DBExecutor] = None
+    ):
         self.cache = RedisCacheManager()
+        if tally_executor is None:
+            tally_executor = TallyExecutor()
+        if tally_queue is None:
+            tally_queue = get_tally_queue()
+        if db_executor is None:
+            db_executor = DBExecutor()
+
+        self.tally_executor = tally_executor
+        self.db_executor = db_executor
+        # winners are computed by tally_worker.py processes if set
+        self.tally_queue = tally_queue
 
     @staticmethod
     def fetch_poll(poll_id: int) -> Result[Polls, MessageBuilder]:
@@ -56,6 +193,169 @@ class RCVTally(object):
         poll = result.unwrap()
         return Ok(poll.num_active_voters)
 
+    @classmethod
+    def _load_poll_ballots(
+        cls, poll_id: int
+    ) -> Result[Tuple[Polls, PackedBallots], None]:
+        poll = cls.fetch_poll(poll_id)
+        if poll.is_err():
+            return Err(None)
+
+        poll = poll.unwrap()
+        # read ballots from the poll's warm tally if it exists, otherwise
+        # load them all from the database in a single streamed query
+        live_tally_manager = LiveTallyManager()
+        ballots = live_tally_manager.get_ballots(
+            poll_id, keep_warm=not poll.closed
+        )
+        if poll.closed:
+            # no more votes can be cast once the poll is closed
+            live_tally_manager.discard(poll_id)
+
+        return Ok((poll, ballots))
+
+    @staticmethod
+    def build_votes_counter(
+        vote_algorithm_no: int, num_poll_voters: int,
+        ballots: PackedBallots, record_ballots: bool = False,
+        engine_name: Optional[str] = None
+    ) -> Any:
+        """
+        VotesCounter of the tally engine with the poll's ballots (and
+        its voters without votes) inserted
+        :param record_ballots:
+        whether the counter can be serialized with to_bytes
+        """
+        tally_engine = get_tally_engine(engine_name)
+        vote_strategy = tally_engine.PyEliminationStrategies.from_int(
+            vote_algorithm_no
+        )
+        # TODO: add a way for poll creator to specify the vote strategy
+        votes_aggregator = tally_engine.VotesCounter(
+            elimination_strategy=vote_strategy,
+            record_ballots=record_ballots
+        )
+        ballots.insert_into(votes_aggregator)
+
+        voters_without_votes = num_poll_voters - ballots.num_ballots
+        assert voters_without_votes >= 0
+        votes_aggregator.insert_empty_votes(voters_without_votes)
+        return votes_aggregator
+
+    @classmethod
+    def count_votes(
+        cls, vote_algorithm_no: int, num_poll_voters: int,
+        ballots: PackedBallots, engine_name: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Runs the ranked choice voting algorithm over the poll's ballots
+        Doesn't touch the database, so it can run in a worker process
+        :param engine_name:
+        tally engine to count with (see tally_engine), defaults to
+        the one configured in config.yml
+        :return:
+        ID of winning option, or None if there's no winner
+        """
+        votes_aggregator = cls.build_votes_counter(
+            vote_algorithm_no, num_poll_voters, ballots,
+            engine_name=engine_name
+        )
+        return votes_aggregator.determine_winner()
+
+    @staticmethod
+    def build_tally_task(
+        vote_algorithm_no: int, num_poll_voters: int,
+        ballots: PackedBallots, engine_name: Optional[str] = None
+    ) -> Any:
+        # TallyTask of the tally engine, which can only be
+        # counted by the same engine's determine_winners
+        tally_engine = get_tally_engine(engine_name)
+        voters_without_votes = num_poll_voters - ballots.num_ballots
+        assert voters_without_votes >= 0
+        return tally_engine.TallyTask(
+            ballots.values, ballots.offsets, voters_without_votes,
+            tally_engine.PyEliminationStrategies.from_int(vote_algorithm_no),
+            counts=ballots.counts if ballots.is_weighted else None
+        )
+
+    @staticmethod
+    def count_votes_batch(
+        tally_tasks: Sequence[Any], num_threads: Optional[int] = None,
+        engine_name: Optional[str] = None
+    ) -> List[Optional[int]]:
+        """
+        Tallies many polls (or strategies) in parallel on the tally
+        engine's thread pool in a single call (with the GIL released
+        for the rust engine)
+        :return:
+        ID of the winning option (or None) of each task, in order
+        """
+        tally_engine = get_tally_engine(engine_name)
+        winner_ids: List[Optional[int]] = []
+        for tally_result in tally_engine.determine_winners(
+            tally_tasks, num_threads=num_threads
+        ):
+            if not tally_result.valid:
+                raise ValueError(tally_result.error_message)
+
+            winner_ids.append(tally_result.winner)
+
+        return winner_ids
+
+    @classmethod
+    def count_strategies(
+        cls, num_poll_voters: int, ballots: PackedBallots,
+        engine_name: Optional[str] = None
+    ) -> Dict[int, Optional[int]]:
+        """
+        Runs every elimination strategy over the same ballots in parallel
+        :return: mapping of vote_algorithm to winning option ID (or None)
+        """
+        vote_algorithms = [
+            strategy.to_int()
+            for strategy in PyEliminationStrategies.get_all_strategies()
+        ]
+        winner_ids = cls.count_votes_batch([
+            cls.build_tally_task(
+                vote_algorithm, num_poll_voters, ballots,
+                engine_name=engine_name
+            ) for vote_algorithm in vote_algorithms
+        ], engine_name=engine_name)
+        return dict(zip(vote_algorithms, winner_ids))
+
+    @classmethod
+    def tally_strategies(
+        cls, num_poll_voters: int, ballots: PackedBallots
+    ) -> Dict[int, RoundReport]:
+        """
+        Runs every elimination strategy over the same ballots
+        :return:
+        mapping of vote_algorithm to the round report of the tally,
+        which includes the ID of the winning option (or None)
+        """
+        # large polls' report rounds are counted across shards, but
+        # the winners always come from the vote counter
+        report_builder = RoundReportBuilder.from_packed_ballots(
+            ballots, num_poll_voters
+        )
+        strategy_winner_ids = cls.count_strategies(num_poll_voters, ballots)
+        round_reports = {
+            vote_algorithm: report_builder.build(
+                vote_algorithm, winning_option_id
+            ) for vote_algorithm, winning_option_id
+            in strategy_winner_ids.items()
+        }
+
+        for vote_algorithm, round_report in round_reports.items():
+            if not round_report.matches_winner():
+                logger.warning(
+                    f'round report of vote algorithm {vote_algorithm} '
+                    f'ends with {round_report.get_final_round_winner()} '
+                    f'but the winner is {round_report.winner_id}'
+                )
+
+        return round_reports
+
     @classmethod
     def _determine_poll_winner(
         cls, poll_id: int
@@ -67,57 +367,105 @@ class RCVTally(object):
         :return:
         ID of winning option, or None if there's no winner
         """
-        poll = cls.fetch_poll(poll_id)
-        if poll.is_err():
+        # tally worker threads don't run in any update's scope
+        with connection_scope():
+            load_result = cls._load_poll_ballots(poll_id)
+        if load_result.is_err():
             return Err(None)
 
-        poll = poll.unwrap()
-        num_poll_voters = poll.num_active_voters
-        vote_algorithm_no = poll.vote_algorithm
-        vote_strategy = PyEliminationStrategies.from_int(vote_algorithm_no)
-        # TODO: add a way for poll creator to specify the vote strategy
-
-        # get votes for the poll sorted by PollVoter and from
-        # the lowest ranking option (most favored)
-        # to the highest ranking option (least favored)
-        votes = VoteRankings.select().join(
-            PollVoters, on=(PollVoters.id == VoteRankings.poll_voter)
-        ).where(
-            PollVoters.poll == poll_id
-        ).order_by(
-            PollVoters.id, VoteRankings.ranking.asc()  # TODO: test ordering
+        poll, ballots = load_result.unwrap()
+        round_reports = cls.tally_strategies(
+            poll.num_active_voters, ballots
         )
+        return Ok(DeterminePollWinnerInfo(
+            winning_option_id=round_reports[poll.vote_algorithm].winner_id,
+            poll=poll, round_reports=round_reports
+        ))
 
-        prev_voter_id, num_votes_cast = None, 0
-        votes_aggregator = PyVotesCounter(elimination_strategy=vote_strategy)
+    async def _compute_poll_winner(
+        self, poll_id: int
+    ) -> Result[DeterminePollWinnerInfo, GetPollWinnerStatus]:
+        """
+        runs the poll tally on the tally executor
+        """
+        if not self.tally_executor.uses_processes:
+            job_result = await self.tally_executor.run(
+                self._determine_poll_winner, poll_id
+            )
+            if job_result.is_err():
+                return Err(self.to_winner_status(job_result.unwrap_err()))
+
+            poll_winner_res = job_result.unwrap()
+            if poll_winner_res.is_err():
+                return Err(GetPollWinnerStatus.FAILED)
+
+            return poll_winner_res
+
+        # worker processes have neither this process's database
+        # connection nor its warm ballots, so ballots are loaded here
+        # and only the vote counting itself runs in the worker
+        load_result = await self.db_executor.run(
+            self._load_poll_ballots, poll_id
+        )
+        if load_result.is_err():
+            return Err(GetPollWinnerStatus.FAILED)
 
-        for vote_ranking in votes:
-            option_row = vote_ranking.option
-            voter_id = vote_ranking.poll_voter.id
+        poll, ballots = load_result.unwrap()
+        job_result = await self.tally_executor.run(
+            self.tally_strategies, poll.num_active_voters, ballots
+        )
+        if job_result.is_err():
+            return Err(self.to_winner_status(job_result.unwrap_err()))
 
-            if prev_voter_id != voter_id:
-                votes_aggregator.flush_votes()
-                prev_voter_id = voter_id
-                num_votes_cast += 1
+        round_reports = job_result.unwrap()
+        return Ok(DeterminePollWinnerInfo(
+            winning_option_id=round_reports[poll.vote_algorithm].winner_id,
+            poll=poll, round_reports=round_reports
+        ))
 
-            if option_row is None:
-                vote_value = vote_ranking.special_value
-            else:
-                vote_value = option_row.id
+    @staticmethod
+    def to_winner_status(job_status: TallyJobStatus) -> GetPollWinnerStatus:
+        if job_status == TallyJobStatus.QUEUE_FULL:
+            return GetPollWinnerStatus.BUSY
+        elif job_status == TallyJobStatus.TIMED_OUT:
+            return GetPollWinnerStatus.TIMED_OUT
+        else:
+            return GetPollWinnerStatus.FAILED
+
+    def _read_cached_winner(
+        self, poll_id: int
+    ) -> Optional[Result[GetPollWinnerInfo, GetPollWinnerStatus]]:
+        """
+        :return:
+        cached poll winner for the poll's current elimination strategy
+        if it has been computed, None otherwise
+        """
+        fetch_poll_result = self.fetch_poll(poll_id)
+        if fetch_poll_result.is_err():
+            return Err(GetPollWinnerStatus.POLL_FETCH_FAILED)
 
-            # print('VOTE_VAL', vote_value, int(vote_value))
-            votes_aggregator.insert_vote_ranking(voter_id, vote_value)
+        poll = fetch_poll_result.unwrap()
+        cache_result = PollWinners.read_poll_winner(
+            poll_id, poll.vote_algorithm
+        )
+        if cache_result.is_err():
+            return None
 
-        votes_aggregator.flush_votes()
-        voters_without_votes = num_poll_voters - num_votes_cast
-        assert voters_without_votes >= 0
-        votes_aggregator.insert_empty_votes(voters_without_votes)
-        winning_option_id = votes_aggregator.determine_winner()
+        poll_winner = cache_result.unwrap()
+        round_report = None
+        if poll_winner.round_report is not None:
+            round_report = RoundReport.from_json(poll_winner.round_report)
 
-        return Ok(DeterminePollWinnerInfo(
-            winning_option_id=winning_option_id, poll=poll
+        return Ok(GetPollWinnerInfo(
+            poll=poll, poll_winner_id=poll_winner.option_id,
+            status=GetPollWinnerStatus.CACHED, round_report=round_report
         ))
 
+    async def read_cached_winner(
+        self, poll_id: int
+    ) -> Optional[Result[GetPollWinnerInfo, GetPollWinnerStatus]]:
+        return await self.db_executor.run(self._read_cached_winner, poll_id)
+
     async def get_poll_winner(
         self, poll_id: int
     ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
@@ -125,7 +473,9 @@ class RCVTally(object):
         Returns poll winner for specified poll
         Attempts to get poll winner from cache if it exists,
         otherwise will run the ranked choice voting computation
-        and write to the redis cache before returning
+        and write to the redis cache before returning.
+        Concurrent requests for the same poll in this process wait on
+        the same in-flight computation instead of starting their own
         # TODO: test that redis lock refresh works
 
         :param poll_id:
@@ -133,27 +483,273 @@ class RCVTally(object):
         poll winner, status of poll winner computation
         """
         assert isinstance(poll_id, int)
-        cache_result = PollWinners.read_poll_winner_id(poll_id)
+        cached_winner = await self.read_cached_winner(poll_id)
+        if cached_winner is not None:
+            # print('CACHE_HIT', cached_winner)
+            return cached_winner
+
+        if self.tally_queue is not None:
+            return await self._single_flight(
+                self._pending_winners, poll_id,
+                lambda: self.__get_queued_poll_winner(poll_id)
+            )
+
+        return await self._single_flight(
+            self._pending_winners, poll_id,
+            lambda: self.__get_poll_winner(poll_id)
+        )
+
+    async def __get_queued_poll_winner(
+        self, poll_id: int
+    ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
+        """
+        queues a tally job for a worker (or joins the poll's existing
+        job) and waits for the worker to publish the winner
+        """
+        job = await asyncio.to_thread(self.tally_queue.enqueue, poll_id)
+        poll_winner_res = await self.__await_remote_winner(poll_id)
+        if poll_winner_res.is_ok() or (
+            poll_winner_res.unwrap_err() != GetPollWinnerStatus.COMPUTING
+        ):
+            return poll_winner_res
+
+        # the worker hasn't finished yet, report how far along it is
+        job = await asyncio.to_thread(self.tally_queue.get_job, job.job_id)
+        if job is None or job.state == TallyJobState.FAILED:
+            return Err(GetPollWinnerStatus.FAILED)
+        elif job.state == TallyJobState.QUEUED:
+            return Err(GetPollWinnerStatus.QUEUED)
+        elif job.state == TallyJobState.DONE:
+            cached_winner = await self.read_cached_winner(poll_id)
+            if cached_winner is not None:
+                return cached_winner
+
+        return Err(GetPollWinnerStatus.COMPUTING)
+
+    @staticmethod
+    def save_poll_winners(
+        poll_id: int, poll_winner_info: DeterminePollWinnerInfo
+    ):
+        round_reports = {
+            vote_algorithm: poll_winner_info.get_round_report(vote_algorithm)
+            for vote_algorithm in poll_winner_info.round_reports
+        }
+        PollWinners.save_strategy_winner_ids(
+            poll_id, poll_winner_info.strategy_winner_ids,
+            round_reports={
+                vote_algorithm: round_report.to_json()
+                for vote_algorithm, round_report in round_reports.items()
+                if round_report is not None
+            }
+        )
+
+    def schedule_poll_winner(self, poll_id: int) -> asyncio.Task:
+        """
+        starts computing the winner of a (just closed) poll in the
+        background, so that PollWinners is filled before anyone asks.
+        Winner requests that arrive in the meantime join the same
+        computation through get_poll_winner
+        """
+        # the task outlives the update that scheduled it, its winner
+        # computation checks out a connection of its own
+        task = asyncio.create_task(self.get_poll_winner(poll_id))
+        self._background_tasks.add(task)
+
+        def on_done(done_task: asyncio.Task):
+            self._background_tasks.discard(done_task)
+            if done_task.cancelled():
+                return
+
+            exception = done_task.exception()
+            if exception is not None:
+                logger.error(
+                    f'background tally of poll {poll_id} failed: '
+                    f'{exception}'
+                )
 
-        if cache_result.is_ok():
-            poll_winner_id = cache_result.unwrap()
-            fetch_poll_result = self.fetch_poll(poll_id)
+        task.add_done_callback(on_done)
+        return task
 
-            if fetch_poll_result.is_err():
-                return Err(GetPollWinnerStatus.POLL_FETCH_FAILED)
+    @staticmethod
+    async def _single_flight(
+        pending_map: Dict[int, asyncio.Task], poll_id: int,
+        compute: Callable[[], Awaitable[
+            Result[GetPollWinnerInfo, GetPollWinnerStatus]
+        ]]
+    ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
+        """
+        runs compute in a task of its own unless a computation for the
+        poll is already in flight in this process, and awaits its result
+        the computation doesn't belong to any one requester, so it keeps
+        running for the others if the requester that started it is
+        cancelled
+        """
+        pending_winner = pending_map.get(poll_id)
+        if pending_winner is None:
+            async def compute_winner():
+                # outlives the request that started it (and its
+                # connection scope), so it checks out its own connection
+                try:
+                    async with checkout_connection():
+                        return await compute()
+                except Exception as e:
+                    logger.error(
+                        f'winner computation of poll {poll_id} failed: {e}'
+                    )
+                    return Err(GetPollWinnerStatus.FAILED)
+
+            def on_done(done_task: asyncio.Task):
+                if pending_map.get(poll_id) is done_task:
+                    del pending_map[poll_id]
+
+            pending_winner = asyncio.create_task(compute_winner())
+            pending_winner.add_done_callback(on_done)
+            pending_map[poll_id] = pending_winner
+
+        # shielded so that a cancelled requester doesn't cancel
+        # the computation for everyone else
+        return await asyncio.shield(pending_winner)
+
+    def _is_provisional_result_stale(
+        self, poll: Polls, provisional_result: ProvisionalResult
+    ) -> bool:
+        # recomputation is driven by the poll's vote counter, but
+        # re-votes replace ballots without changing it, so results
+        # of polls without new votes still expire after a while
+        elapsed = time.time() - provisional_result.computed_at
+        new_votes = poll.num_votes - provisional_result.num_votes
+        if new_votes == 0:
+            return elapsed >= PROVISIONAL_RESULTS_MAX_AGE
+        elif new_votes >= PROVISIONAL_RESULTS_VOTE_INTERVAL:
+            return True
+
+        return elapsed >= PROVISIONAL_RESULTS_MIN_INTERVAL
+
+    async def get_provisional_winner(
+        self, poll_id: int
+    ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
+        """
+        Returns the current leader of an open poll
+        The result is recounted at most once every
+        PROVISIONAL_RESULTS_MIN_INTERVAL seconds, or once every
+        PROVISIONAL_RESULTS_VOTE_INTERVAL new votes, and at least once
+        every PROVISIONAL_RESULTS_MAX_AGE seconds so that re-votes
+        show up. It is served from memory otherwise.
+        Closed polls return their final winner
 
-            poll = fetch_poll_result.unwrap()
-            # print('CACHE_HIT', cache_result)
-            return Ok(GetPollWinnerInfo(
-                poll=poll, poll_winner_id=poll_winner_id,
-                status=GetPollWinnerStatus.CACHED
+        :param poll_id:
+        :return:
+        poll leader, status of poll leader computation
+        """
+        assert isinstance(poll_id, int)
+        fetch_poll_result = await self.db_executor.run(
+            self.fetch_poll, poll_id
+        )
+        if fetch_poll_result.is_err():
+            return Err(GetPollWinnerStatus.POLL_FETCH_FAILED)
+
+        poll = fetch_poll_result.unwrap()
+        if poll.closed:
+            self._provisional_results.pop(poll_id)
+            return await self.get_poll_winner(poll_id)
+
+        provisional_result = self._provisional_results.get(poll_id)
+        if (provisional_result is not None) and not (
+            self._is_provisional_result_stale(poll, provisional_result)
+        ):
+            return Ok(provisional_result.to_winner_info(
+                poll, GetPollWinnerStatus.CACHED
             ))
 
+        return await self._single_flight(
+            self._pending_provisional_winners, poll_id,
+            lambda: self.__get_provisional_winner(poll)
+        )
+
+    async def __get_provisional_winner(
+        self, poll: Polls
+    ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
+        poll_id = poll.id
+        stale_result = self._provisional_results.get(poll_id)
+        redis_lock_key = self.cache.build_provisional_winner_lock_cache_key(
+            poll_id
+        )
+
+        try:
+            # only one process recounts an open poll at a time
+            async with await self.cache.lock(redis_lock_key) as lock:
+                refresh_task = asyncio.create_task(
+                    self.cache.refresh_lock(lock)
+                )
+                try:
+                    # the vote counter is read before the ballots are
+                    # loaded, so votes cast during the count only ever
+                    # make the result look older than it is
+                    num_votes = poll.num_votes
+                    poll_winner_res = await self._compute_poll_winner(
+                        poll_id
+                    )
+                finally:
+                    refresh_task.cancel()
+                    # the task may get cancelled before it starts running
+                    await asyncio.gather(refresh_task, return_exceptions=True)
+
+        except LockError:
+            poll_winner_res = Err(GetPollWinnerStatus.COMPUTING)
+
+        if poll_winner_res.is_err():
+            if stale_result is not None:
+                # serve the previous count rather than nothing at all
+                return Ok(stale_result.to_winner_info(
+                    poll, GetPollWinnerStatus.CACHED
+                ))
+
+            return poll_winner_res
+
+        poll_winner_info = poll_winner_res.unwrap()
+        provisional_result = ProvisionalResult(
+            poll_winner_id=poll_winner_info.winning_option_id,
+            round_report=poll_winner_info.get_round_report(
+                poll.vote_algorithm
+            ),
+            num_votes=num_votes, computed_at=time.time()
+        )
+        self._provisional_results.put(poll_id, provisional_result)
+        return Ok(provisional_result.to_winner_info(
+            poll_winner_info.poll, GetPollWinnerStatus.NEWLY_COMPUTED
+        ))
+
+    async def __await_remote_winner(
+        self, poll_id: int
+    ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
+        """
+        waits for the winner computation that another process
+        is running (and holding the redis lock for) to finish
+        """
+        async def is_ready() -> bool:
+            return await self.read_cached_winner(poll_id) is not None
+
+        status = await self.cache.wait_for_poll_winner(
+            poll_id, is_ready=is_ready
+        )
+        if status == RedisCacheManager.WINNER_FAILED:
+            return Err(GetPollWinnerStatus.FAILED)
+
+        cached_winner = await self.read_cached_winner(poll_id)
+        if cached_winner is not None:
+            return cached_winner
+
+        # nothing was published before the wait timed out
+        return Err(GetPollWinnerStatus.COMPUTING)
+
+    async def __get_poll_winner(
+        self, poll_id: int
+    ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
         redis_lock_key = self.cache.build_poll_winner_lock_cache_key(poll_id)
         # print('CACHE_KEY', redis_cache_key)
         if await self.cache.is_locked(redis_lock_key):
             # print('PRE_LOCKED')
-            return Err(GetPollWinnerStatus.COMPUTING)
+            return await self.__await_remote_winner(poll_id)
         try:
             # prevents race conditions where multiple computations
             # are run concurrently for the same poll
@@ -162,54 +758,51 @@ class RCVTally(object):
                 refresh_task = asyncio.create_task(
                     self.cache.refresh_lock(lock)
                 )
+                winner_status = RedisCacheManager.WINNER_FAILED
 
                 try:
-                    cache_result = PollWinners.read_poll_winner_id(poll_id)
-
-                    if cache_result.is_ok():
-                        poll_winner_id = cache_result.unwrap()
-                        fetch_poll_result = self.fetch_poll(poll_id)
-
-                        if fetch_poll_result.is_err():
-                            return Err(GetPollWinnerStatus.FAILED)
-
-                        poll = fetch_poll_result.unwrap()
-                        # print('INNER_CACHE_HIT', cache_result)
-                        return Ok(GetPollWinnerInfo(
-                            poll=poll, poll_winner_id=poll_winner_id,
-                            status=GetPollWinnerStatus.CACHED
-                        ))
-
-                    # compute the winner in a separate thread to not block
-                    # the async event loop
-                    loop = asyncio.get_event_loop()
-                    with ThreadPoolExecutor() as executor:
-                        poll_winner_res = await loop.run_in_executor(
-                            executor, self._determine_poll_winner, poll_id
-                        )
-
+                    cached_winner = await self.read_cached_winner(poll_id)
+                    if cached_winner is not None:
+                        # print('INNER_CACHE_HIT', cached_winner)
+                        winner_status = RedisCacheManager.WINNER_READY
+                        return cached_winner
+
+                    # compute the winner on the tally worker pool to
+                    # not block the async event loop
+                    poll_winner_res = await self._compute_poll_winner(
+                        poll_id
+                    )
                     if poll_winner_res.is_err():
-                        return Err(GetPollWinnerStatus.FAILED)
+                        return poll_winner_res
 
                     poll_winner_info = poll_winner_res.unwrap()
                     poll_winner_id = poll_winner_info.winning_option_id
                     poll = poll_winner_info.poll
 
-                    # Store computed winner in the db
-                    PollWinners.build_from_fields(
-                        poll_id=poll_id, option_id=poll_winner_id
-                    ).get_or_create()
+                    # Store computed winners of every strategy in the db
+                    round_report = poll_winner_info.get_round_report(
+                        poll.vote_algorithm
+                    )
+                    await self.db_executor.run(
+                        self.save_poll_winners, poll_id, poll_winner_info
+                    )
+                    winner_status = RedisCacheManager.WINNER_READY
                 finally:
                     # Cancel the refresh task
                     refresh_task.cancel()
-                    await refresh_task
+                    await asyncio.gather(refresh_task, return_exceptions=True)
+                    # wake up other processes waiting on this poll
+                    await self.cache.publish_poll_winner(
+                        poll_id, winner_status
+                    )
 
         except LockError:
             # print('LOCK_ERROR')
-            return Err(GetPollWinnerStatus.COMPUTING)
+            return await self.__await_remote_winner(poll_id)
 
         # print('CACHE_MISS', poll_winner_id)
         return Ok(GetPollWinnerInfo(
             poll_winner_id=poll_winner_id, poll=poll,
-            status=GetPollWinnerStatus.NEWLY_COMPUTED
+            status=GetPollWinnerStatus.NEWLY_COMPUTED,
+            round_report=round_report
         ))
@@ -1,9 +1,11 @@
 import asyncio
 import aioredlock
+import redis.asyncio as redis
 
 from enum import IntEnum
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 from aioredlock import Aioredlock
+from redis.exceptions import RedisError
 
 
 class GetPollWinnerStatus(IntEnum):
@@ -12,16 +14,25 @@ class GetPollWinnerStatus(IntEnum):
     COMPUTING = 2
     FAILED = 3
     POLL_FETCH_FAILED = 4
+    BUSY = 5
+    TIMED_OUT = 6
+    QUEUED = 7
 
 
 class RedisCacheManager(object):
     _redis_lock_manager: Optional[Aioredlock] = None
+    _redis_client: Optional[redis.Redis] = None
     _connections = []
 
     POLL_WINNER_KEY = "POLL_WINNER"
     POLL_WINNER_LOCK_KEY = "POLL_WINNER_LOCK"
+    POLL_WINNER_CHANNEL_KEY = "POLL_WINNER_CHANNEL"
+    PROVISIONAL_WINNER_LOCK_KEY = "PROVISIONAL_WINNER_LOCK"
     # CACHE_LOCK_NAME = "REDIS_CACHE_LOCK"
     POLL_CACHE_EXPIRY = 60
+    # messages published on a poll's winner channel
+    WINNER_READY = "READY"
+    WINNER_FAILED = "FAILED"
 
     def __init__(self, connections: list[dict[str, str | int]] | None = None):
         self._connections = connections
@@ -39,6 +50,13 @@ class RedisCacheManager(object):
 
         return self._redis_lock_manager
 
+    @property
+    def redis_client(self) -> redis.Redis:
+        if self._redis_client is None:
+            self._redis_client = self.create_redis_client(self._connections)
+
+        return self._redis_client
+
     async def is_locked(self, resource: str):
         return await self.redis_lock_manager.is_locked(resource)
 
@@ -68,12 +86,94 @@ class RedisCacheManager(object):
         else:
             return Aioredlock()
 
+    @staticmethod
+    def create_redis_client(
+        connections: list[dict[str, str | int]] | None = None
+    ) -> redis.Redis:
+        # pub/sub only needs one server, use the same one
+        # that the first lock manager connection points to
+        if connections:
+            connection = connections[0]
+            if isinstance(connection, str):
+                return redis.Redis.from_url(connection)
+
+            return redis.Redis(**connection)
+        else:
+            return redis.Redis()
+
+    async def publish_poll_winner(self, poll_id: int, status: str) -> bool:
+        """
+        notifies processes waiting on the poll's winner computation
+        that it has finished (status is WINNER_READY or WINNER_FAILED)
+        """
+        channel = self.build_poll_winner_channel(poll_id)
+        try:
+            await self.redis_client.publish(channel, status)
+        except RedisError:
+            return False
+
+        return True
+
+    async def wait_for_poll_winner(
+        self, poll_id: int, is_ready: Callable[[], Awaitable[bool]],
+        timeout: float = POLL_CACHE_EXPIRY
+    ) -> Optional[str]:
+        """
+        waits for a winner computation running in another process
+        to be published. is_ready is checked once after subscribing,
+        so that a result published before the subscription isn't missed
+        :return:
+        published status, or None if nothing was published in time
+        """
+        channel = self.build_poll_winner_channel(poll_id)
+        pubsub = self.redis_client.pubsub()
+        loop = asyncio.get_running_loop()
+
+        try:
+            await pubsub.subscribe(channel)
+            if await is_ready():
+                return self.WINNER_READY
+
+            deadline = loop.time() + timeout
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=remaining
+                )
+                if message is None:
+                    continue
+
+                status = message['data']
+                if isinstance(status, bytes):
+                    status = status.decode()
+
+                return status
+        except RedisError:
+            pass
+        finally:
+            try:
+                await pubsub.aclose()
+            except RedisError:
+                pass
+
+        return None
+
+    @classmethod
+    def build_poll_winner_channel(cls, poll_id: int) -> str:
+        assert isinstance(poll_id, int)
+        return cls._build_cache_key(cls.POLL_WINNER_CHANNEL_KEY, str(poll_id))
+
     def build_poll_winner_lock_cache_key(self, poll_id: int) -> str:
         assert isinstance(poll_id, int)
         return self._build_cache_key(
             self.__class__.POLL_WINNER_LOCK_KEY, str(poll_id)
         )
 
+    def build_provisional_winner_lock_cache_key(self, poll_id: int) -> str:
+        assert isinstance(poll_id, int)
+        return self._build_cache_key(
+            self.__class__.PROVISIONAL_WINNER_LOCK_KEY, str(poll_id)
+        )
+
     @staticmethod
     def _build_cache_key(header: str, key: str):
         return f"{header}:{key}"
@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import json
+import dataclasses
+
+from collections import Counter
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Tuple
+
+from helpers.ballot_loader import PackedBallots
+from helpers.constants import SHARDED_ROUND_COUNT_MIN_BALLOTS
+from helpers.pairwise_matrix import (
+    PairwiseMatrix, RANKED_PAIRS, CONDORCET_RANKED_PAIRS
+)
+from helpers.special_votes import SpecialVotes
+from helpers.tally_engine import RUST_ENGINE_AVAILABLE
+
+"""
+builds round-by-round instant runoff breakdowns of a poll's ballots,
+so that vote counts can be shown alongside the poll winner
+"""
+
+Ballot = Tuple[int, ...]
+# transfer destination for ballots that run out of rankings
+EXHAUSTED = 0
+# vote_algorithm value of PyEliminationStrategies.DowdallScoring
+DOWDALL_SCORING = 0
+
+
+@dataclasses.dataclass
+class RoundSummary(object):
+    # first preference votes of every candidate still in the running
+    first_preferences: Dict[int, int]
+    withheld: int = 0
+    abstained: int = 0
+    exhausted: int = 0
+    eliminated: List[int] = dataclasses.field(default_factory=list)
+    # eliminated candidate -> {next preference -> number of ballots}
+    # next preference is a candidate, a special vote value, or EXHAUSTED
+    transfers: Dict[int, Dict[int, int]] = dataclasses.field(
+        default_factory=dict
+    )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> RoundSummary:
+        # json object keys are always strings
+        return cls(
+            first_preferences={
+                int(candidate): votes for candidate, votes
+                in data['first_preferences'].items()
+            },
+            withheld=data['withheld'], abstained=data['abstained'],
+            exhausted=data['exhausted'], eliminated=data['eliminated'],
+            transfers={
+                int(candidate): {
+                    int(target): count for target, count in targets.items()
+                } for candidate, targets in data['transfers'].items()
+            }
+        )
+
+
+@dataclasses.dataclass
+class RoundReport(object):
+    vote_algorithm: int
+    winner_id: Optional[int]
+    num_ballots: int
+    rounds: List[RoundSummary] = dataclasses.field(default_factory=list)
+
+    def get_final_round_winner(self) -> Optional[int]:
+        """
+        :return:
+        candidate with a majority of the counted votes in the last
+        round, or None if the rounds ended without one (e.g. a tie)
+        """
+        if len(self.rounds) == 0:
+            return None
+
+        final_round = self.rounds[-1]
+        if len(final_round.eliminated) > 0:
+            # every remaining candidate was eliminated
+            return None
+
+        num_counted = (
+            sum(final_round.first_preferences.values()) +
+            final_round.withheld + final_round.exhausted
+        )
+        candidate, top_votes = max(
+            final_round.first_preferences.items(),
+            key=lambda item: (item[1], -item[0])
+        )
+        return candidate if 2 * top_votes > num_counted else None
+
+    def matches_winner(self) -> bool:
+        """
+        whether the rounds end with the winner picked by the vote
+        counter, the rounds are recounted separately and can pick a
+        different winner if the two break ties differently
+        """
+        return self.get_final_round_winner() == self.winner_id
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> RoundReport:
+        return cls(
+            vote_algorithm=data['vote_algorithm'],
+            winner_id=data['winner_id'], num_ballots=data['num_ballots'],
+            rounds=[
+                RoundSummary.from_dict(round_data)
+                for round_data in data['rounds']
+            ]
+        )
+
+    @classmethod
+    def from_json(cls, raw_report: str) -> RoundReport:
+        return cls.from_dict(json.loads(raw_report))
+
+    def to_message_lines(self, option_names: Dict[int, str]) -> List[str]:
+        """
+        one line per round listing first preference votes
+        (strongest candidate first) and eliminated candidates
+        """
+        lines = []
+        for round_no, summary in enumerate(self.rounds, start=1):
+            ranked_votes = sorted(
+                summary.first_preferences.items(),
+                key=lambda item: (-item[1], item[0])
+            )
+            vote_counts = ', '.join(
+                f'{option_names.get(candidate, candidate)}: {votes}'
+                for candidate, votes in ranked_votes
+            )
+            line = f'Round {round_no} - {vote_counts}'
+            if summary.withheld > 0:
+                line += f', withheld: {summary.withheld}'
+            if len(summary.eliminated) > 0:
+                eliminated = ', '.join(
+                    str(option_names.get(candidate, candidate))
+                    for candidate in summary.eliminated
+                )
+                line += f' (eliminated {eliminated})'
+
+            lines.append(line)
+
+        return lines
+
+
+class RoundReportBuilder(object):
+    def __init__(
+        self, ballot_counts: Counter[Ballot], num_empty_votes: int = 0,
+        sharded_ballots: Optional[Any] = None
+    ):
+        self.ballot_counts = ballot_counts
+        # registered voters who didn't vote count as withheld votes
+        self.num_empty_votes = num_empty_votes
+        # py_rcv.ShardedBallots of the same ballots, if set then each
+        # round's first preferences and transfers are counted across
+        # shards in parallel instead of by looping over ballot_counts
+        self.sharded_ballots = sharded_ballots
+        self.candidates = {
+            value for ballot in ballot_counts for value in ballot
+            if value > 0
+        }
+        self._pairwise_matrix: Optional[PairwiseMatrix] = None
+
+    @classmethod
+    def from_packed_ballots(
+        cls, ballots: PackedBallots, num_poll_voters: int
+    ) -> RoundReportBuilder:
+        ballot_counts: Counter[Ballot] = Counter()
+        for ballot, count in ballots.iter_ballot_counts():
+            ballot_counts[tuple(ballot)] += count
+
+        num_empty_votes = num_poll_voters - ballots.num_ballots
+        assert num_empty_votes >= 0
+        sharded_ballots = None
+        if RUST_ENGINE_AVAILABLE and (
+            len(ballots.voter_ids) >= SHARDED_ROUND_COUNT_MIN_BALLOTS
+        ):
+            sharded_ballots = cls.shard_ballots(ballots)
+
+        return cls(ballot_counts, num_empty_votes, sharded_ballots)
+
+    @staticmethod
+    def shard_ballots(
+        ballots: PackedBallots, num_shards: Optional[int] = None
+    ):
+        # imported here so that reports can be built without py_rcv
+        from py_rcv import ShardedBallots
+        return ShardedBallots(
+            ballots.values, ballots.offsets,
+            counts=ballots.counts if ballots.is_weighted else None,
+            num_shards=num_shards
+        )
+
+    @staticmethod
+    def _next_choice(ballot: Ballot, remaining: set[int]) -> int:
+        # first ranking on the ballot that is a special vote
+        # or a candidate that hasn't been eliminated yet
+        for value in ballot:
+            if (value < 0) or (value in remaining):
+                return value
+
+        return EXHAUSTED
+
+    def _dowdall_scores(self, candidates: set[int]) -> Dict[int, Fraction]:
+        # exact fractions, so that equal scores are always tied
+        scores = {candidate: Fraction(0) for candidate in candidates}
+        for ballot, count in self.ballot_counts.items():
+            for ranking, value in enumerate(ballot):
+                if value in scores:
+                    scores[value] += Fraction(count, ranking + 1)
+
+        return scores
+
+    @property
+    def pairwise_matrix(self) -> PairwiseMatrix:
+        if self._pairwise_matrix is None:
+            self._pairwise_matrix = PairwiseMatrix.from_ballots(
+                self.ballot_counts, self.candidates
+            )
+
+        return self._pairwise_matrix
+
+    def _count_round(self, remaining: set[int]) -> RoundSummary:
+        if self.sharded_ballots is not None:
+            round_counts = self.sharded_ballots.count_round(sorted(remaining))
+            return RoundSummary(
+                first_preferences=round_counts.first_preferences,
+                withheld=round_counts.withheld + self.num_empty_votes,
+                abstained=round_counts.abstained,
+                exhausted=round_counts.exhausted
+            )
+
+        summary = RoundSummary(
+            first_preferences={candidate: 0 for candidate in remaining},
+            withheld=self.num_empty_votes
+        )
+        for ballot, count in self.ballot_counts.items():
+            choice = self._next_choice(ballot, remaining)
+            if choice == SpecialVotes.WITHHOLD_VOTE:
+                summary.withheld += count
+            elif choice == SpecialVotes.ABSTAIN_VOTE:
+                summary.abstained += count
+            elif choice == EXHAUSTED:
+                summary.exhausted += count
+            else:
+                summary.first_preferences[choice] += count
+
+        return summary
+
+    def _pick_eliminated(
+        self, summary: RoundSummary, vote_algorithm: int
+    ) -> List[int]:
+        lowest_votes = min(summary.first_preferences.values())
+        eliminated = {
+            candidate for candidate, votes
+            in summary.first_preferences.items() if votes == lowest_votes
+        }
+        if len(eliminated) == 1:
+            return sorted(eliminated)
+
+        if vote_algorithm == DOWDALL_SCORING:
+            # break ties between the weakest candidates by Dowdall score
+            scores = self._dowdall_scores(eliminated)
+            lowest_score = min(scores.values())
+            eliminated = {
+                candidate for candidate, score in scores.items()
+                if score == lowest_score
+            }
+        elif vote_algorithm in (RANKED_PAIRS, CONDORCET_RANKED_PAIRS):
+            # break ties by eliminating the weakest of the tied candidates
+            # in the ranked pairs order, which for the Condorcet variant
+            # also accounts for head-to-heads with every other candidate
+            ranked_candidates = (
+                summary.first_preferences.keys()
+                if vote_algorithm == CONDORCET_RANKED_PAIRS else eliminated
+            )
+            order = self.pairwise_matrix.ranked_pairs_order(
+                ranked_candidates
+            )
+            tied_order = [
+                candidate for candidate in order if candidate in eliminated
+            ]
+            eliminated = {tied_order[-1]}
+
+        return sorted(eliminated)
+
+    def _count_transfers(
+        self, eliminated: List[int], remaining: set[int]
+    ) -> Dict[int, Dict[int, int]]:
+        if self.sharded_ballots is not None:
+            return self.sharded_ballots.count_transfers(
+                eliminated, sorted(remaining)
+            )
+
+        transfers: Dict[int, Counter[int]] = {
+            candidate: Counter() for candidate in eliminated
+        }
+        next_remaining = remaining.difference(eliminated)
+
+        for ballot, count in self.ballot_counts.items():
+            choice = self._next_choice(ballot, remaining)
+            if choice in transfers:
+                next_choice = self._next_choice(ballot, next_remaining)
+                transfers[choice][next_choice] += count
+
+        return {
+            candidate: dict(targets)
+            for candidate, targets in transfers.items()
+        }
+
+    def build(
+        self, vote_algorithm: int, winner_id: Optional[int]
+    ) -> RoundReport:
+        """
+        counts first preferences round by round, eliminating the
+        weakest candidate(s) until one has a majority of the votes
+        that weren't abstained (withheld and exhausted votes count)
+        winner_id is the winner determined by the vote counter, and is
+        recorded as is rather than being derived from the rounds
+        (see RoundReport.matches_winner)
+        """
+        report = RoundReport(
+            vote_algorithm=vote_algorithm, winner_id=winner_id,
+            num_ballots=sum(self.ballot_counts.values())
+        )
+        remaining = set(self.candidates)
+
+        while len(remaining) > 0:
+            summary = self._count_round(remaining)
+            report.rounds.append(summary)
+
+            num_counted = (
+                sum(summary.first_preferences.values()) +
+                summary.withheld + summary.exhausted
+            )
+            top_votes = max(summary.first_preferences.values())
+            if 2 * top_votes > num_counted:
+                break
+
+            summary.eliminated = self._pick_eliminated(
+                summary, vote_algorithm
+            )
+            summary.transfers = self._count_transfers(
+                summary.eliminated, remaining
+            )
+            remaining.difference_update(summary.eliminated)
+
+        return report
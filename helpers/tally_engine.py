@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+
+from types import ModuleType
+from typing import Optional
+
+try:
+    import py_rcv
+except ImportError:
+    py_rcv = None
+
+"""
+picks the vote counting engine that polls are tallied with:
+py_rcv (the rust extension), or helpers.numpy_rcv which implements
+the same interface in python. Set tally.engine in config.yml to
+choose one, numpy_rcv is used if py_rcv isn't installed
+"""
+
+logger = logging.getLogger(__name__)
+
+RUST_ENGINE = 'rust'
+NUMPY_ENGINE = 'numpy'
+TALLY_ENGINES = (RUST_ENGINE, NUMPY_ENGINE)
+RUST_ENGINE_AVAILABLE = py_rcv is not None
+
+if RUST_ENGINE_AVAILABLE:
+    from py_rcv import PyEliminationStrategies, VotesCounter
+else:
+    from helpers.numpy_rcv import PyEliminationStrategies, VotesCounter
+
+_default_engine_name: Optional[str] = None
+
+
+def load_tally_engine(engine_name: str) -> ModuleType:
+    """
+    module with the engine's VotesCounter, PyEliminationStrategies,
+    TallyTask and determine_winners
+    """
+    if engine_name == RUST_ENGINE:
+        if not RUST_ENGINE_AVAILABLE:
+            raise ImportError('py_rcv is not installed')
+        return py_rcv
+    elif engine_name == NUMPY_ENGINE:
+        from helpers import numpy_rcv
+        return numpy_rcv
+    else:
+        raise ValueError(f'Unknown tally engine: {engine_name}')
+
+
+def get_default_engine_name() -> str:
+    global _default_engine_name
+    if _default_engine_name is not None:
+        return _default_engine_name
+
+    from load_config import TALLY_CONFIG
+    engine_name = TALLY_CONFIG.get('engine') or RUST_ENGINE
+    if engine_name not in TALLY_ENGINES:
+        raise ValueError(f'Unknown tally engine: {engine_name}')
+
+    if (engine_name == RUST_ENGINE) and not RUST_ENGINE_AVAILABLE:
+        logger.warning(
+            'py_rcv is not installed, tallying with the numpy engine'
+        )
+        engine_name = NUMPY_ENGINE
+
+    _default_engine_name = engine_name
+    return engine_name
+
+
+def get_tally_engine(engine_name: Optional[str] = None) -> ModuleType:
+    if engine_name is None:
+        engine_name = get_default_engine_name()
+
+    return load_tally_engine(engine_name)
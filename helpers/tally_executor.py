@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+import threading
+import time
+
+from enum import IntEnum
+from typing import Any, Callable, Optional, Tuple
+from concurrent.futures import (
+    Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+)
+from result import Result, Ok, Err
+
+"""
+long-lived worker pool that poll tallies are run on, so that
+winner computations neither block the async event loop nor pay
+for spinning up a fresh executor per request
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class TallyJobStatus(IntEnum):
+    QUEUE_FULL = 0
+    TIMED_OUT = 1
+    FAILED = 2
+
+
+@dataclasses.dataclass
+class TallyExecutorConfig(object):
+    # run tallies in worker processes instead of worker threads
+    use_processes: bool = False
+    max_workers: int = 4
+    # maximum number of jobs that can be queued or running at once
+    max_queue_size: int = 64
+    # seconds to wait for a job (queue wait + compute) to finish
+    job_timeout: float = 60
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> TallyExecutorConfig:
+        config = config or {}
+        defaults = cls()
+        return cls(
+            use_processes=bool(config.get(
+                'use_processes', defaults.use_processes
+            )),
+            max_workers=int(config.get(
+                'max_workers', defaults.max_workers
+            )),
+            max_queue_size=int(config.get(
+                'max_queue_size', defaults.max_queue_size
+            )),
+            job_timeout=float(config.get(
+                'job_timeout', defaults.job_timeout
+            ))
+        )
+
+
+@dataclasses.dataclass
+class TallyMetrics(object):
+    num_completed: int = 0
+    num_failed: int = 0
+    num_rejected: int = 0
+    num_timed_out: int = 0
+    # seconds spent waiting for a free worker
+    total_queue_wait: float = 0
+    max_queue_wait: float = 0
+    # seconds spent running the job itself
+    total_compute_time: float = 0
+    max_compute_time: float = 0
+
+    @property
+    def avg_queue_wait(self) -> float:
+        return self.total_queue_wait / max(self.num_completed, 1)
+
+    @property
+    def avg_compute_time(self) -> float:
+        return self.total_compute_time / max(self.num_completed, 1)
+
+    def record(self, queue_wait: float, compute_time: float):
+        self.num_completed += 1
+        self.total_queue_wait += queue_wait
+        self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+        self.total_compute_time += compute_time
+        self.max_compute_time = max(self.max_compute_time, compute_time)
+
+
+def _run_timed(
+    func: Callable[..., Any], *args
+) -> Tuple[float, float, Any]:
+    # wall clock timestamps are used as they are comparable
+    # across processes, unlike perf_counter readings
+    start_stamp = time.time()
+    result = func(*args)
+    return start_stamp, time.time(), result
+
+
+class TallyExecutor(object):
+    _instance = None
+    """
+    process-wide tally worker pool shared by RCVTally instances
+    the pool is created lazily on first use and lives until shutdown
+    """
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(TallyExecutor, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, config: Optional[TallyExecutorConfig] = None):
+        if hasattr(self, 'config'):
+            return
+
+        if config is None:
+            from load_config import TALLY_CONFIG
+            config = TallyExecutorConfig.from_config(TALLY_CONFIG)
+
+        self.config = config
+        self.metrics = TallyMetrics()
+        self.num_pending = 0
+        # done callbacks fire on worker / pool management threads
+        self.lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.config.use_processes
+
+    def get_executor(self) -> Executor:
+        with self.lock:
+            if self._executor is None:
+                executor_cls = (
+                    ProcessPoolExecutor if self.uses_processes
+                    else ThreadPoolExecutor
+                )
+                self._executor = executor_cls(
+                    max_workers=self.config.max_workers
+                )
+
+            return self._executor
+
+    def get_metrics(self) -> TallyMetrics:
+        with self.lock:
+            return dataclasses.replace(self.metrics)
+
+    def __on_job_done(self, submit_stamp: float, future: Future):
+        with self.lock:
+            self.num_pending -= 1
+            if future.cancelled():
+                return
+            elif future.exception() is not None:
+                self.metrics.num_failed += 1
+                return
+
+            start_stamp, end_stamp, _ = future.result()
+            self.metrics.record(
+                queue_wait=max(start_stamp - submit_stamp, 0),
+                compute_time=end_stamp - start_stamp
+            )
+
+    async def run(
+        self, func: Callable[..., Any], *args,
+        timeout: Optional[float] = None
+    ) -> Result[Any, TallyJobStatus]:
+        """
+        runs func(*args) on the tally pool
+        func and its arguments must be picklable in process mode
+        jobs that time out while still queued are cancelled, while jobs
+        that are already running finish in the background
+        """
+        if timeout is None:
+            timeout = self.config.job_timeout
+
+        executor = self.get_executor()
+        with self.lock:
+            if self.num_pending >= self.config.max_queue_size:
+                self.metrics.num_rejected += 1
+                return Err(TallyJobStatus.QUEUE_FULL)
+
+            self.num_pending += 1
+
+        submit_stamp = time.time()
+        try:
+            future = executor.submit(_run_timed, func, *args)
+        except Exception as e:
+            logger.error(f'tally job submission failed: {e}')
+            with self.lock:
+                self.num_pending -= 1
+                self.metrics.num_failed += 1
+            return Err(TallyJobStatus.FAILED)
+
+        future.add_done_callback(
+            lambda done_future: self.__on_job_done(submit_stamp, done_future)
+        )
+
+        try:
+            _, _, result = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            with self.lock:
+                self.metrics.num_timed_out += 1
+            return Err(TallyJobStatus.TIMED_OUT)
+        except Exception as e:
+            logger.error(f'tally job failed: {e}')
+            return Err(TallyJobStatus.FAILED)
+
+        return Ok(result)
+
+    def shutdown(self, wait: bool = True):
+        with self.lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
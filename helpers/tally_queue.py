@@ -0,0 +1,544 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+import uuid
+import redis
+import sqlite3
+import functools
+import threading
+import dataclasses
+
+from abc import ABCMeta, abstractmethod
+from enum import IntEnum
+from typing import List, Optional
+from redis.exceptions import WatchError
+
+"""
+persistent queue of poll tally jobs, so that winner computations
+can be run by standalone workers (see tally_worker.py) instead of
+inside the bot's update handling process
+"""
+
+
+class TallyJobState(IntEnum):
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+    def is_active(self) -> bool:
+        return self in (TallyJobState.QUEUED, TallyJobState.RUNNING)
+
+
+@dataclasses.dataclass
+class TallyJob(object):
+    job_id: str
+    poll_id: int
+    state: TallyJobState = TallyJobState.QUEUED
+    # number of times the job has been claimed by a worker
+    attempts: int = 0
+    enqueued_at: float = dataclasses.field(default_factory=time.time)
+    # retried jobs can't be claimed before this timestamp
+    available_at: float = 0
+    # running jobs are requeued if their worker hasn't finished
+    # them by this timestamp (i.e. the worker died)
+    lease_expires_at: float = 0
+    last_error: str = ''
+
+    @classmethod
+    def create(cls, poll_id: int) -> TallyJob:
+        return cls(job_id=uuid.uuid4().hex, poll_id=poll_id)
+
+    def to_json(self) -> str:
+        return json.dumps(dataclasses.asdict(self))
+
+    @classmethod
+    def from_json(cls, raw_job: str | bytes) -> TallyJob:
+        job = cls(**json.loads(raw_job))
+        job.state = TallyJobState(job.state)
+        return job
+
+
+class TallyQueue(object, metaclass=ABCMeta):
+    # number of attempts before a job is marked as failed
+    MAX_ATTEMPTS = 3
+    # retry delay of the first failed attempt, doubles every attempt
+    RETRY_BACKOFF = 5.0
+    # seconds a worker has to finish a claimed job
+    LEASE_TIMEOUT = 600.0
+    # seconds between checks for a claimable job (the redis queue
+    # blocks until a job is pushed instead, this is its minimum wait)
+    POLL_INTERVAL = 0.1
+
+    @abstractmethod
+    def enqueue(self, poll_id: int) -> TallyJob:
+        """
+        queues a tally job for the poll, or returns the poll's
+        existing job if it is still queued or running
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, timeout: float = 5) -> Optional[TallyJob]:
+        """
+        waits up to timeout seconds for a job that is ready to run,
+        and marks it as running
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[TallyJob]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_poll_job(self, poll_id: int) -> Optional[TallyJob]:
+        """
+        returns the latest job queued for the poll, if any
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def reap_expired_jobs(self) -> List[TallyJob]:
+        """
+        requeues (or fails, if they are out of attempts) running
+        jobs whose lease has expired, as their worker has died
+        :return: the reaped jobs
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _save_finished_job(self, job: TallyJob):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _requeue_job(self, job: TallyJob):
+        raise NotImplementedError
+
+    def get_retry_delay(self, attempts: int) -> float:
+        return self.RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+
+    def complete(self, job: TallyJob):
+        job.state = TallyJobState.DONE
+        self._save_finished_job(job)
+
+    def _mark_failed(self, job: TallyJob, error: str) -> bool:
+        job.last_error = error
+        job.lease_expires_at = 0
+        if job.attempts >= self.MAX_ATTEMPTS:
+            job.state = TallyJobState.FAILED
+            return False
+
+        job.state = TallyJobState.QUEUED
+        job.available_at = time.time() + self.get_retry_delay(job.attempts)
+        return True
+
+    def fail(self, job: TallyJob, error: str) -> bool:
+        """
+        retries the job after a backoff delay if it has attempts left,
+        otherwise marks it as failed
+        :return: whether the job will be retried
+        """
+        will_retry = self._mark_failed(job, error)
+        if will_retry:
+            self._requeue_job(job)
+        else:
+            self._save_finished_job(job)
+
+        return will_retry
+
+
+class RedisTallyQueue(TallyQueue):
+    PENDING_KEY = "TALLY_JOBS_PENDING"
+    # retried jobs wait here, scored by the time they become available
+    DELAYED_KEY = "TALLY_JOBS_DELAYED"
+    # claimed jobs wait here, scored by the time their lease expires
+    PROCESSING_KEY = "TALLY_JOBS_LEASED"
+    JOB_KEY = "TALLY_JOB"
+    POLL_JOB_KEY = "TALLY_POLL_JOB"
+    # how long finished job statuses are kept around for
+    FINISHED_JOB_EXPIRY = 24 * 3600
+    # pops a pending job and leases it in one step, so that jobs
+    # claimed by a worker that dies right after are still reaped
+    CLAIM_SCRIPT = """
+        local job_id = redis.call('RPOP', KEYS[1])
+        if job_id then
+            redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+        end
+        return job_id
+    """
+
+    def __init__(
+        self, client: Optional[redis.Redis] = None,
+        lease_timeout: Optional[float] = None
+    ):
+        if client is None:
+            client = redis.Redis()
+        if lease_timeout is not None:
+            self.LEASE_TIMEOUT = lease_timeout
+
+        self.client = client
+        self._claim_script = client.register_script(self.CLAIM_SCRIPT)
+
+    @staticmethod
+    def _build_key(header: str, key: str | int) -> str:
+        return f"{header}:{key}"
+
+    @staticmethod
+    def _decode(job_id: str | bytes) -> str:
+        return job_id.decode() if isinstance(job_id, bytes) else job_id
+
+    def _save_job(self, job: TallyJob, expiry: Optional[int] = None):
+        self.client.set(
+            self._build_key(self.JOB_KEY, job.job_id), job.to_json(),
+            ex=expiry
+        )
+
+    def enqueue(self, poll_id: int) -> TallyJob:
+        job = TallyJob.create(poll_id)
+        poll_job_key = self._build_key(self.POLL_JOB_KEY, poll_id)
+
+        with self.client.pipeline() as pipe:
+            while True:
+                # only one active job per poll, the poll job key points
+                # to the latest job of the poll and is watched so that
+                # the job record, the poll job key and the pending entry
+                # are written together, or not at all
+                try:
+                    pipe.watch(poll_job_key)
+                    existing_job_id = pipe.get(poll_job_key)
+                    if existing_job_id is not None:
+                        existing_job = self.get_job(
+                            self._decode(existing_job_id)
+                        )
+                        if (existing_job is not None) and (
+                            existing_job.state.is_active()
+                        ):
+                            pipe.unwatch()
+                            return existing_job
+
+                    pipe.multi()
+                    pipe.set(
+                        self._build_key(self.JOB_KEY, job.job_id),
+                        job.to_json()
+                    )
+                    pipe.set(poll_job_key, job.job_id)
+                    pipe.lpush(self.PENDING_KEY, job.job_id)
+                    pipe.execute()
+                    return job
+                except WatchError:
+                    # another process queued or replaced the poll's job
+                    continue
+
+    def _promote_delayed_jobs(self):
+        ready_job_ids = self.client.zrangebyscore(
+            self.DELAYED_KEY, 0, time.time()
+        )
+        for job_id in ready_job_ids:
+            # zrem guards against two workers promoting the same job
+            if self.client.zrem(self.DELAYED_KEY, job_id):
+                self.client.lpush(self.PENDING_KEY, job_id)
+
+    def _try_claim(self) -> Optional[TallyJob]:
+        lease_expires_at = time.time() + self.LEASE_TIMEOUT
+        job_id = self._claim_script(
+            keys=[self.PENDING_KEY, self.PROCESSING_KEY],
+            args=[lease_expires_at]
+        )
+        if job_id is None:
+            return None
+
+        job_id = self._decode(job_id)
+        job = self.get_job(job_id)
+        if job is None:
+            self.client.zrem(self.PROCESSING_KEY, job_id)
+            return None
+
+        job.state = TallyJobState.RUNNING
+        job.attempts += 1
+        job.lease_expires_at = lease_expires_at
+        self._save_job(job)
+        return job
+
+    def _get_delayed_job_wait(self) -> float:
+        # seconds until the next retried job becomes available
+        next_jobs = self.client.zrange(
+            self.DELAYED_KEY, 0, 0, withscores=True
+        )
+        if len(next_jobs) == 0:
+            return math.inf
+
+        _, available_at = next_jobs[0]
+        return max(available_at - time.time(), 0)
+
+    def claim(self, timeout: float = 5) -> Optional[TallyJob]:
+        deadline = time.time() + timeout
+        while True:
+            self._promote_delayed_jobs()
+            job = self._try_claim()
+            remaining = deadline - time.time()
+            if (job is not None) or (remaining <= 0):
+                return job
+
+            # block until a job is pushed (or a retried job is due)
+            # rather than polling. Moving the last pending job back onto
+            # the end of the list leaves the list as is, the job is then
+            # popped and leased in one step by the claim script
+            wait = min(remaining, self._get_delayed_job_wait())
+            self.client.blmove(
+                self.PENDING_KEY, self.PENDING_KEY,
+                max(wait, self.POLL_INTERVAL), src='RIGHT', dest='RIGHT'
+            )
+
+    def reap_expired_jobs(self) -> List[TallyJob]:
+        reaped_jobs = []
+        expired_job_ids = self.client.zrangebyscore(
+            self.PROCESSING_KEY, 0, time.time()
+        )
+
+        for job_id in expired_job_ids:
+            # zrem guards against two workers reaping the same job
+            if not self.client.zrem(self.PROCESSING_KEY, job_id):
+                continue
+
+            job = self.get_job(self._decode(job_id))
+            if (job is None) or not job.state.is_active():
+                continue
+
+            if job.state == TallyJobState.QUEUED:
+                # the worker died before marking the job as running
+                self.client.lpush(self.PENDING_KEY, job.job_id)
+            else:
+                self.fail(job, 'lease expired')
+
+            reaped_jobs.append(job)
+
+        return reaped_jobs
+
+    def get_job(self, job_id: str) -> Optional[TallyJob]:
+        raw_job = self.client.get(self._build_key(self.JOB_KEY, job_id))
+        if raw_job is None:
+            return None
+
+        return TallyJob.from_json(raw_job)
+
+    def get_poll_job(self, poll_id: int) -> Optional[TallyJob]:
+        job_id = self.client.get(self._build_key(self.POLL_JOB_KEY, poll_id))
+        if job_id is None:
+            return None
+
+        return self.get_job(self._decode(job_id))
+
+    def _save_finished_job(self, job: TallyJob):
+        self._save_job(job, expiry=self.FINISHED_JOB_EXPIRY)
+        poll_job_key = self._build_key(self.POLL_JOB_KEY, job.poll_id)
+        if self._decode(self.client.get(poll_job_key) or b'') == job.job_id:
+            # the poll job key only needs to outlive the job it points to
+            self.client.expire(poll_job_key, self.FINISHED_JOB_EXPIRY)
+        self.client.zrem(self.PROCESSING_KEY, job.job_id)
+
+    def _requeue_job(self, job: TallyJob):
+        self._save_job(job)
+        self.client.zadd(self.DELAYED_KEY, {job.job_id: job.available_at})
+        self.client.zrem(self.PROCESSING_KEY, job.job_id)
+
+
+class SQLiteTallyQueue(TallyQueue):
+    """
+    single host stand-in for the redis queue, used in tests and
+    for running workers on the same machine as the bot
+    """
+    def __init__(
+        self, path: str = ':memory:', lease_timeout: Optional[float] = None
+    ):
+        if lease_timeout is not None:
+            self.LEASE_TIMEOUT = lease_timeout
+
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        # guards the connection when it is shared between threads
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS tally_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    poll_id INTEGER NOT NULL,
+                    state INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    last_error TEXT NOT NULL,
+                    lease_expires_at REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            columns = [
+                row[1] for row in self.connection.execute(
+                    'PRAGMA table_info(tally_jobs)'
+                )
+            ]
+            if 'lease_expires_at' not in columns:
+                # job databases created before jobs had leases
+                self.connection.execute('''
+                    ALTER TABLE tally_jobs ADD COLUMN
+                    lease_expires_at REAL NOT NULL DEFAULT 0
+                ''')
+            self.connection.execute('''
+                CREATE INDEX IF NOT EXISTS tally_jobs_state
+                ON tally_jobs (state, available_at)
+            ''')
+
+    @staticmethod
+    def _to_job(row: Optional[tuple]) -> Optional[TallyJob]:
+        if row is None:
+            return None
+
+        job_id, poll_id, state, attempts, enqueued_at, available_at, \
+            last_error, lease_expires_at = row
+        return TallyJob(
+            job_id=job_id, poll_id=poll_id, state=TallyJobState(state),
+            attempts=attempts, enqueued_at=enqueued_at,
+            available_at=available_at, lease_expires_at=lease_expires_at,
+            last_error=last_error
+        )
+
+    def _save_job(self, job: TallyJob):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO tally_jobs '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                job.job_id, job.poll_id, int(job.state), job.attempts,
+                job.enqueued_at, job.available_at, job.last_error,
+                job.lease_expires_at
+            )
+        )
+
+    def enqueue(self, poll_id: int) -> TallyJob:
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.connection.execute('''
+                    SELECT * FROM tally_jobs
+                    WHERE poll_id = ? AND state IN (?, ?)
+                    ORDER BY enqueued_at DESC LIMIT 1
+                ''', (
+                    poll_id, int(TallyJobState.QUEUED),
+                    int(TallyJobState.RUNNING)
+                )).fetchone()
+
+                job = self._to_job(row)
+                if job is None:
+                    job = TallyJob.create(poll_id)
+                    self._save_job(job)
+            finally:
+                self.connection.execute('COMMIT')
+
+        return job
+
+    def _try_claim(self) -> Optional[TallyJob]:
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.connection.execute('''
+                    SELECT * FROM tally_jobs
+                    WHERE state = ? AND available_at <= ?
+                    ORDER BY available_at, enqueued_at LIMIT 1
+                ''', (int(TallyJobState.QUEUED), time.time())).fetchone()
+
+                job = self._to_job(row)
+                if job is not None:
+                    job.state = TallyJobState.RUNNING
+                    job.attempts += 1
+                    job.lease_expires_at = time.time() + self.LEASE_TIMEOUT
+                    self._save_job(job)
+            finally:
+                self.connection.execute('COMMIT')
+
+        return job
+
+    def claim(self, timeout: float = 5) -> Optional[TallyJob]:
+        deadline = time.time() + timeout
+        while True:
+            job = self._try_claim()
+            if (job is not None) or (time.time() >= deadline):
+                return job
+
+            time.sleep(self.POLL_INTERVAL)
+
+    def reap_expired_jobs(self) -> List[TallyJob]:
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.connection.execute('''
+                    SELECT * FROM tally_jobs
+                    WHERE state = ? AND lease_expires_at <= ?
+                ''', (int(TallyJobState.RUNNING), time.time())).fetchall()
+
+                reaped_jobs = [self._to_job(row) for row in rows]
+                for job in reaped_jobs:
+                    self._mark_failed(job, 'lease expired')
+                    self._save_job(job)
+            finally:
+                self.connection.execute('COMMIT')
+
+        return reaped_jobs
+
+    def get_job(self, job_id: str) -> Optional[TallyJob]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT * FROM tally_jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+
+        return self._to_job(row)
+
+    def get_poll_job(self, poll_id: int) -> Optional[TallyJob]:
+        with self.lock:
+            row = self.connection.execute('''
+                SELECT * FROM tally_jobs WHERE poll_id = ?
+                ORDER BY enqueued_at DESC LIMIT 1
+            ''', (poll_id,)).fetchone()
+
+        return self._to_job(row)
+
+    def _save_finished_job(self, job: TallyJob):
+        with self.lock:
+            self._save_job(job)
+
+    def _requeue_job(self, job: TallyJob):
+        with self.lock:
+            self._save_job(job)
+
+
+def create_tally_queue(config: Optional[dict]) -> Optional[TallyQueue]:
+    """
+    builds the tally queue configured under tally.queue_backend
+    :return: None if tallies are run inside the bot process
+    """
+    config = config or {}
+    backend = config.get('queue_backend') or ''
+    lease_timeout = config.get('lease_timeout')
+    if lease_timeout is not None:
+        lease_timeout = float(lease_timeout)
+
+    if backend == '':
+        return None
+    elif backend == 'redis':
+        return RedisTallyQueue(redis.Redis.from_url(
+            config.get('redis_url', 'redis://localhost:6379')
+        ), lease_timeout=lease_timeout)
+    elif backend == 'sqlite':
+        return SQLiteTallyQueue(
+            config.get('sqlite_path', 'tally_jobs.db'),
+            lease_timeout=lease_timeout
+        )
+    else:
+        raise ValueError(f'Invalid tally queue backend: {backend}')
+
+
+@functools.cache
+def get_tally_queue() -> Optional[TallyQueue]:
+    """
+    process-wide tally queue built from the tally section of config.yml
+    """
+    from load_config import TALLY_CONFIG
+    return create_tally_queue(TALLY_CONFIG)
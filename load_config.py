@@ -11,6 +11,10 @@ SUDO_TELE_ID: int = TELE_CONFIG['sudo_id']
 SETTINGS = YAML_CONFIG['settings']
 PRODUCTION_MODE = bool(SETTINGS['production'])
 CORS_ORIGINS = YAML_CONFIG['webapp']['cors_origins']
+# tally worker pool settings, defaults are used for missing keys
+TALLY_CONFIG = YAML_CONFIG.get('tally') or {}
+# users_middleware cache settings, defaults are used for missing keys
+USERS_CACHE_CONFIG = YAML_CONFIG.get('users_cache') or {}
 
 # print('CORS_ORIGINS =', CORS_ORIGINS)
 # print('PRODUCTION_MODE =', PRODUCTION_MODE)
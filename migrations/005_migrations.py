@@ -0,0 +1,97 @@
+"""Peewee migrations -- 005_migrations.py.
+
+Some examples (model - class or model name)::
+
+    > Model = migrator.orm['table_name']            # Return model in current state by name
+    > Model = migrator.ModelClass                   # Return model in current state by name
+
+    > migrator.sql(sql)                             # Run custom SQL
+    > migrator.run(func, *args, **kwargs)           # Run python function with the given args
+    > migrator.create_model(Model)                  # Create a model (could be used as decorator)
+    > migrator.remove_model(model, cascade=True)    # Remove a model
+    > migrator.add_fields(model, **fields)          # Add fields to a model
+    > migrator.change_fields(model, **fields)       # Change fields
+    > migrator.remove_fields(model, *field_names, cascade=True)
+    > migrator.rename_field(model, old_field_name, new_field_name)
+    > migrator.rename_table(model, new_table_name)
+    > migrator.add_index(model, *col_names, unique=False)
+    > migrator.add_not_null(model, *field_names)
+    > migrator.add_default(model, field_name, default)
+    > migrator.add_constraint(model, name, sql)
+    > migrator.drop_index(model, *col_names)
+    > migrator.drop_not_null(model, *field_names)
+    > migrator.drop_constraints(model, *constraints)
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+def backfill_pairwise_counts(database: pw.Database):
+    # counts every ordered pair of options of every poll in one
+    # INSERT ... SELECT, so that no ballots are read into memory.
+    # A voter prefers winner over loser if winner is ranked (before
+    # any special vote) and loser is either ranked after it or left
+    # unranked, as in helpers.pairwise_matrix.iter_ballot_pairs
+    ranked_options = '''
+        SELECT voterankings.poll_voter_id, voterankings.option_id,
+        voterankings.ranking
+        FROM voterankings INNER JOIN pollvoters
+        ON pollvoters.id = voterankings.poll_voter_id
+        WHERE voterankings.option_id IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM voterankings AS special_ranking
+            WHERE special_ranking.poll_voter_id = voterankings.poll_voter_id
+            AND special_ranking.special_value IS NOT NULL
+            AND special_ranking.ranking < voterankings.ranking
+        )
+    '''
+    database.execute_sql(f'''
+        INSERT INTO pollpairwisecounts (poll_id, winner_id, loser_id, count)
+        SELECT winner.poll_id, winner.id, loser.id, SUM(CASE
+            WHEN ranked_winner.poll_voter_id IS NULL THEN 0
+            WHEN ranked_loser.poll_voter_id IS NULL THEN 1
+            WHEN ranked_winner.ranking < ranked_loser.ranking THEN 1
+            ELSE 0
+        END)
+        FROM polloptions AS winner
+        INNER JOIN polloptions AS loser
+        ON loser.poll_id = winner.poll_id AND loser.id != winner.id
+        LEFT JOIN ({ranked_options}) AS ranked_winner
+        ON ranked_winner.option_id = winner.id
+        LEFT JOIN ({ranked_options}) AS ranked_loser
+        ON ranked_loser.option_id = loser.id
+        AND ranked_loser.poll_voter_id = ranked_winner.poll_voter_id
+        GROUP BY winner.poll_id, winner.id, loser.id
+    ''')
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    @migrator.create_model
+    class PollPairwiseCounts(pw.Model):
+        id = pw.AutoField()
+        poll = pw.ForeignKeyField(column_name='poll_id', field='id', model=migrator.orm['polls'], on_delete='CASCADE')
+        winner = pw.ForeignKeyField(column_name='winner_id', field='id', model=migrator.orm['polloptions'], on_delete='CASCADE')
+        loser = pw.ForeignKeyField(column_name='loser_id', field='id', model=migrator.orm['polloptions'], on_delete='CASCADE')
+        count = pw.IntegerField(default=0)
+
+        class Meta:
+            table_name = "pollpairwisecounts"
+            indexes = [(('poll', 'winner', 'loser'), True)]
+
+    if not fake:
+        migrator.run(backfill_pairwise_counts, database)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.remove_model('pollpairwisecounts')
@@ -0,0 +1,131 @@
+"""Peewee migrations -- 006_migrations.py.
+
+Some examples (model - class or model name)::
+
+    > Model = migrator.orm['table_name']            # Return model in current state by name
+    > Model = migrator.ModelClass                   # Return model in current state by name
+
+    > migrator.sql(sql)                             # Run custom SQL
+    > migrator.run(func, *args, **kwargs)           # Run python function with the given args
+    > migrator.create_model(Model)                  # Create a model (could be used as decorator)
+    > migrator.remove_model(model, cascade=True)    # Remove a model
+    > migrator.add_fields(model, **fields)          # Add fields to a model
+    > migrator.change_fields(model, **fields)       # Change fields
+    > migrator.remove_fields(model, *field_names, cascade=True)
+    > migrator.rename_field(model, old_field_name, new_field_name)
+    > migrator.rename_table(model, new_table_name)
+    > migrator.add_index(model, *col_names, unique=False)
+    > migrator.add_not_null(model, *field_names)
+    > migrator.add_default(model, field_name, default)
+    > migrator.add_constraint(model, name, sql)
+    > migrator.drop_index(model, *col_names)
+    > migrator.drop_not_null(model, *field_names)
+    > migrator.drop_constraints(model, *constraints)
+
+"""
+
+import sys
+import itertools
+
+from array import array
+from contextlib import suppress
+from typing import Iterable, Iterator, Sequence
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+# number of ballots inserted per statement during the backfill
+BACKFILL_BATCH_SIZE = 1000
+
+
+def pack_ballot(ballot: Sequence[int]) -> bytes:
+    # ballot encoding at the time of this migration (little-endian
+    # int32s, as VoteBallots.pack_ballot), kept here so that the
+    # migration doesn't depend on the current models
+    packed_ballot = array('i', ballot)
+    if sys.byteorder == 'big':
+        packed_ballot.byteswap()
+
+    return packed_ballot.tobytes()
+
+
+def iter_poll_ballots(
+    database: pw.Database, poll_id: int
+) -> Iterator[tuple[int, list[int]]]:
+    # (poll_voter_id, ballot) of every voter of the poll that has voted
+    rankings: Iterable[tuple[int, int, int]] = database.execute_sql(f'''
+        SELECT voterankings.poll_voter_id, voterankings.option_id,
+        voterankings.special_value
+        FROM voterankings INNER JOIN pollvoters
+        ON pollvoters.id = voterankings.poll_voter_id
+        WHERE pollvoters.poll_id = {database.param}
+        ORDER BY voterankings.poll_voter_id, voterankings.ranking
+    ''', (poll_id,))
+
+    for poll_voter_id, voter_rankings in itertools.groupby(
+        rankings, key=lambda ranking: ranking[0]
+    ):
+        yield poll_voter_id, [
+            option_id if option_id is not None else special_value
+            for _, option_id, special_value in voter_rankings
+        ]
+
+
+def insert_ballots(
+    database: pw.Database, rows: list[tuple[int, int, bytes]]
+):
+    param = database.param
+    placeholders = ', '.join([f'({param}, {param}, {param})'] * len(rows))
+    database.execute_sql(
+        'INSERT INTO voteballots (poll_id, poll_voter_id, rankings) '
+        f'VALUES {placeholders}',
+        [value for row in rows for value in row]
+    )
+
+
+def backfill_vote_ballots(database: pw.Database):
+    # VoteRankings rows are kept for the dual read period, and can be
+    # dropped once READ_LEGACY_VOTE_RANKINGS has been turned off
+    # ballots are read one poll at a time, so that only a single
+    # poll's rankings are held in memory
+    poll_ids = [
+        poll_id for (poll_id,) in
+        database.execute_sql('SELECT id FROM polls ORDER BY id')
+    ]
+    for poll_id in poll_ids:
+        rows: list[tuple[int, int, bytes]] = []
+        for poll_voter_id, ballot in iter_poll_ballots(database, poll_id):
+            rows.append((poll_id, poll_voter_id, pack_ballot(ballot)))
+            if len(rows) == BACKFILL_BATCH_SIZE:
+                insert_ballots(database, rows)
+                rows = []
+
+        if len(rows) > 0:
+            insert_ballots(database, rows)
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    @migrator.create_model
+    class VoteBallots(pw.Model):
+        id = pw.AutoField()
+        poll = pw.ForeignKeyField(column_name='poll_id', field='id', model=migrator.orm['polls'], on_delete='CASCADE')
+        poll_voter = pw.ForeignKeyField(column_name='poll_voter_id', field='id', model=migrator.orm['pollvoters'], on_delete='CASCADE', unique=True)
+        rankings = pw.BlobField()
+
+        class Meta:
+            table_name = "voteballots"
+
+    if not fake:
+        migrator.run(backfill_vote_ballots, database)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.remove_model('voteballots')
@@ -0,0 +1,80 @@
+"""Peewee migrations -- 008_migrations.py.
+
+Some examples (model - class or model name)::
+
+    > Model = migrator.orm['table_name']            # Return model in current state by name
+    > Model = migrator.ModelClass                   # Return model in current state by name
+
+    > migrator.sql(sql)                             # Run custom SQL
+    > migrator.run(func, *args, **kwargs)           # Run python function with the given args
+    > migrator.create_model(Model)                  # Create a model (could be used as decorator)
+    > migrator.remove_model(model, cascade=True)    # Remove a model
+    > migrator.add_fields(model, **fields)          # Add fields to a model
+    > migrator.change_fields(model, **fields)       # Change fields
+    > migrator.remove_fields(model, *field_names, cascade=True)
+    > migrator.rename_field(model, old_field_name, new_field_name)
+    > migrator.rename_table(model, new_table_name)
+    > migrator.add_index(model, *col_names, unique=False)
+    > migrator.add_not_null(model, *field_names)
+    > migrator.add_default(model, field_name, default)
+    > migrator.add_constraint(model, name, sql)
+    > migrator.drop_index(model, *col_names)
+    > migrator.drop_not_null(model, *field_names)
+    > migrator.drop_constraints(model, *constraints)
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+# the unique context indexes were declared outside of Meta, so they
+# were never created and duplicate rows may exist. Only the latest
+# row of each pair is kept, which is the one that was last saved
+# (the derived table is needed as MySQL can't select from the
+# table it deletes from)
+DEDUPLICATE_CONTEXTS_SQL = """
+    DELETE FROM {table_name} WHERE id NOT IN (
+        SELECT id FROM (
+            SELECT MAX(id) AS id FROM {table_name}
+            GROUP BY user_id, {column_name}
+        ) AS latest_contexts
+    )
+"""
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    if not fake:
+        migrator.sql(DEDUPLICATE_CONTEXTS_SQL.format(
+            table_name='callbackcontextstate', column_name='chat_id'
+        ))
+        migrator.sql(DEDUPLICATE_CONTEXTS_SQL.format(
+            table_name='messagecontextstate', column_name='message_id'
+        ))
+
+    migrator.add_index('callbackcontextstate', 'user', 'chat_id', unique=True)
+    migrator.add_index('callbackcontextstate', 'last_updated_at')
+    migrator.add_index('messagecontextstate', 'user', 'message_id', unique=True)
+    migrator.add_index('messagecontextstate', 'last_updated_at')
+    migrator.add_index('voterankings', 'poll_voter', 'ranking')
+    migrator.add_index('polloptions', 'poll', 'option_number')
+    migrator.add_index('payments', 'paid', 'created_at')
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.drop_index('payments', 'paid', 'created_at')
+    migrator.drop_index('polloptions', 'poll', 'option_number')
+    migrator.drop_index('voterankings', 'poll_voter', 'ranking')
+    migrator.drop_index('messagecontextstate', 'last_updated_at')
+    migrator.drop_index('messagecontextstate', 'user', 'message_id')
+    migrator.drop_index('callbackcontextstate', 'last_updated_at')
+    migrator.drop_index('callbackcontextstate', 'user', 'chat_id')
@@ -12,13 +12,47 @@ class ValidateVoteResult:
     def error_message(self) -> builtins.str: ...
     def to_tuple(self) -> tuple: ...
 
+class RoundCounts:
+    @property
+    def first_preferences(self) -> builtins.dict[builtins.int, builtins.int]: ...
+    @property
+    def withheld(self) -> builtins.int: ...
+    @property
+    def abstained(self) -> builtins.int: ...
+    @property
+    def exhausted(self) -> builtins.int: ...
+
+class ShardedBallots:
+    def __new__(cls, values:typing.Any, offsets:typing.Any, counts:typing.Optional[typing.Any]=None, num_shards:typing.Optional[builtins.int]=None) -> ShardedBallots: ...
+    def get_num_shards(self) -> builtins.int: ...
+    def count_round(self, remaining:typing.Sequence[builtins.int]) -> RoundCounts: ...
+    def count_transfers(self, eliminated:typing.Sequence[builtins.int], remaining:typing.Sequence[builtins.int]) -> builtins.dict[builtins.int, builtins.dict[builtins.int, builtins.int]]: ...
+
+class TallyResult:
+    @property
+    def winner(self) -> typing.Optional[builtins.int]: ...
+    @property
+    def valid(self) -> builtins.bool: ...
+    @property
+    def error_message(self) -> builtins.str: ...
+
+class TallyTask:
+    def __new__(cls, values:typing.Any, offsets:typing.Any, num_empty_votes:builtins.int, elimination_strategy:PyEliminationStrategies, counts:typing.Optional[typing.Any]=None) -> TallyTask: ...
+
 class VotesCounter:
-    def __new__(cls, elimination_strategy:PyEliminationStrategies=PyEliminationStrategies.DowdallScoring) -> VotesCounter: ...
+    def __new__(cls, elimination_strategy:PyEliminationStrategies=PyEliminationStrategies.DowdallScoring, candidates:typing.Optional[typing.Sequence[builtins.int]]=None, record_ballots:builtins.bool=False) -> VotesCounter: ...
+    def set_elimination_strategy(self, elimination_strategy:PyEliminationStrategies) -> None: ...
+    def to_bytes(self) -> builtins.bytes: ...
+    @staticmethod
+    def from_bytes(raw_counter:builtins.bytes) -> VotesCounter: ...
+    def __reduce__(self) -> tuple[typing.Any, tuple[builtins.bytes]]: ...
     def flush_votes(self) -> builtins.bool: ...
     def get_num_votes(self) -> builtins.int: ...
     @staticmethod
     def validate_raw_vote(rankings:typing.Sequence[builtins.int]) -> ValidateVoteResult: ...
     def insert_vote_ranking(self, vote_id:builtins.int, vote_ranking:builtins.int) -> None: ...
+    def insert_ballot(self, ranking:typing.Sequence[builtins.int], count:builtins.int) -> None: ...
+    def insert_ballots(self, values:typing.Any, offsets:typing.Any) -> builtins.int: ...
     def insert_empty_votes(self, num_votes:builtins.int) -> builtins.bool: ...
     def determine_winner(self) -> typing.Optional[builtins.int]: ...
 
@@ -45,3 +79,4 @@ class PySpecialVotes(Enum):
     WITHHOLD = ...
     ABSTAIN = ...
 
+def determine_winners(tasks:typing.Sequence[TallyTask], num_threads:typing.Optional[builtins.int]=None) -> builtins.list[TallyResult]: ...
@@ -7,5 +7,12 @@ pub mod rcv_interface;
 fn py_rcv(module: &Bound<'_, PyModule>) -> PyResult<()> {
     module.add_class::<VotesCounter>()?;
     module.add_class::<rcv_interface::strategies::PyEliminationStrategies>()?;
+    module.add_class::<rcv_interface::batch::TallyTask>()?;
+    module.add_class::<rcv_interface::batch::TallyResult>()?;
+    module.add_class::<rcv_interface::sharded::ShardedBallots>()?;
+    module.add_class::<rcv_interface::sharded::RoundCounts>()?;
+    module.add_function(wrap_pyfunction!(
+        rcv_interface::batch::determine_winners, module
+    )?)?;
     Ok(())
 }
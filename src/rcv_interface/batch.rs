@@ -0,0 +1,145 @@
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use pyo3_stub_gen::derive::{
+    gen_stub_pyclass, gen_stub_pyfunction, gen_stub_pymethods
+};
+use rayon::prelude::*;
+use trie_rcv::VoteErrors;
+use crate::rcv_interface::{ShowErrorMessage, VotesCounter, WITHOLD_VOTE_VAL};
+use crate::rcv_interface::candidates::CandidatesMapper;
+use crate::rcv_interface::strategies::PyEliminationStrategies;
+
+#[gen_stub_pyclass]
+#[pyclass(frozen)]
+pub struct TallyTask {
+    // ballot k is values[offsets[k]..offsets[k+1]]
+    values: Vec<i32>,
+    offsets: Vec<i64>,
+    // copies cast of each ballot, empty if every ballot is cast once
+    counts: Vec<i64>,
+    num_empty_votes: u64,
+    elimination_strategy: PyEliminationStrategies
+}
+impl TallyTask {
+    fn tally(&self) -> Result<Option<u32>, VoteErrors> {
+        // every candidate is known upfront, so they're always remapped
+        let mut votes_counter = VotesCounter::_new(
+            self.elimination_strategy,
+            Some(CandidatesMapper::from_ballots(&self.values)), false
+        );
+        if self.counts.is_empty() {
+            votes_counter._insert_ballots(&self.values, &self.offsets)?;
+        } else {
+            for (bounds, count) in self.offsets.windows(2).zip(&self.counts) {
+                let ballot = self.values[
+                    bounds[0] as usize..bounds[1] as usize
+                ].to_vec();
+                votes_counter._insert_ballot(&ballot, *count as u64)?;
+            }
+        }
+        votes_counter._insert_ballot(
+            &vec![WITHOLD_VOTE_VAL], self.num_empty_votes
+        )?;
+        votes_counter._determine_winner()
+    }
+}
+#[gen_stub_pymethods]
+#[pymethods]
+impl TallyTask {
+    #[new]
+    #[pyo3(signature = (
+        values, offsets, num_empty_votes, elimination_strategy, counts = None
+    ))]
+    fn new(
+        py: Python<'_>, values: &Bound<'_, PyAny>, offsets: &Bound<'_, PyAny>,
+        num_empty_votes: u64, elimination_strategy: PyEliminationStrategies,
+        counts: Option<&Bound<'_, PyAny>>
+    ) -> PyResult<Self> {
+        // buffers are copied here while the GIL is held, so that the
+        // task can be tallied on any thread once the GIL is released
+        let values = PyBuffer::<i32>::get(values)?.to_vec(py)?;
+        let offsets = PyBuffer::<i64>::get(offsets)?.to_vec(py)?;
+        VotesCounter::validate_offsets(&offsets, values.len())?;
+
+        let counts = match counts {
+            Some(counts) => PyBuffer::<i64>::get(counts)?.to_vec(py)?,
+            None => vec![]
+        };
+        if !counts.is_empty() && counts.len() != offsets.len() - 1 {
+            return Err(PyValueError::new_err(
+                "counts must have one entry per ballot"
+            ))
+        }
+        if counts.iter().any(|count| *count < 0) {
+            return Err(PyValueError::new_err("counts must be non-negative"))
+        }
+
+        Ok(TallyTask {
+            values, offsets, counts, num_empty_votes, elimination_strategy
+        })
+    }
+}
+
+#[gen_stub_pyclass]
+#[pyclass]
+pub struct TallyResult {
+    winner: Option<u32>,
+    valid: bool,
+    error_message: String
+}
+impl TallyResult {
+    fn new(tally_result: Result<Option<u32>, VoteErrors>) -> Self {
+        match tally_result {
+            Ok(winner) => TallyResult {
+                winner, valid: true, error_message: "".to_string()
+            },
+            Err(err) => TallyResult {
+                winner: None, valid: false,
+                error_message: err.to_error_message()
+            }
+        }
+    }
+}
+#[gen_stub_pymethods]
+#[pymethods]
+impl TallyResult {
+    #[getter]
+    fn get_winner(&self) -> PyResult<Option<u32>> {
+        Ok(self.winner)
+    }
+    #[getter]
+    fn get_valid(&self) -> PyResult<bool> {
+        Ok(self.valid)
+    }
+    #[getter]
+    fn get_error_message(&self) -> PyResult<String> {
+        Ok(self.error_message.clone())
+    }
+}
+
+#[gen_stub_pyfunction]
+#[pyfunction]
+#[pyo3(signature = (tasks, num_threads = None))]
+pub fn determine_winners(
+    py: Python<'_>, tasks: Vec<Py<TallyTask>>, num_threads: Option<usize>
+) -> PyResult<Vec<TallyResult>> {
+    // tallies every task in parallel with the GIL released, and
+    // returns the results in the same order as the tasks
+    let tally_all = || -> Vec<TallyResult> {
+        tasks.par_iter().map(
+            |task| TallyResult::new(task.get().tally())
+        ).collect()
+    };
+
+    match num_threads {
+        // rayon's global pool has one thread per core
+        None => Ok(py.detach(tally_all)),
+        Some(num_threads) => {
+            let pool = rayon::ThreadPoolBuilder::new()
+                .num_threads(num_threads).build()
+                .map_err(|err| PyValueError::new_err(err.to_string()))?;
+            Ok(py.detach(|| pool.install(tally_all)))
+        }
+    }
+}
@@ -0,0 +1,61 @@
+use std::collections::HashMap;
+use trie_rcv::VoteErrors;
+
+// PollOptions ids are global auto-increment ints, so they grow without
+// bound across polls. CandidatesMapper maps a poll's option ids to the
+// dense candidates 1..=M (0 is left unused, as it isn't a valid
+// candidate) before they reach the trie, and maps winners back.
+// Option ids are mapped in ascending order, so comparisons between
+// candidates (e.g. in tie-breaks) are the same as between option ids
+#[derive(Clone, Debug, Default)]
+pub struct CandidatesMapper {
+    candidates_map: HashMap<i32, i32>,
+    // rev_candidates[k - 1] is the option id mapped to candidate k
+    rev_candidates: Vec<i32>
+}
+impl CandidatesMapper {
+    pub fn new(candidates: &[i32]) -> Result<Self, VoteErrors> {
+        if candidates.iter().any(|candidate| *candidate <= 0) {
+            return Err(VoteErrors::InvalidCastToCandidate)
+        }
+        let mut rev_candidates = candidates.to_vec();
+        rev_candidates.sort_unstable();
+        rev_candidates.dedup();
+
+        let candidates_map = rev_candidates.iter().enumerate().map(
+            |(index, candidate)| (*candidate, index as i32 + 1)
+        ).collect();
+        Ok(CandidatesMapper { candidates_map, rev_candidates })
+    }
+    pub fn from_ballots(values: &[i32]) -> Self {
+        // every candidate ranked in the ballots
+        // (negative values are special votes)
+        let candidates: Vec<i32> = values.iter().copied().filter(
+            |value| *value > 0
+        ).collect();
+        CandidatesMapper::new(&candidates).unwrap()
+    }
+    pub fn get_candidates(&self) -> &[i32] {
+        &self.rev_candidates
+    }
+    pub fn get_num_candidates(&self) -> usize {
+        self.rev_candidates.len()
+    }
+    pub fn map_candidate(&self, candidate: i32) -> Result<i32, VoteErrors> {
+        if candidate < 0 {
+            // special votes are passed through as is
+            return Ok(candidate)
+        }
+        match self.candidates_map.get(&candidate) {
+            Some(raw_candidate) => Ok(*raw_candidate),
+            None => Err(VoteErrors::InvalidCastToCandidate)
+        }
+    }
+    pub fn map_ballot(&self, ballot: &[i32]) -> Result<Vec<i32>, VoteErrors> {
+        ballot.iter().map(|value| self.map_candidate(*value)).collect()
+    }
+    pub fn resolve_candidate(&self, raw_candidate: u32) -> Option<u32> {
+        let index = (raw_candidate as usize).checked_sub(1)?;
+        self.rev_candidates.get(index).map(|candidate| *candidate as u32)
+    }
+}
@@ -1,10 +1,15 @@
 pub mod strategies;
+pub mod batch;
+pub mod sharded;
+pub mod serialization;
+pub mod candidates;
 
+use std::borrow::Cow;
 use std::collections::HashMap;
-use std::hash::Hash;
+use pyo3::buffer::{Element, PyBuffer};
 use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
-use pyo3::types::{PyTuple};
+use pyo3::types::{PyBytes, PyTuple};
 use pyo3_stub_gen::{
     derive::gen_stub_pymethods, derive::gen_stub_pyclass,
     define_stub_info_gatherer
@@ -15,6 +20,11 @@ use trie_rcv::{
     RankedVote, SpecialVotes, VoteErrors
 };
 use crate::rcv_interface::strategies::PyEliminationStrategies;
+use crate::rcv_interface::candidates::CandidatesMapper;
+use crate::rcv_interface::serialization::{
+    ByteReader, ByteWriter, CRATE_VERSION,
+    SERIALIZED_FORMAT_VERSION, SERIALIZED_MAGIC
+};
 
 const WITHOLD_VOTE_VAL: i32 = SpecialVotes::WITHHOLD.to_int();
 
@@ -93,63 +103,376 @@ impl PySpecialVotes {
     }
 }
 
-// mysql int datatype is i32, but RCV vote candidates are cast to u32
-// TODO: implement vote mapping
-trait CandidatesMapper<T: Eq + Hash> {
-    fn get_candidates_map(&self) -> &HashMap<T, u32>;
-    fn get_mut_candidates_map(&mut self) -> &mut HashMap<T, u32>;
-    fn get_rev_candidates_map(&self) -> &HashMap<u32, T>;
-    fn get_rev_mut_candidates_map(&mut self) -> &mut HashMap<u32, T>;
-    // fn get_votes_cache(&self) 
-
-    fn resolve_to_raw_candidate(candidate: T) -> u32;
-    fn resolve_from_raw_candidate(raw_candidate: u32) -> Option<T>;
-    // fn insert_candidate_to
-}
-
 #[gen_stub_pyclass]
 #[pyclass]
 pub struct VotesCounter {
     raw_votes_cache: HashMap<u64, Vec<i32>>,
-    rcv: RankedChoiceVoteTrie
+    rcv: RankedChoiceVoteTrie,
+    elimination_strategy: PyEliminationStrategies,
+    // every ballot inserted and the number of times it was inserted,
+    // which is what the counter is serialized as. Only kept if
+    // record_ballots is set, as it copies every distinct ballot
+    ballot_counts: Option<HashMap<Vec<i32>, u64>>,
+    // validated ballots (keyed by their ranking) that haven't been
+    // inserted into the trie yet, and the number of times each was
+    // cast. trie_rcv has no weighted insert, so counts are kept out
+    // of the trie until the counter is flushed or counted
+    unbuilt_ballots: HashMap<Vec<i32>, (RankedVote, u64)>,
+    // maps option ids to dense candidates in the trie, if set
+    candidates_mapper: Option<CandidatesMapper>
 }
 impl VotesCounter {
+    fn _new(
+        elimination_strategy: PyEliminationStrategies,
+        candidates_mapper: Option<CandidatesMapper>, record_ballots: bool
+    ) -> Self {
+        let strategy = elimination_strategy._to_strategy();
+        let mut rcv = RankedChoiceVoteTrie::new();
+        rcv.set_elimination_strategy(strategy);
+        let ballot_counts = match record_ballots {
+            true => Some(HashMap::new()),
+            false => None
+        };
+
+        VotesCounter {
+            raw_votes_cache: Default::default(), rcv,
+            elimination_strategy, ballot_counts,
+            unbuilt_ballots: Default::default(), candidates_mapper
+        }
+    }
+    fn _record_ballot(&mut self, ranking: &[i32], count: u64) {
+        if let Some(ballot_counts) = &mut self.ballot_counts {
+            if count > 0 {
+                *ballot_counts.entry(ranking.to_vec()).or_insert(0) += count;
+            }
+        }
+    }
+    fn _add_unbuilt_ballot(
+        &mut self, ranking: &[i32], ranked_vote: RankedVote, count: u64
+    ) {
+        if count > 0 {
+            self.unbuilt_ballots.entry(ranking.to_vec()).or_insert(
+                (ranked_vote, 0)
+            ).1 += count;
+        }
+    }
+    fn _map_ranking(&self, ranking: &[i32]) -> Result<Vec<i32>, VoteErrors> {
+        match &self.candidates_mapper {
+            Some(mapper) => mapper.map_ballot(ranking),
+            None => Ok(ranking.to_vec())
+        }
+    }
+    fn _cast_ballot(&self, ranking: &[i32]) -> Result<RankedVote, VoteErrors> {
+        // validates the ballot, with option ids mapped to dense candidates
+        RankedVote::from_vector(&self._map_ranking(ranking)?)
+    }
     fn _flush_votes(&mut self) -> Result<bool, VoteErrors> {
-        // convert raw votes into RankedVotes into the trie
-        let mut raw_votes_inserted = false;
-        for (_, raw_vote) in &self.raw_votes_cache {
-            let cast_result = RankedVote::from_vector(raw_vote)?;
-            self.rcv.insert_vote(cast_result);
-            raw_votes_inserted = true
-        }
-        self.raw_votes_cache.clear();
+        // convert raw votes into RankedVotes into the trie, every raw
+        // vote is validated before any of them is inserted, so that an
+        // invalid vote leaves the trie (and the raw votes) untouched
+        let cast_votes = self.raw_votes_cache.values().map(
+            |raw_vote| self._cast_ballot(raw_vote)
+        ).collect::<Result<Vec<RankedVote>, VoteErrors>>()?;
+
+        let raw_votes_inserted = !cast_votes.is_empty();
+        for ranked_vote in cast_votes {
+            self.rcv.insert_vote(ranked_vote);
+        }
+        for (_, raw_vote) in std::mem::take(&mut self.raw_votes_cache) {
+            self._record_ballot(&raw_vote, 1);
+        }
         Ok(raw_votes_inserted)
     }
+    fn _build_trie(&mut self) -> Result<bool, VoteErrors> {
+        // flushes raw votes, and inserts the counted ballots into the
+        // trie. Copies of a ballot are only inserted here, once
+        let mut votes_inserted = self._flush_votes()?;
+        let unbuilt_ballots = std::mem::take(&mut self.unbuilt_ballots);
+        for (_, (ranked_vote, count)) in unbuilt_ballots {
+            for _ in 0..count {
+                self.rcv.insert_vote(ranked_vote.clone());
+            }
+            votes_inserted = true;
+        }
+        Ok(votes_inserted)
+    }
+    fn _load_ballots(
+        &mut self, ballot_counts: Vec<(Vec<i32>, u64)>
+    ) -> Result<(), VoteErrors> {
+        // validates (and maps) every serialized ballot, but leaves
+        // inserting them into the trie to _build_trie
+        let cast_votes = ballot_counts.iter().map(
+            |(ballot, _)| self._cast_ballot(ballot)
+        ).collect::<Result<Vec<RankedVote>, VoteErrors>>()?;
+
+        for ((ballot, count), ranked_vote) in ballot_counts.iter().zip(
+            cast_votes
+        ) {
+            self._add_unbuilt_ballot(ballot, ranked_vote, *count);
+            self._record_ballot(ballot, *count);
+        }
+        Ok(())
+    }
+    fn _insert_ballot(
+        &mut self, ranking: &[i32], count: u64
+    ) -> Result<(), VoteErrors> {
+        // validate (and map) the ballot once, even if it isn't inserted
+        // the count is only applied when the trie is built, so that
+        // repeated inserts of a ballot just add up its count
+        let ranked_vote = self._cast_ballot(ranking)?;
+        self._add_unbuilt_ballot(ranking, ranked_vote, count);
+        self._record_ballot(ranking, count);
+        Ok(())
+    }
+    fn _insert_ballots(
+        &mut self, values: &[i32], offsets: &[i64]
+    ) -> Result<u64, VoteErrors> {
+        // ballot k is values[offsets[k]..offsets[k+1]], the whole
+        // buffer is validated (and mapped) before any ballot is
+        // inserted, so that an invalid ballot leaves the trie untouched
+        let ballots: Vec<&[i32]> = offsets.windows(2).map(
+            |bounds| &values[bounds[0] as usize..bounds[1] as usize]
+        ).collect();
+        let cast_votes = ballots.iter().map(
+            |ballot| self._cast_ballot(ballot)
+        ).collect::<Result<Vec<RankedVote>, VoteErrors>>()?;
+
+        for ranked_vote in cast_votes {
+            self.rcv.insert_vote(ranked_vote);
+        }
+        for ballot in &ballots {
+            self._record_ballot(ballot, 1);
+        }
+        Ok(ballots.len() as u64)
+    }
+    fn read_buffer<'a, T: Element>(
+        py: Python<'_>, buffer: &'a PyBuffer<T>
+    ) -> PyResult<Cow<'a, [T]>> {
+        // borrows contiguous buffers in place rather than copying them,
+        // the export keeps the memory alive (and e.g. an array from
+        // being resized) until the PyBuffer is dropped
+        if buffer.item_count() == 0 {
+            return Ok(Cow::Owned(vec![]))
+        }
+        if !buffer.is_c_contiguous() {
+            return Ok(Cow::Owned(buffer.to_vec(py)?))
+        }
+        let items = unsafe {
+            std::slice::from_raw_parts(
+                buffer.buf_ptr() as *const T, buffer.item_count()
+            )
+        };
+        Ok(Cow::Borrowed(items))
+    }
+    fn validate_offsets(offsets: &[i64], num_values: usize) -> PyResult<()> {
+        if offsets.is_empty() || offsets[0] != 0 {
+            return Err(PyValueError::new_err("offsets must start at 0"))
+        }
+        if offsets.windows(2).any(|bounds| bounds[0] > bounds[1]) {
+            return Err(PyValueError::new_err("offsets must be non-decreasing"))
+        }
+        if offsets[offsets.len() - 1] as usize != num_values {
+            return Err(PyValueError::new_err(
+                "last offset must equal the number of values"
+            ))
+        }
+        Ok(())
+    }
+    fn _determine_winner(&mut self) -> Result<Option<u32>, VoteErrors> {
+        // winner's option id (mapped back from its dense candidate)
+        self._build_trie()?;
+        let winner = self.rcv.determine_winner();
+        match &self.candidates_mapper {
+            Some(mapper) => Ok(winner.and_then(
+                |raw_candidate| mapper.resolve_candidate(raw_candidate)
+            )),
+            None => Ok(winner)
+        }
+    }
+    fn _to_bytes(&self, ballot_counts: &HashMap<Vec<i32>, u64>) -> Vec<u8> {
+        let mut writer = ByteWriter::new();
+        writer.write_bytes(SERIALIZED_MAGIC);
+        writer.write_u16(SERIALIZED_FORMAT_VERSION);
+        writer.write_u16(CRATE_VERSION.len() as u16);
+        writer.write_bytes(CRATE_VERSION.as_bytes());
+        writer.write_u8(self.elimination_strategy.to_int());
+        match &self.candidates_mapper {
+            Some(mapper) => {
+                writer.write_u8(1);
+                writer.write_u32(mapper.get_num_candidates() as u32);
+                for candidate in mapper.get_candidates() {
+                    writer.write_i32(*candidate);
+                }
+            },
+            None => writer.write_u8(0)
+        }
+
+        // sorted so that equal counters serialize to equal bytes
+        let mut ballot_counts: Vec<_> = ballot_counts.iter().collect();
+        ballot_counts.sort();
+        writer.write_u64(ballot_counts.len() as u64);
+        for (ballot, count) in ballot_counts {
+            writer.write_u64(*count);
+            writer.write_u32(ballot.len() as u32);
+            for ranking in ballot {
+                writer.write_i32(*ranking);
+            }
+        }
+        writer.buffer
+    }
+    fn _read_ballot_counts(
+        reader: &mut ByteReader
+    ) -> PyResult<(
+        PyEliminationStrategies, Option<CandidatesMapper>,
+        Vec<(Vec<i32>, u64)>
+    )> {
+        if reader.read_bytes(SERIALIZED_MAGIC.len())? != SERIALIZED_MAGIC {
+            return Err(PyValueError::new_err("not a serialized VotesCounter"))
+        }
+        let format_version = reader.read_u16()?;
+        if format_version != SERIALIZED_FORMAT_VERSION {
+            return Err(PyValueError::new_err(format!(
+                "unsupported VotesCounter format version {}", format_version
+            )))
+        }
+        let version_length = reader.read_u16()? as usize;
+        let crate_version = reader.read_bytes(version_length)?;
+        if crate_version != CRATE_VERSION.as_bytes() {
+            return Err(PyValueError::new_err(format!(
+                "VotesCounter was serialized by py_rcv {}, not {}",
+                String::from_utf8_lossy(crate_version), CRATE_VERSION
+            )))
+        }
+
+        let strategy = PyEliminationStrategies::new(reader.read_u8()?)?;
+        let candidates_mapper = match reader.read_u8()? {
+            0 => None,
+            _ => {
+                let num_candidates = reader.read_u32()?;
+                let mut candidates = vec![];
+                for _ in 0..num_candidates {
+                    candidates.push(reader.read_i32()?);
+                }
+                match CandidatesMapper::new(&candidates) {
+                    Ok(mapper) => Some(mapper),
+                    Err(err) => return Err(PyValueError::new_err(
+                        err.to_string()
+                    ))
+                }
+            }
+        };
+        let num_ballots = reader.read_u64()?;
+        let mut ballot_counts = vec![];
+        for _ in 0..num_ballots {
+            let count = reader.read_u64()?;
+            let length = reader.read_u32()?;
+            let mut ballot = vec![];
+            for _ in 0..length {
+                ballot.push(reader.read_i32()?);
+            }
+            ballot_counts.push((ballot, count));
+        }
+        if !reader.is_finished() {
+            return Err(PyValueError::new_err(
+                "serialized VotesCounter has trailing bytes"
+            ))
+        }
+        Ok((strategy, candidates_mapper, ballot_counts))
+    }
 }
 #[gen_stub_pymethods]
 #[pymethods]
 impl VotesCounter {
     #[new]
-    #[pyo3(signature = (elimination_strategy = PyEliminationStrategies::DowdallScoring))]
-    fn new(elimination_strategy: PyEliminationStrategies) -> Self {
-        let strategy = elimination_strategy._to_strategy();
-        let mut rcv = RankedChoiceVoteTrie::new();
-        rcv.set_elimination_strategy(strategy);
+    #[pyo3(signature = (
+        elimination_strategy = PyEliminationStrategies::DowdallScoring,
+        candidates = None, record_ballots = false
+    ))]
+    fn new(
+        elimination_strategy: PyEliminationStrategies,
+        candidates: Option<Vec<i32>>, record_ballots: bool
+    ) -> PyResult<Self> {
+        // if candidates (the poll's option ids) are given, they are
+        // remapped to dense candidates in the trie, and ballots that
+        // rank any other option are rejected
+        // record_ballots keeps a copy of every distinct ballot,
+        // which to_bytes requires
+        let candidates_mapper = match candidates {
+            Some(candidates) => match CandidatesMapper::new(&candidates) {
+                Ok(mapper) => Some(mapper),
+                Err(err) => return Err(PyValueError::new_err(err.to_string()))
+            },
+            None => None
+        };
+        Ok(VotesCounter::_new(
+            elimination_strategy, candidates_mapper, record_ballots
+        ))
+    }
+    fn set_elimination_strategy(
+        &mut self, elimination_strategy: PyEliminationStrategies
+    ) {
+        // lets an already built counter be recounted with another strategy
+        self.rcv.set_elimination_strategy(elimination_strategy._to_strategy());
+        self.elimination_strategy = elimination_strategy;
+    }
+    fn to_bytes(&mut self, py: Python<'_>) -> PyResult<Py<PyBytes>> {
+        // serializes the counter's strategy and every ballot
+        // inserted so far (pending raw votes are flushed first)
+        if self.ballot_counts.is_none() {
+            return Err(PyValueError::new_err(
+                "VotesCounter was created without record_ballots"
+            ))
+        }
+        if let Err(err) = self._flush_votes() {
+            return Err(PyValueError::new_err(err.to_string()))
+        }
+        let raw_counter = py.detach(|| match &self.ballot_counts {
+            Some(ballot_counts) => self._to_bytes(ballot_counts),
+            None => vec![]
+        });
+        Ok(PyBytes::new(py, &raw_counter).unbind())
+    }
+    #[staticmethod]
+    fn from_bytes(py: Python<'_>, raw_counter: &[u8]) -> PyResult<Self> {
+        // rebuilds a counter from the output of to_bytes, rejecting
+        // states written by other format or py_rcv versions
+        // ballots are only validated here, the trie is built on the
+        // first count, so reloading a counter to store it again is cheap
+        let mut reader = ByteReader::new(raw_counter);
+        let (strategy, candidates_mapper, ballot_counts) =
+            VotesCounter::_read_ballot_counts(&mut reader)?;
 
-        VotesCounter {
-            raw_votes_cache: Default::default(), rcv
+        let mut votes_counter = VotesCounter::_new(
+            strategy, candidates_mapper, true
+        );
+        let load_result = py.detach(
+            || votes_counter._load_ballots(ballot_counts)
+        );
+        match load_result {
+            Ok(()) => Ok(votes_counter),
+            Err(err) => Err(PyValueError::new_err(err.to_string()))
         }
     }
+    fn __reduce__(
+        &mut self, py: Python<'_>
+    ) -> PyResult<(Py<PyAny>, (Py<PyBytes>,))> {
+        // pickles as VotesCounter.from_bytes(counter.to_bytes())
+        let from_bytes = py.get_type::<VotesCounter>().getattr("from_bytes")?;
+        Ok((from_bytes.unbind(), (self.to_bytes(py)?,)))
+    }
     fn flush_votes(&mut self) -> PyResult<bool> {
-        match self._flush_votes() {
+        match self._build_trie() {
             Ok(result) => Ok(result),
             Err(err) => Err(PyValueError::new_err(err.to_string()))
         }
     }
     fn get_num_votes(&self) -> PyResult<u64> {
         // return the total number of votes cast
+        let num_unbuilt_votes: u64 = self.unbuilt_ballots.values().map(
+            |(_, count)| *count
+        ).sum();
         Ok(
-            self.rcv.get_num_votes() +
+            self.rcv.get_num_votes() + num_unbuilt_votes +
             self.raw_votes_cache.len() as u64
         )
     }
@@ -162,26 +485,49 @@ impl VotesCounter {
         let vote = self.raw_votes_cache.entry(vote_id).or_insert(vec![]);
         vote.push(vote_ranking)
     }
-    fn insert_empty_votes(&mut self, num_votes: u64) -> PyResult<bool> {
-        // insert withhold votes to represent registered voters
-        // who did not vote in the poll
-        for _ in 0..num_votes {
-            let withhold_vote: RankedVote = RankedVote::from_vector(
-                &vec![WITHOLD_VOTE_VAL]
-            ).unwrap();
+    fn insert_ballot(
+        &mut self, py: Python<'_>, ranking: Vec<i32>, count: u64
+    ) -> PyResult<()> {
+        // insert count copies of a ballot in a single call, which
+        // only adds to the ballot's count until the counter is counted
+        match py.detach(|| self._insert_ballot(&ranking, count)) {
+            Ok(()) => Ok(()),
+            Err(err) => Err(PyValueError::new_err(err.to_string()))
+        }
+    }
+    fn insert_ballots(
+        &mut self, py: Python<'_>,
+        values: &Bound<'_, PyAny>, offsets: &Bound<'_, PyAny>
+    ) -> PyResult<u64> {
+        // insert every ballot of a poll from CSR-style buffers
+        // (e.g. array('i') / array('q') or int32 / int64 numpy arrays),
+        // where ballot k is values[offsets[k]:offsets[k+1]]
+        // contiguous buffers are read in place, so they mustn't be
+        // modified by other threads during the call
+        let values_buffer = PyBuffer::<i32>::get(values)?;
+        let offsets_buffer = PyBuffer::<i64>::get(offsets)?;
+        let values = VotesCounter::read_buffer(py, &values_buffer)?;
+        let offsets = VotesCounter::read_buffer(py, &offsets_buffer)?;
+        VotesCounter::validate_offsets(&offsets, values.len())?;
 
-            self.rcv.insert_vote(withhold_vote)
+        match py.detach(|| self._insert_ballots(&values, &offsets)) {
+            Ok(num_ballots) => Ok(num_ballots),
+            Err(err) => Err(PyValueError::new_err(err.to_string()))
         }
+    }
+    fn insert_empty_votes(
+        &mut self, py: Python<'_>, num_votes: u64
+    ) -> PyResult<bool> {
+        // insert withhold votes to represent registered voters
+        // who did not vote in the poll
+        self.insert_ballot(py, vec![WITHOLD_VOTE_VAL], num_votes)?;
         Ok(true)
     }
-    fn determine_winner(&mut self) -> PyResult<Option<u32>> {
-        // TODO: implement elimination strategy selection
-        let flush_result = self._flush_votes();
-        if flush_result.is_err() {
-            return Err(PyValueError::new_err(flush_result.unwrap_err().to_string()))
+    fn determine_winner(&mut self, py: Python<'_>) -> PyResult<Option<u32>> {
+        match py.detach(|| self._determine_winner()) {
+            Ok(winner) => Ok(winner),
+            Err(err) => Err(PyValueError::new_err(err.to_string()))
         }
-        let winner = self.rcv.determine_winner();
-        Ok(winner)
     }
 }
 
@@ -0,0 +1,82 @@
+use pyo3::exceptions::PyValueError;
+use pyo3::PyResult;
+
+// serialized VotesCounter layout (all integers little-endian):
+//   magic           4 bytes, SERIALIZED_MAGIC
+//   format version  u16, SERIALIZED_FORMAT_VERSION
+//   py_rcv version  u16 length + utf-8 crate version
+//   strategy        u8, PyEliminationStrategies value
+//   candidates      u8 flag, then (if set) u32 length + i32 option ids
+//   num ballots     u64 number of distinct ballots
+//   ballots         per ballot: u64 count, u32 length, i32 rankings
+pub const SERIALIZED_MAGIC: &[u8; 4] = b"RCVC";
+// bump whenever the layout above changes
+pub const SERIALIZED_FORMAT_VERSION: u16 = 2;
+// counters are rebuilt by re-inserting their ballots, so states from a
+// different build (and possibly a different trie_rcv) are rejected too
+pub const CRATE_VERSION: &str = env!("CARGO_PKG_VERSION");
+
+pub struct ByteWriter {
+    pub buffer: Vec<u8>
+}
+impl ByteWriter {
+    pub fn new() -> Self {
+        ByteWriter { buffer: vec![] }
+    }
+    pub fn write_bytes(&mut self, bytes: &[u8]) {
+        self.buffer.extend_from_slice(bytes);
+    }
+    pub fn write_u8(&mut self, value: u8) {
+        self.buffer.push(value);
+    }
+    pub fn write_u16(&mut self, value: u16) {
+        self.write_bytes(&value.to_le_bytes());
+    }
+    pub fn write_u32(&mut self, value: u32) {
+        self.write_bytes(&value.to_le_bytes());
+    }
+    pub fn write_u64(&mut self, value: u64) {
+        self.write_bytes(&value.to_le_bytes());
+    }
+    pub fn write_i32(&mut self, value: i32) {
+        self.write_bytes(&value.to_le_bytes());
+    }
+}
+
+pub struct ByteReader<'a> {
+    buffer: &'a [u8],
+    position: usize
+}
+impl<'a> ByteReader<'a> {
+    pub fn new(buffer: &'a [u8]) -> Self {
+        ByteReader { buffer, position: 0 }
+    }
+    pub fn read_bytes(&mut self, length: usize) -> PyResult<&'a [u8]> {
+        let end = self.position.checked_add(length).filter(
+            |end| *end <= self.buffer.len()
+        ).ok_or_else(|| PyValueError::new_err(
+            "serialized VotesCounter is truncated"
+        ))?;
+        let bytes = &self.buffer[self.position..end];
+        self.position = end;
+        Ok(bytes)
+    }
+    pub fn read_u8(&mut self) -> PyResult<u8> {
+        Ok(self.read_bytes(1)?[0])
+    }
+    pub fn read_u16(&mut self) -> PyResult<u16> {
+        Ok(u16::from_le_bytes(self.read_bytes(2)?.try_into().unwrap()))
+    }
+    pub fn read_u32(&mut self) -> PyResult<u32> {
+        Ok(u32::from_le_bytes(self.read_bytes(4)?.try_into().unwrap()))
+    }
+    pub fn read_u64(&mut self) -> PyResult<u64> {
+        Ok(u64::from_le_bytes(self.read_bytes(8)?.try_into().unwrap()))
+    }
+    pub fn read_i32(&mut self) -> PyResult<i32> {
+        Ok(i32::from_le_bytes(self.read_bytes(4)?.try_into().unwrap()))
+    }
+    pub fn is_finished(&self) -> bool {
+        self.position == self.buffer.len()
+    }
+}
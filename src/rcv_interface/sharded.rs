@@ -0,0 +1,300 @@
+use std::collections::{HashMap, HashSet};
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use pyo3_stub_gen::derive::{gen_stub_pyclass, gen_stub_pymethods};
+use rayon::prelude::*;
+use trie_rcv::SpecialVotes;
+use crate::rcv_interface::{VotesCounter, WITHOLD_VOTE_VAL};
+use crate::rcv_interface::candidates::CandidatesMapper;
+
+const ABSTAIN_VOTE_VAL: i32 = SpecialVotes::ABSTAIN.to_int();
+// next choice of a ballot that has run out of rankings
+// (matches round_report.EXHAUSTED on the python side)
+const EXHAUSTED: i32 = 0;
+
+type Transfers = HashMap<i32, HashMap<i32, u64>>;
+
+#[gen_stub_pyclass]
+#[pyclass]
+pub struct RoundCounts {
+    first_preferences: HashMap<i32, u64>,
+    withheld: u64,
+    abstained: u64,
+    exhausted: u64
+}
+#[gen_stub_pymethods]
+#[pymethods]
+impl RoundCounts {
+    #[getter]
+    fn get_first_preferences(&self) -> PyResult<HashMap<i32, u64>> {
+        Ok(self.first_preferences.clone())
+    }
+    #[getter]
+    fn get_withheld(&self) -> PyResult<u64> {
+        Ok(self.withheld)
+    }
+    #[getter]
+    fn get_abstained(&self) -> PyResult<u64> {
+        Ok(self.abstained)
+    }
+    #[getter]
+    fn get_exhausted(&self) -> PyResult<u64> {
+        Ok(self.exhausted)
+    }
+}
+
+struct ShardCounts {
+    // indexed by dense candidate (see CandidatesMapper)
+    first_preferences: Vec<u64>,
+    withheld: u64,
+    abstained: u64,
+    exhausted: u64
+}
+impl ShardCounts {
+    fn new(num_candidates: usize) -> Self {
+        ShardCounts {
+            first_preferences: vec![0; num_candidates + 1],
+            withheld: 0, abstained: 0, exhausted: 0
+        }
+    }
+    fn merge(mut self, other: ShardCounts) -> ShardCounts {
+        // counts are summed, so the merged result doesn't
+        // depend on how the ballots were sharded
+        for (votes, other_votes) in self.first_preferences.iter_mut().zip(
+            other.first_preferences
+        ) {
+            *votes += other_votes;
+        }
+        self.withheld += other.withheld;
+        self.abstained += other.abstained;
+        self.exhausted += other.exhausted;
+        self
+    }
+}
+
+struct BallotShard {
+    // ballot k is values[offsets[k]..offsets[k+1]], with candidates
+    // remapped to dense candidates so that they can index arrays
+    values: Vec<i32>,
+    offsets: Vec<usize>,
+    counts: Vec<u64>
+}
+impl BallotShard {
+    fn next_choice(&self, index: usize, remaining: &[bool]) -> i32 {
+        // first ranking on the ballot that is a special vote
+        // or a candidate that hasn't been eliminated yet
+        let ballot = &self.values[self.offsets[index]..self.offsets[index + 1]];
+        for value in ballot {
+            if *value < 0 || remaining[*value as usize] {
+                return *value
+            }
+        }
+        EXHAUSTED
+    }
+    fn count_round(&self, remaining: &[bool]) -> ShardCounts {
+        let mut shard_counts = ShardCounts::new(remaining.len() - 1);
+        for (index, count) in self.counts.iter().enumerate() {
+            match self.next_choice(index, remaining) {
+                WITHOLD_VOTE_VAL => shard_counts.withheld += count,
+                ABSTAIN_VOTE_VAL => shard_counts.abstained += count,
+                EXHAUSTED => shard_counts.exhausted += count,
+                choice => {
+                    shard_counts.first_preferences[choice as usize] += count;
+                }
+            }
+        }
+        shard_counts
+    }
+    fn count_transfers(
+        &self, eliminated: &[bool], remaining: &[bool],
+        next_remaining: &[bool]
+    ) -> Transfers {
+        let mut transfers: Transfers = HashMap::new();
+        for (index, count) in self.counts.iter().enumerate() {
+            let choice = self.next_choice(index, remaining);
+            if choice <= 0 || !eliminated[choice as usize] {
+                continue
+            }
+            let next_choice = self.next_choice(index, next_remaining);
+            *transfers.entry(choice).or_default()
+                .entry(next_choice).or_insert(0) += count;
+        }
+        transfers
+    }
+}
+
+fn merge_transfers(mut transfers: Transfers, other: Transfers) -> Transfers {
+    for (candidate, targets) in other {
+        let merged_targets = transfers.entry(candidate).or_default();
+        for (target, count) in targets {
+            *merged_targets.entry(target).or_insert(0) += count;
+        }
+    }
+    transfers
+}
+
+#[gen_stub_pyclass]
+#[pyclass(frozen)]
+pub struct ShardedBallots {
+    shards: Vec<BallotShard>,
+    candidates_mapper: CandidatesMapper
+}
+impl ShardedBallots {
+    fn candidates_mask(&self, candidates: &HashSet<i32>) -> Vec<bool> {
+        // mask over dense candidates, where mask[k] is set if
+        // candidate k's option id is in candidates
+        let mapper = &self.candidates_mapper;
+        let mut mask = vec![false; mapper.get_num_candidates() + 1];
+        for candidate in candidates {
+            if let Ok(raw_candidate) = mapper.map_candidate(*candidate) {
+                if raw_candidate > 0 {
+                    mask[raw_candidate as usize] = true;
+                }
+            }
+        }
+        mask
+    }
+    fn resolve(&self, value: i32) -> i32 {
+        // option id of a dense candidate, special votes and
+        // EXHAUSTED are returned as is
+        if value <= 0 {
+            return value
+        }
+        self.candidates_mapper.resolve_candidate(value as u32).unwrap() as i32
+    }
+    fn build_shards(
+        values: &[i32], offsets: &[i64], counts: &[u64], num_shards: usize
+    ) -> Vec<BallotShard> {
+        // contiguous runs of (roughly) equal numbers of ballots
+        let num_ballots = counts.len();
+        let shard_size = std::cmp::max(1, num_ballots.div_ceil(num_shards));
+        let mut shards = vec![];
+        let mut start = 0;
+
+        while start < num_ballots {
+            let end = std::cmp::min(start + shard_size, num_ballots);
+            let base = offsets[start] as usize;
+            shards.push(BallotShard {
+                values: values[base..offsets[end] as usize].to_vec(),
+                offsets: offsets[start..=end].iter().map(
+                    |offset| *offset as usize - base
+                ).collect(),
+                counts: counts[start..end].to_vec()
+            });
+            start = end;
+        }
+        shards
+    }
+}
+#[gen_stub_pymethods]
+#[pymethods]
+impl ShardedBallots {
+    #[new]
+    #[pyo3(signature = (values, offsets, counts = None, num_shards = None))]
+    fn new(
+        py: Python<'_>, values: &Bound<'_, PyAny>, offsets: &Bound<'_, PyAny>,
+        counts: Option<&Bound<'_, PyAny>>, num_shards: Option<usize>
+    ) -> PyResult<Self> {
+        // splits a poll's CSR ballot buffers (optionally weighted by
+        // counts) into shards that are counted on separate threads
+        let values = PyBuffer::<i32>::get(values)?.to_vec(py)?;
+        let offsets = PyBuffer::<i64>::get(offsets)?.to_vec(py)?;
+        VotesCounter::validate_offsets(&offsets, values.len())?;
+
+        let num_ballots = offsets.len() - 1;
+        let counts: Vec<u64> = match counts {
+            Some(counts) => {
+                let counts = PyBuffer::<i64>::get(counts)?.to_vec(py)?;
+                if counts.len() != num_ballots {
+                    return Err(PyValueError::new_err(
+                        "counts must have one entry per ballot"
+                    ))
+                }
+                if counts.iter().any(|count| *count < 0) {
+                    return Err(PyValueError::new_err(
+                        "counts must be non-negative"
+                    ))
+                }
+                counts.iter().map(|count| *count as u64).collect()
+            },
+            None => vec![1; num_ballots]
+        };
+
+        let num_shards = num_shards.unwrap_or(rayon::current_num_threads());
+        if num_shards == 0 {
+            return Err(PyValueError::new_err("num_shards must be positive"))
+        }
+        let candidates_mapper = CandidatesMapper::from_ballots(&values);
+        let values = match candidates_mapper.map_ballot(&values) {
+            Ok(values) => values,
+            Err(err) => return Err(PyValueError::new_err(err.to_string()))
+        };
+        let shards = py.detach(|| ShardedBallots::build_shards(
+            &values, &offsets, &counts, num_shards
+        ));
+        Ok(ShardedBallots { shards, candidates_mapper })
+    }
+    fn get_num_shards(&self) -> usize {
+        self.shards.len()
+    }
+    fn count_round(
+        &self, py: Python<'_>, remaining: Vec<i32>
+    ) -> RoundCounts {
+        // first preference votes of the remaining candidates, along
+        // with withheld, abstained and exhausted ballot counts
+        let remaining: HashSet<i32> = remaining.into_iter().collect();
+        let remaining_mask = self.candidates_mask(&remaining);
+        let num_candidates = self.candidates_mapper.get_num_candidates();
+        let shard_counts = py.detach(|| self.shards.par_iter().map(
+            |shard| shard.count_round(&remaining_mask)
+        ).reduce(|| ShardCounts::new(num_candidates), ShardCounts::merge));
+
+        // candidates without any votes are still in the running
+        let mut first_preferences: HashMap<i32, u64> = remaining.iter().map(
+            |candidate| (*candidate, 0)
+        ).collect();
+        let raw_first_preferences = shard_counts.first_preferences;
+        for (raw_candidate, votes) in raw_first_preferences.iter().enumerate() {
+            if remaining_mask[raw_candidate] {
+                let candidate = self.resolve(raw_candidate as i32);
+                first_preferences.insert(candidate, *votes);
+            }
+        }
+        RoundCounts {
+            first_preferences, withheld: shard_counts.withheld,
+            abstained: shard_counts.abstained,
+            exhausted: shard_counts.exhausted
+        }
+    }
+    fn count_transfers(
+        &self, py: Python<'_>, eliminated: Vec<i32>, remaining: Vec<i32>
+    ) -> HashMap<i32, HashMap<i32, u64>> {
+        // eliminated candidate -> {next preference -> number of ballots}
+        let eliminated: HashSet<i32> = eliminated.into_iter().collect();
+        let remaining: HashSet<i32> = remaining.into_iter().collect();
+        let next_remaining: HashSet<i32> =
+            remaining.difference(&eliminated).copied().collect();
+
+        let eliminated_mask = self.candidates_mask(&eliminated);
+        let remaining_mask = self.candidates_mask(&remaining);
+        let next_remaining_mask = self.candidates_mask(&next_remaining);
+        let raw_transfers = py.detach(|| self.shards.par_iter().map(
+            |shard| shard.count_transfers(
+                &eliminated_mask, &remaining_mask, &next_remaining_mask
+            )
+        ).reduce(HashMap::new, merge_transfers));
+
+        let mut transfers: Transfers = eliminated.iter().map(
+            |candidate| (*candidate, HashMap::new())
+        ).collect();
+        for (raw_candidate, raw_targets) in raw_transfers {
+            let candidate = self.resolve(raw_candidate);
+            let targets = transfers.entry(candidate).or_default();
+            for (raw_target, count) in raw_targets {
+                targets.insert(self.resolve(raw_target), count);
+            }
+        }
+        transfers
+    }
+}
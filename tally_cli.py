@@ -0,0 +1,335 @@
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import dataclasses
+import concurrent.futures
+
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from database import initialize_db, Polls, PollWinners
+from helpers.ballot_loader import BallotLoader
+from helpers.ballot_snapshot import BallotSnapshot, export_poll_snapshot
+from helpers.rcv_tally import RCVTally
+from helpers.tally_engine import TALLY_ENGINES
+
+"""
+offline recounts of stored polls, used to check an engine upgrade
+against the winners already recorded in PollWinners
+usage:
+    python -m tally_cli recount --polls 12 13 --processes 8
+    python -m tally_cli recount --all-closed --format csv -o recount.csv
+    python -m tally_cli export --polls 12 --output-dir snapshots/
+    python -m tally_cli recount --snapshots snapshots/ --no-diff
+    python -m tally_cli recount --all-closed --engine numpy
+"""
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+SNAPSHOT_EXTENSION = '.snapshot'
+
+
+@dataclasses.dataclass
+class PollRecount(object):
+    # poll id, or snapshot path
+    source: str
+    poll_id: Optional[int] = None
+    vote_algorithm: Optional[int] = None
+    num_ballots: int = 0
+    # vote_algorithm -> recounted winning option id
+    winners: Dict[int, Optional[int]] = dataclasses.field(
+        default_factory=dict
+    )
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+@dataclasses.dataclass
+class RecountRow(object):
+    source: str
+    poll_id: Optional[int]
+    vote_algorithm: Optional[int]
+    recounted_winner: Optional[int]
+    stored_winner: Optional[int] = None
+    # None when the poll has no stored winner to compare against
+    matches: Optional[bool] = None
+    is_poll_algorithm: bool = False
+    error: Optional[str] = None
+
+
+def recount_poll(
+    poll_id: int, engine_name: Optional[str] = None
+) -> PollRecount:
+    recount = PollRecount(source=str(poll_id), poll_id=poll_id)
+    start_stamp = time.perf_counter()
+    try:
+        poll = Polls.get_by_id(poll_id)
+        # reads the database directly, skipping any warm live tally
+        ballots = BallotLoader.load_poll_ballots(poll_id)
+        recount.vote_algorithm = poll.vote_algorithm
+        recount.num_ballots = ballots.num_ballots
+        recount.winners = RCVTally.count_strategies(
+            poll.num_active_voters, ballots, engine_name=engine_name
+        )
+    except Exception as e:
+        recount.error = repr(e)
+
+    recount.duration = time.perf_counter() - start_stamp
+    return recount
+
+
+def recount_snapshot(
+    path: str, engine_name: Optional[str] = None
+) -> PollRecount:
+    recount = PollRecount(source=path)
+    start_stamp = time.perf_counter()
+    try:
+        with BallotSnapshot(path) as snapshot:
+            header = snapshot.header
+            recount.poll_id = header.poll_id
+            recount.vote_algorithm = header.vote_algorithm
+            recount.num_ballots = snapshot.ballots.num_ballots
+            recount.winners = RCVTally.count_strategies(
+                header.num_poll_voters, snapshot.ballots,
+                engine_name=engine_name
+            )
+    except Exception as e:
+        recount.error = repr(e)
+
+    recount.duration = time.perf_counter() - start_stamp
+    return recount
+
+
+def _initialize_worker(uses_database: bool):
+    # database connections can't be shared with the parent process
+    if uses_database:
+        initialize_db()
+
+
+def run_recounts(
+    poll_ids: Iterable[int] = (), snapshot_paths: Iterable[str] = (),
+    processes: int = 1, engine_name: Optional[str] = None
+) -> List[PollRecount]:
+    """
+    recounts each poll (or snapshot) as its own task, across
+    a pool of worker processes if processes > 1
+    engine_name is the tally engine to count with, defaults to
+    the one configured in config.yml
+    """
+    tasks = [(recount_poll, poll_id) for poll_id in poll_ids] + [
+        (recount_snapshot, path) for path in snapshot_paths
+    ]
+    if processes <= 1:
+        return [
+            recount_func(source, engine_name)
+            for recount_func, source in tasks
+        ]
+
+    uses_database = any(
+        recount_func is recount_poll for recount_func, _ in tasks
+    )
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes, initializer=_initialize_worker,
+        initargs=(uses_database,)
+    ) as executor:
+        futures = [
+            executor.submit(recount_func, source, engine_name)
+            for recount_func, source in tasks
+        ]
+        return [future.result() for future in futures]
+
+
+def build_report(
+    recounts: List[PollRecount], compare_stored: bool = True
+) -> List[RecountRow]:
+    """
+    one row per poll and strategy, compared against the
+    winners stored in PollWinners if compare_stored is set
+    """
+    rows: List[RecountRow] = []
+    for recount in recounts:
+        if recount.error is not None:
+            rows.append(RecountRow(
+                source=recount.source, poll_id=recount.poll_id,
+                vote_algorithm=None, recounted_winner=None,
+                error=recount.error
+            ))
+            continue
+
+        stored_winners: Dict[int, Optional[int]] = {}
+        if compare_stored and (recount.poll_id is not None):
+            stored_winners = PollWinners.read_strategy_winner_ids(
+                recount.poll_id
+            )
+
+        for vote_algorithm, winner_id in recount.winners.items():
+            row = RecountRow(
+                source=recount.source, poll_id=recount.poll_id,
+                vote_algorithm=vote_algorithm, recounted_winner=winner_id,
+                is_poll_algorithm=vote_algorithm == recount.vote_algorithm
+            )
+            if vote_algorithm in stored_winners:
+                row.stored_winner = stored_winners[vote_algorithm]
+                row.matches = row.stored_winner == winner_id
+
+            rows.append(row)
+
+    return rows
+
+
+def write_report(rows: List[RecountRow], output: TextIO, output_format: str):
+    if output_format == 'json':
+        json.dump([dataclasses.asdict(row) for row in rows], output, indent=2)
+        output.write('\n')
+    elif output_format == 'csv':
+        field_names = [field.name for field in dataclasses.fields(RecountRow)]
+        writer = csv.DictWriter(output, fieldnames=field_names)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dataclasses.asdict(row))
+    else:
+        raise ValueError(f'unknown report format {output_format}')
+
+
+def find_snapshot_paths(paths: Iterable[str]) -> List[str]:
+    # directories are expanded to the snapshot files directly inside them
+    snapshot_paths: List[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            snapshot_paths.append(path)
+            continue
+
+        snapshot_paths.extend(sorted(
+            os.path.join(path, filename) for filename in os.listdir(path)
+            if filename.endswith(SNAPSHOT_EXTENSION)
+        ))
+
+    return snapshot_paths
+
+
+def read_closed_poll_ids() -> List[int]:
+    query = Polls.select(Polls.id).where(Polls.closed).order_by(
+        Polls.id
+    ).tuples()
+    return [poll_id for poll_id, in query]
+
+
+def recount_command(args: argparse.Namespace) -> int:
+    compare_stored = not args.no_diff
+    snapshot_paths = find_snapshot_paths(args.snapshots)
+    poll_ids = list(args.polls)
+    if args.all_closed or (len(poll_ids) > 0) or compare_stored:
+        initialize_db()
+    if args.all_closed:
+        poll_ids.extend(read_closed_poll_ids())
+
+    start_stamp = time.perf_counter()
+    recounts = run_recounts(
+        poll_ids, snapshot_paths, args.processes, engine_name=args.engine
+    )
+    rows = build_report(recounts, compare_stored=compare_stored)
+    logger.info(
+        f'recounted {len(recounts)} polls in '
+        f'{time.perf_counter() - start_stamp:.3f}s'
+    )
+
+    if args.output is None:
+        write_report(rows, sys.stdout, args.format)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            write_report(rows, output, args.format)
+
+    num_mismatches = sum(row.matches is False for row in rows)
+    num_errors = sum(row.error is not None for row in rows)
+    if (num_mismatches > 0) or (num_errors > 0):
+        logger.warning(
+            f'{num_mismatches} winners differ from PollWinners, '
+            f'{num_errors} polls failed to recount'
+        )
+        return 1
+
+    return 0
+
+
+def export_command(args: argparse.Namespace) -> int:
+    initialize_db()
+    poll_ids = list(args.polls)
+    if args.all_closed:
+        poll_ids.extend(read_closed_poll_ids())
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for poll_id in poll_ids:
+        path = os.path.join(
+            args.output_dir, f'poll-{poll_id}{SNAPSHOT_EXTENSION}'
+        )
+        header = export_poll_snapshot(poll_id, path)
+        logger.info(f'exported {header.num_entries} ballots to {path}')
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Offline poll recounts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    recount_parser = subparsers.add_parser(
+        'recount', help='recount polls and compare against PollWinners'
+    )
+    recount_parser.add_argument(
+        '--polls', type=int, nargs='+', default=[],
+        help='ids of polls to recount from the database'
+    )
+    recount_parser.add_argument(
+        '--all-closed', action='store_true',
+        help='recount every closed poll in the database'
+    )
+    recount_parser.add_argument(
+        '--snapshots', nargs='+', default=[],
+        help='snapshot files (or directories of them) to recount'
+    )
+    recount_parser.add_argument(
+        '--processes', type=int, default=os.cpu_count() or 1,
+        help='number of worker processes, one poll per task'
+    )
+    recount_parser.add_argument(
+        '--format', choices=['json', 'csv'], default='json'
+    )
+    recount_parser.add_argument(
+        '-o', '--output', default=None,
+        help='report path, defaults to stdout'
+    )
+    recount_parser.add_argument(
+        '--no-diff', action='store_true',
+        help="don't compare against PollWinners (or connect to the "
+             "database when only recounting snapshots)"
+    )
+    recount_parser.add_argument(
+        '--engine', choices=TALLY_ENGINES, default=None,
+        help='tally engine to recount with, defaults to tally.engine '
+             'in config.yml'
+    )
+    recount_parser.set_defaults(handler=recount_command)
+
+    export_parser = subparsers.add_parser(
+        'export', help='write poll ballots to snapshot files'
+    )
+    export_parser.add_argument('--polls', type=int, nargs='+', default=[])
+    export_parser.add_argument('--all-closed', action='store_true')
+    export_parser.add_argument('--output-dir', required=True)
+    export_parser.set_defaults(handler=export_command)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == '__main__':
+    main()
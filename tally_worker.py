@@ -0,0 +1,179 @@
+import time
+import redis
+import logging
+import argparse
+import multiprocessing
+
+from typing import Optional
+from redis.exceptions import RedisError
+
+from database import initialize_db
+from helpers.rcv_tally import RCVTally
+from helpers.redis_cache_manager import RedisCacheManager
+from helpers.tally_queue import (
+    TallyJob, TallyJobState, TallyQueue, create_tally_queue,
+    get_tally_queue
+)
+
+"""
+standalone worker that computes poll winners from the tally job queue
+so that tallies run outside of the bot and webapp processes
+usage: python -m tally_worker --processes 4
+"""
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+class TallyWorker(object):
+    # seconds to block waiting for a job before checking again
+    CLAIM_TIMEOUT = 5
+
+    def __init__(
+        self, tally_queue: TallyQueue,
+        redis_client: Optional[redis.Redis] = None
+    ):
+        self.tally_queue = tally_queue
+        # used to wake up bot processes waiting on the poll winner
+        self.redis_client = redis_client
+
+    def publish_poll_winner(self, poll_id: int, status: str) -> bool:
+        if self.redis_client is None:
+            return False
+
+        channel = RedisCacheManager.build_poll_winner_channel(poll_id)
+        try:
+            self.redis_client.publish(channel, status)
+        except RedisError as e:
+            logger.warning(f'failed to publish poll {poll_id} winner: {e}')
+            return False
+
+        return True
+
+    def process_job(self, job: TallyJob) -> bool:
+        """
+        computes and stores the winners of the job's poll
+        :return: whether the job succeeded
+        """
+        poll_id = job.poll_id
+        try:
+            poll_winner_res = RCVTally._determine_poll_winner(poll_id)
+            if poll_winner_res.is_err():
+                raise ValueError(f'failed to load poll {poll_id}')
+
+            RCVTally.save_poll_winners(poll_id, poll_winner_res.unwrap())
+        except Exception as e:
+            logger.error(f'tally job {job.job_id} failed: {e}')
+            will_retry = self.tally_queue.fail(job, repr(e))
+            if not will_retry:
+                self.publish_poll_winner(
+                    poll_id, RedisCacheManager.WINNER_FAILED
+                )
+
+            return False
+
+        self.tally_queue.complete(job)
+        self.publish_poll_winner(poll_id, RedisCacheManager.WINNER_READY)
+        return True
+
+    def reap_expired_jobs(self):
+        # requeues the jobs of workers that died mid-tally
+        for job in self.tally_queue.reap_expired_jobs():
+            logger.warning(
+                f'tally job {job.job_id} for poll {job.poll_id} '
+                f'lease expired (attempt={job.attempts})'
+            )
+            if job.state == TallyJobState.FAILED:
+                self.publish_poll_winner(
+                    job.poll_id, RedisCacheManager.WINNER_FAILED
+                )
+
+    def run_once(self) -> Optional[bool]:
+        """
+        :return:
+        whether the claimed job succeeded, None if no job was claimed
+        """
+        self.reap_expired_jobs()
+        job = self.tally_queue.claim(timeout=self.CLAIM_TIMEOUT)
+        if job is None:
+            return None
+
+        start_stamp = time.perf_counter()
+        success = self.process_job(job)
+        logger.info(
+            f'tally job {job.job_id} for poll {job.poll_id} '
+            f'finished in {time.perf_counter() - start_stamp:.3f}s '
+            f'(success={success}, attempt={job.attempts})'
+        )
+        return success
+
+    def run_forever(self):
+        while True:
+            self.run_once()
+
+
+def run_worker(queue_config: Optional[dict] = None):
+    initialize_db()
+    if queue_config is None:
+        from load_config import TALLY_CONFIG
+        queue_config = TALLY_CONFIG
+        tally_queue = get_tally_queue()
+    else:
+        tally_queue = create_tally_queue(queue_config)
+
+    if tally_queue is None:
+        raise ValueError('tally.queue_backend is not configured')
+
+    redis_client = redis.Redis.from_url(
+        queue_config.get('redis_url', 'redis://localhost:6379')
+    )
+    TallyWorker(tally_queue, redis_client=redis_client).run_forever()
+
+
+def main():
+    from load_config import TALLY_CONFIG
+
+    parser = argparse.ArgumentParser(description='Poll tally worker')
+    parser.add_argument(
+        '--processes', type=int, default=1,
+        help='number of worker processes to run'
+    )
+    parser.add_argument(
+        '--backend', choices=['redis', 'sqlite'], default=None,
+        help='overrides tally.queue_backend in config.yml'
+    )
+    parser.add_argument(
+        '--redis-url', default=None, help='overrides tally.redis_url'
+    )
+    parser.add_argument(
+        '--sqlite-path', default=None, help='overrides tally.sqlite_path'
+    )
+    args = parser.parse_args()
+
+    queue_config = dict(TALLY_CONFIG)
+    if args.backend is not None:
+        queue_config['queue_backend'] = args.backend
+    if args.redis_url is not None:
+        queue_config['redis_url'] = args.redis_url
+    if args.sqlite_path is not None:
+        queue_config['sqlite_path'] = args.sqlite_path
+
+    if args.processes <= 1:
+        return run_worker(queue_config)
+
+    # each worker process opens its own database and queue connections
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(queue_config,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,12 @@ import telegram
 
 from typing import Callable, Coroutine, Any, Dict, Optional, List
 
-from py_rcv.py_rcv import PyEliminationStrategies
+from helpers.tally_engine import PyEliminationStrategies
 from result import Result, Err, Ok
 from sqlalchemy.util import await_only
 
 from base_api import BaseAPI, PollInfo
+from async_api import AsyncAPI
 from bot_middleware import track_errors
 from helpers.locks_manager import PollsLockManager
 from helpers.message_buillder import MessageBuilder
@@ -26,9 +27,15 @@ from telegram import (
 )
 
 from database import Users, Polls, ChatWhitelist
-from database.database import UserID, PollOptions
+from database.setup import checkout_connection
+from database.identity_map import remember
+from database.users_cache import UsersCache
+from database.database import UserID, PollOptions, PollPairwiseCounts
 
 from helpers.rcv_tally import RCVTally, GetPollWinnerInfo
+from helpers.pairwise_matrix import (
+    PairwiseMatrix, RANKED_PAIRS, CONDORCET_RANKED_PAIRS
+)
 from helpers.redis_cache_manager import GetPollWinnerStatus
 
 logging.basicConfig(
@@ -37,6 +44,7 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
+async_api = AsyncAPI()
 
 
 class ModifiedTeleUpdate(object):
@@ -115,8 +123,8 @@ class TelegramHelpers(object):
         username: Optional[str], chat_id: Optional[int]
     ) -> bool:
         # returns whether vote was successful
-        vote_result = cls._vote_for_poll(
-            raw_text=raw_text, user_tele_id=user_tele_id,
+        vote_result = await async_api.db_executor.run(
+            cls._vote_for_poll, raw_text=raw_text, user_tele_id=user_tele_id,
             username=username, chat_id=chat_id
         )
 
@@ -131,7 +139,9 @@ class TelegramHelpers(object):
 
     @classmethod
     async def send_post_vote_reply(cls, message: Message, poll_id: int):
-        poll_metadata = Polls.read_poll_metadata(poll_id)
+        poll_metadata = await async_api.db_executor.run(
+            Polls.read_poll_metadata, poll_id
+        )
         num_voters = poll_metadata.num_active_voters
         num_votes = poll_metadata.num_votes
 
@@ -140,6 +150,27 @@ class TelegramHelpers(object):
             {num_votes} / {num_voters} voted
         """))
 
+    @staticmethod
+    def read_update_user(tele_user: TeleUser) -> Users:
+        chat_username: str = tele_user.username
+        users_cache = UsersCache.get_active()
+        user = None if users_cache is None else users_cache.get(tele_user.id)
+
+        if user is None:
+            user, _ = Users.build_from_fields(
+                tele_id=tele_user.id
+            ).get_or_create()
+            if users_cache is not None:
+                users_cache.put(user)
+
+        # update user tele id to username mapping
+        if (user.deleted_at is None) and (user.username != chat_username):
+            user.username = chat_username
+            user.save()
+
+        # lets later lookups by tele_id in this update reuse the row
+        return remember(user)
+
     @staticmethod
     def users_middleware(
         func: Callable[..., Coroutine], include_self=True
@@ -147,6 +178,14 @@ class TelegramHelpers(object):
         async def caller(
             self, update: BaseTeleUpdate | CallbackContext,
             *args, **kwargs
+        ):
+            # each update holds one pooled db connection while it runs
+            async with checkout_connection():
+                return await handle_update(self, update, *args, **kwargs)
+
+        async def handle_update(
+            self, update: BaseTeleUpdate | CallbackContext,
+            *args, **kwargs
         ):
             # print("SELF", self)
             # print('UPDATE', update, args, kwargs)
@@ -175,20 +214,15 @@ class TelegramHelpers(object):
 
                 await respond_callback("User not found")
 
-            tele_id = tele_user.id
-            chat_username: str = tele_user.username
             assert isinstance(tele_user, TeleUser)
-            user, _ = Users.build_from_fields(tele_id=tele_id).get_or_create()
+            user = await async_api.db_executor.run(
+                TelegramHelpers.read_update_user, tele_user
+            )
             # don't allow deleted users to interact with the bot
             if user.deleted_at is not None:
                 await tele_user.send_message("Account has been deleted")
                 return False
 
-            # update user tele id to username mapping
-            if user.username != chat_username:
-                user.username = chat_username
-                user.save()
-
             modified_tele_update = ModifiedTeleUpdate(
                 update=update, user=user
             )
@@ -304,19 +338,24 @@ class TelegramHelpers(object):
         tele_user: TeleUser | None = message.from_user
 
         try:
-            poll = Polls.select().where(Polls.id == poll_id).get()
+            poll = await async_api.db_executor.run(
+                Polls.select().where(Polls.id == poll_id).get
+            )
         except Polls.DoesNotExist:
             await message.reply_text(f'poll {poll_id} does not exist')
             return False
 
         try:
-            user = Users.build_from_fields(tele_id=tele_user.id).get()
+            user = await async_api.db_executor.run(
+                Users.build_from_fields(tele_id=tele_user.id).get
+            )
         except Users.DoesNotExist:
             await message.reply_text(f'UNEXPECTED ERROR: USER DOES NOT EXIST')
             return False
 
         user_id = user.get_user_id()
-        creator_id: UserID = poll.get_creator().get_user_id()
+        # compared by id, so that the creator row isn't loaded
+        creator_id: UserID = poll.creator_id
         if creator_id != user_id:
             await message.reply_text(
                 'only poll creator is allowed to whitelist chats '
@@ -325,9 +364,11 @@ class TelegramHelpers(object):
             return False
 
         if whitelist:
-            _, is_new_whitelist = ChatWhitelist.build_from_fields(
-                poll_id=poll_id, chat_id=message.chat.id
-            ).get_or_create()
+            _, is_new_whitelist = await async_api.db_executor.run(
+                ChatWhitelist.build_from_fields(
+                    poll_id=poll_id, chat_id=message.chat.id
+                ).get_or_create
+            )
 
             if is_new_whitelist:
                 reply_msg = 'Whitelisted chat for user self-registration'
@@ -346,7 +387,8 @@ class TelegramHelpers(object):
             return True
         else:
             try:
-                whitelist_row = ChatWhitelist.get(
+                whitelist_row = await async_api.db_executor.run(
+                    ChatWhitelist.get,
                     (ChatWhitelist.poll == poll_id) &
                     (ChatWhitelist.chat_id == message.chat.id)
                 )
@@ -357,7 +399,7 @@ class TelegramHelpers(object):
                 )
                 return False
 
-            whitelist_row.delete_instance()
+            await async_api.db_executor.run(whitelist_row.delete_instance)
             reply_msg = 'Removed user self-registration chat whitelist'
             await message.reply_text(reply_msg)
             return True
@@ -372,7 +414,7 @@ class TelegramHelpers(object):
         tele_user: TeleUser | None = update.message.from_user
 
         user_id = user.get_user_id()
-        view_poll_result = BaseAPI.get_poll_message(
+        view_poll_result = await async_api.get_poll_message(
             poll_id=poll_id, user_id=user_id,
             bot_username=context.bot.username,
             username=user.username,
@@ -446,13 +488,44 @@ class TelegramHelpers(object):
     @classmethod
     async def handle_poll_winner_request(
         cls, rcv_tally: RCVTally,
-        update: ModifiedTeleUpdate, poll_id: int
+        update: ModifiedTeleUpdate, poll_id: int,
+        provisional: bool = False
     ) -> Result[GetPollWinnerInfo, GetPollWinnerStatus]:
         message = update.message
-        get_winner_result = await rcv_tally.get_poll_winner(poll_id)
+        if provisional:
+            get_winner_result = await rcv_tally.get_provisional_winner(
+                poll_id
+            )
+        else:
+            get_winner_result = await rcv_tally.get_poll_winner(poll_id)
 
         if get_winner_result.is_err():
             err_status = get_winner_result.unwrap_err()
+            if err_status == GetPollWinnerStatus.BUSY:
+                await message.reply_text(textwrap.dedent(f"""
+                    Too many poll results are being computed right now
+                    Please check again later
+                """))
+                return get_winner_result
+            elif err_status == GetPollWinnerStatus.TIMED_OUT:
+                await message.reply_text(textwrap.dedent(f"""
+                    Poll winner computation took too long
+                    Please check again later
+                """))
+                return get_winner_result
+            elif err_status == GetPollWinnerStatus.QUEUED:
+                await message.reply_text(textwrap.dedent(f"""
+                    Poll winner computation is queued
+                    Please check again later
+                """))
+                return get_winner_result
+            elif err_status == GetPollWinnerStatus.COMPUTING:
+                await message.reply_text(textwrap.dedent(f"""
+                    Poll winner computation in progress
+                    Please check again later
+                """))
+                return get_winner_result
+
             await message.reply_text(textwrap.dedent(f"""
                 Unexpected error occurred ({err_status})
             """))
@@ -477,20 +550,57 @@ class TelegramHelpers(object):
                 Please check again later
             """))
             return get_winner_result
-        elif winning_option_id is not None:
-            winning_options = PollOptions.select().where(
-                PollOptions.id == winning_option_id
+
+        option_names = await async_api.db_executor.run(
+            PollOptions.read_option_names, poll.id
+        )
+        report_text = ''
+        if get_winner_info.round_report is not None:
+            # round breakdown is read from storage, never recomputed
+            report_lines = get_winner_info.round_report.to_message_lines(
+                option_names
+            )
+            report_text = '\n' + '\n'.join(report_lines)
+        if poll.vote_algorithm in (RANKED_PAIRS, CONDORCET_RANKED_PAIRS):
+            # read off the poll's pairwise counts, no ballots are scanned
+            pairwise_counts = await async_api.db_executor.run(
+                PollPairwiseCounts.read_counts, poll.id
             )
+            pairwise_matrix = PairwiseMatrix(option_names, pairwise_counts)
+            ranked_pairs_order = pairwise_matrix.ranked_pairs_order()
+            # the winner is decided by instant runoff (ranked pairs only
+            # breaks its ties), so the order is left out when it would
+            # put another option first
+            if (len(ranked_pairs_order) > 0) and (
+                ranked_pairs_order[0] == winning_option_id
+            ):
+                ranked_pairs_ranking = ' > '.join(
+                    option_names[option_id]
+                    for option_id in ranked_pairs_order
+                )
+                report_text += (
+                    f'\nRanked pairs order: {ranked_pairs_ranking}'
+                )
 
-            option_name = winning_options[0].option_name
+        if get_winner_info.provisional:
+            # poll is still open, the leader may yet change
+            leader_name = option_names.get(winning_option_id, 'nobody')
+            await message.reply_text(textwrap.dedent(f"""
+                Provisional results ({poll.num_votes} votes so far)
+                Current leader: {leader_name}
+                (Voting strategy used: {vote_strategy_name})
+            """) + report_text)
+            return get_winner_result
+        elif winning_option_id is not None:
+            option_name = option_names[winning_option_id]
             await message.reply_text(textwrap.dedent(f"""
                 Poll winner is: {option_name}
                 (Voting strategy used: {vote_strategy_name})
-            """))
+            """) + report_text)
             return get_winner_result
         else:
             await message.reply_text(textwrap.dedent(f"""
                 Poll has no winner
                 (Voting strategy used: {vote_strategy_name})
-            """))
+            """) + report_text)
             return get_winner_result
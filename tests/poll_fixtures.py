@@ -0,0 +1,77 @@
+import datetime
+
+from typing import List
+from peewee import Database, fn
+
+from database import (
+    Users, Polls, PollOptions, PollVoters, VoteRankings, VoteBallots
+)
+
+
+class QueryCounter(object):
+    def __init__(self, database: Database):
+        self.database = database
+        self.num_queries = 0
+        self._execute_sql = database.execute_sql
+
+    def execute_sql(self, *args, **kwargs):
+        self.num_queries += 1
+        return self._execute_sql(*args, **kwargs)
+
+    def __enter__(self):
+        self.num_queries = 0
+        self.database.execute_sql = self.execute_sql
+        return self
+
+    def __exit__(self, *_):
+        self.database.execute_sql = self._execute_sql
+
+
+def create_poll(
+    votes: List[List[int]], num_options: int = 4, legacy: bool = False
+) -> Polls:
+    """
+    creates a poll with one registered voter per ballot in votes,
+    where each ballot is given as a list of option numbers
+    (or negative special vote values)
+    ballots are stored as VoteBallots rows, or as legacy
+    VoteRankings rows if legacy is set
+    """
+    # start after existing tele ids, so that a test can create many polls
+    tele_id_offset = Users.select(fn.MAX(Users.tele_id)).scalar() or 0
+    creator = Users.create(tele_id=tele_id_offset + 1)
+    poll = Polls.create(
+        creator=creator, num_voters=len(votes),
+        close_time=datetime.datetime.now(),
+        max_voters=len(votes)
+    )
+    option_ids = {
+        option_number: PollOptions.create(
+            poll=poll, option_name=f'option {option_number}',
+            option_number=option_number
+        ).id for option_number in range(1, num_options + 1)
+    }
+
+    for voter_no, ballot in enumerate(votes):
+        user = Users.create(tele_id=tele_id_offset + 100 + voter_no)
+        poll_voter = PollVoters.create(poll=poll, user=user, voted=True)
+        if not legacy:
+            VoteBallots.save_ballot(poll.id, poll_voter.id, [
+                option_ids[value] if value > 0 else value
+                for value in ballot
+            ])
+            continue
+
+        for ranking, option_number in enumerate(ballot):
+            if option_number > 0:
+                VoteRankings.create(
+                    poll_voter=poll_voter, ranking=ranking,
+                    option=option_ids[option_number]
+                )
+            else:
+                VoteRankings.create(
+                    poll_voter=poll_voter, ranking=ranking,
+                    special_value=option_number
+                )
+
+    return poll
@@ -0,0 +1,126 @@
+import datetime
+import pytest
+
+from collections import Counter
+
+from helpers.ballot_loader import BallotLoader
+from helpers.ballot_compaction import BallotCompactor, BallotCompactionConfig
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import (
+    test_database, Polls, PollWinners, VoteBallots, VoteRankings,
+    CompactedBallots
+)
+
+VOTES = [[1, 2], [2, 1], [1, 2], [3, -1], [1, 2], [3, -1]]
+
+
+def close_poll(poll: Polls, store_winners: bool = True):
+    Polls.update(closed=True).where(Polls.id == poll.id).execute()
+    if store_winners:
+        PollWinners.save_strategy_winner_ids(poll.id, {0: None})
+
+
+def count_ballots(poll_id: int) -> Counter:
+    return Counter(
+        tuple(ballot) for _, ballot in
+        BallotLoader.load_poll_ballots(poll_id).iter_ballots()
+    )
+
+
+def build_compactor(**kwargs) -> BallotCompactor:
+    return BallotCompactor(BallotCompactionConfig(**kwargs))
+
+
+def test_only_closed_polls_with_winners_are_compacted(test_database):
+    open_poll = create_poll(VOTES)
+    unresolved_poll = create_poll(VOTES)
+    close_poll(unresolved_poll, store_winners=False)
+    resolved_poll = create_poll(VOTES)
+    close_poll(resolved_poll)
+
+    compactor = build_compactor()
+    assert compactor.find_compactable_polls() == [resolved_poll.id]
+    assert compactor.compact_poll(open_poll.id) == 0
+    assert compactor.run_once() == (1, 0)
+    assert compactor.find_compactable_polls() == []
+
+
+def test_compacted_ballots_are_weighted(test_database):
+    poll = create_poll(VOTES)
+    raw_ballot_counts = count_ballots(poll.id)
+    close_poll(poll)
+
+    assert BallotCompactor.compact_poll(poll.id) == 3
+    assert CompactedBallots.select().count() == 3
+
+    ballots = BallotLoader.load_poll_ballots(poll.id)
+    assert ballots.is_weighted
+    assert ballots.num_ballots == len(VOTES)
+    assert count_ballots(poll.id) == raw_ballot_counts
+
+
+def test_purge_raw_ballots_in_chunks(test_database):
+    poll = create_poll(VOTES)
+    legacy_poll = create_poll(VOTES, legacy=True)
+    close_poll(poll)
+    close_poll(legacy_poll)
+    raw_ballot_counts = count_ballots(poll.id)
+    legacy_ballot_counts = count_ballots(legacy_poll.id)
+
+    compactor = build_compactor(
+        retention=datetime.timedelta(days=1), purge_chunk_size=4
+    )
+    assert compactor.run_once() == (2, 0)
+    # raw ballots are kept until the retention period is over
+    assert compactor.find_purgeable_polls() == []
+    later = datetime.datetime.now() + datetime.timedelta(days=2)
+    assert compactor.find_purgeable_polls(later) == [
+        poll.id, legacy_poll.id
+    ]
+
+    assert compactor.purge_poll(poll.id) == len(VOTES)
+    assert compactor.purge_poll(legacy_poll.id) == sum(map(len, VOTES))
+    assert compactor.purge_poll(poll.id) == 0
+    assert VoteBallots.select().count() == 0
+    assert VoteRankings.select().count() == 0
+    assert count_ballots(poll.id) == raw_ballot_counts
+    assert count_ballots(legacy_poll.id) == legacy_ballot_counts
+
+    # individual ballots are gone, so the poll can't be reopened
+    assert not BallotCompactor.uncompact_poll(poll.id)
+
+
+def test_uncompact_before_purge(test_database):
+    poll = create_poll(VOTES)
+    close_poll(poll)
+    BallotCompactor.compact_poll(poll.id)
+
+    assert BallotCompactor.uncompact_poll(poll.id)
+    assert CompactedBallots.select().count() == 0
+    assert not BallotLoader.load_poll_ballots(poll.id).is_weighted
+    assert Polls.get_by_id(poll.id).ballots_compacted_at is None
+
+
+def test_recount_matches_raw_ballots(test_database):
+    pytest.importorskip('py_rcv')
+    from helpers.rcv_tally import RCVTally
+
+    poll = create_poll(VOTES)
+    raw_reports = RCVTally._determine_poll_winner(poll.id).unwrap()
+    close_poll(poll)
+    BallotCompactor.compact_poll(poll.id)
+    compacted_reports = RCVTally._determine_poll_winner(poll.id).unwrap()
+
+    assert compacted_reports.round_reports == raw_reports.round_reports
+
+
+def test_config_from_yaml():
+    config = BallotCompactionConfig.from_config({
+        'ballot_retention_days': 7, 'purge_chunk_size': 50,
+        'compaction_max_polls_per_run': 3
+    })
+    assert config.retention.days == 7
+    assert config.purge_chunk_size == 50
+    assert config.max_polls_per_run == 3
+    assert BallotCompactionConfig.from_config(None) == BallotCompactionConfig()
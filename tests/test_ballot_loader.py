@@ -0,0 +1,97 @@
+import pytest
+
+from helpers import constants
+from helpers.special_votes import SpecialVotes
+from helpers.ballot_loader import BallotLoader
+from tests.poll_fixtures import QueryCounter, create_poll
+# noinspection PyUnresolvedReferences
+from database import test_database, Users, PollOptions, VoteBallots
+
+
+def test_load_poll_ballots(test_database):
+    votes = [[1, 2, 3], [3], [2, 1, SpecialVotes.WITHHOLD_VOTE.value]]
+    poll = create_poll(votes)
+    option_ids = {
+        option.option_number: option.id for option in
+        PollOptions.select().where(PollOptions.poll == poll.id)
+    }
+
+    ballots = BallotLoader.load_poll_ballots(poll.id)
+    assert ballots.num_ballots == len(votes)
+    assert len(ballots.offsets) == len(votes) + 1
+
+    for (_, ballot), vote in zip(ballots.iter_ballots(), votes):
+        expected = [
+            option_ids[value] if value > 0 else value for value in vote
+        ]
+        assert list(ballot) == expected
+
+
+def test_pack_ballot_round_trip():
+    ballot = [7, 70000, 2 ** 31 - 1, SpecialVotes.ABSTAIN_VOTE.value]
+    raw_ballot = VoteBallots.pack_ballot(ballot)
+    assert len(raw_ballot) == 4 * len(ballot)
+    assert VoteBallots.unpack_ballot(raw_ballot).tolist() == ballot
+
+
+def test_legacy_rankings_dual_read(test_database, monkeypatch):
+    legacy_poll = create_poll(
+        [[1, 2], [3, SpecialVotes.WITHHOLD_VOTE.value]], legacy=True
+    )
+    poll_voter_ids = list(BallotLoader.load_poll_ballots(
+        legacy_poll.id
+    ).voter_ids)
+    assert len(poll_voter_ids) == 2
+    # a ballot rewritten as a VoteBallots row takes precedence
+    # over the voter's leftover VoteRankings rows
+    VoteBallots.save_ballot(legacy_poll.id, poll_voter_ids[0], [-2])
+
+    ballots = BallotLoader.load_poll_ballots(legacy_poll.id)
+    assert sorted(ballots.voter_ids) == poll_voter_ids
+    assert list(ballots.get_ballot(0)) == [-2]
+    assert VoteBallots.read_ballot(poll_voter_ids[1])[1] == -1
+
+    monkeypatch.setattr(constants, 'READ_LEGACY_VOTE_RANKINGS', False)
+    ballots = BallotLoader.load_poll_ballots(legacy_poll.id)
+    assert list(ballots.voter_ids) == poll_voter_ids[:1]
+    assert VoteBallots.read_ballot(poll_voter_ids[1]) == []
+
+
+def test_ballot_query_count_is_constant(test_database):
+    query_counts = []
+
+    for num_voters in (3, 30):
+        poll = create_poll([[1, 2, 3, 4]] * num_voters)
+        with QueryCounter(test_database) as counter:
+            ballots = BallotLoader.load_poll_ballots(poll.id)
+
+        assert ballots.num_ballots == num_voters
+        query_counts.append(counter.num_queries)
+        Users.delete().execute()
+
+    # compacted ballots check and packed ballots, plus
+    # legacy rankings during the dual read period
+    expected_num_queries = 2 + int(constants.READ_LEGACY_VOTE_RANKINGS)
+    assert query_counts[0] == query_counts[1] == expected_num_queries
+
+
+def test_tally_query_count_is_constant(test_database, monkeypatch):
+    from helpers import tally_engine
+    from helpers.rcv_tally import RCVTally
+    # the query count doesn't depend on the engine, so the test
+    # runs with the numpy engine whether or not py_rcv is installed
+    monkeypatch.setattr(
+        tally_engine, '_default_engine_name', tally_engine.NUMPY_ENGINE
+    )
+    query_counts = []
+
+    for num_voters in (3, 30):
+        poll = create_poll([[1, 2, 3, 4]] * num_voters)
+        with QueryCounter(test_database) as counter:
+            winner_res = RCVTally._determine_poll_winner(poll.id)
+
+        assert winner_res.is_ok()
+        query_counts.append(counter.num_queries)
+        Users.delete().execute()
+
+    assert query_counts[0] == query_counts[1]
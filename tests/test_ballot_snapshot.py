@@ -0,0 +1,158 @@
+import os
+import struct
+import pytest
+
+from collections import Counter
+
+from helpers.ballot_loader import BallotLoader
+from helpers.ballot_compaction import BallotCompactor
+from helpers.ballot_snapshot import (
+    BallotSnapshot, SnapshotFormatError, export_poll_snapshot
+)
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import test_database, Polls, PollWinners
+
+VOTES = [[1, 2], [2, 1], [1, 2, 3], [3, -1], [-2], [1]]
+
+
+def snapshot_ballots(snapshot: BallotSnapshot) -> Counter:
+    return Counter(
+        tuple(ballot) for _, ballot in snapshot.ballots.iter_ballots()
+    )
+
+
+def test_snapshot_round_trip(test_database, tmp_path):
+    poll = create_poll(VOTES)
+    path = str(tmp_path / 'poll.snapshot')
+    header = export_poll_snapshot(poll.id, path)
+    assert header.num_entries == len(VOTES)
+
+    expected_ballots = BallotLoader.load_poll_ballots(poll.id)
+    with BallotSnapshot(path) as snapshot:
+        assert snapshot.header == header
+        assert len(snapshot.header.options) == 4
+        assert not snapshot.ballots.is_weighted
+        # arrays are views over the mapped file rather than copies
+        assert isinstance(snapshot.ballots.values, memoryview)
+        assert list(snapshot.ballots.values) == list(expected_ballots.values)
+        assert list(snapshot.ballots.offsets) == list(
+            expected_ballots.offsets
+        )
+        assert list(snapshot.ballots.voter_ids) == list(
+            expected_ballots.voter_ids
+        )
+
+
+def test_weighted_snapshot(test_database, tmp_path):
+    poll = create_poll(VOTES + VOTES)
+    Polls.update(closed=True).where(Polls.id == poll.id).execute()
+    PollWinners.save_strategy_winner_ids(poll.id, {0: None})
+    BallotCompactor.compact_poll(poll.id)
+
+    path = str(tmp_path / 'poll.snapshot')
+    export_poll_snapshot(poll.id, path)
+    with BallotSnapshot(path) as snapshot:
+        assert snapshot.ballots.is_weighted
+        assert snapshot.ballots.num_ballots == 2 * len(VOTES)
+        assert snapshot_ballots(snapshot) == Counter(
+            tuple(ballot) for _, ballot in
+            BallotLoader.load_poll_ballots(poll.id).iter_ballots()
+        )
+
+
+def test_invalid_snapshots(test_database, tmp_path):
+    poll = create_poll(VOTES)
+    path = tmp_path / 'poll.snapshot'
+    export_poll_snapshot(poll.id, str(path))
+    raw_snapshot = path.read_bytes()
+
+    path.write_bytes(b'NOTASNAP' + raw_snapshot[8:])
+    with pytest.raises(SnapshotFormatError):
+        BallotSnapshot(str(path))
+
+    path.write_bytes(
+        raw_snapshot[:8] + struct.pack('<H', 99) + raw_snapshot[10:]
+    )
+    with pytest.raises(SnapshotFormatError):
+        BallotSnapshot(str(path))
+
+    path.write_bytes(raw_snapshot[:-4])
+    with pytest.raises(SnapshotFormatError):
+        BallotSnapshot(str(path))
+
+    # offsets that start and end right but aren't in order
+    num_values = sum(len(ranking) for ranking in VOTES)
+    offsets_start = len(raw_snapshot) - 4 * num_values - 8 * (len(VOTES) + 1)
+    path.write_bytes(
+        raw_snapshot[:offsets_start + 8] +
+        struct.pack('<q', num_values) + raw_snapshot[offsets_start + 16:]
+    )
+    with pytest.raises(SnapshotFormatError):
+        BallotSnapshot(str(path))
+
+
+def test_close_with_ballots_in_use(test_database, tmp_path):
+    poll = create_poll(VOTES)
+    path = str(tmp_path / 'poll.snapshot')
+    export_poll_snapshot(poll.id, path)
+
+    snapshot = BallotSnapshot(path)
+    ballot = snapshot.ballots.get_ballot(0)
+    with pytest.raises(BufferError):
+        snapshot.close()
+
+    ballot.release()
+    snapshot.close()
+
+
+def test_recount_without_database(test_database, tmp_path):
+    pytest.importorskip('py_rcv')
+    from helpers.rcv_tally import RCVTally
+
+    poll = create_poll(VOTES)
+    path = str(tmp_path / 'poll.snapshot')
+    export_poll_snapshot(poll.id, path)
+    expected_winner = RCVTally.count_votes(
+        poll.vote_algorithm, poll.num_active_voters,
+        BallotLoader.load_poll_ballots(poll.id)
+    )
+
+    test_database.close()
+    with BallotSnapshot(path) as snapshot:
+        assert snapshot.count_votes() == expected_winner
+
+
+def test_recounts_load_fresh_counters(test_database, tmp_path, monkeypatch):
+    from helpers.rcv_tally import RCVTally
+    poll = create_poll(VOTES)
+    path = str(tmp_path / 'poll.snapshot')
+    export_poll_snapshot(poll.id, path)
+    ballots = BallotLoader.load_poll_ballots(poll.id)
+    expected_winners = {
+        vote_algorithm: RCVTally.count_votes(
+            vote_algorithm, poll.num_active_voters, ballots
+        ) for vote_algorithm in range(4)
+    }
+
+    num_builds = 0
+    build_votes_counter = RCVTally.build_votes_counter
+
+    def counting_build_votes_counter(*args, **kwargs):
+        nonlocal num_builds
+        num_builds += 1
+        return build_votes_counter(*args, **kwargs)
+
+    monkeypatch.setattr(
+        RCVTally, 'build_votes_counter', counting_build_votes_counter
+    )
+    with BallotSnapshot(path) as snapshot:
+        # counts in both orders, so that each strategy follows another
+        for vote_algorithm in [*range(4), *reversed(range(4))]:
+            assert snapshot.count_votes(vote_algorithm) == (
+                expected_winners[vote_algorithm]
+            )
+
+    # the counter is built once, and recounts leave no files behind
+    assert num_builds == 1
+    assert os.listdir(tmp_path) == ['poll.snapshot']
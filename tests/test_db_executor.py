@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import pytest
+
+from peewee import SqliteDatabase
+from database.setup import database_proxy, checkout_connection
+from helpers.db_executor import DBExecutor
+from tests.test_db_pool import PooledTestDB, build_pool
+
+
+@pytest.fixture
+def db_executor():
+    DBExecutor._instance = None
+    executor = DBExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+    DBExecutor._instance = None
+
+
+@pytest.fixture
+def pooled_proxy(build_pool):
+    prev_db = database_proxy.obj
+    pool = build_pool(max_connections=4, checkout_timeout=1)
+    database_proxy.initialize(pool)
+    yield pool
+    database_proxy.initialize(prev_db)
+
+
+def read_connection(pool: PooledTestDB):
+    pool.execute_sql('SELECT 1')
+    return threading.get_ident(), pool.connection()
+
+
+def test_runs_on_update_connection(db_executor, pooled_proxy):
+    async def handle_update():
+        async with checkout_connection():
+            update_connection = pooled_proxy.connection()
+            results = await asyncio.gather(*(
+                db_executor.run(read_connection, pooled_proxy)
+                for _ in range(4)
+            ))
+        return update_connection, results
+
+    update_connection, results = asyncio.run(handle_update())
+    assert all(thread_id != threading.get_ident() for thread_id, _ in results)
+    assert all(conn is update_connection for _, conn in results)
+    assert pooled_proxy.get_metrics().in_use == 0
+
+
+def test_borrows_connection_outside_updates(db_executor, pooled_proxy):
+    asyncio.run(db_executor.run(read_connection, pooled_proxy))
+    metrics = pooled_proxy.get_metrics()
+    assert metrics.num_checkouts == 1
+    assert metrics.in_use == 0
+    # the borrowed connection went back into the pool
+    assert metrics.idle == 1
+
+
+def test_unpooled_databases_run_inline(db_executor):
+    prev_db = database_proxy.obj
+    database_proxy.initialize(SqliteDatabase(':memory:'))
+    try:
+        thread_id = asyncio.run(db_executor.run(threading.get_ident))
+    finally:
+        database_proxy.initialize(prev_db)
+
+    assert thread_id == threading.get_ident()
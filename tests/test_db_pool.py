@@ -0,0 +1,165 @@
+import time
+import asyncio
+import pytest
+
+from playhouse.pool import PooledSqliteDatabase, MaxConnectionsExceeded
+from database.pool import ConnectionPoolMixin, PoolConfig
+
+
+class PooledTestDB(ConnectionPoolMixin, PooledSqliteDatabase):
+    pass
+
+
+@pytest.fixture
+def build_pool(tmp_path):
+    pools = []
+
+    def build(**kwargs) -> PooledTestDB:
+        # pooled connections get handed between threads
+        pool = PooledTestDB.from_pool_config(
+            str(tmp_path / 'pool.db'), PoolConfig(**kwargs),
+            check_same_thread=False
+        )
+        pools.append(pool)
+        return pool
+
+    yield build
+    for pool in pools:
+        pool.close_all()
+
+
+def test_concurrent_tasks_hold_separate_connections(build_pool):
+    pool = build_pool(max_connections=4, checkout_timeout=1)
+    scope_connections = []
+
+    async def handle_update():
+        async with pool.async_connection_scope():
+            connection = pool.connection()
+            scope_connections.append(connection)
+            await asyncio.sleep(0.05)
+            assert pool.connection() is connection
+            pool.execute_sql('SELECT 1')
+
+    async def handle_updates():
+        await asyncio.gather(*(handle_update() for _ in range(3)))
+
+    asyncio.run(handle_updates())
+    assert len(set(map(id, scope_connections))) == 3
+
+    metrics = pool.get_metrics()
+    assert metrics.num_checkouts == 3
+    assert metrics.in_use == 0
+    assert metrics.idle == 3
+    # connections are returned to the pool and reused
+    asyncio.run(handle_update())
+    assert pool.get_metrics().idle == 3
+
+
+def test_checkout_waits_for_free_connection(build_pool):
+    pool = build_pool(max_connections=1, checkout_timeout=2)
+
+    async def hold_connection(delay: float):
+        async with pool.async_connection_scope():
+            await asyncio.sleep(delay)
+
+    async def contend():
+        await asyncio.gather(hold_connection(0.2), hold_connection(0))
+
+    asyncio.run(contend())
+    metrics = pool.get_metrics()
+    assert metrics.num_checkouts == 2
+    assert metrics.num_timeouts == 0
+    assert metrics.max_wait >= 0.1
+
+
+def test_checkout_times_out(build_pool):
+    pool = build_pool(max_connections=1, checkout_timeout=1)
+
+    async def contend():
+        async with pool.async_connection_scope():
+            with pytest.raises(MaxConnectionsExceeded):
+                async with pool.async_connection_scope():
+                    pass
+
+    asyncio.run(contend())
+    metrics = pool.get_metrics()
+    assert metrics.num_timeouts == 1
+    assert metrics.in_use == 0
+
+
+def test_sync_scope_restores_outer_connection(build_pool):
+    pool = build_pool(max_connections=2)
+    pool.connect()
+    outer_connection = pool.connection()
+
+    with pool.connection_scope():
+        assert pool.connection() is not outer_connection
+
+    assert pool.connection() is outer_connection
+    assert pool.get_metrics().in_use == 1
+    pool.close()
+
+
+def test_maintain_fills_and_recycles_pool(build_pool):
+    pool = build_pool(min_connections=3, max_connections=4)
+    pool.maintain()
+    assert pool.get_metrics().idle == 3
+
+    # stale idle connections are replaced by fresh ones
+    stale_connections = {conn for _, conn in pool._connections}
+    pool._connections = [(0, conn) for _, conn in pool._connections]
+    pool.maintain()
+    assert pool.get_metrics().idle == 3
+    assert stale_connections.isdisjoint(
+        conn for _, conn in pool._connections
+    )
+
+
+def test_maintain_keeps_idle_connections_in_heap_order(build_pool):
+    pool = build_pool(min_connections=4, max_connections=4)
+    pool.maintain()
+    conns = [conn for _, conn in pool._connections]
+    now = time.time()
+    # a valid heap, which isn't one anymore once its stale root is dropped
+    pool._connections = [(0, conns[0])] + [
+        (now + offset, conn) for offset, conn in zip((10, 1, 11), conns[1:])
+    ]
+    pool.min_connections = 0
+    pool.maintain()
+    assert pool._connections[0][0] == now + 1
+
+
+def test_spawned_tasks_dont_share_scope(build_pool):
+    pool = build_pool(max_connections=4, checkout_timeout=1)
+
+    async def query_later(open_scope: bool):
+        await asyncio.sleep(0.05)
+        if open_scope:
+            async with pool.async_connection_scope():
+                pool.execute_sql('SELECT 1')
+        else:
+            pool.execute_sql('SELECT 1')
+
+    async def handle_update():
+        async with pool.async_connection_scope():
+            update_connection = pool.connection()
+            tasks = [
+                asyncio.create_task(query_later(open_scope))
+                for open_scope in (True, False)
+            ]
+            # threads spawned by the update don't get its connection
+            thread_connection = await asyncio.to_thread(pool.connection)
+            assert thread_connection is not update_connection
+
+        # the update's connection went back to the pool, and
+        # the tasks only query after the update's scope has ended
+        assert pool.get_metrics().in_use == 1
+        await asyncio.gather(*tasks)
+
+    asyncio.run(handle_update())
+    # the task without a scope of its own falls back on a connection
+    # per thread (like peewee's unpooled databases) instead of
+    # reopening the connection of the update's scope
+    assert pool.get_metrics().in_use == 2
+    pool.close()
+    assert pool.get_metrics().in_use == 1
@@ -0,0 +1,108 @@
+from tests.poll_fixtures import create_poll, QueryCounter
+# noinspection PyUnresolvedReferences
+from database import test_database, Users, Polls, PollVoters
+from database.identity_map import identity_scope, remember
+
+
+def test_fetch_reuses_rows_in_scope(test_database):
+    poll = create_poll([[1, 2]])
+
+    with identity_scope() as identity_map:
+        with QueryCounter(test_database) as counter:
+            first_read = Polls.fetch(poll.id)
+            second_read = Polls.fetch(poll.id)
+            creator = Users.fetch(poll.creator_id)
+            assert Users.fetch_by(Users.tele_id, creator.tele_id) is creator
+
+        assert first_read is second_read
+        assert counter.num_queries == 2
+        assert len(identity_map) == 2
+
+    # rows aren't cached outside of an identity scope
+    with QueryCounter(test_database) as counter:
+        assert Polls.fetch(poll.id) is not Polls.fetch(poll.id)
+    assert counter.num_queries == 2
+
+
+def test_writes_evict_rows(test_database):
+    poll = create_poll([[1, 2]])
+
+    with identity_scope() as identity_map:
+        cached_poll = Polls.fetch(poll.id)
+        Polls.update({Polls.num_voters: Polls.num_voters + 1}).where(
+            Polls.id == poll.id
+        ).execute()
+
+        fresh_poll = Polls.fetch(poll.id)
+        assert fresh_poll is not cached_poll
+        assert fresh_poll.num_voters == cached_poll.num_voters + 1
+
+        fresh_poll.desc = 'edited'
+        fresh_poll.save()
+        assert Polls.fetch(poll.id).desc == 'edited'
+
+        # writes to other models leave the poll cached
+        remember(Users.get_by_id(poll.creator_id))
+        PollVoters.update({PollVoters.voted: False}).execute()
+        assert len(identity_map) == 2
+        Users.delete().where(Users.id == -1).execute()
+        assert len(identity_map) == 1
+
+
+def test_read_poll_metadata_reads_poll_once(test_database):
+    from base_api import BaseAPI
+    poll = create_poll([[1, 2]])
+    poll_voter = PollVoters.select().where(PollVoters.poll == poll.id).get()
+
+    with identity_scope():
+        with QueryCounter(test_database) as counter:
+            assert BaseAPI.has_access_to_poll_id(
+                poll.id, poll_voter.user_id, username=None
+            )
+            BaseAPI.unverified_read_poll_info(poll.id)
+            assert BaseAPI.get_poll_closed(poll.id).is_err()
+
+    # one poll read, one voter check and one options read
+    assert counter.num_queries == 3
+
+
+def test_transactions_bypass_identity_map(test_database):
+    poll = create_poll([[1, 2]])
+
+    with identity_scope() as identity_map:
+        cached_poll = Polls.fetch(poll.id)
+        # e.g. another process' write the map doesn't know about
+        Polls.raw(
+            'UPDATE polls SET num_voters = 7 WHERE id = ?', poll.id
+        ).execute()
+
+        with test_database.atomic():
+            fresh_poll = Polls.fetch(poll.id)
+            assert fresh_poll is not cached_poll
+            assert fresh_poll.num_voters == 7
+            remember(Users.get_by_id(poll.creator_id))
+
+        # rows read in the transaction weren't remembered
+        assert Polls.fetch(poll.id) is cached_poll
+        assert len(identity_map) == 1
+
+
+def test_identity_map_stays_with_its_scope(test_database):
+    import asyncio
+    import contextvars
+    from database.identity_map import borrow_identity_map, get_identity_map
+
+    with identity_scope() as identity_map:
+        context = contextvars.copy_context()
+        # threads spawned in the scope only use the map when it's lent
+        assert asyncio.run(asyncio.to_thread(get_identity_map)) is None
+
+        def borrow():
+            with borrow_identity_map(identity_map):
+                return get_identity_map()
+
+        assert asyncio.run(asyncio.to_thread(borrow)) is identity_map
+        assert context.run(get_identity_map) is identity_map
+
+    # copies of the scope's context that outlive it stop using the map
+    assert context.run(get_identity_map) is None
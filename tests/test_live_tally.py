@@ -0,0 +1,176 @@
+import logging
+import pytest
+import threading
+
+from helpers.ballot_loader import BallotLoader
+from helpers.live_tally import LivePollTally, LiveTallyManager
+from tests.poll_fixtures import QueryCounter, create_poll
+# noinspection PyUnresolvedReferences
+from database import test_database, PollVoters, VoteBallots
+
+
+def test_set_and_remove_ballots():
+    live_tally = LivePollTally(poll_id=1)
+    assert live_tally.set_ballot(10, [1, 2]) is None
+    assert live_tally.set_ballot(11, [1, 2]) is None
+    assert live_tally.set_ballot(10, [3]) == (1, 2)
+    assert live_tally.count_ballots() == {(1, 2): 1, (3,): 1}
+
+    assert live_tally.remove_ballot(11) == (1, 2)
+    assert live_tally.remove_ballot(11) is None
+    assert live_tally.num_ballots == 1
+
+    packed_ballots = live_tally.to_packed_ballots()
+    assert [
+        (voter_id, list(ballot))
+        for voter_id, ballot in packed_ballots.iter_ballots()
+    ] == [(10, [3])]
+
+
+def test_warm_poll_skips_database(test_database):
+    manager = LiveTallyManager()
+    manager.clear()
+    poll = create_poll([[1, 2], [2, 1]])
+
+    cold_ballots = manager.get_ballots(poll.id, keep_warm=False)
+    assert not manager.is_warm(poll.id)
+    warm_ballots = manager.get_ballots(poll.id)
+    assert manager.is_warm(poll.id)
+    assert warm_ballots == cold_ballots
+
+    voter_id = warm_ballots.voter_ids[0]
+    assert manager.register_ballot(poll.id, voter_id, [-1])
+    with QueryCounter(test_database) as counter:
+        ballots = manager.get_ballots(poll.id)
+
+    assert counter.num_queries == 0
+    assert list(ballots.get_ballot(0)) == [-1]
+    manager.clear()
+
+
+def test_verify_poll_rebuilds_on_mismatch(test_database):
+    manager = LiveTallyManager()
+    manager.clear()
+    poll = create_poll([[1, 2], [2, 1], [3]])
+    manager.get_ballots(poll.id)
+    assert manager.verify_poll(poll.id)
+
+    # delete a ballot without going through register_ballot
+    poll_voter = PollVoters.select().where(
+        PollVoters.poll == poll.id
+    ).get()
+    VoteBallots.delete().where(
+        VoteBallots.poll_voter == poll_voter.id
+    ).execute()
+
+    assert manager.verify_all() == [poll.id]
+    assert manager.get_ballots(poll.id).num_ballots == 2
+    assert manager.verify_poll(poll.id)
+    manager.clear()
+
+
+def test_ballots_registered_on_commit(test_database):
+    from base_api import BaseAPI
+    register_vote = getattr(BaseAPI, '_BaseAPI__unsafe_register_vote')
+    manager = LiveTallyManager()
+    manager.clear()
+    poll = create_poll([[1, 2], [2, 1]])
+    poll_voter = PollVoters.select().where(PollVoters.poll == poll.id).get()
+    manager.get_ballots(poll.id)
+
+    # votes rolled back by an outer transaction never reach the tally
+    with pytest.raises(RuntimeError):
+        with test_database.atomic():
+            register_vote(poll.id, poll_voter.id, [3])
+            assert manager.live_tallies[poll.id].voter_ballots[
+                poll_voter.id
+            ] != (3,)
+            raise RuntimeError
+    assert manager.verify_poll(poll.id)
+
+    with test_database.atomic():
+        register_vote(poll.id, poll_voter.id, [3])
+    assert manager.verify_poll(poll.id)
+    manager.clear()
+
+
+def test_deleted_accounts_remove_ballots(test_database):
+    manager = LiveTallyManager()
+    manager.clear()
+    poll = create_poll([[1, 2], [2, 1]])
+    poll_voter = PollVoters.select().where(PollVoters.poll == poll.id).get()
+    assert manager.get_ballots(poll.id).num_ballots == 2
+
+    poll_voter.user.delete_account(logging.getLogger())
+    live_tally = manager.live_tallies[poll.id]
+    assert poll_voter.id not in live_tally.voter_ballots
+    assert live_tally.num_ballots == 1
+
+    poll.creator.delete_account(logging.getLogger())
+    assert not manager.is_warm(poll.id)
+    manager.clear()
+
+
+def test_rebuild_applies_votes_cast_while_loading(
+    test_database, monkeypatch
+):
+    manager = LiveTallyManager()
+    manager.clear()
+    poll = create_poll([[1, 2], [2, 1]])
+    voter_ids = manager.get_ballots(poll.id, keep_warm=False).voter_ids
+    load_poll_ballots = BallotLoader.load_poll_ballots
+
+    def load_and_vote(poll_id: int):
+        ballots = load_poll_ballots(poll_id)
+        # votes cast after the rows were read, before the tally is built
+        manager.register_ballot(poll_id, voter_ids[0], [3])
+        manager.remove_ballot(poll_id, voter_ids[1])
+        return ballots
+
+    monkeypatch.setattr(BallotLoader, 'load_poll_ballots', load_and_vote)
+    live_tally = manager.rebuild(poll.id)
+    assert live_tally.voter_ballots == {voter_ids[0]: (3,)}
+    assert manager._pending_changes == {}
+    manager.clear()
+
+
+def test_ballot_changes_are_broadcast_in_background(monkeypatch):
+    manager = LiveTallyManager()
+    published = []
+    sending = threading.Event()
+    release = threading.Event()
+
+    class FakePipeline(object):
+        def __init__(self):
+            self.messages = []
+
+        def publish(self, channel: str, message: str):
+            self.messages.append(message.partition(':')[2])
+
+        def execute(self):
+            sending.set()
+            assert release.wait(timeout=5)
+            published.append(self.messages)
+
+    class FakeClient(object):
+        @staticmethod
+        def pipeline(transaction: bool):
+            return FakePipeline()
+
+    monkeypatch.setattr(manager, 'redis_url', 'redis://localhost')
+    monkeypatch.setattr(manager, 'get_redis_client', lambda: FakeClient())
+    # votes don't wait for the broadcast to be sent
+    manager.register_ballot(1, 10, [1])
+    assert sending.wait(timeout=5)
+    # changes made while a broadcast is being sent are coalesced
+    for voter_id in range(3):
+        manager.register_ballot(2, voter_id, [1])
+        manager.remove_ballot(3, voter_id)
+
+    release.set()
+    manager.publish(manager.FLUSH_ALL)
+    manager._publish_executor.submit(lambda: None).result(timeout=5)
+    assert published in (
+        [['1'], ['2', '3', manager.FLUSH_ALL]],
+        [['1'], ['2', '3'], [manager.FLUSH_ALL]]
+    )
@@ -0,0 +1,158 @@
+import pickle
+import random
+import pytest
+
+pytest.importorskip('numpy')
+from helpers.numpy_rcv import (
+    PyEliminationStrategies, VotesCounter, TallyTask, determine_winners
+)
+from helpers.rcv_tally import RCVTally
+from helpers.round_report import RoundReport, RoundReportBuilder
+from helpers.tally_engine import NUMPY_ENGINE, RUST_ENGINE
+from tests.test_round_report import build_random_ballots, WITHHOLD, ABSTAIN
+
+
+def count_winner(votes, strategy=PyEliminationStrategies.DowdallScoring):
+    votes_counter = VotesCounter(strategy)
+    for vote_id, vote in enumerate(votes):
+        for vote_ranking in vote:
+            votes_counter.insert_vote_ranking(vote_id, vote_ranking)
+
+    votes_counter.flush_votes()
+    return votes_counter.determine_winner()
+
+
+@pytest.mark.parametrize('votes, winner', [
+    ([[1, 2, 3, 4], [1, 2, 3], [3], [3, 2, 4], [4, 1]], 1),
+    ([[1, 2], [2, 1]], None),
+    # exhausted ballots still count towards the majority
+    ([[1, WITHHOLD], [2, 1], [3, 2], [3]], None),
+    ([[WITHHOLD], [WITHHOLD], [WITHHOLD], [ABSTAIN]], None),
+    # abstained ballots don't
+    ([[1, ABSTAIN], [2, 1], [3, 2], [3]], 3),
+    ([
+        [1, 6, 15], [1, 2, 6, 15, 5, 4, 7, 3, 11],
+        [6, 15, 1, 11, 10, 16, 17, 8, 2, 3, 5, 7],
+        [9, 8, 6, 11, 13, 3, 1], [13, 14, 16, 6, 3, 4, 5, 2, 1, 8, 9]
+    ], 6)
+])
+def test_known_winners(votes, winner):
+    # same scenarios as test_ranked_vote.TestRankedChoiceVote
+    assert count_winner(votes) == winner
+
+
+def test_vote_validation():
+    assert VotesCounter.validate_raw_vote([1, 0, 3, 5]).to_tuple() == (
+        True, ''
+    )
+    for invalid_vote in ([], [1, 2, 2], [1, WITHHOLD, 2], [1, -3]):
+        validate_result = VotesCounter.validate_raw_vote(invalid_vote)
+        assert not validate_result.valid
+        assert len(validate_result.error_message) > 0
+
+    votes_counter = VotesCounter(candidates=[10, 20])
+    with pytest.raises(ValueError):
+        votes_counter.insert_ballot([10, 30], 1)
+    with pytest.raises(ValueError):
+        votes_counter.insert_ballots([1, 1], [0, 2])
+    with pytest.raises(ValueError):
+        votes_counter.insert_ballots([1, 2], [0, 3])
+
+
+def test_serialization_round_trip():
+    votes_counter = VotesCounter(
+        PyEliminationStrategies.EliminateAll, candidates=[10, 20, 30],
+        record_ballots=True
+    )
+    votes_counter.insert_ballot([10, 20], 3)
+    votes_counter.insert_ballots([20, 30, WITHHOLD], [0, 1, 3])
+    votes_counter.insert_empty_votes(2)
+
+    raw_counter = votes_counter.to_bytes()
+    restored_counter = VotesCounter.from_bytes(raw_counter)
+    assert restored_counter.to_bytes() == raw_counter
+    assert restored_counter.get_num_votes() == votes_counter.get_num_votes()
+    assert restored_counter.determine_winner() == (
+        votes_counter.determine_winner()
+    )
+    assert pickle.loads(pickle.dumps(votes_counter)).to_bytes() == raw_counter
+
+    with pytest.raises(ValueError):
+        VotesCounter.from_bytes(b'XXXX' + raw_counter[4:])
+    with pytest.raises(ValueError):
+        VotesCounter.from_bytes(raw_counter[:-1])
+    with pytest.raises(ValueError):
+        # ballots are only recorded for serialization if asked to
+        VotesCounter(PyEliminationStrategies.EliminateAll).to_bytes()
+
+
+def report_winner(report: RoundReport):
+    # the last round ends with a majority unless every
+    # remaining candidate was eliminated in it
+    if (len(report.rounds) == 0) or report.rounds[-1].eliminated:
+        return None
+
+    first_preferences = report.rounds[-1].first_preferences
+    return max(first_preferences, key=first_preferences.get)
+
+
+def test_winners_match_round_reports():
+    rng = random.Random(0)
+    for _ in range(200):
+        ballots = build_random_ballots(rng)
+        num_poll_voters = ballots.num_ballots + rng.randint(0, 3)
+        builder = RoundReportBuilder.from_packed_ballots(
+            ballots, num_poll_voters
+        )
+        for strategy in PyEliminationStrategies.get_all_strategies():
+            winner = RCVTally.count_votes(
+                strategy.to_int(), num_poll_voters, ballots,
+                engine_name=NUMPY_ENGINE
+            )
+            report = builder.build(strategy.to_int(), winner)
+            assert winner == report_winner(report)
+
+
+def test_batch_matches_single_counts():
+    rng = random.Random(1)
+    tasks, expected_winners = [], []
+    for _ in range(20):
+        ballots = build_random_ballots(rng)
+        num_poll_voters = ballots.num_ballots + 1
+        strategy = rng.choice(PyEliminationStrategies.get_all_strategies())
+        tasks.append(TallyTask(
+            ballots.values, ballots.offsets, 1, strategy
+        ))
+        expected_winners.append(RCVTally.count_votes(
+            strategy.to_int(), num_poll_voters, ballots,
+            engine_name=NUMPY_ENGINE
+        ))
+
+    tally_results = determine_winners(tasks, num_threads=4)
+    assert all(tally_result.valid for tally_result in tally_results)
+    assert [tally_result.winner for tally_result in tally_results] == (
+        expected_winners
+    )
+
+    invalid_task = TallyTask([1, 1], [0, 2], 0, 0)
+    [tally_result] = determine_winners([invalid_task])
+    assert not tally_result.valid
+
+
+def test_matches_rust_engine():
+    # the numpy engine is an independent implementation of py_rcv's
+    # counting, so every strategy has to pick the same winners
+    pytest.importorskip('py_rcv')
+    rng = random.Random(2)
+
+    for _ in range(300):
+        ballots = build_random_ballots(rng)
+        num_poll_voters = ballots.num_ballots + rng.randint(0, 3)
+        for strategy in PyEliminationStrategies.get_all_strategies():
+            assert RCVTally.count_votes(
+                strategy.to_int(), num_poll_voters, ballots,
+                engine_name=NUMPY_ENGINE
+            ) == RCVTally.count_votes(
+                strategy.to_int(), num_poll_voters, ballots,
+                engine_name=RUST_ENGINE
+            )
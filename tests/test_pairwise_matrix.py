@@ -0,0 +1,177 @@
+import time
+import random
+import pytest
+
+from collections import Counter
+
+from helpers.pairwise_matrix import (
+    PairwiseMatrix, ballot_pair_deltas, iter_ballot_pairs
+)
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import (
+    test_database, Polls, PollOptions, PollVoters, PollPairwiseCounts,
+    VoteBallots
+)
+
+
+def test_ballot_pairs():
+    assert set(iter_ballot_pairs([2, 1], [1, 2, 3])) == {
+        (2, 1), (2, 3), (1, 3)
+    }
+    # rankings stop at special votes
+    assert set(iter_ballot_pairs([3, -1], [1, 2, 3])) == {(3, 1), (3, 2)}
+    assert set(iter_ballot_pairs([-2], [1, 2, 3])) == set()
+
+
+def test_ballot_pair_deltas():
+    assert ballot_pair_deltas([1, 2, 3], [1, 2], [1, 2]) == {}
+    assert ballot_pair_deltas([1, 2, 3], [1, 2], [2, 1]) == {
+        (1, 2): -1, (2, 1): 1
+    }
+    assert ballot_pair_deltas([1, 2], None, [2]) == {(2, 1): 1}
+    assert ballot_pair_deltas([1, 2], [2], None) == {(2, 1): -1}
+
+
+def test_ranked_pairs_order():
+    # 1 beats 2 (7-2), 2 beats 3 (6-3), 3 beats 1 (5-4): the weakest
+    # majority (3 over 1) is skipped as it would create a cycle
+    matrix = PairwiseMatrix.from_ballots(Counter({
+        (1, 2, 3): 4, (2, 3, 1): 2, (3, 1, 2): 3
+    }), candidates=[1, 2, 3])
+    assert matrix.get(1, 2) == 7
+    assert matrix.condorcet_winner() is None
+    assert matrix.ranked_pairs_order() == [1, 2, 3]
+    assert matrix.ranked_pairs_order([2, 3]) == [2, 3]
+
+    matrix.add_ballot((3, 2, 1), 4)
+    assert matrix.condorcet_winner() == 3
+    assert matrix.ranked_pairs_order()[0] == 3
+    matrix.add_ballot((3, 2, 1), -4)
+    assert matrix.condorcet_winner() is None
+
+
+def read_option_ids(poll_id: int) -> list[int]:
+    return [
+        option.id for option in PollOptions.select().where(
+            PollOptions.poll == poll_id
+        ).order_by(PollOptions.option_number)
+    ]
+
+
+def test_pairwise_counts_track_ballots(test_database):
+    poll = create_poll([[1, 2], [2, 1, 3], [3, -1], [-2]])
+    assert PollPairwiseCounts.create_poll_rows(poll.id) == 4 * 3
+    option_ids = read_option_ids(poll.id)
+
+    # rows start zeroed, so bring them in line with the fixture's votes
+    poll_voters = PollVoters.select().where(PollVoters.poll == poll.id)
+    ballots = {
+        poll_voter.id: VoteBallots.read_ballot(poll_voter.id)
+        for poll_voter in poll_voters
+    }
+    for ballot in ballots.values():
+        PollPairwiseCounts.replace_ballot(poll.id, option_ids, None, ballot)
+
+    def expected_counts() -> dict:
+        matrix = PairwiseMatrix.from_ballots(
+            Counter(tuple(ballot) for ballot in ballots.values()),
+            option_ids
+        )
+        return {
+            (winner_id, loser_id): matrix.get(winner_id, loser_id)
+            for winner_id in option_ids for loser_id in option_ids
+            if winner_id != loser_id
+        }
+
+    assert PollPairwiseCounts.read_counts(poll.id) == expected_counts()
+
+    rng = random.Random(0)
+    for _ in range(20):
+        poll_voter_id = rng.choice(list(ballots))
+        new_ballot = rng.sample(option_ids, rng.randint(1, 4))
+        PollPairwiseCounts.replace_ballot(
+            poll.id, option_ids, ballots[poll_voter_id], new_ballot
+        )
+        ballots[poll_voter_id] = new_ballot
+
+    assert PollPairwiseCounts.read_counts(poll.id) == expected_counts()
+
+
+def test_vote_registration_updates_counts(test_database):
+    pytest.importorskip('py_rcv')
+    from base_api import BaseAPI
+
+    poll = create_poll([[1, 2]], num_options=3)
+    PollPairwiseCounts.create_poll_rows(poll.id)
+    option_ids = read_option_ids(poll.id)
+    poll_voter = PollVoters.get(PollVoters.poll == poll.id)
+    register_vote = getattr(BaseAPI, '_BaseAPI__unsafe_register_vote')
+
+    PollPairwiseCounts.replace_ballot(
+        poll.id, option_ids, None, VoteBallots.read_ballot(poll_voter.id)
+    )
+
+    assert register_vote(poll.id, poll_voter.id, [3, 1]).unwrap() is False
+    counts = PollPairwiseCounts.read_counts(poll.id)
+    assert counts == {
+        (option_ids[2], option_ids[0]): 1, (option_ids[2], option_ids[1]): 1,
+        (option_ids[0], option_ids[1]): 1, (option_ids[0], option_ids[2]): 0,
+        (option_ids[1], option_ids[0]): 0, (option_ids[1], option_ids[2]): 0
+    }
+
+
+def test_concurrent_revotes_apply_in_turn(test_database, tmp_path):
+    import threading
+    from base_api import BaseAPI
+    from database import database
+    from database.test_database import SqliteTestDB
+
+    # every thread gets its own connection to the in-memory database
+    # (i.e. its own database), so the votes go to a database file
+    database.initialize_db(SqliteTestDB(str(tmp_path / 'votes.db')))
+    poll = create_poll([[1, 2]], num_options=3)
+    PollPairwiseCounts.create_poll_rows(poll.id)
+    option_ids = read_option_ids(poll.id)
+    poll_voter = PollVoters.get(PollVoters.poll == poll.id)
+    VoteBallots.delete().execute()
+    PollVoters.update(voted=False).execute()
+    register_vote = getattr(BaseAPI, '_BaseAPI__unsafe_register_vote')
+
+    # the first vote holds on to the previous ballot it read
+    # while the second vote comes in
+    first_read = threading.Event()
+    read_ballot = VoteBallots.read_ballot
+
+    def slow_read_ballot(poll_voter_id: int) -> list[int]:
+        ballot = read_ballot(poll_voter_id)
+        if not first_read.is_set():
+            first_read.set()
+            time.sleep(0.3)
+        return ballot
+
+    results = {}
+
+    def vote(ranking: list[int]):
+        results[tuple(ranking)] = register_vote(
+            poll.id, poll_voter.id, ranking
+        ).unwrap()
+
+    VoteBallots.read_ballot = slow_read_ballot
+    try:
+        first_vote = threading.Thread(target=vote, args=([3, 1],))
+        first_vote.start()
+        first_read.wait()
+        vote([2, 3])
+        first_vote.join()
+    finally:
+        VoteBallots.read_ballot = read_ballot
+
+    assert results == {(3, 1): True, (2, 3): False}
+    assert Polls.get_by_id(poll.id).num_votes == poll.num_votes + 1
+    # the counts only hold the last ballot
+    assert PollPairwiseCounts.read_counts(poll.id) == {
+        (option_ids[1], option_ids[2]): 1, (option_ids[1], option_ids[0]): 1,
+        (option_ids[2], option_ids[0]): 1, (option_ids[2], option_ids[1]): 0,
+        (option_ids[0], option_ids[1]): 0, (option_ids[0], option_ids[2]): 0
+    }
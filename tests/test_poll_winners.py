@@ -0,0 +1,87 @@
+import pytest
+
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import test_database, PollWinners, PollOptions
+
+
+def test_strategy_winners_round_trip(test_database):
+    poll = create_poll([[1, 2], [2, 1], [1]])
+    option_ids = [
+        option.id for option in
+        PollOptions.select().where(PollOptions.poll == poll.id)
+    ]
+    strategy_winner_ids = {0: option_ids[0], 1: None, 2: option_ids[1]}
+    PollWinners.save_strategy_winner_ids(poll.id, strategy_winner_ids)
+
+    assert PollWinners.read_poll_winner_id(poll.id, 0).unwrap() == (
+        option_ids[0]
+    )
+    assert PollWinners.read_poll_winner_id(poll.id, 1).unwrap() is None
+    assert PollWinners.read_poll_winner_id(poll.id, 3).is_err()
+    assert PollWinners.read_strategy_winner_ids(poll.id) == (
+        strategy_winner_ids
+    )
+
+    PollWinners.save_strategy_winner_ids(
+        poll.id, {3: None}, round_reports={3: '{"rounds":[]}'}
+    )
+    assert PollWinners.read_round_reports(poll.id) == {
+        0: None, 1: None, 2: None, 3: '{"rounds":[]}'
+    }
+    # saving again keeps the rows that were already stored
+    PollWinners.save_strategy_winner_ids(poll.id, {0: option_ids[2]})
+    assert PollWinners.read_strategy_winner_ids(poll.id) == {
+        **strategy_winner_ids, 3: None
+    }
+
+
+def test_winners_computed_for_every_strategy(test_database):
+    pytest.importorskip('py_rcv')
+    from py_rcv import PyEliminationStrategies
+    from helpers.rcv_tally import RCVTally
+
+    poll = create_poll([[1, 2], [1, 3], [2, 1]])
+    winner_info = RCVTally._determine_poll_winner(poll.id).unwrap()
+    all_strategies = PyEliminationStrategies.get_all_strategies()
+
+    assert set(winner_info.strategy_winner_ids) == {
+        strategy.to_int() for strategy in all_strategies
+    }
+    assert winner_info.winning_option_id == (
+        winner_info.strategy_winner_ids[poll.vote_algorithm]
+    )
+    round_report = winner_info.round_reports[poll.vote_algorithm]
+    assert round_report.num_ballots == 3
+    assert round_report.rounds[0].first_preferences[
+        winner_info.winning_option_id
+    ] == 2
+
+
+def test_contradicting_round_reports_are_not_saved(test_database):
+    from collections import Counter
+    from helpers.rcv_tally import RCVTally, DeterminePollWinnerInfo
+    from helpers.round_report import RoundReportBuilder
+
+    poll = create_poll([[1, 2], [1, 3], [2, 1]])
+    option_ids = [
+        option.id for option in
+        PollOptions.select().where(PollOptions.poll == poll.id)
+    ]
+    builder = RoundReportBuilder(Counter({
+        (option_ids[0], option_ids[1]): 2, (option_ids[1],): 1
+    }))
+    RCVTally.save_poll_winners(poll.id, DeterminePollWinnerInfo(
+        winning_option_id=option_ids[0], poll=poll, round_reports={
+            0: builder.build(0, option_ids[0]),
+            # rounds end with option 0 winning, not option 1
+            1: builder.build(1, option_ids[1])
+        }
+    ))
+
+    assert PollWinners.read_strategy_winner_ids(poll.id) == {
+        0: option_ids[0], 1: option_ids[1]
+    }
+    raw_reports = PollWinners.read_round_reports(poll.id)
+    assert raw_reports[0] is not None
+    assert raw_reports[1] is None
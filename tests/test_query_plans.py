@@ -0,0 +1,87 @@
+import pytest
+
+from typing import List, Tuple
+from peewee import Database
+
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import (
+    test_database, Users, PollOptions, PollVoters, PollWinners,
+    VoteRankings, CallbackContextState, MessageContextState, Payments
+)
+
+
+class QueryPlanRecorder(object):
+    """
+    runs EXPLAIN QUERY PLAN (sqlite) on every statement executed
+    while active, and records the plan of each statement
+    """
+    def __init__(self, database: Database):
+        self.database = database
+        self.plans: List[Tuple[str, List[str]]] = []
+        self._execute_sql = database.execute_sql
+
+    def execute_sql(self, sql: str, params=None, *args, **kwargs):
+        plan_rows = self._execute_sql(f'EXPLAIN QUERY PLAN {sql}', params)
+        self.plans.append((sql, [row[-1] for row in plan_rows]))
+        return self._execute_sql(sql, params, *args, **kwargs)
+
+    def full_scans(self) -> List[Tuple[str, str]]:
+        # table scans, and sorts that an index could have avoided
+        return [
+            (sql, detail) for sql, details in self.plans
+            for detail in details if detail.startswith(
+                ('SCAN ', 'USE TEMP B-TREE')
+            )
+        ]
+
+    def __enter__(self):
+        self.plans = []
+        self.database.execute_sql = self.execute_sql
+        return self
+
+    def __exit__(self, *_):
+        self.database.execute_sql = self._execute_sql
+
+
+@pytest.fixture
+def poll(test_database):
+    return create_poll([[1, 2], [2, 1], [1]], legacy=True)
+
+
+def run_hot_queries(poll, user_id: int, poll_voter_id: int):
+    # context lookups run on every message and button tap
+    CallbackContextState.build_from_fields(
+        user_id=user_id, chat_id=1
+    ).safe_get()
+    MessageContextState.build_from_fields(
+        user_id=user_id, message_id=1
+    ).safe_get()
+    # periodic pruning
+    CallbackContextState.prune_expired_contexts()
+    MessageContextState.prune_expired_contexts()
+    Payments.prune_expired()
+    # poll reads
+    list(PollOptions.select().where(
+        PollOptions.poll == poll.id
+    ).order_by(PollOptions.option_number))
+    VoteRankings.read_ballot(poll_voter_id)
+    PollWinners.read_strategy_winner_ids(poll.id)
+
+
+def test_hot_queries_use_indexes(test_database, poll):
+    user = Users.get(Users.id == poll.creator)
+    poll_voter = PollVoters.select().where(PollVoters.poll == poll.id).get()
+
+    with QueryPlanRecorder(test_database) as recorder:
+        run_hot_queries(poll, user.id, poll_voter.id)
+
+    assert len(recorder.plans) > 0
+    assert recorder.full_scans() == []
+
+
+def test_recorder_detects_full_scans(test_database, poll):
+    with QueryPlanRecorder(test_database) as recorder:
+        list(PollOptions.select().where(PollOptions.option_name == 'x'))
+
+    assert len(recorder.full_scans()) == 1
@@ -1,7 +1,11 @@
+import pickle
 import unittest
 
+from array import array
 from helpers.special_votes import SpecialVotes
-from py_rcv import VotesCounter as PyVotesCounter
+from py_rcv import (
+    VotesCounter as PyVotesCounter, PyEliminationStrategies
+)
 
 
 class TestRankedChoiceVote(unittest.TestCase):
@@ -213,5 +217,210 @@ class TestVoteValidation(unittest.TestCase):
         )
 
 
+class TestBallotIngestion(unittest.TestCase):
+    """
+    Unittests for the bulk / weighted ballot insertion methods
+    """
+    @staticmethod
+    def pack_votes(votes):
+        values, offsets = array('i'), array('q', [0])
+        for vote in votes:
+            values.extend(vote)
+            offsets.append(len(values))
+
+        return values, offsets
+
+    def test_bulk_matches_per_ranking_insert(self):
+        votes = [
+            [1, 6, 15],
+            [1, 2, 6, 15, 5, 4, 7, 3, 11],
+            [6, 15, 1, 11, 10, 16, 17, 8, 2, 3, 5, 7],
+            [9, 8, 6, 11, 13, 3, 1],
+            [13, 14, 16, 6, 3, 4, 5, 2, 1, 8, 9]
+        ]
+        bulk_aggregator = PyVotesCounter()
+        num_inserted = bulk_aggregator.insert_ballots(*self.pack_votes(votes))
+        self.assertEqual(num_inserted, len(votes))
+        self.assertEqual(bulk_aggregator.get_num_votes(), len(votes))
+
+        votes_aggregator = PyVotesCounter()
+        for vote_idx, vote_rankings in enumerate(votes):
+            for vote_ranking in vote_rankings:
+                votes_aggregator.insert_vote_ranking(vote_idx, vote_ranking)
+
+        self.assertEqual(
+            bulk_aggregator.determine_winner(),
+            votes_aggregator.determine_winner()
+        )
+
+    def test_weighted_ballot(self):
+        votes_aggregator = PyVotesCounter()
+        votes_aggregator.insert_ballot([1, 2], 3)
+        votes_aggregator.insert_ballot([2, 1], 2)
+        self.assertEqual(votes_aggregator.get_num_votes(), 5)
+        self.assertEqual(votes_aggregator.determine_winner(), 1)
+
+    def test_weighted_empty_votes(self):
+        votes_aggregator = PyVotesCounter()
+        votes_aggregator.insert_ballot([1], 3)
+        votes_aggregator.insert_empty_votes(2)
+        self.assertEqual(votes_aggregator.get_num_votes(), 5)
+        self.assertEqual(votes_aggregator.determine_winner(), 1)
+
+    def test_invalid_buffers(self):
+        votes_aggregator = PyVotesCounter()
+        with self.assertRaises(ValueError):
+            # last offset doesn't cover every value
+            votes_aggregator.insert_ballots(
+                array('i', [1, 2]), array('q', [0, 1])
+            )
+        with self.assertRaises(ValueError):
+            # duplicate rankings within a ballot
+            votes_aggregator.insert_ballots(*self.pack_votes([[1, 1]]))
+        with self.assertRaises(ValueError):
+            votes_aggregator.insert_ballot([1, -1, 2], 1)
+        # invalid buffers and ballots don't insert any of their ballots
+        self.assertEqual(votes_aggregator.get_num_votes(), 0)
+
+    def test_invalid_ballot_inserts_nothing(self):
+        votes_aggregator = PyVotesCounter()
+        with self.assertRaises(ValueError):
+            votes_aggregator.insert_ballots(
+                *self.pack_votes([[1, 2], [2, 1], [3, 3]])
+            )
+        self.assertEqual(votes_aggregator.get_num_votes(), 0)
+
+        votes_aggregator.insert_vote_ranking(0, 1)
+        votes_aggregator.insert_vote_ranking(1, 2)
+        votes_aggregator.insert_vote_ranking(1, 2)
+        with self.assertRaises(ValueError):
+            votes_aggregator.flush_votes()
+        self.assertEqual(votes_aggregator.get_num_votes(), 2)
+
+
+class TestCandidatesMapping(unittest.TestCase):
+    """
+    Unittests for remapping option ids to dense candidates
+    """
+    def test_large_option_ids(self):
+        offset = 2 ** 31 - 100
+        votes = [[1, 2, 3], [2, 1], [3, 2, 1], [1, 3], [2, -1]]
+        plain_aggregator = PyVotesCounter()
+        mapped_aggregator = PyVotesCounter(candidates=[
+            offset + 3, offset + 1, offset + 2
+        ], record_ballots=True)
+        for vote in votes:
+            plain_aggregator.insert_ballot(vote, 1)
+            mapped_aggregator.insert_ballot([
+                value + offset if value > 0 else value for value in vote
+            ], 1)
+
+        self.assertEqual(
+            mapped_aggregator.determine_winner(),
+            plain_aggregator.determine_winner() + offset
+        )
+        restored_aggregator = PyVotesCounter.from_bytes(
+            mapped_aggregator.to_bytes()
+        )
+        self.assertEqual(
+            restored_aggregator.determine_winner(),
+            mapped_aggregator.determine_winner()
+        )
+
+    def test_unknown_candidate(self):
+        votes_aggregator = PyVotesCounter(candidates=[10, 20])
+        votes_aggregator.insert_ballot([20, 10, -1], 1)
+        with self.assertRaises(ValueError):
+            votes_aggregator.insert_ballot([30], 1)
+        with self.assertRaises(ValueError):
+            PyVotesCounter(candidates=[0, 1])
+
+
+class TestVotesCounterSerialization(unittest.TestCase):
+    """
+    Unittests for VotesCounter to_bytes / from_bytes / pickling
+    """
+    @staticmethod
+    def build_counter():
+        votes_aggregator = PyVotesCounter(
+            elimination_strategy=PyEliminationStrategies.EliminateAll,
+            record_ballots=True
+        )
+        votes_aggregator.insert_ballot([1, 2], 3)
+        votes_aggregator.insert_ballot([2, 1], 2)
+        votes_aggregator.insert_ballot([3, 2], 2)
+        votes_aggregator.insert_vote_ranking(0, 3)
+        votes_aggregator.insert_empty_votes(1)
+        return votes_aggregator
+
+    def test_round_trip(self):
+        votes_aggregator = self.build_counter()
+        raw_counter = votes_aggregator.to_bytes()
+        restored_aggregator = PyVotesCounter.from_bytes(raw_counter)
+
+        self.assertEqual(restored_aggregator.to_bytes(), raw_counter)
+        self.assertEqual(
+            restored_aggregator.get_num_votes(),
+            votes_aggregator.get_num_votes()
+        )
+        self.assertEqual(
+            restored_aggregator.determine_winner(),
+            votes_aggregator.determine_winner()
+        )
+
+    def test_pickle(self):
+        votes_aggregator = self.build_counter()
+        restored_aggregator = pickle.loads(pickle.dumps(votes_aggregator))
+        self.assertEqual(
+            restored_aggregator.to_bytes(), votes_aggregator.to_bytes()
+        )
+
+    def test_strategy_change(self):
+        votes_aggregator = self.build_counter()
+        restored_aggregator = PyVotesCounter.from_bytes(
+            votes_aggregator.to_bytes()
+        )
+        restored_aggregator.set_elimination_strategy(
+            PyEliminationStrategies.DowdallScoring
+        )
+        fresh_aggregator = self.build_counter()
+        fresh_aggregator.set_elimination_strategy(
+            PyEliminationStrategies.DowdallScoring
+        )
+        self.assertEqual(
+            restored_aggregator.determine_winner(),
+            fresh_aggregator.determine_winner()
+        )
+
+    def test_requires_record_ballots(self):
+        votes_aggregator = PyVotesCounter()
+        votes_aggregator.insert_ballot([1, 2], 3)
+        with self.assertRaises(ValueError):
+            votes_aggregator.to_bytes()
+
+    def test_trie_built_on_first_count(self):
+        votes_aggregator = self.build_counter()
+        raw_counter = votes_aggregator.to_bytes()
+        restored_aggregator = PyVotesCounter.from_bytes(raw_counter)
+        # a reloaded counter can be stored again before it's counted
+        self.assertEqual(restored_aggregator.to_bytes(), raw_counter)
+        self.assertEqual(restored_aggregator.get_num_votes(), 9)
+        self.assertTrue(restored_aggregator.flush_votes())
+        self.assertEqual(restored_aggregator.get_num_votes(), 9)
+        self.assertFalse(restored_aggregator.flush_votes())
+
+    def test_invalid_bytes(self):
+        raw_counter = self.build_counter().to_bytes()
+        with self.assertRaises(ValueError):
+            PyVotesCounter.from_bytes(b'XXXX' + raw_counter[4:])
+        with self.assertRaises(ValueError):
+            # unknown format version
+            PyVotesCounter.from_bytes(
+                raw_counter[:4] + b'\xff\xff' + raw_counter[6:]
+            )
+        with self.assertRaises(ValueError):
+            PyVotesCounter.from_bytes(raw_counter[:-1])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,272 @@
+import time
+import asyncio
+import pytest
+import contextlib
+
+from types import SimpleNamespace
+from result import Ok
+
+pytest.importorskip('py_rcv')
+from helpers.constants import (
+    PROVISIONAL_RESULTS_MIN_INTERVAL, PROVISIONAL_RESULTS_VOTE_INTERVAL,
+    PROVISIONAL_RESULTS_MAX_AGE
+)
+from helpers.round_report import RoundReport
+from helpers.rcv_tally import (
+    RCVTally, GetPollWinnerInfo, DeterminePollWinnerInfo,
+    ProvisionalResult, ProvisionalResultsCache
+)
+from helpers.redis_cache_manager import (
+    GetPollWinnerStatus, RedisCacheManager
+)
+
+
+@pytest.fixture
+def single_flight_tally(monkeypatch):
+    """
+    RCVTally whose winner computation is a slow counted stub,
+    so that overlapping requests can be observed without redis
+    """
+    computations = []
+
+    async def compute_winner(self, poll_id: int):
+        computations.append(poll_id)
+        await asyncio.sleep(0.05)
+        return Ok(GetPollWinnerInfo(
+            poll=None, poll_winner_id=poll_id * 10,
+            status=GetPollWinnerStatus.NEWLY_COMPUTED
+        ))
+
+    monkeypatch.setattr(
+        RCVTally, '_read_cached_winner', lambda self, poll_id: None
+    )
+    monkeypatch.setattr(RCVTally, '_RCVTally__get_poll_winner', compute_winner)
+    return RCVTally(), computations
+
+
+def test_concurrent_requests_share_computation(single_flight_tally):
+    rcv_tally, computations = single_flight_tally
+
+    async def request_winners():
+        return await asyncio.gather(
+            *[rcv_tally.get_poll_winner(1) for _ in range(5)],
+            RCVTally().get_poll_winner(2)
+        )
+
+    results = asyncio.run(request_winners())
+    assert sorted(computations) == [1, 2]
+    assert [result.unwrap().poll_winner_id for result in results] == (
+        [10] * 5 + [20]
+    )
+    assert not RCVTally._pending_winners
+
+
+def test_cancelled_waiter_keeps_computation(single_flight_tally):
+    rcv_tally, computations = single_flight_tally
+
+    async def request_winners():
+        owner_task = asyncio.create_task(rcv_tally.get_poll_winner(1))
+        waiter_task = asyncio.create_task(rcv_tally.get_poll_winner(1))
+        await asyncio.sleep(0.01)
+        waiter_task.cancel()
+        return await owner_task
+
+    result = asyncio.run(request_winners())
+    assert result.unwrap().poll_winner_id == 10
+    assert computations == [1]
+
+
+def test_cancelled_owner_keeps_computation(single_flight_tally):
+    rcv_tally, computations = single_flight_tally
+
+    async def request_winners():
+        owner_task = asyncio.create_task(rcv_tally.get_poll_winner(1))
+        await asyncio.sleep(0.01)
+        waiter_task = asyncio.create_task(rcv_tally.get_poll_winner(1))
+        await asyncio.sleep(0.01)
+        # the request that started the computation goes away
+        owner_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner_task
+        return await waiter_task
+
+    result = asyncio.run(request_winners())
+    assert result.unwrap().poll_winner_id == 10
+    assert computations == [1]
+    assert not RCVTally._pending_winners
+
+
+def test_requests_join_background_tally(single_flight_tally, monkeypatch):
+    import helpers.rcv_tally
+    rcv_tally, computations = single_flight_tally
+    checkouts = []
+
+    @contextlib.asynccontextmanager
+    async def checkout_connection():
+        checkouts.append(None)
+        yield
+
+    monkeypatch.setattr(
+        helpers.rcv_tally, 'checkout_connection', checkout_connection
+    )
+
+    async def close_and_request():
+        background_task = rcv_tally.schedule_poll_winner(3)
+        assert background_task in RCVTally._background_tasks
+        # let the background job start before the request comes in
+        await asyncio.sleep(0)
+        winner_result = await RCVTally().get_poll_winner(3)
+        await background_task
+        return winner_result
+
+    result = asyncio.run(close_and_request())
+    assert result.unwrap().poll_winner_id == 30
+    assert computations == [3]
+    # only the shared computation holds a pooled connection
+    assert len(checkouts) == 1
+    assert not RCVTally._background_tasks
+
+
+@pytest.fixture
+def provisional_tally(monkeypatch):
+    """
+    RCVTally for a fake open poll, with the redis lock and the
+    vote count replaced so that recounts can be observed
+    """
+    poll = SimpleNamespace(id=1, closed=False, num_votes=5, vote_algorithm=0)
+    computations = []
+
+    class FakeLock(object):
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *_):
+            return False
+
+    async def fake_lock(_):
+        return FakeLock()
+
+    async def no_refresh(_):
+        # like refresh_lock, runs until it gets cancelled
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            pass
+
+    async def compute_winner(self, poll_id: int):
+        computations.append(poll.num_votes)
+        return Ok(DeterminePollWinnerInfo(
+            winning_option_id=poll.num_votes, poll=poll,
+            round_reports={0: RoundReport(
+                vote_algorithm=0, winner_id=poll.num_votes,
+                num_ballots=poll.num_votes
+            )}
+        ))
+
+    monkeypatch.setattr(
+        RCVTally, 'fetch_poll', staticmethod(lambda poll_id: Ok(poll))
+    )
+    monkeypatch.setattr(RCVTally, '_compute_poll_winner', compute_winner)
+    monkeypatch.setattr(
+        RedisCacheManager, 'refresh_lock', staticmethod(no_refresh)
+    )
+    RCVTally._provisional_results.clear()
+
+    rcv_tally = RCVTally()
+    monkeypatch.setattr(rcv_tally.cache, 'lock', fake_lock)
+    yield rcv_tally, poll, computations
+    RCVTally._provisional_results.clear()
+
+
+def test_provisional_results_are_throttled(provisional_tally):
+    rcv_tally, poll, computations = provisional_tally
+
+    def get_provisional_winner():
+        result = asyncio.run(rcv_tally.get_provisional_winner(poll.id))
+        winner_info = result.unwrap()
+        assert winner_info.provisional
+        return winner_info
+
+    assert get_provisional_winner().status == (
+        GetPollWinnerStatus.NEWLY_COMPUTED
+    )
+    # no new votes, served from the cached result
+    assert get_provisional_winner().status == GetPollWinnerStatus.CACHED
+    # a few new votes within the interval are not enough to recount
+    poll.num_votes += 1
+    assert get_provisional_winner().poll_winner_id == 5
+    assert computations == [5]
+
+    poll.num_votes += PROVISIONAL_RESULTS_VOTE_INTERVAL
+    assert get_provisional_winner().poll_winner_id == poll.num_votes
+    assert len(computations) == 2
+
+    # enough time has passed since the last count
+    RCVTally._provisional_results.get(poll.id).computed_at -= (
+        PROVISIONAL_RESULTS_MIN_INTERVAL
+    )
+    assert get_provisional_winner().status == GetPollWinnerStatus.CACHED
+    poll.num_votes += 1
+    assert get_provisional_winner().status == (
+        GetPollWinnerStatus.NEWLY_COMPUTED
+    )
+    assert len(computations) == 3
+
+    # re-votes leave the vote counter as is, the result still expires
+    RCVTally._provisional_results.get(poll.id).computed_at -= (
+        PROVISIONAL_RESULTS_MAX_AGE
+    )
+    assert get_provisional_winner().status == (
+        GetPollWinnerStatus.NEWLY_COMPUTED
+    )
+    assert len(computations) == 4
+
+
+def test_provisional_results_are_bounded(monkeypatch):
+    results_cache = ProvisionalResultsCache(max_size=2, ttl=60)
+    for poll_id in (1, 2):
+        results_cache.put(poll_id, ProvisionalResult(
+            poll_winner_id=poll_id, round_report=None, num_votes=1,
+            computed_at=0
+        ))
+
+    assert results_cache.get(1).poll_winner_id == 1
+    results_cache.put(3, results_cache.get(1))
+    # poll 2's result was the least recently read
+    assert results_cache.get(2) is None
+    assert len(results_cache) == 2
+
+    # reading a result doesn't postpone its expiry
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 59)
+    assert results_cache.get(1).poll_winner_id == 1
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+    assert results_cache.get(1) is None
+    assert results_cache.get(3) is None
+    assert len(results_cache) == 0
+
+
+def test_batch_tally_matches_sequential_tally():
+    from array import array
+    from helpers.ballot_loader import PackedBallots
+
+    ballots = PackedBallots(
+        voter_ids=array('q', [1, 2, 3, 4, 5]),
+        values=array('i', [1, 2, 2, 1, 1, 3, 3, -1, 2]),
+        offsets=array('q', [0, 2, 4, 6, 8, 9])
+    )
+    weighted_ballots = PackedBallots(
+        voter_ids=array('q', [1, 2]), values=array('i', [2, 1, 1]),
+        offsets=array('q', [0, 2, 3]), counts=array('q', [3, 2])
+    )
+    tasks = [
+        (vote_algorithm, num_poll_voters, poll_ballots)
+        for vote_algorithm in range(4)
+        for num_poll_voters, poll_ballots in (
+            (6, ballots), (5, weighted_ballots)
+        )
+    ]
+    winner_ids = RCVTally.count_votes_batch([
+        RCVTally.build_tally_task(*task) for task in tasks
+    ], num_threads=2)
+    assert winner_ids == [RCVTally.count_votes(*task) for task in tasks]
@@ -0,0 +1,150 @@
+import random
+import pytest
+
+from collections import Counter
+
+from helpers.ballot_loader import PackedBallots
+from helpers.round_report import (
+    RoundReport, RoundReportBuilder, EXHAUSTED
+)
+from helpers.special_votes import SpecialVotes
+
+WITHHOLD = SpecialVotes.WITHHOLD_VOTE.value
+ABSTAIN = SpecialVotes.ABSTAIN_VOTE.value
+
+
+def test_tie_eliminates_every_candidate():
+    builder = RoundReportBuilder(Counter({
+        (1, 2): 2, (2, 1): 2, (3, 2): 1, (3,): 1
+    }))
+    report = builder.build(vote_algorithm=1, winner_id=None)
+    assert report.num_ballots == 6
+    assert len(report.rounds) == 1
+
+    first_round = report.rounds[0]
+    assert first_round.first_preferences == {1: 2, 2: 2, 3: 2}
+    assert first_round.eliminated == [1, 2, 3]
+    assert first_round.transfers == {
+        1: {EXHAUSTED: 2}, 2: {EXHAUSTED: 2}, 3: {EXHAUSTED: 2}
+    }
+
+
+def test_elimination_and_transfers():
+    builder = RoundReportBuilder(Counter({
+        (1, 2): 3, (2, 1): 2, (3, 2): 2, (3, WITHHOLD): 1
+    }), num_empty_votes=1)
+    report = builder.build(vote_algorithm=1, winner_id=None)
+
+    first_round = report.rounds[0]
+    assert first_round.first_preferences == {1: 3, 2: 2, 3: 3}
+    assert first_round.withheld == 1
+    assert first_round.eliminated == [2]
+    assert first_round.transfers == {2: {1: 2}}
+
+    second_round = report.rounds[1]
+    assert second_round.first_preferences == {1: 5, 3: 3}
+    # 5 of 9 counted votes (withheld votes included) is a majority
+    assert second_round.eliminated == []
+    assert len(report.rounds) == 2
+
+
+def test_abstain_and_dowdall_tie_break():
+    builder = RoundReportBuilder(Counter({
+        (1, 2): 2, (2, 3): 1, (3, 2): 1, (ABSTAIN,): 4
+    }))
+    report = builder.build(vote_algorithm=0, winner_id=1)
+    first_round = report.rounds[0]
+    assert first_round.abstained == 4
+    # 2 and 3 are tied on first preferences, 3 has the lower Dowdall score
+    assert first_round.eliminated == [3]
+    assert first_round.transfers == {3: {2: 1}}
+    assert report.rounds[1].first_preferences == {1: 2, 2: 2}
+
+
+def test_report_json_round_trip():
+    builder = RoundReportBuilder(Counter({(1, 2): 3, (2, 1): 2, (3,): 2}))
+    report = builder.build(vote_algorithm=1, winner_id=1)
+    raw_report = report.to_json()
+    assert ' ' not in raw_report
+    assert RoundReport.from_json(raw_report) == report
+
+    lines = report.to_message_lines({1: 'apple', 2: 'pear', 3: 'fig'})
+    assert lines[0] == 'Round 1 - apple: 3, pear: 2, fig: 2 (eliminated pear, fig)'
+
+
+def build_random_ballots(rng: random.Random) -> PackedBallots:
+    num_candidates = rng.randint(1, 6)
+    ballots = PackedBallots()
+    for voter_id in range(rng.randint(0, 60)):
+        ballot = rng.sample(
+            range(1, num_candidates + 1), rng.randint(0, num_candidates)
+        )
+        if (len(ballot) == 0) or (rng.random() < 0.15):
+            ballot.append(rng.choice([WITHHOLD, ABSTAIN]))
+
+        for value in ballot:
+            ballots.add_ranking(voter_id, value)
+
+    return ballots
+
+
+def test_sharded_rounds_match_sequential_rounds():
+    pytest.importorskip('py_rcv')
+    rng = random.Random(0)
+
+    for _ in range(200):
+        ballots = build_random_ballots(rng)
+        num_empty_votes = rng.randint(0, 3)
+        builder = RoundReportBuilder.from_packed_ballots(
+            ballots, ballots.num_ballots + num_empty_votes
+        )
+        assert builder.sharded_ballots is None
+
+        for num_shards in (1, 3, 8):
+            sharded_builder = RoundReportBuilder(
+                builder.ballot_counts, num_empty_votes,
+                RoundReportBuilder.shard_ballots(ballots, num_shards)
+            )
+            for vote_algorithm in range(4):
+                assert sharded_builder.build(vote_algorithm, None) == (
+                    builder.build(vote_algorithm, None)
+                )
+
+
+def test_reports_that_contradict_the_winner():
+    builder = RoundReportBuilder(Counter({(1, 2): 3, (2, 1): 2, (3,): 2}))
+    report = builder.build(vote_algorithm=1, winner_id=1)
+    assert report.get_final_round_winner() == 1
+    assert report.matches_winner()
+
+    # e.g. the vote counter broke a tie differently than the rounds
+    assert not builder.build(vote_algorithm=1, winner_id=2).matches_winner()
+
+    tied_report = RoundReportBuilder(Counter({(1,): 1, (2,): 1})).build(
+        vote_algorithm=1, winner_id=None
+    )
+    assert tied_report.get_final_round_winner() is None
+    assert tied_report.matches_winner()
+
+
+def test_sharded_polls_take_winners_from_vote_counter(monkeypatch):
+    pytest.importorskip('py_rcv')
+    from helpers import round_report
+    from helpers.rcv_tally import RCVTally
+    # shard every poll, as if they were all large
+    monkeypatch.setattr(round_report, 'SHARDED_ROUND_COUNT_MIN_BALLOTS', 1)
+    rng = random.Random(2)
+
+    for _ in range(50):
+        ballots = build_random_ballots(rng)
+        num_poll_voters = ballots.num_ballots + rng.randint(0, 3)
+        round_reports = RCVTally.tally_strategies(num_poll_voters, ballots)
+        # the shards only count the report's rounds, the winners
+        # (special votes and tie breaks included) are the trie's
+        strategy_winner_ids = RCVTally.count_strategies(
+            num_poll_voters, ballots
+        )
+        assert {
+            vote_algorithm: report.winner_id
+            for vote_algorithm, report in round_reports.items()
+        } == strategy_winner_ids
@@ -0,0 +1,79 @@
+import io
+import csv
+import json
+import pytest
+
+from helpers.ballot_snapshot import export_poll_snapshot
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import test_database, PollOptions, PollWinners
+
+pytest.importorskip('py_rcv')
+import tally_cli
+
+VOTES = [[1, 2], [2, 1], [1, 2], [3, -1], [1]]
+
+
+def test_recount_matches_stored_winners(test_database):
+    poll = create_poll(VOTES)
+    recount, = tally_cli.run_recounts([poll.id])
+    assert recount.error is None
+    assert recount.num_ballots == len(VOTES)
+    PollWinners.save_strategy_winner_ids(poll.id, recount.winners)
+
+    rows = tally_cli.build_report([recount])
+    assert len(rows) == len(recount.winners)
+    assert all(row.matches for row in rows)
+    assert sum(row.is_poll_algorithm for row in rows) == 1
+
+    # a stored winner that the engine no longer agrees with
+    other_option = PollOptions.select().where(
+        (PollOptions.poll == poll.id) &
+        (PollOptions.id != recount.winners[0])
+    ).first()
+    PollWinners.update(option=other_option.id).where(
+        (PollWinners.poll == poll.id) & (PollWinners.vote_algorithm == 0)
+    ).execute()
+    mismatches = [
+        row for row in tally_cli.build_report([recount])
+        if row.matches is False
+    ]
+    assert [row.vote_algorithm for row in mismatches] == [0]
+
+
+def test_snapshot_recounts_in_worker_processes(test_database, tmp_path):
+    polls = [create_poll(VOTES), create_poll(VOTES[:3])]
+    for poll in polls:
+        export_poll_snapshot(
+            poll.id, str(tmp_path / f'poll-{poll.id}.snapshot')
+        )
+
+    snapshot_paths = tally_cli.find_snapshot_paths([str(tmp_path)])
+    assert len(snapshot_paths) == 2
+    expected_recounts = tally_cli.run_recounts([poll.id for poll in polls])
+    recounts = tally_cli.run_recounts(
+        snapshot_paths=snapshot_paths, processes=2
+    )
+    assert [recount.poll_id for recount in recounts] == [
+        poll.id for poll in polls
+    ]
+    assert [recount.winners for recount in recounts] == [
+        recount.winners for recount in expected_recounts
+    ]
+
+
+def test_report_formats(test_database, tmp_path):
+    poll = create_poll(VOTES)
+    recounts = tally_cli.run_recounts([poll.id, poll.id + 1000])
+    assert recounts[1].error is not None
+    rows = tally_cli.build_report(recounts, compare_stored=False)
+
+    json_output = io.StringIO()
+    tally_cli.write_report(rows, json_output, 'json')
+    assert len(json.loads(json_output.getvalue())) == len(rows)
+
+    csv_output = io.StringIO()
+    tally_cli.write_report(rows, csv_output, 'csv')
+    csv_rows = list(csv.DictReader(io.StringIO(csv_output.getvalue())))
+    assert len(csv_rows) == len(rows)
+    assert csv_rows[-1]['error'] != ''
@@ -0,0 +1,95 @@
+import time
+import asyncio
+import pytest
+
+from helpers.tally_executor import (
+    TallyExecutor, TallyExecutorConfig, TallyJobStatus
+)
+
+
+def slow_square(value: int, delay: float = 0.0) -> int:
+    time.sleep(delay)
+    return value * value
+
+
+def failing_job():
+    raise ValueError('tally failed')
+
+
+@pytest.fixture
+def build_executor():
+    executors = []
+
+    def build(**kwargs) -> TallyExecutor:
+        TallyExecutor._instance = None
+        executor = TallyExecutor(TallyExecutorConfig(**kwargs))
+        executors.append(executor)
+        return executor
+
+    yield build
+    for executor in executors:
+        executor.shutdown()
+
+    TallyExecutor._instance = None
+
+
+def test_executor_is_shared(build_executor):
+    executor = build_executor(max_workers=1)
+    assert TallyExecutor() is executor
+    assert TallyExecutor().config.max_workers == 1
+
+
+def test_thread_jobs_record_metrics(build_executor):
+    executor = build_executor(max_workers=1)
+
+    async def run_jobs():
+        return await asyncio.gather(*[
+            executor.run(slow_square, value, 0.05) for value in range(3)
+        ])
+
+    results = asyncio.run(run_jobs())
+    assert [result.unwrap() for result in results] == [0, 1, 4]
+
+    metrics = executor.get_metrics()
+    assert metrics.num_completed == 3
+    assert metrics.total_compute_time >= 0.15
+    # with a single worker the last job has to wait for the other two
+    assert metrics.max_queue_wait >= 0.05
+    assert executor.num_pending == 0
+
+
+def test_queue_full_rejects_jobs(build_executor):
+    executor = build_executor(max_workers=1, max_queue_size=1)
+
+    async def run_jobs():
+        return await asyncio.gather(
+            executor.run(slow_square, 2, 0.1),
+            executor.run(slow_square, 3)
+        )
+
+    first_result, second_result = asyncio.run(run_jobs())
+    assert first_result.unwrap() == 4
+    assert second_result.unwrap_err() == TallyJobStatus.QUEUE_FULL
+    assert executor.get_metrics().num_rejected == 1
+
+
+def test_job_timeout_and_failure(build_executor):
+    executor = build_executor(max_workers=1, job_timeout=0.05)
+
+    timeout_result = asyncio.run(executor.run(slow_square, 2, 0.3))
+    assert timeout_result.unwrap_err() == TallyJobStatus.TIMED_OUT
+    failed_result = asyncio.run(executor.run(failing_job, timeout=1))
+    assert failed_result.unwrap_err() == TallyJobStatus.FAILED
+
+    metrics = executor.get_metrics()
+    assert metrics.num_timed_out == 1
+    assert metrics.num_failed == 1
+
+
+def test_process_pool_jobs(build_executor):
+    executor = build_executor(use_processes=True, max_workers=2)
+    assert executor.uses_processes
+
+    result = asyncio.run(executor.run(slow_square, 7, timeout=30))
+    assert result.unwrap() == 49
+    assert executor.get_metrics().num_completed == 1
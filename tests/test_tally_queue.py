@@ -0,0 +1,226 @@
+import time
+import redis
+import pytest
+import sqlite3
+import threading
+
+from redis.exceptions import RedisError
+from helpers.tally_queue import (
+    RedisTallyQueue, SQLiteTallyQueue, TallyJobState, create_tally_queue
+)
+from tests.poll_fixtures import create_poll
+# noinspection PyUnresolvedReferences
+from database import test_database, PollWinners
+
+
+@pytest.fixture
+def tally_queue():
+    tally_queue = SQLiteTallyQueue()
+    tally_queue.RETRY_BACKOFF = 0.05
+    tally_queue.POLL_INTERVAL = 0.01
+    return tally_queue
+
+
+@pytest.fixture
+def redis_tally_queue():
+    # runs against a local redis server, flushes a scratch database
+    client = redis.Redis(db=15, socket_connect_timeout=0.2)
+    try:
+        client.ping()
+    except RedisError:
+        pytest.skip('redis server is not available')
+
+    client.flushdb()
+    tally_queue = RedisTallyQueue(client, lease_timeout=0.1)
+    tally_queue.RETRY_BACKOFF = 0.05
+    tally_queue.POLL_INTERVAL = 0.01
+    yield tally_queue
+    client.flushdb()
+
+
+def test_create_tally_queue():
+    assert create_tally_queue({}) is None
+    assert create_tally_queue({'queue_backend': ''}) is None
+    assert isinstance(create_tally_queue({
+        'queue_backend': 'sqlite', 'sqlite_path': ':memory:'
+    }), SQLiteTallyQueue)
+
+    with pytest.raises(ValueError):
+        create_tally_queue({'queue_backend': 'kafka'})
+
+
+def test_enqueue_deduplicates_active_jobs(tally_queue):
+    job = tally_queue.enqueue(1)
+    assert job.state == TallyJobState.QUEUED
+    assert tally_queue.enqueue(1).job_id == job.job_id
+    assert tally_queue.enqueue(2).job_id != job.job_id
+
+    claimed_job = tally_queue.claim(timeout=0)
+    assert claimed_job.job_id == job.job_id
+    assert claimed_job.state == TallyJobState.RUNNING
+    assert claimed_job.attempts == 1
+    # running jobs are joined rather than queued again
+    assert tally_queue.enqueue(1).job_id == job.job_id
+
+    tally_queue.complete(claimed_job)
+    assert tally_queue.get_job(job.job_id).state == TallyJobState.DONE
+    # finished jobs don't stop new jobs from being queued
+    new_job = tally_queue.enqueue(1)
+    assert new_job.job_id != job.job_id
+    assert tally_queue.get_poll_job(1).job_id == new_job.job_id
+
+
+def test_claim_times_out_when_empty(tally_queue):
+    start_stamp = time.time()
+    assert tally_queue.claim(timeout=0.05) is None
+    assert time.time() - start_stamp >= 0.05
+
+
+def test_failed_jobs_retry_with_backoff(tally_queue):
+    job = tally_queue.enqueue(1)
+
+    for attempt in range(1, tally_queue.MAX_ATTEMPTS):
+        claimed_job = tally_queue.claim(timeout=1)
+        assert claimed_job.job_id == job.job_id
+        assert claimed_job.attempts == attempt
+
+        fail_stamp = time.time()
+        assert tally_queue.fail(claimed_job, 'boom')
+        retried_job = tally_queue.get_job(job.job_id)
+        assert retried_job.state == TallyJobState.QUEUED
+        assert retried_job.available_at >= (
+            fail_stamp + tally_queue.get_retry_delay(attempt)
+        )
+        # the job can't be claimed until its backoff delay has passed
+        assert tally_queue.claim(timeout=0) is None
+
+    claimed_job = tally_queue.claim(timeout=1)
+    assert claimed_job.attempts == tally_queue.MAX_ATTEMPTS
+    assert not tally_queue.fail(claimed_job, 'boom')
+
+    failed_job = tally_queue.get_job(job.job_id)
+    assert failed_job.state == TallyJobState.FAILED
+    assert failed_job.last_error == 'boom'
+    assert tally_queue.claim(timeout=0) is None
+
+
+def test_retry_delay_doubles(tally_queue):
+    assert tally_queue.get_retry_delay(1) == tally_queue.RETRY_BACKOFF
+    assert tally_queue.get_retry_delay(3) == 4 * tally_queue.RETRY_BACKOFF
+
+
+def test_worker_stores_poll_winners(test_database, tally_queue):
+    pytest.importorskip('py_rcv')
+    from tally_worker import TallyWorker
+
+    poll = create_poll([[1, 2], [1, 3], [2, 1]])
+    job = tally_queue.enqueue(poll.id)
+    worker = TallyWorker(tally_queue)
+    worker.CLAIM_TIMEOUT = 0
+
+    assert worker.run_once()
+    assert tally_queue.get_job(job.job_id).state == TallyJobState.DONE
+    assert PollWinners.read_poll_winner(
+        poll.id, poll.vote_algorithm
+    ).is_ok()
+    assert worker.run_once() is None
+
+
+def test_expired_leases_are_requeued(tally_queue):
+    tally_queue.LEASE_TIMEOUT = 0.05
+    job = tally_queue.enqueue(1)
+    claimed_job = tally_queue.claim(timeout=0)
+    assert claimed_job.lease_expires_at > time.time()
+    assert tally_queue.reap_expired_jobs() == []
+
+    # the worker died without finishing the job
+    time.sleep(0.1)
+    reaped_jobs = tally_queue.reap_expired_jobs()
+    assert [reaped_job.job_id for reaped_job in reaped_jobs] == [job.job_id]
+    requeued_job = tally_queue.get_job(job.job_id)
+    assert requeued_job.state == TallyJobState.QUEUED
+    assert requeued_job.last_error == 'lease expired'
+    # the poll still has one active job, which gets claimed again
+    assert tally_queue.enqueue(1).job_id == job.job_id
+    assert tally_queue.claim(timeout=1).attempts == 2
+
+
+def test_sqlite_queue_adds_lease_column(tmp_path):
+    path = str(tmp_path / 'tally_jobs.db')
+    connection = sqlite3.connect(path)
+    connection.execute('''
+        CREATE TABLE tally_jobs (
+            job_id TEXT PRIMARY KEY, poll_id INTEGER NOT NULL,
+            state INTEGER NOT NULL, attempts INTEGER NOT NULL,
+            enqueued_at REAL NOT NULL, available_at REAL NOT NULL,
+            last_error TEXT NOT NULL
+        )
+    ''')
+    connection.execute(
+        "INSERT INTO tally_jobs VALUES ('old', 1, 0, 0, 0, 0, '')"
+    )
+    connection.commit()
+    connection.close()
+
+    tally_queue = SQLiteTallyQueue(path)
+    assert tally_queue.enqueue(1).job_id == 'old'
+    assert tally_queue.claim(timeout=0).lease_expires_at > 0
+
+
+def test_redis_enqueue_is_atomic(redis_tally_queue):
+    client = redis_tally_queue.client
+    job = redis_tally_queue.enqueue(1)
+    assert redis_tally_queue.enqueue(1).job_id == job.job_id
+    # the job record, poll job key and pending entry are written together
+    assert redis_tally_queue.get_poll_job(1).job_id == job.job_id
+    assert client.lrange(redis_tally_queue.PENDING_KEY, 0, -1) == [
+        job.job_id.encode()
+    ]
+
+    claimed_job = redis_tally_queue.claim(timeout=0)
+    redis_tally_queue.complete(claimed_job)
+    poll_job_key = redis_tally_queue._build_key(
+        redis_tally_queue.POLL_JOB_KEY, 1
+    )
+    assert client.ttl(poll_job_key) > 0
+    new_job = redis_tally_queue.enqueue(1)
+    assert new_job.job_id != job.job_id
+    # queueing a new job clears the finished job's expiry
+    assert client.ttl(poll_job_key) == -1
+
+
+def test_redis_expired_leases_are_requeued(redis_tally_queue):
+    job = redis_tally_queue.enqueue(1)
+    assert redis_tally_queue.claim(timeout=0).job_id == job.job_id
+    assert redis_tally_queue.reap_expired_jobs() == []
+
+    time.sleep(0.15)
+    reaped_jobs = redis_tally_queue.reap_expired_jobs()
+    assert [reaped_job.job_id for reaped_job in reaped_jobs] == [job.job_id]
+    assert redis_tally_queue.get_job(job.job_id).state == (
+        TallyJobState.QUEUED
+    )
+    reclaimed_job = redis_tally_queue.claim(timeout=1)
+    assert reclaimed_job.job_id == job.job_id
+    assert reclaimed_job.attempts == 2
+
+
+def test_redis_claim_waits_for_jobs(redis_tally_queue):
+    # the claim blocks on the pending list instead of polling it
+    redis_tally_queue.POLL_INTERVAL = 10
+    enqueue_timer = threading.Timer(0.1, redis_tally_queue.enqueue, (1,))
+    enqueue_timer.start()
+    start = time.time()
+    job = redis_tally_queue.claim(timeout=5)
+    enqueue_timer.join()
+    assert job.poll_id == 1
+    assert time.time() - start < 1
+    # jobs pushed while waiting are leased by the claim, not moved
+    assert redis_tally_queue.client.llen(redis_tally_queue.PENDING_KEY) == 0
+
+    redis_tally_queue.fail(job, 'error')
+    # the wait ends once the retried job is available
+    redis_tally_queue.POLL_INTERVAL = 0.01
+    retried_job = redis_tally_queue.claim(timeout=5)
+    assert retried_job.job_id == job.job_id
+    assert time.time() - start < 1
@@ -0,0 +1,104 @@
+import time
+import logging
+import pytest
+
+from telegram import User as TeleUser
+from tests.poll_fixtures import QueryCounter
+# noinspection PyUnresolvedReferences
+from database import test_database, Users, db
+from database.users_cache import UsersCache, UsersCacheConfig
+
+
+@pytest.fixture
+def build_cache():
+    def build(**kwargs) -> UsersCache:
+        UsersCache._instance = None
+        return UsersCache(UsersCacheConfig(redis_url='', **kwargs))
+
+    yield build
+    # deactivate the cache for other tests
+    UsersCache._instance = None
+
+
+def read_update_user(tele_id: int, username: str) -> Users:
+    from tele_helpers import TelegramHelpers
+    return TelegramHelpers.read_update_user(TeleUser(
+        id=tele_id, first_name='user', is_bot=False, username=username
+    ))
+
+
+def test_cached_users_skip_database(test_database, build_cache):
+    users_cache = build_cache()
+    user = read_update_user(1, 'alice')
+
+    with QueryCounter(test_database) as counter:
+        cached_user = read_update_user(1, 'alice')
+
+    assert counter.num_queries == 0
+    assert cached_user.id == user.id
+    # each read gets its own copy of the row
+    assert cached_user is not read_update_user(1, 'alice')
+    assert users_cache.get_metrics().hits == 2
+
+
+def test_writes_go_through_cache(test_database, build_cache):
+    users_cache = build_cache()
+    read_update_user(1, 'alice')
+    renamed_user = read_update_user(1, 'bob')
+
+    assert users_cache.get(1).username == 'bob'
+    assert Users.get_by_id(renamed_user.id).username == 'bob'
+
+    # rows saved in a transaction are only cached once it commits
+    with db.atomic():
+        renamed_user.username = 'carol'
+        renamed_user.save()
+        assert users_cache.get(1) is None
+        renamed_user.username = 'unsaved'
+    assert users_cache.get(1).username == 'carol'
+
+    with pytest.raises(RuntimeError):
+        with db.atomic():
+            renamed_user.username = 'dave'
+            renamed_user.save()
+            raise RuntimeError
+    # the rolled back rename never reaches the cache
+    assert users_cache.get(1) is None
+    assert read_update_user(1, 'carol').username == 'carol'
+
+    read_update_user(1, 'carol').delete_account(logging.getLogger())
+    assert users_cache.get(1) is None
+    assert Users.select().where(Users.tele_id == 1).count() == 0
+
+
+def test_lru_and_ttl_eviction(test_database, build_cache):
+    users_cache = build_cache(max_size=2, ttl=0.2)
+    for tele_id in (1, 2):
+        read_update_user(tele_id, f'user{tele_id}')
+
+    users_cache.get(1)
+    read_update_user(3, 'user3')
+    # user 2 was the least recently used
+    assert users_cache.get(2) is None
+    assert users_cache.get(1) is not None
+
+    time.sleep(0.3)
+    assert users_cache.get(1) is None
+
+
+def test_remote_invalidation(test_database, build_cache):
+    users_cache = build_cache()
+    for tele_id in (1, 2):
+        read_update_user(tele_id, f'user{tele_id}')
+
+    # messages published by this process are ignored
+    users_cache.handle_message(f'{users_cache.instance_id}:1')
+    assert users_cache.get(1) is not None
+
+    users_cache.handle_message(b'other:1')
+    assert users_cache.get(1) is None
+    assert users_cache.get(2) is not None
+
+    users_cache.handle_message(f'other:{UsersCache.FLUSH_ALL}')
+    assert users_cache.get(2) is None
+    assert users_cache.get_metrics().remote_invalidations == 2
@@ -1,11 +1,17 @@
 import json
+import asyncio
 import argparse
 import uvicorn
 import dataclasses
 
 from load_config import *
 from base_api import BaseAPI
-from database.database import Users
+from database.database import Users, PollWinners
+from database.setup import checkout_connection
+from database.users_cache import UsersCache
+from helpers.live_tally import LiveTallyManager
+from playhouse.pool import MaxConnectionsExceeded
+from result import Result, Ok, Err
 
 from fastapi import FastAPI, APIRouter
 from pydantic import BaseModel
@@ -28,6 +34,17 @@ class VoteRequestPayload(BaseModel):
     votes: List[int]
 
 
+class DatabaseConnectionMiddleware(BaseHTTPMiddleware):
+    # each request holds one pooled db connection while it runs
+    async def dispatch(self, request: Request, call_next):
+        try:
+            async with checkout_connection():
+                return await call_next(request)
+        except MaxConnectionsExceeded:
+            content = {'detail': 'Server busy, try again later'}
+            return JSONResponse(content=content, status_code=503)
+
+
 class VerifyMiddleware(BaseHTTPMiddleware):
     # how many seconds auth tokens are valid for
     # AUTH_TOKEN_EXPIRY = 24 * 3600
@@ -113,10 +130,15 @@ class VotingWebApp(BaseAPI):
             '/fetch_poll', self.fetch_poll_endpoint,
             methods=['POST']
         )
+        self.router.add_api_route(
+            '/fetch_poll_report', self.fetch_poll_report_endpoint,
+            methods=['POST']
+        )
 
-    def fetch_poll_endpoint(
-        self, request: Request, payload: FetchPollPayload
-    ):
+    @staticmethod
+    def read_request_user(request: Request) -> Result[
+        tuple[Users, dict], JSONResponse
+    ]:
         telegram_data_header = request.headers.get(TELEGRAM_DATA_HEADER)
         parsed_query = parse_qs(telegram_data_header)
         user_json_str = unquote(parsed_query['user'][0])
@@ -125,15 +147,25 @@ class VotingWebApp(BaseAPI):
         tele_id = int(user_info['id'])
         user_res = Users.get_from_tele_id(tele_id)
         if user_res.is_err():
-            return JSONResponse(
+            return Err(JSONResponse(
                 status_code=400, content={'error': 'User not found'}
-            )
+            ))
         user = user_res.unwrap()
         if user.is_deleted():
-            return JSONResponse(
+            return Err(JSONResponse(
                 status_code=403, content={'error': 'User is deleted'}
-            )
+            ))
+
+        return Ok((user, user_info))
 
+    def fetch_poll_endpoint(
+        self, request: Request, payload: FetchPollPayload
+    ):
+        user_res = self.read_request_user(request)
+        if user_res.is_err():
+            return user_res.unwrap_err()
+
+        user, user_info = user_res.unwrap()
         user_id = user.get_user_id()
         username = user_info['username']
         read_poll_result = self.read_poll_info(
@@ -150,10 +182,60 @@ class VotingWebApp(BaseAPI):
         poll_info = read_poll_result.unwrap()
         return dataclasses.asdict(poll_info)
 
+    def fetch_poll_report_endpoint(
+        self, request: Request, payload: FetchPollPayload
+    ):
+        """
+        returns the stored round-by-round tally reports of the poll
+        for every elimination strategy that has been computed
+        """
+        user_res = self.read_request_user(request)
+        if user_res.is_err():
+            return user_res.unwrap_err()
+
+        user, user_info = user_res.unwrap()
+        has_poll_access = self.has_access_to_poll_id(
+            payload.poll_id, user.get_user_id(),
+            username=user_info['username']
+        )
+        if not has_poll_access:
+            return JSONResponse(
+                status_code=403, content={
+                    'error': f'You have no access to poll {payload.poll_id}'
+                }
+            )
+
+        raw_reports = PollWinners.read_round_reports(payload.poll_id)
+        if len(raw_reports) == 0:
+            return JSONResponse(
+                status_code=404,
+                content={'error': 'Poll results have not been computed'}
+            )
+
+        return {
+            'poll_id': payload.poll_id,
+            'reports': {
+                vote_algorithm: json.loads(raw_report)
+                for vote_algorithm, raw_report in raw_reports.items()
+                if raw_report is not None
+            }
+        }
+
+
+async def listen_for_cache_invalidations():
+    loop = asyncio.get_running_loop()
+    # drop warm poll tallies that the bot has registered votes for
+    loop.create_task(LiveTallyManager().listen())
+    # the users cache broadcasts this process' Users writes to the bot
+    # (and drops rows that the bot has written)
+    loop.create_task(UsersCache().listen())
+
 
 app = FastAPI()
 predictor = VotingWebApp()
 app.include_router(predictor.router)
+# innermost middleware, so only authorized requests take up connections
+app.add_middleware(DatabaseConnectionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
@@ -162,6 +244,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(VerifyMiddleware)
+app.add_event_handler('startup', listen_for_cache_invalidations)
+app.add_event_handler('shutdown', predictor.tally_executor.shutdown)
 
 
 if __name__ == "__main__":